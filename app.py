@@ -15,8 +15,26 @@ from dotenv import load_dotenv
 
 from config.eureka_client import register_with_eureka, shutdown_eureka
 from routes.cluster_route import router as cluster_router
+from routes.placement_route import router as placement_router
+from routes.image_staging_route import router as image_staging_router
+from routes.allocation_route import router as allocation_router
+from routes.placement_group_route import router as placement_group_router
+from routes.admin_route import router as admin_router
+from routes.system_image_route import router as system_image_router
 from config.settings import load_config
-from database import create_tables, init_database, seed_database
+from database import SessionLocal, create_tables, init_database, seed_database
+from services.allocation_ledger import allocation_ledger
+from services.capabilities import capabilities
+from services.health_monitor import health_monitor
+from services.event_log import event_log, EVENT_LOG_PATH
+from services.idempotency import idempotency_store
+from services.replica_router import replica_router
+from services.timeseries import timeseries
+from services.traffic_capture import TrafficCaptureMiddleware, traffic_capture
+from services.tracing import TracingMiddleware, tracer
+from services.warm_pool import warm_pool
+from services.zone_index import zone_index
+from services.image_variants import shutdown_executor
 
 # Configurer le logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -52,6 +70,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Capture du trafic pour les essais de rejeu (inactive sans TRAFFIC_CAPTURE_PATH)
+app.add_middleware(TrafficCaptureMiddleware)
+# Traces et profils par requête (en-têtes X-Trace / X-Profile ou échantillonnage)
+app.add_middleware(TracingMiddleware)
+
     
 # Eureka lifecycle events
 @app.on_event("startup")
@@ -61,11 +84,49 @@ async def startup_event():
         #creation de la base de donnee
         create_tables()
         seed_database()
+        try:
+            idempotency_store.purge_expired()
+        except Exception as e:
+            logger.warning(f"Impossible de purger les clés d'idempotence expirées: {e}")
+        # Recalculer les ressources allouées par hôte depuis le registre
+        allocation_ledger.rebuild_now()
+    # Recharger l'état du journal d'événements (instantané de tête puis relecture) et en alimenter les index
+    # d'hôtes; sans journal exploitable, ils se construisent depuis la base au premier usage
+    if EVENT_LOG_PATH:
+        try:
+            event_log.open()
+            db = SessionLocal()
+            try:
+                event_log.seed(db, (zone_index, capabilities))
+            finally:
+                db.close()
+            logger.info(f"Journal d'événements rechargé: {event_log.recovery}")
+        except Exception as e:
+            logger.error(f"Impossible d'ouvrir le journal d'événements {EVENT_LOG_PATH}: {e}")
+    # Mesurer le retard des réplicas en lecture s'il y en a
+    replica_router.start()
     await register_with_eureka()
+    # Démarrer la sonde de santé des hôtes
+    health_monitor.start()
+    # Recharger et sauvegarder périodiquement les séries temporelles si configuré
+    timeseries.start()
+    # Réconcilier périodiquement le registre d'allocations avec les capacités déclarées
+    allocation_ledger.start()
+    # Maintenir les pools de VM préchauffées (reconstitués depuis le registre)
+    warm_pool.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await health_monitor.stop()
+    await timeseries.stop()
+    await allocation_ledger.stop()
+    await warm_pool.stop()
+    event_log.close()
+    traffic_capture.close()
+    tracer.close()
+    await replica_router.stop()
     await shutdown_eureka()
+    shutdown_executor()
 
 
 
@@ -83,6 +144,12 @@ def info():
     }
 
 # Inclure les routers
+app.include_router(placement_router)
+app.include_router(image_staging_router)
+app.include_router(allocation_router)
+app.include_router(placement_group_router)
+app.include_router(admin_router)
+app.include_router(system_image_router)
 app.include_router(cluster_router)
 
 
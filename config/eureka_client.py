@@ -37,7 +37,7 @@ async def register_with_eureka():
             renewal_interval_in_secs=30,
             duration_in_secs=90,
             metadata={
-                "zone": "primary",
+                "zone": os.getenv('APP_ZONE', 'primary'),
                 "securePortEnabled": "false",
                 "securePort": "443",
                 "statusPageUrl": f"http://{app_host}:{app_port}/api/service-clusters/info",
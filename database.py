@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, literal, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -24,22 +24,78 @@ MYSQL_HOST = os.getenv('MYSQL_HOST', 'mysql_db_service_cluster')
 MYSQL_PORT = os.getenv('MYSQL_PORT', '3306')
 MYSQL_DB = os.getenv('MYSQL_DATABASE', 'service_cluster_db')
 
-DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+DATABASE_URL = os.getenv('DATABASE_URL') or \
+    f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+# Réplicas en lecture, séparés par des virgules
+READ_REPLICA_URLS = [url.strip() for url in os.getenv('READ_REPLICA_URLS', '').split(',') if url.strip()]
 
 # Créer le moteur SQLAlchemy
 engine = create_engine(DATABASE_URL)
+replica_engines = [create_engine(url) for url in READ_REPLICA_URLS]
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Sessions de lecture routées vers les réplicas (primaire en repli et après écriture)
+from services.replica_router import RoutingSession, replica_router
+replica_router.configure(engine, replica_engines)
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
 def create_tables():
     """Crée les tables dans la base de données"""
     try:
         Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
         logger.info("Tables créées avec succès")
     except Exception as e:
         logger.error(f"Erreur lors de la création des tables: {str(e)}")
         raise
 
+
+def _column_ddl(column, dialect) -> str:
+    """Définition d'une colonne pour ALTER TABLE ADD COLUMN.
+
+    Seule une valeur par défaut littérale est reprise; sans elle, la colonne est ajoutée NULL pour que les
+    lignes existantes restent valides. Les clés étrangères ne sont pas ajoutées.
+    """
+    default = column.server_default.arg if column.server_default is not None else \
+        column.default.arg if column.default is not None and column.default.is_scalar else None
+    ddl = f"{dialect.identifier_preparer.quote(column.name)} {column.type.compile(dialect=dialect)}"
+    if isinstance(default, (str, int, float)):
+        value = literal(default).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f" DEFAULT {value}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def upgrade_schema(bind) -> list:
+    """Ajoute aux tables existantes les colonnes et index des modèles qui leur manquent.
+
+    Une base conservée (MYSQL_RESET_ON_STARTUP=false) créée par une version antérieure reçoit ainsi les
+    colonnes ajoutées depuis (zone, rack, architecture, cpu_flags...). Idempotent: sans écart, rien n'est fait.
+    """
+    inspector = inspect(bind)
+    existing = set(inspector.get_table_names())
+    added = []
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    connection.execute(text(f"ALTER TABLE {bind.dialect.identifier_preparer.quote(table.name)} "
+                                            f"ADD COLUMN {_column_ddl(column, bind.dialect)}"))
+                    added.append(f"{table.name}.{column.name}")
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(bind=connection)
+                    added.append(index.name)
+    if added:
+        logger.info(f"Schéma mis à jour: {', '.join(added)}")
+    return added
+
 # Fonction pour obtenir une session de base de données
 def get_db():
     db = SessionLocal()
@@ -51,6 +107,9 @@ def get_db():
 
 # Fonction pour initialiser la base de données
 def init_database():
+    if not DATABASE_URL.startswith('mysql'):
+        # Base embarquée (SQLite...): rien à créer côté serveur
+        return True
     try:
         logger.info("Initialisation de la base de données...")
         logger.info(f"Connexion à MySQL: {MYSQL_HOST}:{MYSQL_PORT} avec l'utilisateur {MYSQL_USER}")
@@ -72,7 +131,9 @@ def init_database():
         )
         
         cursor = conn.cursor()
-        cursor.execute(f"DROP DATABASE IF EXISTS {mysql_database}")
+        # Par défaut la base est recréée à chaque démarrage; MYSQL_RESET_ON_STARTUP=false conserve les données
+        if os.getenv('MYSQL_RESET_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes'):
+            cursor.execute(f"DROP DATABASE IF EXISTS {mysql_database}")
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {mysql_database}")
         conn.commit()
         
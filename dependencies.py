@@ -12,6 +12,15 @@ def get_db():
     finally:
         db.close()
 
+# Dépendance pour les lectures: réplica si disponible, primaire après une écriture
+def get_read_db():
+    from database import ReadSessionLocal
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 # Modèle de réponse standardisée
 class StandardResponse(BaseModel):
     statusCode: int
@@ -1 +1,7 @@
-from .model_cluster import ClusterEntity
\ No newline at end of file
+from .model_cluster import ClusterEntity
+from .model_staging import ImageStagingEntity
+from .model_idempotency import IdempotencyRecordEntity
+from .model_placement_group import PlacementGroupEntity
+from .model_allocation import VMAllocationEntity
+from .model_replica import ReplicaHeartbeatEntity
+from .model_system_image import SystemImageEntity
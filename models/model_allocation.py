@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
+from database import Base
+
+
+# Ressources consommées par une VM sur un hôte
+class VMAllocationEntity(Base):
+    __tablename__ = 'vm_allocation'
+    __table_args__ = (
+        Index('ix_vm_allocation_cluster_state', 'cluster_id', 'state'),
+        Index('ix_vm_allocation_user_state', 'user_id', 'state'),
+        Index('ix_vm_allocation_group_state', 'placement_group_id', 'state'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    cluster_id = Column(Integer, ForeignKey('service_cluster.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(String(64), nullable=False)
+    vm_name = Column(String(100), nullable=False)
+    vm_id = Column(String(100), nullable=True)  # identifiant retourné par le service-vm-host
+    cpu_count = Column(Integer, nullable=False)
+    memory_size_mib = Column(Integer, nullable=False)
+    disk_size_gb = Column(Integer, nullable=False)
+    vm_offer_id = Column(Integer, nullable=True)
+    system_image_id = Column(Integer, nullable=True)
+    placement_group_id = Column(Integer, ForeignKey('placement_group.id'), nullable=True)
+    priority = Column(String(20), nullable=True)  # classe de priorité (classe par défaut si absente)
+    state = Column(String(20), nullable=False, default='reserved')  # reserved, active, unknown, failed, released
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cluster_id': self.cluster_id,
+            'user_id': self.user_id,
+            'vm_name': self.vm_name,
+            'vm_id': self.vm_id,
+            'cpu_count': self.cpu_count,
+            'memory_size_mib': self.memory_size_mib,
+            'disk_size_gb': self.disk_size_gb,
+            'vm_offer_id': self.vm_offer_id,
+            'system_image_id': self.system_image_id,
+            'placement_group_id': self.placement_group_id,
+            'priority': self.priority,
+            'state': self.state,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 from typing import Optional, List
-from sqlalchemy import Column, Integer, String, Text, DateTime, func, Enum, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, func, Enum, Float, Index
 from pydantic import BaseModel
 from database import Base
 
@@ -8,6 +8,7 @@ from database import Base
 # Définir le modèle de données
 class ClusterEntity(Base):
     __tablename__ = 'service_cluster'
+    __table_args__ = (Index('ix_service_cluster_zone_ram', 'zone', 'available_ram'),)
     
     id = Column(Integer, primary_key=True)
     nom = Column(String(100), nullable=False)
@@ -20,6 +21,10 @@ class ClusterEntity(Base):
     processeur = Column(String(100), nullable=False)
     available_processor = Column(Float, nullable=False)  # en pourcentage
     number_of_core = Column(Integer, nullable=False)
+    zone = Column(String(64), nullable=False, default='default')  # zone de disponibilité
+    rack = Column(String(64), nullable=True)  # domaine de panne à l'intérieur de la zone
+    architecture = Column(String(16), nullable=True)  # x86_64, aarch64...
+    cpu_flags = Column(Text, nullable=True)  # drapeaux CPU séparés par des espaces (avx2, vmx...)
 
     def to_dict(self):
         return {
@@ -33,7 +38,11 @@ class ClusterEntity(Base):
             'available_ram': self.available_ram,
             'processeur': self.processeur,
             'available_processor': self.available_processor,
-            'number_of_core': self.number_of_core
+            'number_of_core': self.number_of_core,
+            'zone': self.zone,
+            'rack': self.rack,
+            'architecture': self.architecture,
+            'cpu_flags': self.cpu_flags.split() if self.cpu_flags else []
         }
 
 class VMRequirements(BaseModel):
@@ -46,6 +55,34 @@ class VMRequirements(BaseModel):
     root_password: Optional[str] = "password" # mot de passe root
     vm_offer_id: int = 1 # id de l'offre de VM
     system_image_id: int = 2 # id de l'image de système
+    zone: Optional[str] = None # zone préférée
+    zone_priority: Optional[List[str]] = None # zones à essayer dans l'ordre (remplace zone)
+    zone_spillover: bool = True # déborder sur les autres zones si les zones demandées sont pleines
+    spread: Optional[str] = None # 'zone' ou 'rack': répartir les VM de l'utilisateur entre domaines de panne
+    placement_group: Optional[str] = None # nom du groupe de placement (affinité, anti-affinité, répartition)
+    architecture: Optional[str] = None # architecture exigée (x86_64, aarch64)
+    cpu_features: Optional[List[str]] = None # drapeaux CPU exigés (ex: ["avx2", "vmx"])
+    priority: Optional[str] = None # classe de priorité (PRIORITY_CLASSES; PRIORITY_DEFAULT_CLASS si absente)
+
+class WarmPoolConfig(BaseModel):
+    vm_offer_id: int # offre de VM servie par le pool
+    system_image_id: int # image système des VM du pool
+    cpu_count: int # ressources de l'offre
+    memory_size_mib: int
+    disk_size_gb: int
+    os_type: Optional[str] = None # type d'OS exigé des demandes servies (tous si absent)
+    size: int = 0 # nombre de VM préchauffées à maintenir (0: vider le pool)
+
+class RebalanceTarget(BaseModel):
+    cpu_count: int # taille de VM à pouvoir placer
+    memory_size_mib: int
+    disk_size_gb: int = 0
+    count: int = 1 # nombre d'emplacements à libérer pour cette taille
+
+class RebalanceRequest(BaseModel):
+    targets: List[RebalanceTarget]
+    zone: Optional[str] = None # limiter le plan aux hôtes d'une zone
+    budget_s: Optional[float] = None # budget de temps du calcul (REBALANCE_TIME_BUDGET par défaut)
     
 class ClusterBase(BaseModel):
     nom: str
@@ -58,6 +95,11 @@ class ClusterBase(BaseModel):
     processeur: str
     available_processor: float
     number_of_core: int
+    cached_images: Optional[List[int]] = None # ids des images système en cache sur l'hôte
+    zone: Optional[str] = None # zone de disponibilité (DEFAULT_ZONE si absente à la création)
+    rack: Optional[str] = None # rack de l'hôte
+    architecture: Optional[str] = None # architecture de l'hôte (déduite du processeur si absente)
+    cpu_flags: Optional[List[str]] = None # drapeaux CPU de l'hôte
     
 
 class ClusterCreate(ClusterBase):
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from database import Base
+
+
+# Résultat d'une requête identifiée par un en-tête Idempotency-Key
+class IdempotencyRecordEntity(Base):
+    __tablename__ = 'idempotency_record'
+
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default='in_progress')  # in_progress, completed
+    http_status = Column(Integer, nullable=True)
+    response = Column(Text, nullable=True)  # corps JSON de la réponse
+    created_at = Column(DateTime, server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+from typing import Optional
+from sqlalchemy import Column, Integer, String, DateTime, func
+from pydantic import BaseModel
+from database import Base
+
+
+# Groupe de VM soumises à une même contrainte de placement
+class PlacementGroupEntity(Base):
+    __tablename__ = 'placement_group'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    policy = Column(String(20), nullable=False)  # affinity, anti_affinity, soft_spread
+    scope = Column(String(10), nullable=False, default='host')  # host, rack, zone
+    user_id = Column(String(64), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'policy': self.policy,
+            'scope': self.scope,
+            'user_id': self.user_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class PlacementGroupCreate(BaseModel):
+    name: str # nom unique du groupe
+    policy: str # affinity, anti_affinity ou soft_spread
+    scope: Optional[str] = "host" # domaine de la contrainte: host, rack ou zone
+    user_id: Optional[str] = None # propriétaire du groupe
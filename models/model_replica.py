@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+from sqlalchemy import Column, Integer, Float
+from database import Base
+
+
+# Battement écrit sur le primaire et relu sur les réplicas pour mesurer leur retard
+class ReplicaHeartbeatEntity(Base):
+    __tablename__ = 'replica_heartbeat'
+
+    id = Column(Integer, primary_key=True)
+    written_at = Column(Float, nullable=False)  # secondes epoch
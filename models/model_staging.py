@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+from typing import Optional, List
+from sqlalchemy import Column, Integer, String, Text, DateTime, BigInteger, ForeignKey, UniqueConstraint, func
+from pydantic import BaseModel
+from database import Base
+
+
+# Progression de la pré-distribution d'une image système sur un hôte
+class ImageStagingEntity(Base):
+    __tablename__ = 'image_staging'
+    __table_args__ = (UniqueConstraint('system_image_id', 'cluster_id', name='uq_image_staging_image_cluster'),)
+
+    id = Column(Integer, primary_key=True)
+    system_image_id = Column(Integer, nullable=False, index=True)
+    cluster_id = Column(Integer, ForeignKey('service_cluster.id', ondelete='CASCADE'), nullable=False)
+    status = Column(String(20), nullable=False, default='pending')  # pending, staging, done, failed
+    chunks_total = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    bytes_done = Column(BigInteger, nullable=False, default=0)
+    source = Column(String(50), nullable=True)  # 'origin' ou 'peer:<cluster_id>'
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'system_image_id': self.system_image_id,
+            'cluster_id': self.cluster_id,
+            'status': self.status,
+            'chunks_total': self.chunks_total,
+            'chunks_done': self.chunks_done,
+            'bytes_done': self.bytes_done,
+            'source': self.source,
+            'error': self.error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class StagingRequest(BaseModel):
+    source_path: str # chemin du rootfs à distribuer, relatif à IMAGE_ROOTFS_DIR
+    cluster_ids: Optional[List[int]] = None # hôtes ciblés (tous par défaut)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from database import Base
+
+
+# Image système proposée à la création de VM, avec son illustration
+class SystemImageEntity(Base):
+    __tablename__ = 'system_images'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    os_type = Column(String(255), nullable=False)
+    version = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    image_path = Column(String(255), nullable=True)  # relatif à SYSTEM_IMAGE_DIR
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'os_type': self.os_type,
+            'version': self.version,
+            'description': self.description,
+            'image_path': self.image_path,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
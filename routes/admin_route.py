@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, Response
+from dependencies import StandardResponse
+from services.tracing import tracer
+
+router = APIRouter(
+    prefix="/api/service-clusters/admin",
+    tags=["Administration"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get('/tracing', response_model=StandardResponse,
+            summary="État du traçage et profils disponibles",
+            description="Taux d'échantillonnage, en-têtes de déclenchement, requêtes tracées et profils CPU conservés (les plus récents d'abord)")
+def get_tracing_stats():
+    """État du traçage des requêtes et liste des profils"""
+    return StandardResponse(
+        statusCode=200,
+        message="État du traçage récupéré avec succès",
+        data=tracer.stats()
+    )
+
+
+@router.get('/traces',
+            summary="Télécharge les traces des requêtes",
+            description="Fichier de traces au format Chrome (tableau JSON), à ouvrir dans chrome://tracing ou ui.perfetto.dev")
+async def download_traces():
+    """Traces des requêtes tracées depuis la dernière rotation"""
+    content = await run_in_threadpool(tracer.trace_document)
+    return Response(content=content, media_type="application/json",
+                    headers={"Content-Disposition": 'attachment; filename="traces.json"'})
+
+
+@router.get('/profiles/{trace_id}',
+            summary="Télécharge le profil CPU d'une requête",
+            description="Fichier pstats (python -m pstats, snakeviz...). Paramètre format=text pour un résumé des fonctions les plus coûteuses, trié par sort (cumulative, tottime...).")
+async def download_profile(trace_id: str, format: str = 'pstats', sort: str = 'cumulative', limit: int = 40):
+    """Profil cProfile d'une requête tracée avec l'en-tête de profilage"""
+    entry = tracer.profile(trace_id)
+    if entry is None:
+        return StandardResponse(
+            statusCode=404,
+            message=f"Aucun profil pour la trace {trace_id}",
+            data=None
+        )
+    if format == 'text':
+        try:
+            text = await run_in_threadpool(tracer.profile_text, trace_id, sort, max(1, min(limit, 500)))
+        except KeyError:
+            return StandardResponse(
+                statusCode=400,
+                message=f"Clé de tri inconnue: {sort}",
+                data=None
+            )
+        return PlainTextResponse(text)
+    return FileResponse(entry['path'], media_type="application/octet-stream", filename=f"{trace_id}.prof")
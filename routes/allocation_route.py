@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+from typing import Optional
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from dependencies import get_read_db, StandardResponse
+from services.allocation_ledger import allocation_ledger, STATES
+
+router = APIRouter(
+    prefix="/api/service-clusters/allocations",
+    tags=["Allocations"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get('/', response_model=StandardResponse,
+            summary="Liste les allocations de VM",
+            description="Paramètres: \n- cluster_id: allocations d'un hôte \n- user_id: allocations d'un utilisateur \n- state: reserved, active, unknown, failed ou released (par défaut les allocations qui consomment de la capacité) \n- limit: nombre maximal de résultats")
+def get_allocations(cluster_id: Optional[int] = None, user_id: Optional[str] = None, state: Optional[str] = None,
+                    limit: int = 100, db: Session = Depends(get_read_db)):
+    """Liste les allocations de VM par hôte et/ou par utilisateur"""
+    if state is not None and state not in STATES:
+        return StandardResponse(
+            statusCode=400,
+            message=f"État inconnu: {state} (valeurs possibles: {', '.join(STATES)})",
+            data=None
+        )
+    try:
+        allocations = allocation_ledger.find(db, cluster_id=cluster_id, user_id=user_id, state=state,
+                                             limit=max(1, min(limit, 1000)))
+        data = {"allocations": allocations}
+        if cluster_id is not None:
+            data["allocated"] = allocation_ledger.allocated(cluster_id).to_dict()
+        return StandardResponse(
+            statusCode=200,
+            message="Allocations récupérées avec succès",
+            data=data
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la récupération des allocations: {str(e)}",
+            data=None
+        )
+
+
+@router.get('/reconciliation', response_model=StandardResponse,
+            summary="Écarts entre le registre d'allocations et la capacité déclarée",
+            description="Ressources allouées par hôte et dernier rapport de réconciliation. Paramètre run=true pour lancer une réconciliation immédiate.")
+async def get_reconciliation(run: bool = False):
+    """Rapport de réconciliation du registre d'allocations"""
+    try:
+        if run:
+            await run_in_threadpool(allocation_ledger.reconcile_now)
+        return StandardResponse(
+            statusCode=200,
+            message="Rapport de réconciliation récupéré avec succès",
+            data=allocation_ledger.stats()
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la réconciliation du registre d'allocations: {str(e)}",
+            data=None
+        )
+
+
+@router.post('/{allocation_id}/release', response_model=StandardResponse,
+             summary="Libère une allocation",
+             description="À appeler lors de la suppression d'une VM: la capacité redevient disponible pour le placement")
+def release_allocation(allocation_id: int):
+    """Libère les ressources d'une VM supprimée"""
+    allocation = allocation_ledger.release(allocation_id)
+    if allocation is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Allocation non trouvée",
+            data=None
+        )
+    return StandardResponse(
+        statusCode=200,
+        message="Allocation libérée avec succès",
+        data={"allocation": allocation}
+    )
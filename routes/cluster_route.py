@@ -1,12 +1,39 @@
 #!/usr/bin/env python3
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from models.model_cluster import ClusterEntity, ClusterCreate, ClusterUpdate, ClusterResponse, VMRequirements
 from dotenv import load_dotenv
 # Importer les dépendances depuis le fichier dependencies.py
-from dependencies import get_db, StandardResponse
+from dependencies import get_db, get_read_db, StandardResponse
+from services.health_monitor import health_monitor
+from services.idempotency import IDEMPOTENCY_KEY_MAX_LENGTH, idempotency_store, fingerprint
+from services.image_locality import image_locality
+from services.placement import rank_hosts
+from services.admission import admission, AdmissionRejected
+from services.allocation_ledger import allocation_ledger
+from services.circuit_breaker import breakers
+from services.cluster_hooks import notify_cluster_change
+from services.event_log import event_log
+from services.fleet_stats import fleet_stats
+from services.timeseries import timeseries, METRICS
+from services.replica_router import replica_router
+from services.zone_index import zone_index, spread_order, DEFAULT_ZONE
+from services.placement_groups import placement_groups
+from services.preemption import preemption_planner
+from services.priority_classes import priority_classes
+from services.capacity_model import capacity_model
+from services.capabilities import capabilities, normalize_arch, normalize_flags, infer_arch
+from services.decision_cache import decision_cache
+from services.tracing import span, traced
+from itertools import chain
+from services.vm_host_client import vm_host_url, vm_id_of
+from services.warm_pool import warm_pool
+import json
 import os
+import time
 import requests
 
 router = APIRouter(
@@ -18,13 +45,23 @@ router = APIRouter(
 # Charger les variables d'environnement avant d'importer les autres modules
 load_dotenv()
 
+# Budget de latence total (secondes) et nombre maximal d'hôtes essayés pour une création de VM
+PLACEMENT_LATENCY_BUDGET = float(os.getenv('PLACEMENT_LATENCY_BUDGET', '1500'))
+PLACEMENT_MAX_ATTEMPTS = int(os.getenv('PLACEMENT_MAX_ATTEMPTS', '3'))
+VM_HOST_CONNECT_TIMEOUT = float(os.getenv('VM_HOST_CONNECT_TIMEOUT', '5'))
+# Une réservation du registre doit survivre à la plus longue création possible
+allocation_ledger.register_create_timeout('placement', PLACEMENT_LATENCY_BUDGET + VM_HOST_CONNECT_TIMEOUT)
+
 @router.get("/", response_model=StandardResponse)
-def get_clusters(nom: Optional[str] = None, db: Session = Depends(get_db)):
+@traced('get_clusters', profile=True)
+def get_clusters(nom: Optional[str] = None, db: Session = Depends(get_read_db)):
     query = db.query(ClusterEntity)
     if nom:
         query = query.filter(ClusterEntity.nom.like(f'%{nom}%'))
-    clusters = query.all()
-    clusters_list = [cluster.to_dict() for cluster in clusters]
+    with span('orm.clusters', 'orm'):
+        clusters = query.all()
+    with span('serialize.clusters', 'serialize', count=len(clusters)):
+        clusters_list = [cluster.to_dict() for cluster in clusters]
 
     if nom:
         message = f"Clusters trouvés pour le nom: {nom}"
@@ -38,7 +75,7 @@ def get_clusters(nom: Optional[str] = None, db: Session = Depends(get_db)):
     )
 
 @router.get('/available', response_model=StandardResponse)
-def get_available_clusters(db: Session = Depends(get_db)):
+def get_available_clusters(db: Session = Depends(get_read_db)):
     """Obtient les clusters de service avec des ressources disponibles"""
     try:
         service_clusters = db.query(ClusterEntity).filter(
@@ -59,9 +96,78 @@ def get_available_clusters(db: Session = Depends(get_db)):
             data=None
         )
 
+@router.get('/stats', response_model=StandardResponse,
+            summary="Statistiques de capacité de la flotte",
+            description="Totaux, pourcentages d'utilisation, ventilation par type de processeur, histogrammes de capacité libre et ressources allouées par le registre (réservations comprises), maintenus de façon incrémentale. Paramètre reconcile=true pour vérifier (et corriger) les agrégats par un recalcul complet depuis la base.")
+def get_fleet_stats(reconcile: bool = False, db: Session = Depends(get_db)):
+    """Statistiques de capacité de la flotte"""
+    try:
+        reconciliation = None
+        if reconcile or not fleet_stats.initialized:
+            clusters = [cluster.to_dict() for cluster in db.query(ClusterEntity).all()]
+            if fleet_stats.initialized:
+                reconciliation = fleet_stats.reconcile(clusters)
+            else:
+                fleet_stats.rebuild(clusters)
+        data = fleet_stats.snapshot()
+        if reconciliation is not None:
+            data["reconciliation"] = reconciliation
+        return StandardResponse(
+            statusCode=200,
+            message="Statistiques de la flotte récupérées avec succès",
+            data=data
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors du calcul des statistiques de la flotte: {str(e)}",
+            data=None
+        )
+
+@router.get('/timeseries', response_model=StandardResponse,
+            summary="Occupation mémoire des séries temporelles",
+            description="Nombre d'hôtes suivis, taille des anneaux raw / 1m / 1h et mémoire occupée par hôte et au total")
+def get_timeseries_stats():
+    """Statistiques du stockage des séries temporelles"""
+    return StandardResponse(
+        statusCode=200,
+        message="Statistiques des séries temporelles récupérées avec succès",
+        data=timeseries.stats()
+    )
+
+@router.get('/replicas', response_model=StandardResponse,
+            summary="État des réplicas en lecture",
+            description="Retard mesuré de chaque réplica, lectures servies et nombre de replis sur le primaire")
+def get_replicas():
+    """État du routage des lectures vers les réplicas"""
+    return StandardResponse(
+        statusCode=200,
+        message="État des réplicas récupéré avec succès",
+        data=replica_router.stats()
+    )
+
+@router.get('/zones', response_model=StandardResponse,
+            summary="Zones de disponibilité",
+            description="Hôtes et racks par zone, capacité maximale disponible d'un hôte de chaque zone et ordre de débordement par défaut")
+def get_zones(db: Session = Depends(get_read_db)):
+    """Index de capacité par zone"""
+    try:
+        zone_index.ensure(db)
+        return StandardResponse(
+            statusCode=200,
+            message="Zones récupérées avec succès",
+            data=zone_index.stats()
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la récupération des zones: {str(e)}",
+            data=None
+        )
+
 @router.post("/", response_model=StandardResponse, status_code=status.HTTP_201_CREATED,
              summary="Crée un nouveau cluster",
-             description="Les différents paramètres sont: \n- un nom \n- une adresse MAC \n- une IP \n- une ROM \n- une RAM \n- un processeur \n- un nombre de cœurs")
+             description="Les différents paramètres sont: \n- un nom \n- une adresse MAC \n- une IP \n- une ROM \n- une RAM \n- un processeur \n- un nombre de cœurs \n- une zone et un rack (optionnels) \n- une architecture et des drapeaux CPU (optionnels)")
 def create_cluster(cluster: ClusterCreate, db: Session = Depends(get_db)):
     """Crée un nouveau cluster"""
     try:
@@ -69,6 +175,7 @@ def create_cluster(cluster: ClusterCreate, db: Session = Depends(get_db)):
         # Vérifier si un cluster avec cette adresse MAC existe déjà
         existing_cluster = db.query(ClusterEntity).filter(ClusterEntity.adresse_mac == cluster.adresse_mac).first()
         if existing_cluster:
+            before = existing_cluster.to_dict()
             # Mettre à jour le cluster existant
             existing_cluster.nom = cluster.nom
             existing_cluster.ip = cluster.ip
@@ -79,10 +186,22 @@ def create_cluster(cluster: ClusterCreate, db: Session = Depends(get_db)):
             existing_cluster.processeur = cluster.processeur
             existing_cluster.available_processor = cluster.available_processor
             existing_cluster.number_of_core = cluster.number_of_core
+            if cluster.zone:
+                existing_cluster.zone = cluster.zone
+            if cluster.rack is not None:
+                existing_cluster.rack = cluster.rack
+            if cluster.architecture:
+                existing_cluster.architecture = normalize_arch(cluster.architecture)
+            if cluster.cpu_flags is not None:
+                existing_cluster.cpu_flags = ' '.join(normalize_flags(cluster.cpu_flags))
             
             db.add(existing_cluster)
             db.commit()
             db.refresh(existing_cluster)
+            notify_cluster_change(before, existing_cluster.to_dict())
+            if cluster.cached_images is not None:
+                image_locality.update_host(existing_cluster.id, cluster.cached_images)
+            health_monitor.track_host(existing_cluster.id, existing_cluster.ip)
             
             return StandardResponse(
                 statusCode=200,
@@ -101,12 +220,20 @@ def create_cluster(cluster: ClusterCreate, db: Session = Depends(get_db)):
                 available_ram=cluster.available_ram,
                 processeur=cluster.processeur,
                 available_processor=cluster.available_processor,
-                number_of_core=cluster.number_of_core
+                number_of_core=cluster.number_of_core,
+                zone=cluster.zone or DEFAULT_ZONE,
+                rack=cluster.rack,
+                architecture=normalize_arch(cluster.architecture) or infer_arch(cluster.processeur),
+                cpu_flags=' '.join(normalize_flags(cluster.cpu_flags)) or None
             )
         
             db.add(new_cluster)
             db.commit()
             db.refresh(new_cluster)
+            notify_cluster_change(None, new_cluster.to_dict())
+            if cluster.cached_images is not None:
+                image_locality.update_host(new_cluster.id, cluster.cached_images)
+            health_monitor.track_host(new_cluster.id, new_cluster.ip)
         
             return StandardResponse(
                 statusCode=201,
@@ -125,7 +252,7 @@ def create_cluster(cluster: ClusterCreate, db: Session = Depends(get_db)):
 
 @router.put("/{cluster_id}", response_model=StandardResponse,
              summary="Met à jour un cluster existant",
-             description="Paramètres: \n- cluster_id (chemin): L'identifiant unique du cluster à modifier \n- corps de la requête: Un objet JSON contenant les champs à mettre à jour: \n  - nom (optionnel): Le nouveau nom du cluster \n  - adresse_mac (optionnel): La nouvelle adresse MAC \n  - ip (optionnel): La nouvelle IP \n  - rom (optionnel): La nouvelle ROM \n  - available_rom (optionnel): La ROM disponible \n  - ram (optionnel): La nouvelle RAM \n  - available_ram (optionnel): La RAM disponible \n  - processeur (optionnel): Le nouveau processeur \n  - available_processor (optionnel): Le processeur disponible \n  - number_of_core (optionnel): Le nombre de cœurs")
+             description="Paramètres: \n- cluster_id (chemin): L'identifiant unique du cluster à modifier \n- corps de la requête: Un objet JSON contenant les champs à mettre à jour: \n  - nom (optionnel): Le nouveau nom du cluster \n  - adresse_mac (optionnel): La nouvelle adresse MAC \n  - ip (optionnel): La nouvelle IP \n  - rom (optionnel): La nouvelle ROM \n  - available_rom (optionnel): La ROM disponible \n  - ram (optionnel): La nouvelle RAM \n  - available_ram (optionnel): La RAM disponible \n  - processeur (optionnel): Le nouveau processeur \n  - available_processor (optionnel): Le processeur disponible \n  - number_of_core (optionnel): Le nombre de cœurs \n  - zone (optionnel): La zone de disponibilité \n  - rack (optionnel): Le rack \n  - architecture (optionnel): L'architecture CPU \n  - cpu_flags (optionnel): Les drapeaux CPU")
 def update_cluster(cluster_id: int, cluster: ClusterUpdate, db: Session = Depends(get_db)):
     """Met à jour un cluster existant"""
     try:
@@ -137,6 +264,7 @@ def update_cluster(cluster_id: int, cluster: ClusterUpdate, db: Session = Depend
                 data=None
             )
         
+        before = db_cluster.to_dict()
         # Mettre à jour les champs
         if cluster.nom is not None:
             db_cluster.nom = cluster.nom
@@ -158,9 +286,21 @@ def update_cluster(cluster_id: int, cluster: ClusterUpdate, db: Session = Depend
             db_cluster.available_processor = cluster.available_processor
         if cluster.number_of_core is not None:
             db_cluster.number_of_core = cluster.number_of_core
+        if cluster.zone:
+            db_cluster.zone = cluster.zone
+        if cluster.rack is not None:
+            db_cluster.rack = cluster.rack
+        if cluster.architecture:
+            db_cluster.architecture = normalize_arch(cluster.architecture)
+        if cluster.cpu_flags is not None:
+            db_cluster.cpu_flags = ' '.join(normalize_flags(cluster.cpu_flags))
         
         db.commit()
         db.refresh(db_cluster)
+        notify_cluster_change(before, db_cluster.to_dict())
+        if cluster.cached_images is not None:
+            image_locality.update_host(db_cluster.id, cluster.cached_images)
+        health_monitor.track_host(db_cluster.id, db_cluster.ip)
         
         return StandardResponse(
             statusCode=200,
@@ -190,8 +330,13 @@ def delete_cluster(cluster_id: int, db: Session = Depends(get_db)):
                 data=None
             )
         
+        before = db_cluster.to_dict()
         db.delete(db_cluster)
         db.commit()
+        notify_cluster_change(before, None)
+        image_locality.remove_host(cluster_id)
+        health_monitor.forget_host(cluster_id)
+        breakers.forget(cluster_id)
         
         return StandardResponse(
             statusCode=200,
@@ -209,7 +354,7 @@ def delete_cluster(cluster_id: int, db: Session = Depends(get_db)):
 @router.get("/{cluster_id}", response_model=StandardResponse,
             summary="Récupère un cluster existant",
             description="Paramètres: \n- cluster_id (chemin): L'identifiant unique du cluster à récupérer")
-def get_cluster(cluster_id: int, db: Session = Depends(get_db)):
+def get_cluster(cluster_id: int, db: Session = Depends(get_read_db)):
     """Récupère un cluster existant"""
     try:
         db_cluster = db.query(ClusterEntity).filter(ClusterEntity.id == cluster_id).first()
@@ -233,9 +378,245 @@ def get_cluster(cluster_id: int, db: Session = Depends(get_db)):
         )
 
 
-@router.post('/find-suitable-host')
-def find_suitable_host(vm_requirements: VMRequirements, db: Session = Depends(get_db)):
+@router.get("/{cluster_id}/timeseries", response_model=StandardResponse,
+            summary="Historique de la capacité disponible d'un cluster",
+            description="Paramètres: \n- metric: available_ram, available_rom ou available_processor \n- start / end: bornes en secondes epoch (par défaut la dernière heure) \n- resolution: raw, 1m, 1h ou auto (la plus fine couvrant la plage)")
+def get_cluster_timeseries(cluster_id: int, metric: str = 'available_ram', start: Optional[float] = None,
+                           end: Optional[float] = None, resolution: str = 'auto'):
+    """Points et agrégats (min, max, moyenne) d'une métrique sur une plage de temps"""
+    if metric not in METRICS:
+        return StandardResponse(
+            statusCode=400,
+            message=f"Métrique inconnue: {metric} (valeurs possibles: {', '.join(METRICS)})",
+            data=None
+        )
+    if resolution not in ('auto', 'raw', '1m', '1h'):
+        return StandardResponse(
+            statusCode=400,
+            message=f"Résolution inconnue: {resolution} (valeurs possibles: auto, raw, 1m, 1h)",
+            data=None
+        )
+    end = time.time() if end is None else end
+    start = end - 3600 if start is None else start
+    if start > end:
+        return StandardResponse(
+            statusCode=400,
+            message="Le début de la plage doit précéder la fin",
+            data=None
+        )
+    data = timeseries.query(cluster_id, metric, start, end, resolution)
+    if data is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Aucun historique pour ce cluster",
+            data=None
+        )
+    return StandardResponse(
+        statusCode=200,
+        message="Historique du cluster récupéré avec succès",
+        data=data
+    )
+
+def _too_many_requests(message: str, retry_after: int) -> JSONResponse:
+    """Réponse 429 avec en-tête Retry-After (contre-pression)"""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(retry_after)},
+        content=StandardResponse(statusCode=429, message=message, data={"retry_after": retry_after}).model_dump()
+    )
+
+
+def _normalize_response(response) -> tuple:
+    """Convertit une réponse de placement en (statut HTTP, corps, en-têtes) pour le cache d'idempotence"""
+    if isinstance(response, JSONResponse):
+        headers = {}
+        if "retry-after" in response.headers:
+            headers["Retry-After"] = response.headers["retry-after"]
+        return response.status_code, json.loads(response.body), headers
+    return 200, response.model_dump(), {}
+
+
+@router.post('/find-suitable-host',
+             summary="Trouve un hôte et crée la VM",
+             description="L'en-tête optionnel Idempotency-Key permet de réessayer sans risque: les requêtes concurrentes avec la même clé partagent un seul placement et le résultat est rejoué pendant IDEMPOTENCY_TTL secondes.")
+@traced('find_suitable_host')
+async def find_suitable_host(vm_requirements: VMRequirements, db: Session = Depends(get_db),
+                             idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Trouve un hôte approprié pour une nouvelle VM en fonction des ressources requises et transmet la demande"""
+    if not idempotency_key:
+        return await _admit_and_place(vm_requirements, db)
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return JSONResponse(
+            status_code=400,
+            content=StandardResponse(
+                statusCode=400,
+                message=f"Clé d'idempotence trop longue (maximum {IDEMPOTENCY_KEY_MAX_LENGTH} caractères)",
+                data=None
+            ).model_dump()
+        )
+
+    async def producer():
+        # Session propre au placement partagé: il peut survivre à la requête qui l'a lancé
+        from database import SessionLocal
+        placement_db = SessionLocal()
+        try:
+            return _normalize_response(await _admit_and_place(vm_requirements, placement_db))
+        finally:
+            placement_db.close()
+
+    (http_status, content, headers), replayed = await idempotency_store.execute(
+        idempotency_key, fingerprint(vm_requirements.model_dump_json()), producer)
+    if replayed:
+        headers = dict(headers, **{"Idempotent-Replayed": "true"})
+    return JSONResponse(status_code=http_status, content=content, headers=headers)
+
+
+async def _admit_and_place(vm_requirements: VMRequirements, db: Session):
+    if priority_classes.resolve(vm_requirements.priority) is None:
+        return StandardResponse(
+            statusCode=400,
+            message=f"Classe de priorité inconnue: {vm_requirements.priority} "
+                    f"(classes: {', '.join(priority_classes.names())})",
+            data=None
+        )
+    # L'attente dans la file d'admission se fait dans la boucle d'événements, sans bloquer de thread
+    try:
+        with span('admission.wait', 'admission'):
+            ticket = await admission.acquire(vm_requirements.user_id, vm_requirements.priority)
+    except AdmissionRejected as e:
+        _log_placement(vm_requirements, 'rejected')
+        return _too_many_requests(f"Trop de créations de VM en attente ({e.reason}), réessayez plus tard", e.retry_after)
+    try:
+        result = await run_in_threadpool(_place_vm, vm_requirements, db)
+    finally:
+        admission.release(ticket)
+    _log_placement(vm_requirements, _placement_outcome(result), result)
+    return result
+
+
+def _placement_outcome(result) -> str:
+    if isinstance(result, JSONResponse):
+        return 'rejected'
+    if result.statusCode == 200:
+        return 'created' if result.data and "vm_creation" in result.data else 'suggested'
+    return {404: 'no_host', 503: 'unavailable', 504: 'timeout'}.get(result.statusCode, 'failed')
+
+
+def _log_placement(vm_requirements: VMRequirements, outcome: str, result=None):
+    """Enregistre la décision de placement dans le journal d'événements"""
+    data = getattr(result, 'data', None) or {}
+    event_log.record_placement({
+        'outcome': outcome,
+        'status': getattr(result, 'statusCode', getattr(result, 'status_code', None)),
+        'host_id': (data.get('host') or {}).get('id'),
+        'allocation_id': (data.get('allocation') or {}).get('id'),
+        'attempts': [attempt['host_id'] for attempt in data.get('attempts') or []],
+        'user_id': vm_requirements.user_id,
+        'name': vm_requirements.name,
+        'cpu_count': vm_requirements.cpu_count,
+        'memory_size_mib': vm_requirements.memory_size_mib,
+        'disk_size_gb': vm_requirements.disk_size_gb,
+        'system_image_id': vm_requirements.system_image_id,
+        'priority': priority_classes.resolve(vm_requirements.priority),
+    })
+
+
+def _zone_candidates(db: Session, zone: str, minimum: dict) -> List[ClusterEntity]:
+    """Hôtes de la zone dont les valeurs déclarées atteignent les seuils minimaux"""
+    return db.query(ClusterEntity).filter(
+            ClusterEntity.zone == zone,
+            ClusterEntity.available_rom >= minimum['available_rom'],
+            ClusterEntity.available_ram >= minimum['available_ram'],
+            ClusterEntity.available_processor >= minimum['available_processor'],
+            ClusterEntity.number_of_core >= minimum['number_of_core']
+        ).all()
+
+
+def _ranked_candidates(vm_requirements: VMRequirements, db: Session, constraint=None, eligible=None):
+    """Produit les hôtes candidats zone par zone, dans l'ordre de priorité des zones"""
+    cpu_count = vm_requirements.cpu_count
+    memory_size_mib = vm_requirements.memory_size_mib
+    disk_size_gb = vm_requirements.disk_size_gb
+
+    # Seuils minimaux sur les valeurs déclarées; le modèle de capacité tranche ensuite hôte par hôte
+    minimum = capacity_model.prefilter(cpu_count, memory_size_mib, disk_size_gb)
+
+    zone_index.ensure(db)
+    zones = zone_index.order(vm_requirements.zone, vm_requirements.zone_priority, vm_requirements.zone_spillover)
+    user_counts = {}
+    if vm_requirements.spread in ('zone', 'rack'):
+        # Répartir les VM de l'utilisateur: domaines de panne les moins occupés d'abord
+        user_counts = allocation_ledger.count_by_host(db, vm_requirements.user_id)
+        by_zone = {}
+        for cluster_id, vms in user_counts.items():
+            zone = zone_index.zone_of(cluster_id)
+            by_zone[zone] = by_zone.get(zone, 0) + vms
+        if vm_requirements.spread == 'zone':
+            zones = spread_order(zones, by_zone, lambda zone: zone)
+
+    for zone in zones:
+        # Zone sans aucun hôte assez grand, ou exclue par le groupe de placement: pas de requête
+        if not zone_index.can_fit(zone, minimum['available_ram'], minimum['available_rom'],
+                                  minimum['available_processor'], minimum['number_of_core']):
+            continue
+        if constraint is not None and not constraint.allows_zone(zone):
+            continue
+        if decision_cache.enabled:
+            # Classement mémorisé pour ce profil de demande; la base n'est lue qu'en cas d'absence
+            def load(zone=zone):
+                with span('orm.candidates', 'orm', zone=zone):
+                    return _zone_candidates(db, zone, minimum)
+            with span('rank', 'placement', cached=True):
+                ranked = decision_cache.ranked(zone, vm_requirements, load, eligible)
+                if vm_requirements.spread == 'rack' or constraint is not None:
+                    ranked = list(ranked)
+        else:
+            # Trouver les clusters de la zone qui ont suffisamment de ressources disponibles
+            with span('orm.candidates', 'orm', zone=zone):
+                candidates = _zone_candidates(db, zone, minimum)
+            # Architecture et drapeaux CPU: un test de bit dans l'intersection calculée une fois
+            if eligible is not None:
+                candidates = [host for host in candidates if capabilities.contains(eligible, host.id)]
+            # vCPU et mémoire allouables selon la classe de l'hôte, moins les allocations du registre
+            with span('rank', 'placement', candidates=len(candidates)):
+                candidates = [host for host in candidates
+                              if allocation_ledger.fits(host.to_dict(), cpu_count, memory_size_mib, disk_size_gb)]
+                # Trier par la somme des ressources disponibles (pour équilibrer la charge),
+                # en favorisant les hôtes ayant déjà l'image système en cache
+                ranked = rank_hosts(candidates, vm_requirements)
+        if vm_requirements.spread == 'rack':
+            by_rack = {}
+            for cluster_id, vms in user_counts.items():
+                rack = (zone_index.zone_of(cluster_id), zone_index.rack_of(cluster_id))
+                by_rack[rack] = by_rack.get(rack, 0) + vms
+            ranked = spread_order(ranked, by_rack, lambda host: (host.zone, host.rack))
+        if constraint is not None:
+            ranked = constraint.apply(ranked)
+        yield from ranked
+
+
+def _no_host(vm_requirements: VMRequirements, db: Session, eligible, message: str) -> StandardResponse:
+    """Réponse 404 accompagnée, si possible, des VM moins prioritaires dont l'arrêt libérerait un hôte"""
+    zones = zone_index.order(vm_requirements.zone, vm_requirements.zone_priority, vm_requirements.zone_spillover)
+    with span('preemption.candidates', 'placement'):
+        candidates = preemption_planner.candidates(db, vm_requirements, zones, eligible)
+    if candidates is None:
+        return StandardResponse(
+            statusCode=404,
+            message=message,
+            data=None
+        )
+    return StandardResponse(
+        statusCode=404,
+        message=f"{message}; préemption possible de {len(candidates['victims'])} VM moins prioritaire(s) "
+                f"(suggestion, aucune VM arrêtée)",
+        data={"preemption": candidates}
+    )
+
+
+@traced('place_vm', 'placement', profile=True)
+def _place_vm(vm_requirements: VMRequirements, db: Session):
+    """Sélectionne l'hôte et transmet la création de VM (exécuté dans un thread)"""
     
     # Extraire les exigences de ressources
     cpu_count = vm_requirements.cpu_count
@@ -250,94 +631,209 @@ def find_suitable_host(vm_requirements: VMRequirements, db: Session = Depends(ge
     os_type = vm_requirements.os_type
     root_password = vm_requirements.root_password
         
-    # Convertir la mémoire de MiB à GB pour la comparaison
-    memory_size_gb = memory_size_mib / 1024
-        
-    # Calculer le pourcentage de CPU requis (estimation basée sur le nombre de cœurs)
-    # Supposons qu'un cœur équivaut à environ 10% de CPU
-    cpu_percentage = cpu_count * 10
-        
-    # Trouver les clusters qui ont suffisamment de ressources disponibles
-    suitable_clusters = db.query(ClusterEntity).filter(
-            ClusterEntity.available_rom >= disk_size_gb,
-            ClusterEntity.available_ram >= memory_size_gb,
-            ClusterEntity.available_processor >= cpu_percentage,
-            ClusterEntity.number_of_core >= cpu_count
-        ).order_by(
-            # Trier par la somme des ressources disponibles (pour équilibrer la charge)
-            (ClusterEntity.available_rom / ClusterEntity.rom + 
-             ClusterEntity.available_ram / ClusterEntity.ram + 
-             ClusterEntity.available_processor / 100) / 3
-        ).first()
-        
-    if suitable_clusters:
-        host_info = suitable_clusters.to_dict()
-            
-        # Si tous les paramètres nécessaires pour la création de VM sont présents
-        if vm_name and user_id and os_type:
+    group = None
+    constraint = None
+    if vm_requirements.placement_group:
+        placement_groups.ensure(db)
+        group = placement_groups.get(vm_requirements.placement_group)
+        if group is None:
+            return StandardResponse(
+                statusCode=400,
+                message=f"Groupe de placement inconnu: {vm_requirements.placement_group}",
+                data=None
+            )
+        constraint = placement_groups.constraint(group)
+
+    # Hôtes fournissant l'architecture et les drapeaux CPU demandés (intersection de bitsets)
+    capabilities.ensure(db)
+    eligible, missing = capabilities.eligible(vm_requirements.architecture, vm_requirements.cpu_features)
+    if eligible == 0:
+        detail = f" (fournies par aucun hôte: {', '.join(missing)})" if missing else ""
+        return StandardResponse(
+            statusCode=404,
+            message=f"Aucun hôte ne fournit l'architecture et les fonctionnalités CPU demandées{detail}",
+            data=None
+        )
+
+    # VM préchauffée de la même offre et image: réclamée sans attendre une création complète
+    if warm_pool.enabled and group is None and vm_name and user_id and os_type:
+        zone_index.ensure(db)
+        zones = zone_index.order(vm_requirements.zone, vm_requirements.zone_priority, vm_requirements.zone_spillover)
+        with span('warm_pool.claim', 'placement'):
+            warm = warm_pool.claim(db, vm_requirements, zones, eligible)
+        if warm is not None:
+            return StandardResponse(
+                statusCode=200,
+                message="VM créée avec succès",
+                data=warm
+            )
+
+    # Candidats classés zone par zone, évalués au fur et à mesure des tentatives
+    ranked = _ranked_candidates(vm_requirements, db, constraint, eligible)
+    first = next(ranked, None)
+
+    if first is None:
+        message = "Aucun hôte avec suffisamment de ressources disponibles n'a été trouvé"
+        if group is not None:
+            message += f" en respectant la contrainte {group.policy} du groupe '{group.name}'"
+            return StandardResponse(
+                statusCode=404,
+                message=message,
+                data=None
+            )
+        return _no_host(vm_requirements, db, eligible, message)
+
+    # Sans les paramètres nécessaires à la création de VM, retourner seulement l'hôte choisi
+    if not (vm_name and user_id and os_type):
+        return StandardResponse(
+            statusCode=200,
+            message="Hôte approprié trouvé",
+            data={"host": first.to_dict()}
+        )
+
+    # Préparer les données pour la création de VM
+    vm_config = {
+        "name": vm_name,
+        "user_id": user_id,
+        "os_type": os_type,
+        "cpu_count": cpu_count,
+        "memory_size_mib": memory_size_mib,
+        "disk_size_gb": disk_size_gb,
+        "vm_offer_id":vm_offer_id,
+        "system_image_id":system_image_id
+    }
+    # Ajouter le mot de passe root s'il est fourni
+    if root_password:
+        vm_config["root_password"] = root_password
+
+    # Essayer les hôtes dans l'ordre du classement tant que le budget de latence
+    # et le nombre de tentatives le permettent
+    deadline = time.monotonic() + PLACEMENT_LATENCY_BUDGET
+    attempts = []
+    saturated = 0
+    exhausted = 0
+    for host in chain([first], ranked):
+        if len(attempts) >= PLACEMENT_MAX_ATTEMPTS:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # Limiter le nombre de créations simultanées sur un même hôte
+        if not admission.try_acquire_host(host.id):
+            saturated += 1
+            continue
+        # Revérifier la contrainte du groupe au moment de réserver (placements concurrents), avant de consommer
+        # un essai du disjoncteur
+        if group is not None and not placement_groups.claim(group, host.id):
+            admission.release_host(host.id)
+            exhausted += 1
+            continue
+        breaker = breakers.get(host.id)
+        if not breaker.allow_request():
+            if group is not None:
+                placement_groups.unclaim(group, host.id)
+            admission.release_host(host.id)
+            continue
+
+        host_info = host.to_dict()
+        try:
+            # Réserver la capacité dans le registre avant d'appeler l'hôte
             try:
-                # Préparer les données pour la création de VM
-                vm_config = {
-                    "service_cluster_id": host_info['id'],
-                    "name": vm_name,
-                    "user_id": user_id,
-                    "os_type": os_type,
-                    "cpu_count": cpu_count,
-                    "memory_size_mib": memory_size_mib,
-                    "disk_size_gb": disk_size_gb,
-                    "vm_offer_id":vm_offer_id,
-                    "system_image_id":system_image_id
-                }
-                    
-                # Ajouter le mot de passe root s'il est fourni
-                if root_password:
-                    vm_config["root_password"] = root_password
-                    
-                # Obtenir l'URL du service-vm-host à partir de l'hôte sélectionné
-                host_ip = host_info['ip']
-                vm_host_port = os.getenv('SERVICE_VM_HOST_PORT', '5003')
-                vm_host_url = f"http://{host_ip}:{vm_host_port}/api/service-vm-host/vm/create"
-                    
-                # Envoyer la requête de création de VM au service-vm-host
-                
+                allocation_id = allocation_ledger.reserve(host_info, vm_config,
+                                                          group.id if group is not None else None,
+                                                          priority_classes.resolve(vm_requirements.priority))
+            except Exception:
+                # L'hôte n'a pas été appelé: rendre l'essai half_open
+                breaker.release()
+                if group is not None:
+                    placement_groups.unclaim(group, host.id)
+                raise
+            if allocation_id is None:
+                # Capacité prise entre-temps par un placement concurrent
+                breaker.release()
+                if group is not None:
+                    placement_groups.unclaim(group, host.id)
+                exhausted += 1
+                continue
+            with span('vm_host.create', 'vm_host', host_id=host_info['id']):
                 response = requests.post(
-                    vm_host_url,
-                    json=vm_config,
+                    vm_host_url(host_info['ip'], "/vm/create"),
+                    json=dict(vm_config, service_cluster_id=host_info['id']),
                     headers={"Content-Type": "application/json"},
-                    timeout=1500  # Timeout de 5 secondes
-                )
-                    
-                # Vérifier la réponse
-                if response.status_code in [200, 201, 202]:
-                    # Retourner les informations de l'hôte et la réponse de création de VM
-                    return StandardResponse(
-                        statusCode=200,
-                        message="VM créée avec succès",
-                        data={
-                            "host": host_info,
-                            "vm_creation": response.json()
-                        }
-                    )
-                else:
-                    # En cas d'échec de création de VM, retourner l'erreur
-                    return StandardResponse(
-                        statusCode=500,
-                        message=f"Erreur lors de la création de VM: {response.status_code} - {response.text}",
-                        data=None
-                    )
-                        
-            except Exception as e:
-                # En cas d'erreur lors de la requête, retourner l'hôte mais avec un message d'erreur
-                return StandardResponse(
-                    statusCode=500,
-                    message=f"Erreur lors de la communication avec le service-vm-host: {str(e)}",
-                    data=None
+                    timeout=(min(VM_HOST_CONNECT_TIMEOUT, remaining), remaining)
                 )
-            
-        else:
+        except requests.exceptions.ReadTimeout as e:
+            # La VM a pu être créée malgré l'absence de réponse: ne pas risquer un doublon sur un autre hôte
+            breaker.record_failure()
+            allocation_ledger.mark_unknown(allocation_id)
+            return StandardResponse(
+                statusCode=504,
+                message=f"Délai dépassé lors de la création de VM sur l'hôte {host_info['nom']}: {str(e)}",
+                data={"attempts": attempts + [{"host_id": host_info['id'], "error": "timeout"}]}
+            )
+        except requests.exceptions.RequestException as e:
+            breaker.record_failure()
+            allocation_ledger.fail(allocation_id)
+            attempts.append({"host_id": host_info['id'], "error": str(e)})
+            continue
+        finally:
+            admission.release_host(host.id)
+
+        # Vérifier la réponse
+        if response.status_code in [200, 201, 202]:
+            breaker.record_success()
+            vm_creation = response.json()
+            allocation = allocation_ledger.activate(allocation_id, vm_id_of(vm_creation))
+            image_locality.record_placement(host_info['id'], system_image_id)
+            # L'hôte possède désormais l'image système dans son cache
+            image_locality.add_image(host_info['id'], system_image_id)
+            # Retourner les informations de l'hôte et la réponse de création de VM
+            return StandardResponse(
+                statusCode=200,
+                message="VM créée avec succès",
+                data={
+                    "host": host_info,
+                    "vm_creation": vm_creation,
+                    "allocation": allocation,
+                    "attempts": attempts
+                }
+            )
+        allocation_ledger.fail(allocation_id)
+        if response.status_code >= 500 or response.status_code == 429:
+            # Erreur côté hôte: passer au candidat suivant
+            breaker.record_failure()
+            attempts.append({"host_id": host_info['id'], "error": f"{response.status_code} - {response.text}"})
+            continue
+
+        # Requête refusée par le service-vm-host: inutile de réessayer ailleurs
+        breaker.record_success()
+        return StandardResponse(
+            statusCode=response.status_code,
+            message=f"Erreur lors de la création de VM: {response.status_code} - {response.text}",
+            data={"attempts": attempts}
+        )
+
+    if not attempts and saturated:
+        admission.record_rejection('hosts_saturated', priority_classes.resolve(vm_requirements.priority))
+        return _too_many_requests("Tous les hôtes appropriés ont atteint leur limite de créations simultanées",
+                                  admission.retry_after())
+    if not attempts and exhausted:
+        if group is not None:
             return StandardResponse(
                 statusCode=404,
                 message="Aucun hôte avec suffisamment de ressources disponibles n'a été trouvé",
                 data=None
             )
-
+        return _no_host(vm_requirements, db, eligible,
+                        "Aucun hôte avec suffisamment de ressources disponibles n'a été trouvé")
+    if not attempts:
+        return StandardResponse(
+            statusCode=503,
+            message="Tous les hôtes appropriés sont temporairement indisponibles (disjoncteurs ouverts)",
+            data=None
+        )
+    return StandardResponse(
+        statusCode=500,
+        message=f"Erreur lors de la communication avec le service-vm-host après {len(attempts)} tentative(s)",
+        data={"attempts": attempts}
+    )
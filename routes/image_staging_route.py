@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from models.model_staging import ImageStagingEntity, StagingRequest
+from dependencies import get_db, StandardResponse
+from services.image_distribution import image_distributor, resolve_source
+
+router = APIRouter(
+    prefix="/api/service-clusters/images",
+    tags=["Distribution des images"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.post('/{system_image_id}/stage', response_model=StandardResponse,
+             summary="Pré-distribue une image système sur les hôtes",
+             description="Le chemin source_path est relatif à IMAGE_ROOTFS_DIR. Découpe le rootfs en chunks adressés par contenu et le pousse vers les hôtes (tous par défaut) en éventail à débit limité. La distribution s'exécute en arrière-plan.")
+async def stage_image(system_image_id: int, staging: StagingRequest):
+    """Lance la pré-distribution d'une image système"""
+    if image_distributor.is_running(system_image_id):
+        return StandardResponse(
+            statusCode=409,
+            message=f"Une distribution de l'image {system_image_id} est déjà en cours",
+            data=image_distributor.job_status(system_image_id)
+        )
+    try:
+        source_path = resolve_source(staging.source_path)
+    except ValueError as e:
+        return StandardResponse(
+            statusCode=403,
+            message=str(e),
+            data=None
+        )
+    if not os.path.isfile(source_path):
+        return StandardResponse(
+            statusCode=404,
+            message=f"Fichier image introuvable: {staging.source_path}",
+            data=None
+        )
+    image_distributor.start(system_image_id, source_path, staging.cluster_ids)
+    return StandardResponse(
+        statusCode=202,
+        message=f"Distribution de l'image {system_image_id} démarrée",
+        data=None
+    )
+
+
+@router.get('/{system_image_id}/staging', response_model=StandardResponse,
+            summary="Progression de la pré-distribution d'une image système",
+            description="Retourne l'état de la distribution en cours et la progression par hôte enregistrée en base")
+def get_staging_progress(system_image_id: int, db: Session = Depends(get_db)):
+    """Progression de la distribution d'une image système par hôte"""
+    rows = db.query(ImageStagingEntity).filter(
+        ImageStagingEntity.system_image_id == system_image_id
+    ).order_by(ImageStagingEntity.cluster_id).all()
+    return StandardResponse(
+        statusCode=200,
+        message="Progression de la distribution récupérée avec succès",
+        data={
+            "job": image_distributor.job_status(system_image_id),
+            "hosts": [row.to_dict() for row in rows]
+        }
+    )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from dependencies import get_db, StandardResponse
+from models.model_placement_group import PlacementGroupEntity, PlacementGroupCreate
+from services.placement_groups import placement_groups, POLICIES, SCOPES
+
+router = APIRouter(
+    prefix="/api/service-clusters/placement-groups",
+    tags=["Placement groups"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.post('/', response_model=StandardResponse,
+             summary="Crée un groupe de placement",
+             description="policy: affinity (même domaine), anti_affinity (un seul membre par domaine) ou soft_spread (domaines les moins occupés d'abord); scope: host, rack ou zone. Les VM rejoignent le groupe via le champ placement_group de la demande de placement.")
+def create_placement_group(group: PlacementGroupCreate, db: Session = Depends(get_db)):
+    """Crée un groupe de placement"""
+    scope = group.scope or 'host'
+    if group.policy not in POLICIES:
+        return StandardResponse(
+            statusCode=400,
+            message=f"Politique inconnue: {group.policy} (valeurs possibles: {', '.join(POLICIES)})",
+            data=None
+        )
+    if scope not in SCOPES:
+        return StandardResponse(
+            statusCode=400,
+            message=f"Portée inconnue: {scope} (valeurs possibles: {', '.join(SCOPES)})",
+            data=None
+        )
+    try:
+        placement_groups.ensure(db)
+        if db.query(PlacementGroupEntity).filter(PlacementGroupEntity.name == group.name).first():
+            return StandardResponse(
+                statusCode=409,
+                message=f"Un groupe de placement nommé '{group.name}' existe déjà",
+                data=None
+            )
+        entity = PlacementGroupEntity(name=group.name, policy=group.policy, scope=scope, user_id=group.user_id)
+        db.add(entity)
+        db.commit()
+        db.refresh(entity)
+        placement_groups.add_group(entity.to_dict())
+        return StandardResponse(
+            statusCode=201,
+            message="Groupe de placement créé avec succès",
+            data=entity.to_dict()
+        )
+    except Exception as e:
+        db.rollback()
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la création du groupe de placement: {str(e)}",
+            data=None
+        )
+
+
+@router.get('/', response_model=StandardResponse,
+            summary="Liste les groupes de placement",
+            description="Politique, portée, nombre de VM et nombre d'hôtes occupés par chaque groupe")
+def get_placement_groups(db: Session = Depends(get_db)):
+    """Liste les groupes de placement"""
+    try:
+        placement_groups.ensure(db)
+        return StandardResponse(
+            statusCode=200,
+            message="Groupes de placement récupérés avec succès",
+            data={"groups": placement_groups.snapshot(), "conflicts": placement_groups.conflicts}
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la récupération des groupes de placement: {str(e)}",
+            data=None
+        )
+
+
+@router.get('/{name}', response_model=StandardResponse,
+            summary="Détail d'un groupe de placement",
+            description="Groupe et nombre de VM du groupe par hôte")
+def get_placement_group(name: str, db: Session = Depends(get_db)):
+    """Détail d'un groupe de placement avec ses membres"""
+    placement_groups.ensure(db)
+    group = placement_groups.get(name)
+    if group is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Groupe de placement non trouvé",
+            data=None
+        )
+    return StandardResponse(
+        statusCode=200,
+        message="Groupe de placement récupéré avec succès",
+        data=group.to_dict(include_members=True)
+    )
+
+
+@router.delete('/{name}', response_model=StandardResponse,
+               summary="Supprime un groupe de placement",
+               description="Refusé tant que des VM du groupe occupent de la capacité")
+def delete_placement_group(name: str, db: Session = Depends(get_db)):
+    """Supprime un groupe de placement vide"""
+    placement_groups.ensure(db)
+    group = placement_groups.get(name)
+    if group is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Groupe de placement non trouvé",
+            data=None
+        )
+    if group.size() > 0:
+        return StandardResponse(
+            statusCode=409,
+            message=f"Le groupe contient encore {group.size()} VM",
+            data=group.to_dict()
+        )
+    try:
+        from models.model_allocation import VMAllocationEntity
+        # Les allocations terminées gardent leur historique sans référence au groupe
+        db.query(VMAllocationEntity).filter(VMAllocationEntity.placement_group_id == group.id).update(
+            {VMAllocationEntity.placement_group_id: None}, synchronize_session=False)
+        db.query(PlacementGroupEntity).filter(PlacementGroupEntity.id == group.id).delete()
+        db.commit()
+        placement_groups.remove_group(group.id)
+        return StandardResponse(
+            statusCode=200,
+            message="Groupe de placement supprimé avec succès",
+            data=None
+        )
+    except Exception as e:
+        db.rollback()
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la suppression du groupe de placement: {str(e)}",
+            data=None
+        )
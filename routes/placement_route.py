@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+from typing import Optional
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from dependencies import get_read_db, StandardResponse
+from models.model_cluster import ClusterEntity, RebalanceRequest, WarmPoolConfig
+from services.admission import admission
+from services.allocation_ledger import allocation_ledger
+from services.capabilities import capabilities, popcount
+from services.capacity_model import capacity_model
+from services.circuit_breaker import breakers
+from services.decision_cache import decision_cache
+from services.event_log import event_log
+from services.health_monitor import health_monitor
+from services.idempotency import idempotency_store
+from services.image_locality import image_locality
+from services.preemption import preemption_planner
+from services.rebalancer import rebalancer
+from services.traffic_capture import traffic_capture
+from services.warm_pool import warm_pool
+
+router = APIRouter(
+    prefix="/api/service-clusters/placement",
+    tags=["Placement"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get('/image-locality', response_model=StandardResponse,
+            summary="Statistiques de localité des images système",
+            description="Nombre de placements, taux de placements sur un hôte ayant déjà l'image en cache et nombre d'hôtes par image")
+def get_image_locality_stats():
+    """Statistiques de localité des images système"""
+    return StandardResponse(
+        statusCode=200,
+        message="Statistiques de localité récupérées avec succès",
+        data=image_locality.stats()
+    )
+
+
+@router.get('/health', response_model=StandardResponse,
+            summary="État de santé des hôtes",
+            description="États up / suspect / down issus de la sonde, statistiques de latence des sondes et du dernier cycle. Paramètre all=true pour détailler tous les hôtes.")
+def get_host_health(all: bool = False):
+    """État de santé des hôtes vu par la sonde"""
+    return StandardResponse(
+        statusCode=200,
+        message="État de santé des hôtes récupéré avec succès",
+        data=health_monitor.stats(include_hosts=all)
+    )
+
+
+@router.get('/breakers', response_model=StandardResponse,
+            summary="État des disjoncteurs par hôte",
+            description="État closed / open / half_open du disjoncteur de chaque hôte ayant reçu au moins une demande de création de VM")
+def get_breakers():
+    """État des disjoncteurs par hôte"""
+    return StandardResponse(
+        statusCode=200,
+        message="État des disjoncteurs récupéré avec succès",
+        data={"breakers": breakers.snapshot()}
+    )
+
+
+@router.get('/admission', response_model=StandardResponse,
+            summary="Métriques du contrôle d'admission",
+            description="Placements en cours, profondeur des files par utilisateur et par classe de priorité, temps d'attente et rejets par classe, créations en cours par hôte")
+def get_admission_metrics():
+    """Métriques du contrôle d'admission des créations de VM"""
+    return StandardResponse(
+        statusCode=200,
+        message="Métriques d'admission récupérées avec succès",
+        data=admission.metrics()
+    )
+
+
+@router.get('/preemption', response_model=StandardResponse,
+            summary="Suggestions de préemption par classe de priorité",
+            description="Par classe de priorité: demandes sans hôte évaluées et ensembles de VM moins prioritaires trouvés (les suggestions accompagnent les réponses 404 de find-suitable-host)")
+def get_preemption_stats():
+    """Compteurs des suggestions de préemption"""
+    return StandardResponse(
+        statusCode=200,
+        message="Statistiques de préemption récupérées avec succès",
+        data=preemption_planner.stats()
+    )
+
+
+@router.get('/idempotency', response_model=StandardResponse,
+            summary="Statistiques du cache d'idempotence",
+            description="Placements exécutés, rejoués depuis le cache, requêtes concurrentes jointes à un placement en cours, conflits et clés réutilisées avec un autre corps")
+def get_idempotency_stats():
+    """Statistiques du cache d'idempotence des créations de VM"""
+    return StandardResponse(
+        statusCode=200,
+        message="Statistiques d'idempotence récupérées avec succès",
+        data=idempotency_store.stats()
+    )
+
+
+@router.get('/event-log', response_model=StandardResponse,
+            summary="État du journal d'événements",
+            description="Offset courant, événements en attente de fsync, instantanés écrits, durée de la dernière reprise et résumé de l'état reconstruit")
+def get_event_log_stats():
+    """État du journal d'événements des clusters et des placements"""
+    return StandardResponse(
+        statusCode=200,
+        message="État du journal d'événements récupéré avec succès",
+        data=event_log.stats()
+    )
+
+
+@router.get('/traffic-capture', response_model=StandardResponse,
+            summary="État de la capture du trafic",
+            description="Fichier de capture, taux d'échantillonnage, requêtes enregistrées, corps non conservés et requêtes en cours")
+def get_traffic_capture_stats():
+    """État de la capture du trafic destinée au rejeu"""
+    return StandardResponse(
+        statusCode=200,
+        message="État de la capture du trafic récupéré avec succès",
+        data=traffic_capture.stats()
+    )
+
+
+@router.get('/decision-cache', response_model=StandardResponse,
+            summary="Cache des candidats classés par profil de demande",
+            description="Taux de succès, entrées expirées ou évincées, hôtes reclassés et profils les plus demandés")
+def get_decision_cache_stats(limit: int = 20):
+    """État du cache des décisions de placement"""
+    return StandardResponse(
+        statusCode=200,
+        message="État du cache des décisions récupéré avec succès",
+        data=decision_cache.stats(max(1, min(limit, 256)))
+    )
+
+
+@router.get('/warm-pools', response_model=StandardResponse,
+            summary="Pools de VM préchauffées",
+            description="Par pool (offre, image): VM prêtes et en création, taux de réclamation, retard de remplissage et hôtes; capacité totale retenue par les pools")
+def get_warm_pools():
+    """État des pools de VM préchauffées"""
+    return StandardResponse(
+        statusCode=200,
+        message="État des pools de VM préchauffées récupéré avec succès",
+        data=warm_pool.stats()
+    )
+
+
+@router.put('/warm-pools', response_model=StandardResponse,
+            summary="Crée ou redimensionne un pool de VM préchauffées",
+            description="Pool identifié par (vm_offer_id, system_image_id). size=0 vide le pool; un changement de ressources ou d'OS remplace ses VM. Configuration non persistée (voir WARM_POOLS).")
+def configure_warm_pool(config: WarmPoolConfig):
+    """Configure un pool de VM préchauffées"""
+    if config.size < 0 or min(config.cpu_count, config.memory_size_mib, config.disk_size_gb) <= 0:
+        return StandardResponse(
+            statusCode=400,
+            message="La taille doit être positive ou nulle et les ressources strictement positives",
+            data=None
+        )
+    pool = warm_pool.configure(config.model_dump())
+    return StandardResponse(
+        statusCode=200,
+        message="Pool de VM préchauffées configuré avec succès",
+        data=pool.spec()
+    )
+
+
+@router.post('/rebalance-plan', response_model=StandardResponse,
+             summary="Plan de migrations pour libérer de la capacité contiguë",
+             description="Cherche le plus petit ensemble de migrations qui libère, pour chaque taille cible, le nombre d'emplacements demandé. Calcul borné par budget_s (plan partiel si dépassé). Suggestion seulement: aucune migration n'est exécutée.")
+def plan_rebalance(request: RebalanceRequest, db: Session = Depends(get_read_db)):
+    """Suggère des migrations qui défragmentent la capacité libre"""
+    if not request.targets or any(min(target.cpu_count, target.memory_size_mib, target.count) <= 0
+                                  or target.disk_size_gb < 0 for target in request.targets):
+        return StandardResponse(
+            statusCode=400,
+            message="Au moins une taille cible est requise, avec des ressources et un nombre d'emplacements strictement positifs",
+            data=None
+        )
+    if request.budget_s is not None and request.budget_s <= 0:
+        return StandardResponse(
+            statusCode=400,
+            message="Le budget de temps doit être strictement positif",
+            data=None
+        )
+    try:
+        plan = rebalancer.plan(db, [target.model_dump() for target in request.targets], request.budget_s,
+                               request.zone)
+        return StandardResponse(
+            statusCode=200,
+            message=f"Plan de {len(plan['migrations'])} migration(s) calculé (suggestion, aucune migration exécutée)",
+            data=plan
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors du calcul du plan de migrations: {str(e)}",
+            data=None
+        )
+
+
+@router.get('/rebalance-plan', response_model=StandardResponse,
+            summary="Dernier plan de migrations calculé",
+            description="Dernier plan renvoyé par POST /placement/rebalance-plan sur cette instance")
+def get_rebalance_plan():
+    """Dernier plan de défragmentation"""
+    if rebalancer.last_plan is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Aucun plan de migrations calculé",
+            data=None
+        )
+    return StandardResponse(
+        statusCode=200,
+        message="Dernier plan de migrations récupéré avec succès",
+        data=rebalancer.last_plan
+    )
+
+
+@router.get('/capacity', response_model=StandardResponse,
+            summary="Modèle de capacité et densité par classe d'hôte",
+            description="Classes d'hôtes et ratios de surallocation, vCPU / mémoire allouables et alloués par classe. Paramètre all=true pour détailler chaque hôte.")
+def get_capacity(all: bool = False, db: Session = Depends(get_read_db)):
+    """Capacité allouable et allocations par classe d'hôte"""
+    try:
+        by_class = {}
+        hosts = []
+        for cluster in db.query(ClusterEntity).all():
+            host = cluster.to_dict()
+            detail = capacity_model.describe(host, allocation_ledger.allocated(host['id']))
+            totals = by_class.setdefault(detail['class'], {'hosts': 0, 'cores': 0, 'vcpus': 0, 'allocated_vcpus': 0,
+                                                           'memory_mib': 0, 'allocated_memory_mib': 0})
+            totals['hosts'] += 1
+            totals['cores'] += host['number_of_core']
+            totals['vcpus'] += detail['capacity']['vcpus']
+            totals['allocated_vcpus'] += detail['allocated']['vcpus']
+            totals['memory_mib'] += detail['capacity']['memory_mib']
+            totals['allocated_memory_mib'] += detail['allocated']['memory_mib']
+            if all:
+                hosts.append(dict(detail, cluster_id=host['id'], nom=host['nom']))
+        for totals in by_class.values():
+            totals['vcpu_per_core'] = round(totals['allocated_vcpus'] / totals['cores'], 2) if totals['cores'] else None
+        data = dict(capacity_model.stats(), by_class=by_class)
+        if all:
+            data['hosts'] = hosts
+        return StandardResponse(
+            statusCode=200,
+            message="Capacité récupérée avec succès",
+            data=data
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors du calcul de la capacité: {str(e)}",
+            data=None
+        )
+
+
+@router.get('/capabilities', response_model=StandardResponse,
+            summary="Architectures et drapeaux CPU des hôtes",
+            description="Nombre d'hôtes par architecture et par drapeau CPU dans l'index de capacités. Paramètres architecture et features (séparés par des virgules) pour compter les hôtes compatibles.")
+def get_capabilities(architecture: Optional[str] = None, features: Optional[str] = None,
+                     db: Session = Depends(get_read_db)):
+    """Index des capacités matérielles des hôtes"""
+    try:
+        capabilities.ensure(db)
+        data = capabilities.stats()
+        if architecture or features:
+            eligible, missing = capabilities.eligible(architecture, features.split(',') if features else None)
+            data['eligible_hosts'] = popcount(eligible or 0)
+            data['missing'] = missing
+        return StandardResponse(
+            statusCode=200,
+            message="Capacités des hôtes récupérées avec succès",
+            data=data
+        )
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la récupération des capacités: {str(e)}",
+            data=None
+        )
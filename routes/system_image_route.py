@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import shutil
+import uuid
+from typing import Optional
+from fastapi import APIRouter, Depends, File, Form, UploadFile
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+from models.model_system_image import SystemImageEntity
+from dependencies import get_db, StandardResponse
+from services.image_variants import MEDIA_TYPES, VARIANTS, delete_variants, read_variant, schedule_variants
+
+router = APIRouter(
+    prefix="/api/service-clusters/system-images",
+    tags=["Images système"],
+    responses={404: {"description": "Not found"}},
+)
+
+# Dossier de stockage des illustrations des images système
+SYSTEM_IMAGE_DIR = os.getenv('SYSTEM_IMAGE_DIR', os.path.join('static', 'img', 'system'))
+
+
+def _absolute(image_path: str) -> str:
+    return os.path.join(SYSTEM_IMAGE_DIR, image_path)
+
+
+def _save_upload(image: UploadFile) -> str:
+    """Enregistre le fichier sous un nom unique et lance la génération de ses variantes en arrière-plan"""
+    os.makedirs(SYSTEM_IMAGE_DIR, exist_ok=True)
+    filename = f"{uuid.uuid4().hex}_{secure_filename(image.filename) or 'image'}"
+    with open(_absolute(filename), 'wb') as f:
+        shutil.copyfileobj(image.file, f)
+    schedule_variants(_absolute(filename))
+    return filename
+
+
+def _delete_file(image_path: Optional[str]):
+    if image_path and os.path.exists(_absolute(image_path)):
+        os.remove(_absolute(image_path))
+        delete_variants(_absolute(image_path))
+
+
+@router.post('/', response_model=StandardResponse,
+             summary="Crée une image système",
+             description="Formulaire multipart; l'illustration (champ image) est déclinée en variantes thumbnail, card et webp dans un pool de processus")
+def create_system_image(name: str = Form(...), os_type: str = Form(...), version: str = Form(...),
+                        description: Optional[str] = Form(None), image: Optional[UploadFile] = File(None),
+                        db: Session = Depends(get_db)):
+    """Crée une image système et génère les variantes de son illustration"""
+    image_path = _save_upload(image) if image is not None and image.filename else None
+    try:
+        entity = SystemImageEntity(name=name, os_type=os_type, version=version, description=description,
+                                   image_path=image_path)
+        db.add(entity)
+        db.commit()
+        db.refresh(entity)
+        return StandardResponse(
+            statusCode=201,
+            message="Image système créée avec succès",
+            data=entity.to_dict()
+        )
+    except Exception as e:
+        db.rollback()
+        _delete_file(image_path)
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la création de l'image système: {str(e)}",
+            data=None
+        )
+
+
+@router.get('/', response_model=StandardResponse,
+            summary="Liste les images système",
+            description="Filtre optionnel par type de système d'exploitation")
+def get_system_images(os_type: Optional[str] = None, db: Session = Depends(get_db)):
+    """Liste les images système"""
+    query = db.query(SystemImageEntity)
+    if os_type:
+        query = query.filter(SystemImageEntity.os_type == os_type)
+    return StandardResponse(
+        statusCode=200,
+        message="Images système récupérées avec succès",
+        data=[entity.to_dict() for entity in query.all()]
+    )
+
+
+@router.get('/{system_image_id}', response_model=StandardResponse,
+            summary="Détail d'une image système")
+def get_system_image(system_image_id: int, db: Session = Depends(get_db)):
+    """Obtient une image système par son ID"""
+    entity = db.query(SystemImageEntity).filter(SystemImageEntity.id == system_image_id).first()
+    if entity is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Image système non trouvée",
+            data=None
+        )
+    return StandardResponse(
+        statusCode=200,
+        message="Image système récupérée avec succès",
+        data=entity.to_dict()
+    )
+
+
+@router.get('/{system_image_id}/image',
+            summary="Illustration d'une image système",
+            description="variant: thumbnail, card ou webp (original par défaut). Une variante évincée du cache est régénérée à la demande.")
+async def get_system_image_file(system_image_id: int, variant: Optional[str] = None, db: Session = Depends(get_db)):
+    """Télécharge l'illustration d'une image système ou l'une de ses variantes"""
+    entity = db.query(SystemImageEntity).filter(SystemImageEntity.id == system_image_id).first()
+    if entity is None or not entity.image_path:
+        return StandardResponse(
+            statusCode=404,
+            message="Aucune illustration associée à cette image système",
+            data=None
+        )
+    file_path = _absolute(entity.image_path)
+    if not os.path.exists(file_path):
+        return StandardResponse(
+            statusCode=404,
+            message="Fichier image introuvable",
+            data=None
+        )
+    if not variant:
+        return FileResponse(file_path)
+    if variant not in VARIANTS:
+        return StandardResponse(
+            statusCode=400,
+            message=f"Variante inconnue: {variant} (valeurs possibles: {', '.join(VARIANTS)})",
+            data=None
+        )
+    try:
+        # Le contenu est lu en une fois: une éviction concurrente ne peut pas couper l'envoi
+        content = await asyncio.to_thread(read_variant, file_path, variant)
+    except Exception as e:
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la génération de la variante: {str(e)}",
+            data=None
+        )
+    return Response(content=content, media_type=MEDIA_TYPES[VARIANTS[variant]['format']])
+
+
+@router.delete('/{system_image_id}', response_model=StandardResponse,
+               summary="Supprime une image système",
+               description="Supprime aussi son illustration et les variantes en cache")
+def delete_system_image(system_image_id: int, db: Session = Depends(get_db)):
+    """Supprime une image système"""
+    entity = db.query(SystemImageEntity).filter(SystemImageEntity.id == system_image_id).first()
+    if entity is None:
+        return StandardResponse(
+            statusCode=404,
+            message="Image système non trouvée",
+            data=None
+        )
+    image_path = entity.image_path
+    try:
+        db.delete(entity)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return StandardResponse(
+            statusCode=500,
+            message=f"Erreur lors de la suppression de l'image système: {str(e)}",
+            data=None
+        )
+    _delete_file(image_path)
+    return StandardResponse(
+        statusCode=200,
+        message="Image système supprimée avec succès",
+        data=None
+    )
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Benchmark du cache des candidats classés (services/decision_cache.py).
+
+Crée une flotte d'hôtes dans une base SQLite en mémoire puis mesure le
+temps jusqu'au premier candidat de _ranked_candidates pour quelques profils
+de demande répétés:
+- sans cache (requête, filtre de capacité et tri à chaque demande),
+- avec le cache (lecture de la tête de la liste mémorisée),
+- avec le cache et une modification d'hôte entre chaque demande
+  (réévaluation sélective de cet hôte dans les profils de sa zone).
+
+Usage:
+    python scripts/bench_decision_cache.py --hosts 2000 --iterations 2000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models.model_cluster import ClusterEntity, VMRequirements
+from database import Base
+from routes.cluster_route import _ranked_candidates
+from services.cluster_hooks import notify_cluster_change
+from services.decision_cache import decision_cache
+from services.zone_index import zone_index
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=2000)
+    parser.add_argument('--zones', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    rnd = random.Random(args.seed)
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    for i in range(args.hosts):
+        ram = rnd.choice([64, 128, 256])
+        db.add(ClusterEntity(nom=f"h{i}", adresse_mac=f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+                             ip=f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", rom=2000,
+                             available_rom=rnd.randint(100, 2000), ram=ram, available_ram=rnd.randint(4, ram),
+                             processeur="x86_64", available_processor=rnd.uniform(5, 95),
+                             number_of_core=rnd.choice([16, 32, 64]), zone=f"z{i % args.zones}"))
+    db.commit()
+    hosts = db.query(ClusterEntity).all()
+    zone_index.ensure(db)
+
+    # Quelques offres de VM représentent l'essentiel des demandes
+    profiles = [VMRequirements(cpu_count=cpu, memory_size_mib=memory, disk_size_gb=disk, system_image_id=1,
+                               zone=f"z{zone}", zone_spillover=False)
+                for cpu, memory, disk in [(1, 1024, 10), (2, 4096, 20), (4, 8192, 40)]
+                for zone in range(args.zones)]
+
+    def run(mutate: bool):
+        timings = []
+        for _ in range(args.iterations):
+            requirements = rnd.choice(profiles)
+            if mutate:
+                host = rnd.choice(hosts)
+                before = host.to_dict()
+                host.available_ram = rnd.randint(4, host.ram)
+                host.available_processor = rnd.uniform(5, 95)
+                notify_cluster_change(before, host.to_dict())
+            started = time.perf_counter()
+            next(_ranked_candidates(requirements, db), None)
+            timings.append((time.perf_counter() - started) * 1e6)
+        return timings
+
+    decision_cache.enabled = False
+    results = [("sans cache", run(False))]
+    decision_cache.enabled = True
+    decision_cache.clear()
+    results.append(("avec cache", run(False)))
+    results.append(("cache + modifications", run(True)))
+
+    print(f"{args.hosts} hôtes, {args.zones} zones, {len(profiles)} profils, {args.iterations} demandes\n")
+    print(f"{'':<24}{'p50 µs':>10}{'p99 µs':>10}")
+    for name, timings in results:
+        print(f"{name:<24}{percentile(timings, 0.5):>10.1f}{percentile(timings, 0.99):>10.1f}")
+    stats = decision_cache.stats()
+    print(f"\nTaux de succès {stats['hit_ratio']}, compteurs {stats['counters']}")
+
+
+if __name__ == '__main__':
+    main()
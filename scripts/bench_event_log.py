@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark du journal d'événements: débit d'ajout et durée de reprise.
+
+Mesure le débit d'ajout (fsync groupé) de N événements, puis la durée de reprise
+au démarrage par relecture complète et après compaction (instantané de tête).
+
+Usage:
+    python scripts/bench_event_log.py --events 1000000 --hosts 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.event_log import CLUSTER_UPSERT, PLACEMENT, EventLog
+
+
+def host(i: int, rng: random.Random) -> dict:
+    return {
+        'id': i, 'nom': f"host-{i}", 'adresse_mac': f"02:00:00:{i >> 16 & 255:02x}:{i >> 8 & 255:02x}:{i & 255:02x}",
+        'ip': f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 'rom': 2000, 'available_rom': rng.randint(0, 2000),
+        'ram': 256, 'available_ram': rng.randint(0, 256), 'processeur': 'x86_64',
+        'available_processor': round(rng.uniform(0, 100), 1), 'number_of_core': 64,
+    }
+
+
+def append(log: EventLog, rng: random.Random, args):
+    if rng.random() < args.placement_ratio:
+        log.append(PLACEMENT, {'outcome': 'created', 'host_id': rng.randrange(args.hosts),
+                               'user_id': str(rng.randrange(500)), 'cpu_count': 2,
+                               'memory_size_mib': 2048, 'disk_size_gb': 10})
+    else:
+        log.append(CLUSTER_UPSERT, host(rng.randrange(args.hosts), rng))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--hosts', type=int, default=1000)
+    parser.add_argument('--placement-ratio', type=float, default=0.3, help="part des décisions de placement")
+    parser.add_argument('--fsync-batch', type=int, default=512)
+    parser.add_argument('--fsync-interval', type=float, default=0.05)
+    parser.add_argument('--snapshot-at', type=float, default=0.9, help="position de la compaction (fraction)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'events.log')
+        log = EventLog(path, fsync_interval=args.fsync_interval, fsync_batch=args.fsync_batch,
+                       snapshot_every=args.events * 10)
+        log.open()
+        snapshot_at = int(args.events * args.snapshot_at)
+        started = time.perf_counter()
+        for _ in range(snapshot_at):
+            append(log, rng, args)
+        log.close()
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(path)
+        print(f"Ajout: {snapshot_at} événements en {elapsed:.2f}s "
+              f"({snapshot_at / elapsed:,.0f} évts/s), {size / 1e6:.1f} Mo ({size / snapshot_at:.0f} o/évt), "
+              f"{log.counters['fsyncs']} fsync")
+
+        recovered = EventLog(path, snapshot_every=args.events * 10)
+        recovery = recovered.open()
+        print(f"Reprise complète: {recovery['replayed_events']} événements rejoués "
+              f"en {recovery['duration_ms'] / 1000:.2f}s")
+
+        started = time.perf_counter()
+        recovered.compact()
+        print(f"Compaction en {time.perf_counter() - started:.2f}s: {size / 1e6:.1f} Mo -> "
+              f"{os.path.getsize(path) / 1e6:.1f} Mo")
+        for _ in range(snapshot_at, args.events):
+            append(recovered, rng, args)
+        recovered.close()
+
+        recovered = EventLog(path)
+        recovery = recovered.open()
+        recovered.close()
+        print(f"Reprise depuis l'instantané: {recovery['replayed_events']} événements rejoués "
+              f"en {recovery['duration_ms'] / 1000:.2f}s, {len(recovered.state.hosts)} hôtes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark: latence upload -> variantes disponibles sous uploads concurrents.
+
+Usage:
+    python scripts/bench_image_variants.py --uploads 64 --concurrency 16 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+
+def make_image(path: str, size: int, seed: int):
+    img = Image.new('RGB', (size, size), ((seed * 37) % 256, (seed * 91) % 256, (seed * 13) % 256))
+    # Un peu de bruit pour que l'encodage ne soit pas trivial
+    img = Image.blend(img, Image.effect_noise((size, size), 64).convert('RGB'), 0.3)
+    img.save(path, 'PNG')
+
+
+async def run(args):
+    os.environ['IMAGE_VARIANT_WORKERS'] = str(args.workers)
+    from services import image_variants
+
+    image_variants.IMAGE_VARIANT_WORKERS = args.workers
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.uploads):
+            path = os.path.join(tmp, f"upload_{i}.png")
+            make_image(path, args.size, i)
+            paths.append(path)
+
+        # Démarrer les workers avant la mesure
+        await image_variants.generate_variants(paths[0], ['thumbnail'])
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        # Mesurer que la boucle d'événements reste réactive pendant la génération
+        loop_lag = []
+
+        async def upload(path):
+            async with semaphore:
+                start = time.perf_counter()
+                await image_variants.generate_variants(path)
+                latencies.append(time.perf_counter() - start)
+
+        async def heartbeat(stop):
+            while not stop.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                loop_lag.append(time.perf_counter() - start - 0.01)
+
+        stop = asyncio.Event()
+        hb = asyncio.create_task(heartbeat(stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(upload(p) for p in paths))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await hb
+        image_variants.shutdown_executor()
+
+    latencies.sort()
+    print(f"uploads={args.uploads} concurrence={args.concurrency} workers={args.workers} taille={args.size}px")
+    print(f"débit: {args.uploads / elapsed:.1f} uploads/s ({elapsed:.2f}s au total)")
+    print(f"latence p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms "
+          f"max={latencies[-1] * 1000:.1f}ms")
+    print(f"retard max de la boucle d'événements: {max(loop_lag) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--size', type=int, default=1920)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark du surcoût du traçage des requêtes (services/tracing.py).
+
+Mesure, sans trace active (cas de toutes les requêtes non tracées):
+- un bloc `with span(...)` contre un bloc vide,
+- une fonction décorée par @traced contre la même fonction non décorée,
+- un ordre SQL (SQLite en mémoire) sans puis avec les hooks SQLAlchemy
+  (branchés à la première requête tracée),
+puis le coût d'un span quand la requête est tracée.
+
+Usage:
+    python scripts/bench_tracing.py --iterations 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from services import tracing
+from services.tracing import RequestTrace, span, traced
+
+
+def per_call(func, iterations: int) -> float:
+    """Durée moyenne d'un appel en nanosecondes (meilleure de trois séries)"""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        func(iterations)
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=1000000)
+    parser.add_argument('--sql-iterations', type=int, default=50000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    class Empty:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    empty = Empty()
+
+    def bare(k):
+        for _ in range(k):
+            with empty:
+                pass
+
+    def spans(k):
+        for _ in range(k):
+            with span('bench'):
+                pass
+
+    def work(x):
+        return x
+
+    decorated = traced('bench')(work)
+
+    def plain_calls(k):
+        for i in range(k):
+            work(i)
+
+    def decorated_calls(k):
+        for i in range(k):
+            decorated(i)
+
+    engine = create_engine('sqlite://')
+    connection = engine.connect()
+    statement = text('SELECT 1')
+
+    def sql(k):
+        for _ in range(k):
+            connection.execute(statement)
+
+    results = [
+        ("bloc vide", per_call(bare, n)),
+        ("span inactif", per_call(spans, n)),
+        ("appel direct", per_call(plain_calls, n)),
+        ("appel @traced inactif", per_call(decorated_calls, n)),
+        ("SQL sans hooks", per_call(sql, args.sql_iterations)),
+    ]
+    # Hooks branchés par la première requête tracée, puis actifs pour toutes les requêtes
+    tracing.install_sql_hooks()
+    results.append(("SQL avec hooks", per_call(sql, args.sql_iterations)))
+
+    token = tracing._current.set(RequestTrace('bench', 1, 'bench', False))
+    try:
+        def active_spans(k):
+            trace = tracing._current.get()
+            for _ in range(k):
+                with span('bench'):
+                    pass
+                trace.events.clear()
+        results.append(("span actif", per_call(active_spans, n // 10)))
+    finally:
+        tracing._current.reset(token)
+
+    for name, ns in results:
+        print(f"{name:<24}{ns:>10.0f} ns")
+    timings = dict(results)
+    print(f"\nSurcoût désactivé: span {timings['span inactif'] - timings['bloc vide']:.0f} ns, "
+          f"@traced {timings['appel @traced inactif'] - timings['appel direct']:.0f} ns, "
+          f"ordre SQL {timings['SQL avec hooks'] - timings['SQL sans hooks']:.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Affiche et filtre le journal d'événements binaire.
+
+Usage:
+    python scripts/dump_event_log.py data/events.log
+    python scripts/dump_event_log.py data/events.log --type placement --cluster-id 3 --since 2026-01-01T00:00:00
+    python scripts/dump_event_log.py data/events.log --offset 123456 --limit 20 --json
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.event_log import EVENT_CODES, EVENT_TYPES, read_events
+
+
+def parse_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def matches_cluster(event_type: str, payload: dict, cluster_id: int) -> bool:
+    if event_type == 'placement':
+        return payload.get('host_id') == cluster_id or cluster_id in (payload.get('attempts') or [])
+    return payload.get('id') == cluster_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help="fichier du journal")
+    parser.add_argument('--offset', type=int, default=0, help="offset logique de départ (stable après compaction)")
+    parser.add_argument('--type', action='append', choices=sorted(EVENT_CODES), help="type d'événement (répétable)")
+    parser.add_argument('--cluster-id', type=int, help="événements concernant cet hôte")
+    parser.add_argument('--user-id', help="décisions de placement de cet utilisateur")
+    parser.add_argument('--outcome', help="issue de placement (created, failed, timeout, no_host, ...)")
+    parser.add_argument('--since', help="horodatage epoch ou ISO 8601")
+    parser.add_argument('--until', help="horodatage epoch ou ISO 8601")
+    parser.add_argument('--limit', type=int, default=0, help="nombre maximal d'événements affichés")
+    parser.add_argument('--json', action='store_true', help="une ligne JSON par événement")
+    parser.add_argument('--count', action='store_true', help="affiche seulement le nombre d'événements par type")
+    args = parser.parse_args()
+
+    types = {EVENT_CODES[name] for name in args.type} if args.type else None
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+    shown = 0
+    counts = {}
+    for offset, ts, code, payload in read_events(args.path, args.offset, types):
+        if since is not None and ts < since:
+            continue
+        if until is not None and ts > until:
+            continue
+        event_type = EVENT_TYPES.get(code, str(code))
+        if args.cluster_id is not None and not matches_cluster(event_type, payload, args.cluster_id):
+            continue
+        if args.user_id is not None and str(payload.get('user_id')) != args.user_id:
+            continue
+        if args.outcome is not None and payload.get('outcome') != args.outcome:
+            continue
+        if args.count:
+            counts[event_type] = counts.get(event_type, 0) + 1
+            continue
+        if args.json:
+            print(json.dumps({'offset': offset, 'ts': ts, 'type': event_type, 'payload': payload}))
+        else:
+            when = datetime.datetime.fromtimestamp(ts).isoformat(timespec='milliseconds')
+            print(f"{offset:>12} {when} {event_type:<15} {json.dumps(payload, separators=(',', ':'))}")
+        shown += 1
+        if args.limit and shown >= args.limit:
+            break
+    if args.count:
+        for event_type, count in sorted(counts.items()):
+            print(f"{event_type:<15} {count}")
+
+
+if __name__ == '__main__':
+    main()
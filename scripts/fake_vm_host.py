@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Faux service-vm-host pour les essais en local.
+
+Chaque processus simule un hôte: création de VM (avec injection de pannes et
+de latence), VM préchauffées (création en pause, réclamation, suppression),
+réception et service des chunks d'images, assemblage des rootfs.
+Le service cluster contacte les hôtes sur http://<ip>:SERVICE_VM_HOST_PORT ;
+sous Linux, toute l'adresse 127.0.0.0/8 est locale, on peut donc lancer
+plusieurs faux hôtes sur le même port avec des IP différentes:
+
+    python scripts/fake_vm_host.py --host 127.0.0.2 --cluster-url http://localhost:5000
+    python scripts/fake_vm_host.py --host 127.0.0.3 --cluster-url http://localhost:5000 --fail-rate 0.5
+
+Les pannes peuvent aussi être modifiées à chaud:
+    curl -X POST http://127.0.0.3:5003/_faults -d '{"fail_rate": 1.0, "latency": 2}'
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import uuid
+
+import requests
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+
+PREFIX = "/api/service-vm-host"
+
+app = FastAPI(title="Fake service-vm-host")
+state = {
+    "data_dir": None,
+    "fail_rate": 0.0,
+    "latency": 0.0,
+    "jitter": 0.0,
+    "vms": {},
+    "images": set(),
+}
+
+
+def _chunk_dir(image_id: int) -> str:
+    path = os.path.join(state["data_dir"], "chunks", str(image_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _store_chunk(image_id: int, digest: str, data: bytes):
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise HTTPException(status_code=422, detail="Empreinte du chunk invalide")
+    path = os.path.join(_chunk_dir(image_id), digest)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+async def _inject_faults():
+    delay = state["latency"] + random.uniform(0, state["jitter"])
+    if delay:
+        await asyncio.sleep(delay)
+    if random.random() < state["fail_rate"]:
+        raise HTTPException(status_code=503, detail="Panne injectée")
+
+
+@app.get(f"{PREFIX}/health")
+def health():
+    return {"status": "UP"}
+
+
+@app.post("/_faults")
+async def set_faults(request: Request):
+    body = await request.json()
+    for key in ("fail_rate", "latency", "jitter"):
+        if key in body:
+            state[key] = float(body[key])
+    return {k: state[k] for k in ("fail_rate", "latency", "jitter")}
+
+
+@app.post(f"{PREFIX}/vm/create")
+async def create_vm(request: Request):
+    await _inject_faults()
+    config = await request.json()
+    vm_id = uuid.uuid4().hex[:12]
+    state["vms"][vm_id] = config
+    if config.get("system_image_id") is not None:
+        state["images"].add(int(config["system_image_id"]))
+    status = "paused" if config.get("paused") else "running"
+    state["vms"][vm_id]["status"] = status
+    return {"vm_id": vm_id, "status": status, "name": config.get("name")}
+
+
+@app.post(f"{PREFIX}/vm/{{vm_id}}/claim")
+async def claim_vm(vm_id: str, request: Request):
+    """Personnalise et relance une VM préchauffée"""
+    await _inject_faults()
+    vm = state["vms"].get(vm_id)
+    if vm is None:
+        raise HTTPException(status_code=404, detail="VM inconnue")
+    if vm.get("status") != "paused":
+        raise HTTPException(status_code=409, detail="VM déjà réclamée")
+    vm.update(await request.json(), status="running")
+    return {"vm_id": vm_id, "status": "running", "name": vm.get("name")}
+
+
+@app.delete(f"{PREFIX}/vm/{{vm_id}}")
+def delete_vm(vm_id: str):
+    if state["vms"].pop(vm_id, None) is None:
+        raise HTTPException(status_code=404, detail="VM inconnue")
+    return {"vm_id": vm_id, "status": "deleted"}
+
+
+@app.get(f"{PREFIX}/images/{{image_id}}/chunks")
+def list_chunks(image_id: int):
+    return {"chunks": [n for n in os.listdir(_chunk_dir(image_id)) if not n.endswith(".tmp")]}
+
+
+@app.put(f"{PREFIX}/images/{{image_id}}/chunks/{{digest}}", status_code=201)
+async def put_chunk(image_id: int, digest: str, request: Request):
+    await _inject_faults()
+    _store_chunk(image_id, digest, await request.body())
+    return {"stored": digest}
+
+
+@app.get(f"{PREFIX}/images/{{image_id}}/chunks/{{digest}}")
+def get_chunk(image_id: int, digest: str):
+    path = os.path.join(_chunk_dir(image_id), digest)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Chunk absent")
+    with open(path, "rb") as f:
+        return Response(content=f.read(), media_type="application/octet-stream")
+
+
+@app.post(f"{PREFIX}/images/{{image_id}}/chunks/{{digest}}/fetch")
+async def fetch_chunk(image_id: int, digest: str, request: Request):
+    await _inject_faults()
+    source_url = (await request.json())["source_url"]
+    response = await asyncio.to_thread(requests.get, source_url, timeout=60)
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"Pair indisponible: {response.status_code}")
+    _store_chunk(image_id, digest, response.content)
+    return {"stored": digest, "source": source_url}
+
+
+@app.post(f"{PREFIX}/images/{{image_id}}/manifest")
+async def assemble(image_id: int, request: Request):
+    manifest = await request.json()
+    chunk_dir = _chunk_dir(image_id)
+    image_hash = hashlib.sha256()
+    target = os.path.join(state["data_dir"], f"image-{image_id}.rootfs")
+    with open(target, "wb") as out:
+        for chunk in manifest["chunks"]:
+            path = os.path.join(chunk_dir, chunk["digest"])
+            if not os.path.exists(path):
+                raise HTTPException(status_code=409, detail=f"Chunk manquant: {chunk['digest']}")
+            with open(path, "rb") as f:
+                data = f.read()
+            image_hash.update(data)
+            out.write(data)
+    if image_hash.hexdigest() != manifest["digest"]:
+        raise HTTPException(status_code=422, detail="Empreinte de l'image invalide")
+    state["images"].add(image_id)
+    return {"system_image_id": image_id, "size": manifest["size"]}
+
+
+def local_cpu_flags() -> list:
+    """Drapeaux CPU de la machine locale (Linux), comme les déclarerait un vrai service-vm-host"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return line.split(":", 1)[1].split()
+    except OSError:
+        pass
+    return []
+
+
+async def heartbeat(args):
+    """Enregistre l'hôte auprès du service cluster puis envoie un heartbeat périodique"""
+    last = [int(x) for x in args.host.split(".")[-2:]]
+    payload = {
+        "nom": f"fake-{args.host}",
+        "adresse_mac": "02:00:00:00:%02x:%02x" % (last[0], last[1]),
+        "ip": args.host,
+        "rom": args.rom,
+        "available_rom": args.rom,
+        "ram": args.ram,
+        "available_ram": args.ram,
+        "processeur": "x86_64",
+        "available_processor": 100.0,
+        "number_of_core": args.cores,
+        "zone": args.zone,
+        "rack": args.rack,
+        "architecture": args.architecture,
+        "cpu_flags": args.cpu_flags.replace(",", " ").split() if args.cpu_flags is not None else local_cpu_flags(),
+    }
+    while True:
+        payload["cached_images"] = sorted(state["images"])
+        try:
+            await asyncio.to_thread(requests.post, f"{args.cluster_url}/api/service-clusters/",
+                                    json=payload, timeout=5)
+        except Exception as e:
+            print(f"Heartbeat échoué: {e}", file=sys.stderr)
+        await asyncio.sleep(args.heartbeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.2")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_VM_HOST_PORT", "5003")))
+    parser.add_argument("--data-dir", default=None, help="répertoire des chunks (temporaire par défaut)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probabilité d'échec des appels (0-1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence ajoutée en secondes")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latence aléatoire supplémentaire maximale")
+    parser.add_argument("--cluster-url", default=None, help="URL du service cluster pour l'enregistrement")
+    parser.add_argument("--heartbeat", type=float, default=30.0)
+    parser.add_argument("--rom", type=int, default=500)
+    parser.add_argument("--ram", type=int, default=64)
+    parser.add_argument("--cores", type=int, default=16)
+    parser.add_argument("--zone", default=None, help="zone de disponibilité déclarée")
+    parser.add_argument("--rack", default=None, help="rack déclaré")
+    parser.add_argument("--architecture", default=platform.machine(), help="architecture CPU déclarée")
+    parser.add_argument("--cpu-flags", default=None,
+                        help="drapeaux CPU déclarés, séparés par des virgules (par défaut ceux de /proc/cpuinfo)")
+    args = parser.parse_args()
+
+    cleanup = args.data_dir is None
+    state["data_dir"] = args.data_dir or tempfile.mkdtemp(prefix=f"fake-vm-host-{args.host}-")
+    state.update(fail_rate=args.fail_rate, latency=args.latency, jitter=args.jitter)
+
+    if args.cluster_url:
+        @app.on_event("startup")
+        async def start_heartbeat():
+            asyncio.create_task(heartbeat(args))
+
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    finally:
+        if cleanup:
+            shutil.rmtree(state["data_dir"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Rejeu d'une capture de trafic (services/traffic_capture.py) contre une instance locale.
+
+Les requêtes sont renvoyées à leur instant d'origine divisé par --speed (1x à
+Nx), en boucle ouverte: chaque requête part à son heure sans attendre les
+précédentes, ce qui reproduit la concurrence d'origine (accélérée d'autant).
+Les hôtes des heartbeats reçoivent chacun une adresse de boucle locale
+127.1.x.y et une adresse MAC locale; un faux service-vm-host
+(scripts/fake_vm_host.py) écoutant sur toutes les interfaces répond aux
+créations de VM pour toutes ces adresses. L'instance rejouée doit utiliser le
+même SERVICE_VM_HOST_PORT que le faux hôte (--fake-host-port).
+
+Avant la mesure, le premier heartbeat de chaque hôte est envoyé pour que la
+flotte existe même si la capture a commencé en cours de vie du service
+(désactivable avec --no-warmup).
+
+Le rapport donne, par route: nombre de requêtes, réponses 2xx / 4xx / 5xx
+(statut applicatif statusCode des StandardResponse s'il est présent) et
+exceptions, latences p50 / p90 / p99 / max comparées aux durées capturées, et
+les erreurs les plus fréquentes. Le retard d'envoi (p99) signale un client de
+rejeu saturé: augmenter --workers.
+
+Usage:
+    TRAFFIC_CAPTURE_PATH=data/traffic.jsonl python app.py       # capture
+    python scripts/replay_traffic.py data/traffic.jsonl.1 data/traffic.jsonl --speed 4 --json rejeu.json
+    python scripts/replay_traffic.py data/traffic.jsonl --dry-run            # composition de la capture
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HEARTBEAT_ROUTE = ('POST', '/api/service-clusters/')
+
+
+def load_capture(paths: list) -> list:
+    """Entrées de plusieurs fichiers de capture, triées par instant absolu puis ramenées à t=0"""
+    entries = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('v') != 1:
+                raise ValueError(f"{path}: version de capture inconnue {header.get('v')}")
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # dernière ligne tronquée (arrêt brutal)
+                entry['t'] += header['start']
+                entries.append(entry)
+    entries.sort(key=lambda entry: entry['t'])
+    if entries:
+        origin = entries[0]['t']
+        for entry in entries:
+            entry['t'] -= origin
+    return entries
+
+
+def route_key(entry: dict) -> str:
+    return f"{entry['m']} {entry['r']}"
+
+
+class Rewriter:
+    """Remplace les pseudonymes d'adresses d'hôtes par des adresses locales stables"""
+
+    def __init__(self):
+        self.ips = {}
+        self.macs = {}
+
+    def ip(self, value: str) -> str:
+        if value not in self.ips:
+            n = len(self.ips) + 1
+            self.ips[value] = f"127.1.{n >> 8 & 255}.{n & 255}"
+        return self.ips[value]
+
+    def mac(self, value: str) -> str:
+        if value not in self.macs:
+            n = len(self.macs) + 1
+            self.macs[value] = "02:00:01:%02x:%02x:%02x" % (n >> 16 & 255, n >> 8 & 255, n & 255)
+        return self.macs[value]
+
+    def body(self, body):
+        if isinstance(body, dict):
+            body = dict(body)
+            if isinstance(body.get('ip'), str):
+                body['ip'] = self.ip(body['ip'])
+            if isinstance(body.get('adresse_mac'), str):
+                body['adresse_mac'] = self.mac(body['adresse_mac'])
+        return body
+
+    def request(self, entry: dict, target: str) -> dict:
+        path = entry['r']
+        if entry.get('pp'):
+            path = path.format(**entry['pp'])
+        request = {'method': entry['m'], 'url': target + path, 'params': entry.get('q')}
+        if 'b' in entry:
+            request['json'] = self.body(entry['b'])
+        elif entry.get('bs'):
+            request['data'] = os.urandom(min(entry['bs'], 1 << 20))  # corps non conservé: taille seule
+        if entry.get('k'):
+            request['headers'] = {'Idempotency-Key': entry['k']}
+        return request
+
+
+def percentile(values: list, p: float) -> float:
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+class Replay:
+    def __init__(self, target: str, speed: float, workers: int, timeout: float):
+        self.target = target.rstrip('/')
+        self.speed = speed
+        self.timeout = timeout
+        self.rewriter = Rewriter()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.results = defaultdict(list)  # route -> [(statut ou None, latence, retard)]
+        self.errors = defaultdict(Counter)
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, request: dict):
+        return self._session().request(timeout=self.timeout, **request)
+
+    def warmup(self, entries: list) -> int:
+        """Premier heartbeat de chaque hôte, hors mesure"""
+        seen = set()
+        for entry in entries:
+            if (entry['m'], entry['r']) == HEARTBEAT_ROUTE and isinstance(entry.get('b'), dict):
+                mac = entry['b'].get('adresse_mac')
+                if mac not in seen:
+                    seen.add(mac)
+                    self.send(self.rewriter.request(entry, self.target))
+        return len(seen)
+
+    def _run_one(self, key: str, request: dict, due: float, origin: float):
+        started = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        status = None
+        try:
+            response = self.send(request)
+            status = response.status_code
+            try:
+                body = response.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and isinstance(body.get('statusCode'), int):
+                # StandardResponse: le statut applicatif peut différer du statut HTTP
+                status = body['statusCode']
+            if status >= 400:
+                detail = (body.get('detail') or body.get('message') or body) if isinstance(body, dict) else response.text
+                self.errors[key][f"{status} {str(detail)[:100]}"] += 1
+        except requests.RequestException as e:
+            self.errors[key][f"{type(e).__name__}: {str(e)[:100]}"] += 1
+        finally:
+            latency = time.perf_counter() - started
+            with self._lock:
+                self.in_flight -= 1
+                self.results[key].append((status, latency, started - origin - due))
+
+    def run(self, entries: list) -> float:
+        origin = time.perf_counter()
+        futures = []
+        for entry in entries:
+            due = entry['t'] / self.speed
+            delay = origin + due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            request = self.rewriter.request(entry, self.target)
+            futures.append(self.executor.submit(self._run_one, route_key(entry), request, due, origin))
+        for future in futures:
+            future.result()
+        self.executor.shutdown()
+        return time.perf_counter() - origin
+
+    def report(self, entries: list) -> dict:
+        recorded = defaultdict(list)
+        for entry in entries:
+            recorded[route_key(entry)].append(entry['d'] / 1000)
+        routes = {}
+        lags = []
+        for key, results in sorted(self.results.items(), key=lambda item: -len(item[1])):
+            latencies = sorted(latency for _, latency, _ in results)
+            lags.extend(lag for _, _, lag in results)
+            statuses = [status for status, _, _ in results]
+            original = sorted(recorded[key])
+            routes[key] = {
+                'requests': len(results),
+                '2xx': sum(1 for s in statuses if s is not None and s < 400),
+                '4xx': sum(1 for s in statuses if s is not None and 400 <= s < 500),
+                '5xx': sum(1 for s in statuses if s is not None and s >= 500),
+                'exceptions': statuses.count(None),
+                'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+                'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+                'max_ms': round(latencies[-1] * 1000, 2),
+                'captured_p50_ms': round(percentile(original, 0.5) * 1000, 2),
+                'captured_p99_ms': round(percentile(original, 0.99) * 1000, 2),
+                'top_errors': dict(self.errors[key].most_common(3)),
+            }
+        lags.sort()
+        return {
+            'routes': routes,
+            'max_in_flight': self.max_in_flight,
+            'send_lag_p99_ms': round(percentile(lags, 0.99) * 1000, 2),
+        }
+
+
+def start_fake_host(args) -> subprocess.Popen:
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_vm_host.py')
+    process = subprocess.Popen([sys.executable, script, '--host', args.fake_host_bind,
+                                '--port', str(args.fake_host_port), '--latency', str(args.fake_host_latency),
+                                '--jitter', str(args.fake_host_jitter), '--fail-rate', str(args.fake_host_fail_rate)])
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.1.0.1:{args.fake_host_port}/api/service-vm-host/health", timeout=1)
+            return process
+        except requests.RequestException:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Le faux service-vm-host n'a pas démarré")
+
+
+def summarize(entries: list):
+    duration = entries[-1]['t'] if entries else 0.0
+    print(f"Capture: {len(entries)} requêtes sur {duration:.1f} s, "
+          f"concurrence capturée max {max((e.get('c', 0) for e in entries), default=0) + 1}")
+    for key, count in Counter(route_key(entry) for entry in entries).most_common():
+        print(f"  {count:>8}  {key}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('captures', nargs='+', help="fichiers de capture (les plus anciens d'abord)")
+    parser.add_argument('--target', default='http://localhost:5000', help="URL de l'instance à tester")
+    parser.add_argument('--speed', type=float, default=1.0, help="facteur d'accélération (1 = temps réel)")
+    parser.add_argument('--routes', help="ne rejouer que ces routes (sous-chaînes séparées par des virgules)")
+    parser.add_argument('--duration', type=float, help="ne rejouer que les N premières secondes de la capture")
+    parser.add_argument('--workers', type=int, help="threads d'envoi (défaut: 2 x concurrence capturée, min 16)")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--no-warmup', action='store_true', help="ne pas pré-enregistrer les hôtes")
+    parser.add_argument('--no-fake-host', action='store_true', help="ne pas lancer de faux service-vm-host")
+    parser.add_argument('--fake-host-bind', default='0.0.0.0',
+                        help="adresse d'écoute du faux hôte (doit couvrir 127.1.0.0/16)")
+    parser.add_argument('--fake-host-port', type=int, default=int(os.getenv('SERVICE_VM_HOST_PORT', '5003')))
+    parser.add_argument('--fake-host-latency', type=float, default=0.0)
+    parser.add_argument('--fake-host-jitter', type=float, default=0.0)
+    parser.add_argument('--fake-host-fail-rate', type=float, default=0.0)
+    parser.add_argument('--dry-run', action='store_true', help="afficher la composition de la capture sans rejouer")
+    parser.add_argument('--json', help="exporter le rapport en JSON")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed doit être positif")
+
+    entries = load_capture(args.captures)
+    if args.routes:
+        wanted = [r.strip() for r in args.routes.split(',') if r.strip()]
+        entries = [entry for entry in entries if any(w in route_key(entry) for w in wanted)]
+    if args.duration is not None:
+        entries = [entry for entry in entries if entry['t'] <= args.duration]
+    summarize(entries)
+    if args.dry_run or not entries:
+        return
+
+    workers = args.workers or max(16, 2 * (max(entry.get('c', 0) for entry in entries) + 1))
+    fake_host = None if args.no_fake_host else start_fake_host(args)
+    try:
+        replay = Replay(args.target, args.speed, workers, args.timeout)
+        if not args.no_warmup:
+            print(f"Pré-enregistrement de {replay.warmup(entries)} hôtes")
+        print(f"Rejeu à x{args.speed:g} avec {workers} threads...")
+        elapsed = replay.run(entries)
+    finally:
+        if fake_host is not None:
+            fake_host.terminate()
+            fake_host.wait()
+
+    report = replay.report(entries)
+    report.update(speed=args.speed, requests=len(entries), elapsed_s=round(elapsed, 2),
+                  throughput_rps=round(len(entries) / elapsed, 1) if elapsed else None)
+    print(f"\n{len(entries)} requêtes en {elapsed:.1f} s ({report['throughput_rps']} req/s), "
+          f"concurrence max {report['max_in_flight']}, retard d'envoi p99 {report['send_lag_p99_ms']} ms")
+    columns = ('requests', '2xx', '4xx', '5xx', 'exceptions', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms',
+               'captured_p50_ms', 'captured_p99_ms')
+    print(f"{'route':<52}" + ''.join(f"{c:>11}" for c in ('n', '2xx', '4xx', '5xx', 'exc', 'p50', 'p90', 'p99',
+                                                             'max', 'capt.p50', 'capt.p99')))
+    for key, stats in report['routes'].items():
+        print(f"{key[:51]:<52}" + ''.join(f"{stats[c]!s:>11}" for c in columns))
+        for error, count in stats['top_errors'].items():
+            print(f"    {count:>6} x {error}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
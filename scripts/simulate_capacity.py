@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Simulation de densité: ancien calcul de capacité contre modèle de capacité.
+
+Une flotte type (petits, moyens et gros hôtes) reçoit des VM tirées d'un
+catalogue d'offres jusqu'à saturation (N refus consécutifs). Les deux modèles
+voient les mêmes demandes dans le même ordre et placent sur l'hôte le moins
+chargé qui accepte la VM:
+- ancien : un cœur = 10 % de CPU, mémoire comparée en GB à la RAM libre
+- modèle : vCPU contre number_of_core x ratio de la classe, mémoire en MiB
+  moins la réserve de l'hôte (services/capacity_model.py)
+
+L'usage CPU réel est simulé par une utilisation moyenne par vCPU; un hôte est
+« saturé » si la demande CPU attendue dépasse --safe-cpu de ses cœurs.
+
+Usage:
+    python scripts/simulate_capacity.py --small 40 --medium 40 --large 20 --vcpu-utilization 0.15
+"""
+import argparse
+import os
+import random
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.allocation_ledger import Allocated
+from services.capacity_model import CapacityModel
+
+# (vCPU, MiB, GB disque, poids)
+OFFERS = [(1, 1024, 10, 30), (2, 2048, 20, 30), (2, 4096, 20, 15), (4, 8192, 40, 15), (8, 16384, 80, 7),
+          (16, 32768, 160, 3)]
+FLEET = {'small': (8, 32), 'medium': (32, 128), 'large': (96, 384)}  # cœurs, RAM en GB
+
+
+def build_fleet(counts: dict) -> list:
+    hosts = []
+    for kind, count in counts.items():
+        cores, ram = FLEET[kind]
+        for _ in range(count):
+            hosts.append({'id': len(hosts) + 1, 'kind': kind, 'number_of_core': cores, 'ram': ram, 'rom': 4000})
+    return hosts
+
+
+class Simulation:
+    def __init__(self, hosts: list, utilization: float):
+        self.hosts = hosts
+        self.utilization = utilization
+        self.allocated = {host['id']: Allocated() for host in hosts}
+
+    def reported(self, host: dict) -> dict:
+        """Valeurs que l'hôte déclarerait: mémoire des VM consommée, CPU selon l'utilisation moyenne"""
+        allocated = self.allocated[host['id']]
+        busy = min(100.0, allocated.cpu_count * self.utilization / host['number_of_core'] * 100)
+        return dict(host, available_ram=int(host['ram'] - allocated.memory_size_mib / 1024),
+                    available_rom=host['rom'] - allocated.disk_size_gb, available_processor=100 - busy)
+
+    def legacy_fits(self, host: dict, cpu_count: int, memory_size_mib: int, disk_size_gb: int) -> bool:
+        allocated = self.allocated[host['id']]
+        return (host['ram'] - allocated.memory_size_mib / 1024 >= memory_size_mib / 1024
+                and host['rom'] - allocated.disk_size_gb >= disk_size_gb
+                and 100 - allocated.cpu_count * 10 >= cpu_count * 10
+                and host['number_of_core'] >= cpu_count)
+
+    def load(self, host: dict) -> float:
+        allocated = self.allocated[host['id']]
+        return max(allocated.cpu_count / host['number_of_core'], allocated.memory_size_mib / (host['ram'] * 1024))
+
+    def place(self, fits, offer) -> bool:
+        cpu_count, memory_size_mib, disk_size_gb = offer
+        candidates = [host for host in self.hosts if fits(host, cpu_count, memory_size_mib, disk_size_gb)]
+        if not candidates:
+            return False
+        host = min(candidates, key=self.load)
+        self.allocated[host['id']].add(cpu_count, memory_size_mib, disk_size_gb)
+        return True
+
+    def report(self, safe_cpu: float) -> dict:
+        by_kind = defaultdict(lambda: {'hosts': 0, 'vms': 0, 'vcpus': 0, 'cores': 0, 'memory_mib': 0, 'ram_mib': 0,
+                                       'max_vcpu_per_core': 0.0, 'saturated': 0})
+        for host in self.hosts:
+            allocated = self.allocated[host['id']]
+            entry = by_kind[host['kind']]
+            entry['hosts'] += 1
+            entry['vms'] += allocated.vms
+            entry['vcpus'] += allocated.cpu_count
+            entry['cores'] += host['number_of_core']
+            entry['memory_mib'] += allocated.memory_size_mib
+            entry['ram_mib'] += host['ram'] * 1024
+            ratio = allocated.cpu_count / host['number_of_core']
+            entry['max_vcpu_per_core'] = max(entry['max_vcpu_per_core'], ratio)
+            if ratio * self.utilization > safe_cpu:
+                entry['saturated'] += 1
+        return dict(by_kind)
+
+
+def print_report(name: str, simulation: Simulation, safe_cpu: float):
+    report = simulation.report(safe_cpu)
+    vms = sum(entry['vms'] for entry in report.values())
+    vcpus = sum(entry['vcpus'] for entry in report.values())
+    memory = sum(entry['memory_mib'] for entry in report.values()) / sum(e['ram_mib'] for e in report.values())
+    print(f"\n{name}: {vms} VM, {vcpus} vCPU, mémoire allouée {memory:.0%}")
+    print(f"  {'classe':<8}{'hôtes':>6}{'VM':>7}{'vCPU/cœur':>11}{'max':>7}{'mémoire':>9}{'saturés':>9}")
+    for kind, entry in report.items():
+        print(f"  {kind:<8}{entry['hosts']:>6}{entry['vms']:>7}{entry['vcpus'] / entry['cores']:>11.2f}"
+              f"{entry['max_vcpu_per_core']:>7.2f}{entry['memory_mib'] / entry['ram_mib']:>9.0%}{entry['saturated']:>9}")
+    return vms, vcpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--small', type=int, default=40)
+    parser.add_argument('--medium', type=int, default=40)
+    parser.add_argument('--large', type=int, default=20)
+    parser.add_argument('--vcpu-utilization', type=float, default=0.15, help="usage moyen d'un vCPU (0..1)")
+    parser.add_argument('--safe-cpu', type=float, default=0.9, help="part des cœurs au-delà de laquelle un hôte sature")
+    parser.add_argument('--rejections', type=int, default=200, help="refus consécutifs marquant la saturation")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    hosts = build_fleet({'small': args.small, 'medium': args.medium, 'large': args.large})
+    rng = random.Random(args.seed)
+    weights = [offer[3] for offer in OFFERS]
+    # Même suite de demandes pour les deux modèles, assez longue pour saturer la flotte
+    total_cores = sum(host['number_of_core'] for host in hosts)
+    offers = [offer[:3] for offer in rng.choices(OFFERS, weights=weights, k=total_cores * 8)]
+    model = CapacityModel()
+
+    results = {}
+    for name, fits_of in (
+            ("Ancien calcul (1 cœur = 10 % CPU)", lambda sim: sim.legacy_fits),
+            ("Modèle de capacité", lambda sim: lambda host, *request: model.fits(
+                sim.reported(host), sim.allocated[host['id']], *request))):
+        simulation = Simulation(hosts, args.vcpu_utilization)
+        fits = fits_of(simulation)
+        rejected = 0
+        for offer in offers:
+            if simulation.place(fits, offer):
+                rejected = 0
+            else:
+                rejected += 1
+                if rejected >= args.rejections:
+                    break
+        results[name] = print_report(name, simulation, args.safe_cpu)
+
+    (old_vms, old_vcpus), (new_vms, new_vcpus) = results.values()
+    print(f"\nGain de densité: {new_vms / old_vms - 1:+.0%} VM, {new_vcpus / old_vcpus - 1:+.0%} vCPU")
+    print("Classes: " + ", ".join(f"{c.name} (≥{c.min_cores} cœurs, x{c.cpu_overcommit:g} CPU, "
+                                  f"x{c.ram_overcommit:g} RAM)" for c in model.classes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Simulation du planificateur de défragmentation (services/rebalancer.py).
+
+Génère une flotte fragmentée: les hôtes sont remplis de petites VM puis une
+partie des VM est supprimée au hasard (churn), si bien que la mémoire libre
+est répartie en petits morceaux. Le planificateur cherche ensuite les
+migrations qui libèrent des emplacements pour une grosse taille cible, sous
+un budget de temps, et le script vérifie le plan en le rejouant sur la
+copie initiale.
+
+Usage:
+    python scripts/simulate_rebalance.py --hosts 2000 --slots 300 --budget 2
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.capacity_model import capacity_model
+from services.rebalancer import RebalancePlanner, _vm_resources
+
+# Offres courantes (vCPU, MiB, GB) et leur fréquence
+SMALL_OFFERS = [((1, 1024, 10), 5), ((2, 2048, 20), 4), ((2, 4096, 20), 3), ((4, 8192, 40), 2)]
+
+
+def fleet(hosts: int, churn: float, pinned: float, rnd: random.Random) -> tuple:
+    """Hôtes de 32 cœurs / 128 GB remplis de petites VM jusqu'à leur capacité allouable, puis vidés en partie"""
+    offers = [offer for offer, weight in SMALL_OFFERS for _ in range(weight)]
+    clusters, allocations = [], []
+    for i in range(hosts):
+        host = {'id': i + 1, 'nom': f"h{i}", 'number_of_core': 32, 'ram': 128, 'rom': 2000,
+                'available_ram': 128.0, 'available_rom': 2000.0, 'available_processor': 80.0,
+                'architecture': 'x86_64', 'zone': f"z{i % 4}"}
+        free = capacity_model.capacity(host)
+        free_cpu, free_mib, free_disk = free['vcpus'], free['memory_mib'], free['disk_gb']
+        while True:
+            fitting = [offer for offer in offers if offer[0] <= free_cpu and offer[1] <= free_mib and offer[2] <= free_disk]
+            if not fitting:
+                break
+            cpu, memory, disk = rnd.choice(fitting)
+            free_mib, free_cpu, free_disk = free_mib - memory, free_cpu - cpu, free_disk - disk
+            if rnd.random() < churn:
+                continue  # VM supprimée depuis
+            allocations.append({'id': len(allocations) + 1, 'cluster_id': host['id'], 'user_id': 1,
+                                'vm_name': f"vm{len(allocations)}", 'vm_id': f"vm-{len(allocations)}",
+                                'cpu_count': cpu, 'memory_size_mib': memory, 'disk_size_gb': disk,
+                                'placement_group_id': 1 if rnd.random() < pinned else None, 'state': 'active'})
+            host['available_ram'] -= memory / 1024
+            host['available_rom'] -= disk
+        clusters.append(host)
+    return clusters, allocations
+
+
+def replay(clusters: list, allocations: list, migrations: list) -> RebalancePlanner:
+    """Rejoue le plan sur une copie neuve: chaque étape doit tenir sur sa destination"""
+    planner = RebalancePlanner(clusters, allocations)
+    by_id = {allocation['id']: allocation for allocation in allocations}
+    for migration in migrations:
+        vm = by_id[migration['allocation_id']]
+        source, destination = planner.hosts[migration['from_cluster_id']], planner.hosts[migration['to_cluster_id']]
+        assert vm['id'] in source.vms, f"étape {migration['step']}: VM absente de l'hôte source"
+        assert planner._fits(destination, *_vm_resources(vm)), f"étape {migration['step']}: destination pleine"
+        planner._move(vm, source, destination)
+    return planner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=2000)
+    parser.add_argument('--churn', type=float, default=0.15, help="part des VM supprimées après remplissage")
+    parser.add_argument('--pinned', type=float, default=0.05, help="part des VM dans un groupe de placement")
+    parser.add_argument('--cpu', type=int, default=8)
+    parser.add_argument('--memory', type=int, default=32768, help="mémoire de la taille cible (MiB)")
+    parser.add_argument('--disk', type=int, default=80)
+    parser.add_argument('--slots', type=int, default=300, help="emplacements à libérer pour la taille cible")
+    parser.add_argument('--budget', type=float, default=2.0, help="budget de temps (secondes)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    clusters, allocations = fleet(args.hosts, args.churn, args.pinned, random.Random(args.seed))
+    target = {'cpu_count': args.cpu, 'memory_size_mib': args.memory, 'disk_size_gb': args.disk, 'count': args.slots}
+    plan = RebalancePlanner(clusters, allocations).plan([target], args.budget)
+    report = plan['targets'][0]
+
+    print(f"{plan['hosts']} hôtes, {plan['movable_vms']} VM déplaçables, {plan['pinned_vms']} VM fixes")
+    print(f"Cible {args.cpu} vCPU / {args.memory} MiB / {args.disk} GB x {args.slots}, budget {args.budget} s\n")
+    print(f"{'':<26}{'avant':>10}{'après':>10}")
+    print(f"{'emplacements libres':<26}{report['before']['slots']:>10}{report['after']['slots']:>10}")
+    print(f"{'mémoire libre isolée':<26}{report['before']['stranded_ratio']:>10.1%}"
+          f"{report['after']['stranded_ratio']:>10.1%}")
+    moved = plan['moved']
+    print(f"\nMigrations: {moved['vms']} ({moved['vcpus']} vCPU, {moved['memory_mib'] // 1024} GiB déplacés) "
+          f"pour {len(plan['freed_hosts'])} hôte(s) libéré(s), "
+          f"{moved['vms'] / len(plan['freed_hosts']):.1f} par emplacement" if plan['freed_hosts'] else
+          "\nAucune migration nécessaire ou possible")
+    print(f"Temps de calcul: {plan['elapsed_ms']} ms, complet: {plan['complete']}, "
+          f"budget épuisé: {plan['budget_exhausted']}")
+
+    replayed = replay(clusters, allocations, plan['migrations'])
+    slots = replayed.fragmentation((args.cpu, args.memory, args.disk))['slots']
+    print(f"Plan rejoué: {len(plan['migrations'])} étape(s) valides, {slots} emplacement(s) libres")
+
+
+if __name__ == '__main__':
+    main()
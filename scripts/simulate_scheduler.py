@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Simulateur à événements discrets du placement, piloté par des traces.
+
+Rejoue une trace d'arrivées et de départs de VM sur une flotte définie en JSON,
+en utilisant le code de placement réel: index de capacités (architecture,
+drapeaux CPU), modèle de capacité (surallocation par classe d'hôte), classement
+rank_hosts avec localité des images. Seule la base de données est remplacée par
+l'état en mémoire des hôtes simulés. Plusieurs politiques de classement
+(services/placement.py: POLICIES) sont comparées sur la même trace.
+
+Métriques par politique: taux d'acceptation, utilisation vCPU et mémoire
+pondérée par le temps, fragmentation (part de la mémoire libre sur des hôtes
+qui ne peuvent plus accueillir la VM de référence, médiane de la trace),
+latence de décision (p50 / p99) et taux de placements sur un cache d'image chaud.
+
+Traces acceptées:
+- CSV ou JSONL: time (s), vm_id, cpu_count, memory_size_mib, disk_size_gb, et
+  optionnellement duration (s), event (arrival / departure), system_image_id,
+  architecture, cpu_features (séparés par des espaces)
+- journal d'événements (--event-log): chaque demande de placement enregistrée
+  devient une arrivée, de durée tirée selon --mean-duration
+- trace synthétique (--generate), écrite en CSV avec --save-trace
+
+Usage:
+    python scripts/simulate_scheduler.py --generate --hours 2000 --rate 10 --policies pack,spread,dominant \\
+        --csv results.csv --json results.json
+    python scripts/simulate_scheduler.py --fleet fleet.json --trace trace.csv
+"""
+import argparse
+import csv
+import heapq
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.model_cluster import VMRequirements
+from services.allocation_ledger import Allocated
+from services.capabilities import CapabilityIndex
+from services.capacity_model import CapacityModel
+from services.health_monitor import HealthMonitor
+from services.image_locality import ImageLocalityIndex
+from services.placement import POLICIES, rank_hosts
+
+HOUR = 3600.0
+DEFAULT_FLEET = {'hosts': [
+    {'count': 20, 'number_of_core': 8, 'ram': 32, 'rom': 1000},
+    {'count': 20, 'number_of_core': 32, 'ram': 128, 'rom': 2000},
+    {'count': 4, 'number_of_core': 96, 'ram': 384, 'rom': 4000},
+    {'count': 4, 'number_of_core': 64, 'ram': 256, 'rom': 2000, 'architecture': 'aarch64'},
+]}
+# (vCPU, MiB, GB disque, poids)
+OFFERS = [(1, 1024, 10, 30), (2, 2048, 20, 30), (2, 4096, 20, 15), (4, 8192, 40, 15), (8, 16384, 80, 7),
+          (16, 32768, 160, 3)]
+
+
+class SimHost:
+    """Hôte simulé: mêmes attributs que ClusterEntity, accessible aussi comme un dictionnaire"""
+    __slots__ = ('id', 'nom', 'rom', 'ram', 'number_of_core', 'available_rom', 'available_ram',
+                 'available_processor', 'processeur', 'architecture', 'cpu_flags', 'zone', 'rack', 'allocated')
+
+    def __init__(self, id: int, spec: dict):
+        self.id = id
+        self.nom = f"sim-{id}"
+        self.rom = spec['rom']
+        self.ram = spec['ram']
+        self.number_of_core = spec['number_of_core']
+        self.processeur = spec.get('processeur', 'x86_64')
+        self.architecture = spec.get('architecture')
+        self.cpu_flags = spec.get('cpu_flags') or []
+        self.zone = spec.get('zone', 'default')
+        self.rack = spec.get('rack')
+        self.allocated = Allocated()
+        self.refresh(0.0)
+
+    # Lecture comme un dictionnaire (modèle de capacité) sans surcoût Python
+    __getitem__ = object.__getattribute__
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def refresh(self, utilization: float):
+        """Valeurs que l'hôte déclarerait: mémoire et disque des VM consommés, CPU selon l'utilisation moyenne"""
+        self.available_ram = int(self.ram - self.allocated.memory_size_mib / 1024)
+        self.available_rom = self.rom - self.allocated.disk_size_gb
+        busy = self.allocated.cpu_count * utilization / self.number_of_core * 100 if self.number_of_core else 100
+        self.available_processor = max(0.0, 100 - busy)
+
+
+def build_fleet(definition: dict) -> list:
+    hosts = []
+    for spec in definition['hosts']:
+        for _ in range(spec.get('count', 1)):
+            hosts.append(SimHost(len(hosts) + 1, spec))
+    return hosts
+
+
+# --- Traces ---
+
+def _event(row: dict) -> dict:
+    features = row.get('cpu_features') or []
+    if isinstance(features, str):
+        features = features.split()
+    duration = row.get('duration')
+    return {
+        'time': float(row['time']),
+        'event': row.get('event') or 'arrival',
+        'vm_id': str(row['vm_id']),
+        'cpu_count': int(row.get('cpu_count') or 1),
+        'memory_size_mib': int(row.get('memory_size_mib') or 1024),
+        'disk_size_gb': int(row.get('disk_size_gb') or 10),
+        'duration': float(duration) if duration not in (None, '') else None,
+        'system_image_id': int(row['system_image_id']) if row.get('system_image_id') not in (None, '') else None,
+        'architecture': row.get('architecture') or None,
+        'cpu_features': features,
+    }
+
+
+def load_trace(path: str) -> list:
+    with open(path, newline='') as f:
+        if path.endswith('.jsonl'):
+            return [_event(json.loads(line)) for line in f if line.strip()]
+        return [_event(row) for row in csv.DictReader(f)]
+
+
+def trace_from_event_log(path: str, mean_duration_h: float, rng: random.Random) -> list:
+    from services.event_log import PLACEMENT, read_events
+    events = []
+    start = None
+    for offset, ts, _type, body in read_events(path, types={PLACEMENT}):
+        start = ts if start is None else start
+        events.append(_event({
+            'time': ts - start, 'vm_id': offset, 'cpu_count': body.get('cpu_count'),
+            'memory_size_mib': body.get('memory_size_mib'), 'disk_size_gb': body.get('disk_size_gb'),
+            'system_image_id': body.get('system_image_id'),
+            'duration': rng.expovariate(1 / (mean_duration_h * HOUR)),
+        }))
+    return events
+
+
+def generate_trace(hours: float, rate: float, mean_duration_h: float, rng: random.Random,
+                   arm_share: float = 0.1) -> list:
+    """Arrivées de Poisson (rate par heure), durées log-normales de moyenne mean_duration_h"""
+    events = []
+    sigma = 1.0
+    mu = math.log(mean_duration_h * HOUR) - sigma ** 2 / 2
+    weights = [offer[3] for offer in OFFERS]
+    t = 0.0
+    n = 0
+    while True:
+        t += rng.expovariate(rate / HOUR)
+        if t > hours * HOUR:
+            return events
+        cpu_count, memory_size_mib, disk_size_gb, _ = rng.choices(OFFERS, weights=weights)[0]
+        n += 1
+        events.append({
+            'time': t, 'event': 'arrival', 'vm_id': str(n), 'cpu_count': cpu_count,
+            'memory_size_mib': memory_size_mib, 'disk_size_gb': disk_size_gb,
+            'duration': rng.lognormvariate(mu, sigma),
+            'system_image_id': min(int(rng.paretovariate(1.2)), 20),
+            'architecture': 'aarch64' if rng.random() < arm_share else None, 'cpu_features': [],
+        })
+
+
+def save_trace(events: list, path: str):
+    fields = ['time', 'event', 'vm_id', 'cpu_count', 'memory_size_mib', 'disk_size_gb', 'duration',
+              'system_image_id', 'architecture', 'cpu_features']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for event in events:
+            writer.writerow(dict(event, cpu_features=' '.join(event['cpu_features'])))
+
+
+# --- Simulation ---
+
+class Simulation:
+    def __init__(self, fleet: dict, trace: list, policy: str, model: CapacityModel, utilization: float,
+                 sample_interval: float):
+        self.hosts = build_fleet(fleet)
+        self.by_id = {host.id: host for host in self.hosts}
+        self.trace = trace
+        self.policy = policy
+        self.model = model
+        self.utilization = utilization
+        self.sample_interval = sample_interval
+        self.capabilities = CapabilityIndex()
+        self.capabilities.rebuild({'id': h.id, 'architecture': h.architecture, 'cpu_flags': h.cpu_flags,
+                                   'processeur': h.processeur} for h in self.hosts)
+        self.locality = ImageLocalityIndex()
+        self.health = HealthMonitor()
+        arrivals = [e for e in trace if e['event'] == 'arrival']
+        # VM de référence pour la fragmentation: médiane des demandes
+        self.reference = (int(statistics.median(e['cpu_count'] for e in arrivals)) if arrivals else 1,
+                          int(statistics.median(e['memory_size_mib'] for e in arrivals)) if arrivals else 1024)
+        capacity = [model.capacity(host) for host in self.hosts]
+        self.total_vcpus = sum(c['vcpus'] for c in capacity)
+        self.total_memory = sum(c['memory_mib'] for c in capacity)
+
+    def decide(self, event: dict):
+        """Même enchaînement que find-suitable-host: capacités, modèle de capacité, classement"""
+        eligible, _missing = self.capabilities.eligible(event['architecture'], event['cpu_features'])
+        if eligible == 0:
+            return None
+        cpu_count, memory_size_mib, disk_size_gb = event['cpu_count'], event['memory_size_mib'], event['disk_size_gb']
+        # Équivalent de la clause WHERE sur les valeurs déclarées, puis modèle de capacité hôte par hôte
+        minimum = self.model.prefilter(cpu_count, memory_size_mib, disk_size_gb)
+        min_ram, min_rom, min_cpu = minimum['available_ram'], minimum['available_rom'], minimum['available_processor']
+        candidates = [host for host in self.hosts
+                      if host.available_ram >= min_ram and host.available_rom >= min_rom
+                      and host.available_processor >= min_cpu and host.number_of_core >= cpu_count
+                      and self.capabilities.contains(eligible, host.id)
+                      and self.model.fits(host, host.allocated, cpu_count, memory_size_mib, disk_size_gb)]
+        if not candidates:
+            return None
+        requirements = VMRequirements(cpu_count=cpu_count, memory_size_mib=memory_size_mib,
+                                      disk_size_gb=disk_size_gb, system_image_id=event['system_image_id'])
+        ranked = rank_hosts(candidates, requirements, locality=self.locality, health=self.health,
+                            policy=self.policy)
+        return ranked[0] if ranked else None
+
+    def fragmentation(self) -> float:
+        cpu_count, memory_size_mib = self.reference
+        stranded = free_total = 0
+        for host in self.hosts:
+            free = self.model.free(host, host.allocated)['memory_mib']
+            if free <= 0:
+                continue
+            free_total += free
+            if not self.model.fits(host, host.allocated, cpu_count, memory_size_mib, 0):
+                stranded += free
+        return stranded / free_total if free_total else 0.0
+
+    def run(self) -> dict:
+        heap = []
+        for seq, event in enumerate(self.trace):
+            heapq.heappush(heap, (event['time'], 1 if event['event'] == 'departure' else 2, seq, event))
+        end = max((e['time'] for e in self.trace), default=0.0)
+        next_sample = 0.0
+        placements = {}  # vm_id -> (hôte, ressources)
+        latencies = []
+        arrivals = accepted = warm = 0
+        vcpu_area = memory_area = 0.0
+        allocated_vcpus = allocated_memory = 0
+        fragmentation = []
+        now = 0.0
+        seq = len(self.trace)
+        started = time.perf_counter()
+        while heap:
+            t, _kind, _seq, event = heapq.heappop(heap)
+            if t > end:
+                break  # départs au-delà de la fin de la trace
+            while next_sample <= t:
+                fragmentation.append(self.fragmentation())
+                next_sample += self.sample_interval
+            vcpu_area += allocated_vcpus * (t - now)
+            memory_area += allocated_memory * (t - now)
+            now = t
+            if event['event'] == 'departure':
+                placement = placements.pop(event['vm_id'], None)
+                if placement is None:
+                    continue  # VM refusée ou inconnue
+                host, resources = placement
+                host.allocated.add(*resources, sign=-1)
+                host.refresh(self.utilization)
+                allocated_vcpus -= resources[0]
+                allocated_memory -= resources[1]
+                continue
+            arrivals += 1
+            decision_started = time.perf_counter()
+            host = self.decide(event)
+            latencies.append(time.perf_counter() - decision_started)
+            if host is None:
+                continue
+            accepted += 1
+            resources = (event['cpu_count'], event['memory_size_mib'], event['disk_size_gb'])
+            host.allocated.add(*resources)
+            host.refresh(self.utilization)
+            allocated_vcpus += resources[0]
+            allocated_memory += resources[1]
+            if self.locality.record_placement(host.id, event['system_image_id']):
+                warm += 1
+            elif event['system_image_id'] is not None:
+                self.locality.add_image(host.id, event['system_image_id'])
+            placements[event['vm_id']] = (host, resources)
+            if event['duration'] is not None:
+                seq += 1
+                heapq.heappush(heap, (t + event['duration'], 1, seq,
+                                      {'event': 'departure', 'vm_id': event['vm_id']}))
+        wall = time.perf_counter() - started
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e6 if latencies else 0.0
+
+        return {
+            'policy': self.policy,
+            'simulated_hours': round(end / HOUR, 1),
+            'wall_s': round(wall, 2),
+            'arrivals': arrivals,
+            'accepted': accepted,
+            'acceptance_rate': round(accepted / arrivals, 4) if arrivals else None,
+            'vcpu_utilization': round(vcpu_area / (self.total_vcpus * end), 4) if end and self.total_vcpus else 0.0,
+            'memory_utilization': round(memory_area / (self.total_memory * end), 4) if end else 0.0,
+            'fragmentation': round(statistics.mean(fragmentation), 4) if fragmentation else 0.0,
+            'decision_p50_us': round(percentile(0.5), 1),
+            'decision_p99_us': round(percentile(0.99), 1),
+            'warm_image_rate': round(warm / accepted, 4) if accepted else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fleet', help="définition JSON de la flotte (flotte type par défaut)")
+    parser.add_argument('--trace', help="trace CSV ou JSONL")
+    parser.add_argument('--event-log', help="journal d'événements du service à rejouer")
+    parser.add_argument('--generate', action='store_true', help="générer une trace synthétique")
+    parser.add_argument('--hours', type=float, default=2000, help="durée de la trace synthétique")
+    parser.add_argument('--rate', type=float, default=10, help="arrivées par heure (trace synthétique)")
+    parser.add_argument('--mean-duration', type=float, default=120, help="durée de vie moyenne d'une VM en heures")
+    parser.add_argument('--save-trace', help="écrire la trace utilisée en CSV")
+    parser.add_argument('--policies', default=','.join(POLICIES), help="politiques à comparer")
+    parser.add_argument('--vcpu-utilization', type=float, default=0.15, help="usage moyen d'un vCPU (0..1)")
+    parser.add_argument('--sample-interval', type=float, default=24, help="heures entre deux mesures de fragmentation")
+    parser.add_argument('--csv', help="exporter les résultats en CSV")
+    parser.add_argument('--json', help="exporter les résultats en JSON")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.trace:
+        trace = load_trace(args.trace)
+    elif args.event_log:
+        trace = trace_from_event_log(args.event_log, args.mean_duration, rng)
+    else:
+        trace = generate_trace(args.hours, args.rate, args.mean_duration, rng)
+    if args.save_trace:
+        save_trace(trace, args.save_trace)
+    fleet = DEFAULT_FLEET
+    if args.fleet:
+        with open(args.fleet) as f:
+            fleet = json.load(f)
+    policies = [policy.strip() for policy in args.policies.split(',') if policy.strip()]
+    unknown = [policy for policy in policies if policy not in POLICIES]
+    if unknown:
+        parser.error(f"politiques inconnues: {', '.join(unknown)} (disponibles: {', '.join(POLICIES)})")
+
+    model = CapacityModel()
+    print(f"Trace: {len(trace)} événements, flotte: {sum(s.get('count', 1) for s in fleet['hosts'])} hôtes")
+    results = []
+    for policy in policies:
+        simulation = Simulation(fleet, trace, policy, model, args.vcpu_utilization, args.sample_interval * HOUR)
+        results.append(simulation.run())
+
+    columns = ['policy', 'acceptance_rate', 'vcpu_utilization', 'memory_utilization', 'fragmentation',
+               'decision_p50_us', 'decision_p99_us', 'warm_image_rate', 'simulated_hours', 'wall_s']
+    print('  '.join(f"{column:>18}" for column in columns))
+    for result in results:
+        print('  '.join(f"{result[column]!s:>18}" for column in columns))
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'fleet': fleet, 'trace_events': len(trace), 'seed': args.seed, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
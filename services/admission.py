@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Contrôle d'admission des créations de VM.
+
+- Au plus ADMISSION_MAX_CONCURRENCY placements en cours; au-delà les demandes
+  attendent dans une file de priorité (tas binaire): la classe de priorité la
+  plus haute d'abord (services/priority_classes.py), puis, dans une classe,
+  équité pondérée entre utilisateurs (un utilisateur de poids 2 obtient deux
+  créneaux quand un utilisateur de poids 1 en obtient un). Chaque demande
+  reçoit une étiquette de fin virtuelle (fair queuing pondéré): insertion et
+  retrait en O(log n) quel que soit le nombre d'utilisateurs en attente.
+- Une classe basse n'est servie que si aucune classe plus haute n'attend:
+  sous saturation prolongée, ses demandes expirent (ADMISSION_QUEUE_TIMEOUT).
+- Contre-pression: si la file globale ou celle de l'utilisateur est pleine, ou
+  si l'attente dépasse ADMISSION_QUEUE_TIMEOUT, la demande est rejetée avec un
+  délai Retry-After estimé.
+- Au plus ADMISSION_MAX_INFLIGHT_PER_HOST créations simultanées par hôte.
+
+La file est manipulée depuis la boucle d'événements uniquement; les créneaux
+par hôte sont pris depuis les threads de placement et protégés par un verrou.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque, defaultdict
+from typing import Deque, Dict, List, Optional
+
+from services.priority_classes import priority_classes
+
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', '16'))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv('ADMISSION_MAX_QUEUE_DEPTH', '256'))
+ADMISSION_MAX_USER_QUEUE_DEPTH = int(os.getenv('ADMISSION_MAX_USER_QUEUE_DEPTH', '32'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '30'))
+ADMISSION_MAX_INFLIGHT_PER_HOST = int(os.getenv('ADMISSION_MAX_INFLIGHT_PER_HOST', '4'))
+ADMISSION_DEFAULT_WEIGHT = int(os.getenv('ADMISSION_DEFAULT_WEIGHT', '1'))
+# Poids par utilisateur, ex: "42:3,7:2"
+ADMISSION_USER_WEIGHTS = os.getenv('ADMISSION_USER_WEIGHTS', '')
+# Nombre de temps d'attente conservés pour les percentiles
+ADMISSION_WAIT_WINDOW = 10000
+
+
+def parse_weights(value: str) -> Dict[str, int]:
+    weights = {}
+    for item in value.split(','):
+        if ':' in item:
+            user_id, weight = item.rsplit(':', 1)
+            weights[user_id.strip()] = max(1, int(weight))
+    return weights
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    __slots__ = ('user_id', 'priority', 'future', 'enqueued_at', 'granted_at', 'finish', 'queued')
+
+    def __init__(self, user_id: str, priority: str):
+        self.user_id = user_id
+        self.priority = priority  # nom de la classe de priorité
+        self.future = None
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.finish = 0.0  # étiquette de fin virtuelle dans la classe
+        self.queued = False  # présent dans le tas (les tickets retirés y restent jusqu'à leur sortie)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+                 max_queue_depth: int = ADMISSION_MAX_QUEUE_DEPTH,
+                 max_user_queue_depth: int = ADMISSION_MAX_USER_QUEUE_DEPTH,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 max_inflight_per_host: int = ADMISSION_MAX_INFLIGHT_PER_HOST,
+                 user_weights: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_user_queue_depth = max_user_queue_depth
+        self.queue_timeout = queue_timeout
+        self.max_inflight_per_host = max_inflight_per_host
+        self.user_weights = parse_weights(ADMISSION_USER_WEIGHTS) if user_weights is None else user_weights
+
+        self._running = 0
+        self._heap: List[tuple] = []  # (-valeur de priorité, fin virtuelle, ordre d'arrivée, ticket)
+        self._sequence = itertools.count()
+        self._queued = 0
+        self._queued_by_user: Dict[str, int] = defaultdict(int)
+        self._queued_by_class: Dict[str, int] = defaultdict(int)
+        self._queued_by_key: Dict[tuple, int] = defaultdict(int)
+        # Temps virtuel de chaque classe et dernière fin virtuelle de chaque (classe, utilisateur) en attente
+        self._virtual_time: Dict[str, float] = defaultdict(float)
+        self._last_finish: Dict[tuple, float] = {}
+
+        self._host_lock = threading.Lock()
+        self._host_inflight: Dict[int, int] = defaultdict(int)
+
+        # Temps de service moyen (EWMA) pour estimer Retry-After
+        self._service_time = 1.0
+        self._waits: Deque[float] = deque(maxlen=ADMISSION_WAIT_WINDOW)
+        self._class_waits: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=ADMISSION_WAIT_WINDOW))
+        self.admitted = 0
+        self.admitted_by_class: Dict[str, int] = defaultdict(int)
+        self.rejections: Dict[str, int] = defaultdict(int)
+        self.rejections_by_class: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def weight(self, user_id: str) -> int:
+        return self.user_weights.get(str(user_id), ADMISSION_DEFAULT_WEIGHT)
+
+    def retry_after(self) -> int:
+        """Estimation du délai avant qu'un créneau ne se libère pour une nouvelle demande"""
+        return max(1, math.ceil(self._service_time * (self._queued + 1) / max(1, self.max_concurrency)))
+
+    def _reject(self, reason: str, priority: Optional[str] = None):
+        self.rejections[reason] += 1
+        if priority is not None:
+            self.rejections_by_class[priority][reason] += 1
+        raise AdmissionRejected(reason, self.retry_after())
+
+    # --- File globale ---
+
+    async def acquire(self, user_id: str, priority: Optional[str] = None) -> Ticket:
+        user_id = str(user_id)
+        ticket = Ticket(user_id, priority_classes.resolve(priority) or priority_classes.default)
+        if self._running < self.max_concurrency and self._queued == 0:
+            self._grant(ticket)
+            return ticket
+        if self._queued >= self.max_queue_depth:
+            self._reject('queue_full', ticket.priority)
+        if self._queued_by_user.get(user_id, 0) >= self.max_user_queue_depth:
+            self._reject('user_queue_full', ticket.priority)
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._push(ticket)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.granted_at is not None:
+                # Créneau attribué au moment de l'abandon: le rendre
+                self.release(ticket)
+            else:
+                self._remove(ticket)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject('queue_timeout', ticket.priority)
+        return ticket
+
+    def release(self, ticket: Ticket):
+        self._running -= 1
+        if ticket.granted_at is not None:
+            elapsed = time.monotonic() - ticket.granted_at
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+        self._dispatch()
+
+    def _grant(self, ticket: Ticket):
+        self._running += 1
+        self.admitted += 1
+        self.admitted_by_class[ticket.priority] += 1
+        ticket.granted_at = time.monotonic()
+        wait = ticket.granted_at - ticket.enqueued_at
+        self._waits.append(wait)
+        self._class_waits[ticket.priority].append(wait)
+        if ticket.future is not None and not ticket.future.done():
+            ticket.future.set_result(True)
+
+    def _push(self, ticket: Ticket):
+        """Insère le ticket avec son étiquette de fin virtuelle: début au plus tôt au temps virtuel de la classe,
+        durée virtuelle inversement proportionnelle au poids de l'utilisateur"""
+        key = (ticket.priority, ticket.user_id)
+        start = max(self._virtual_time[ticket.priority], self._last_finish.get(key, 0.0))
+        ticket.finish = self._last_finish[key] = start + 1.0 / self.weight(ticket.user_id)
+        ticket.queued = True
+        heapq.heappush(self._heap, (-priority_classes.value(ticket.priority), ticket.finish, next(self._sequence),
+                                    ticket))
+        self._count(ticket, 1)
+
+    def _count(self, ticket: Ticket, delta: int):
+        key = (ticket.priority, ticket.user_id)
+        self._queued += delta
+        for counts, counter in ((self._queued_by_user, ticket.user_id), (self._queued_by_class, ticket.priority),
+                                (self._queued_by_key, key)):
+            counts[counter] += delta
+            if counts[counter] <= 0:
+                del counts[counter]
+        if key not in self._queued_by_key:
+            # Plus aucune demande de l'utilisateur dans la classe: sa prochaine demande part du temps virtuel
+            self._last_finish.pop(key, None)
+
+    def _remove(self, ticket: Ticket):
+        """Retrait paresseux: le ticket reste dans le tas et sera ignoré à sa sortie"""
+        if not ticket.queued:
+            return
+        ticket.queued = False
+        self._count(ticket, -1)
+        if len(self._heap) > 2 * self._queued + 64:
+            # Trop de tickets retirés (expirations en rafale): reconstruire le tas
+            self._heap = [entry for entry in self._heap if entry[3].queued]
+            heapq.heapify(self._heap)
+
+    def _dispatch(self):
+        """Attribue les créneaux libres par priorité, puis par fin virtuelle dans la classe"""
+        while self._running < self.max_concurrency and self._queued:
+            _priority, finish, _sequence, ticket = heapq.heappop(self._heap)
+            if not ticket.queued:
+                continue
+            ticket.queued = False
+            self._count(ticket, -1)
+            self._virtual_time[ticket.priority] = finish
+            self._grant(ticket)
+        if not self._queued:
+            # File vide: les tickets retirés restants sont oubliés
+            self._heap.clear()
+
+    # --- Créneaux par hôte ---
+
+    def try_acquire_host(self, cluster_id: int) -> bool:
+        with self._host_lock:
+            if self._host_inflight[cluster_id] >= self.max_inflight_per_host:
+                return False
+            self._host_inflight[cluster_id] += 1
+            return True
+
+    def release_host(self, cluster_id: int):
+        with self._host_lock:
+            self._host_inflight[cluster_id] -= 1
+            if self._host_inflight[cluster_id] <= 0:
+                del self._host_inflight[cluster_id]
+
+    def record_rejection(self, reason: str, priority: Optional[str] = None):
+        self.rejections[reason] += 1
+        if priority is not None:
+            self.rejections_by_class[priority][reason] += 1
+
+    # --- Métriques ---
+
+    @staticmethod
+    def _wait_summary(window) -> dict:
+        waits = sorted(window)
+
+        def percentile(p):
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 2)
+
+        return {
+            'avg': round(sum(waits) / len(waits) * 1000, 2) if waits else None,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'max': round(waits[-1] * 1000, 2) if waits else None,
+        }
+
+    def metrics(self) -> dict:
+        with self._host_lock:
+            host_inflight = dict(self._host_inflight)
+        classes = {}
+        for name in priority_classes.names():
+            classes[name] = {
+                'priority': priority_classes.value(name),
+                'queue_depth': self._queued_by_class.get(name, 0),
+                'admitted': self.admitted_by_class.get(name, 0),
+                'rejections': dict(self.rejections_by_class.get(name, {})),
+                'wait_ms': self._wait_summary(self._class_waits.get(name, ())),
+            }
+        return {
+            'running': self._running,
+            'max_concurrency': self.max_concurrency,
+            'queue_depth': self._queued,
+            'queue_depth_by_user': dict(self._queued_by_user),
+            'admitted': self.admitted,
+            'rejections': dict(self.rejections),
+            'wait_ms': self._wait_summary(self._waits),
+            'classes': classes,
+            'estimated_service_time_s': round(self._service_time, 3),
+            'host_inflight': host_inflight,
+            'max_inflight_per_host': self.max_inflight_per_host,
+        }
+
+
+# Instance partagée par les routes
+admission = AdmissionController()
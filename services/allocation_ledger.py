@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""Registre des allocations de VM, source de vérité de la capacité consommée.
+
+Chaque création de VM écrit une ligne vm_allocation pendant le placement:
+reserved (avant l'appel à l'hôte) -> active (VM créée) ou failed; unknown si
+l'hôte n'a pas répondu à temps (la VM a pu être créée); released à la
+suppression de la VM.
+
+Les ressources allouées par hôte (états reserved, active, unknown) sont
+maintenues en mémoire de façon incrémentale. La capacité libre
+(capacité allouable du modèle de capacité - allocations) est bornée par celle
+déclarée par l'hôte. La réservation vérifie et décompte
+la capacité sous verrou pour que deux placements concurrents ne puissent pas
+surallouer un hôte.
+
+Une réconciliation périodique recalcule les sommes depuis la base (ce qui
+absorbe les écritures d'autres instances), expire les réservations orphelines
+et signale les hôtes dont la capacité déclarée s'écarte des allocations.
+Réservations et changements d'état écrivent la base et les sommes sous un
+verrou partagé; la reconstruction prend ce verrou en exclusif le temps de la
+requête et du remplacement des sommes, si bien qu'aucune écriture concurrente
+n'est perdue.
+
+Une réservation n'expire qu'au-delà du plus long délai de création déclaré par
+les appelants (register_create_timeout) augmenté de LEDGER_RESERVATION_MARGIN:
+une création encore en cours côté hôte garde sa capacité.
+"""
+import asyncio
+import datetime
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from services.capacity_model import capacity_model
+from services.cluster_hooks import on_cluster_change
+
+logger = logging.getLogger(__name__)
+
+LEDGER_RECONCILE_INTERVAL = float(os.getenv('LEDGER_RECONCILE_INTERVAL', '300'))
+# Réservations sans issue (crash pendant le placement) au-delà de ce délai -> failed; relevé si besoin
+# au plus long délai de création déclaré + LEDGER_RESERVATION_MARGIN
+LEDGER_RESERVATION_TTL = float(os.getenv('LEDGER_RESERVATION_TTL', '600'))
+LEDGER_RESERVATION_MARGIN = float(os.getenv('LEDGER_RESERVATION_MARGIN', '300'))
+# Écarts tolérés entre capacité déclarée et capacité dérivée
+LEDGER_DRIFT_TOLERANCE_RAM = float(os.getenv('LEDGER_DRIFT_TOLERANCE_RAM', '1'))  # GB
+LEDGER_DRIFT_TOLERANCE_ROM = float(os.getenv('LEDGER_DRIFT_TOLERANCE_ROM', '2'))  # GB
+
+ALLOCATED_STATES = ('reserved', 'active', 'unknown')
+STATES = ALLOCATED_STATES + ('failed', 'released')
+
+
+class Allocated:
+    __slots__ = ('cpu_count', 'memory_size_mib', 'disk_size_gb', 'vms')
+
+    def __init__(self):
+        self.cpu_count = 0
+        self.memory_size_mib = 0
+        self.disk_size_gb = 0
+        self.vms = 0
+
+    def add(self, cpu_count: int, memory_size_mib: int, disk_size_gb: int, sign: int = 1):
+        self.cpu_count += sign * cpu_count
+        self.memory_size_mib += sign * memory_size_mib
+        self.disk_size_gb += sign * disk_size_gb
+        self.vms += sign
+
+    def copy(self) -> 'Allocated':
+        other = Allocated()
+        other.cpu_count = self.cpu_count
+        other.memory_size_mib = self.memory_size_mib
+        other.disk_size_gb = self.disk_size_gb
+        other.vms = self.vms
+        return other
+
+    def to_dict(self) -> dict:
+        return {'vms': self.vms, 'cpu_count': self.cpu_count, 'memory_size_mib': self.memory_size_mib,
+                'disk_size_gb': self.disk_size_gb}
+
+
+class SharedExclusiveLock:
+    """Verrou partagé / exclusif; un demandeur exclusif en attente bloque les nouveaux accès partagés"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._exclusive or self._waiting:
+                self._condition.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                if not self._shared:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._waiting += 1
+            while self._exclusive or self._shared:
+                self._condition.wait()
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+def derived_free(host: dict, allocated: Allocated) -> dict:
+    """Mémoire et disque physiques libres déduits des allocations, dans les unités de ClusterEntity"""
+    return {
+        'available_ram': host['ram'] - allocated.memory_size_mib / 1024,
+        'available_rom': host['rom'] - allocated.disk_size_gb,
+    }
+
+
+class AllocationLedger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Partagé par les écritures (base + sommes), exclusif pour la reconstruction
+        self._writes = SharedExclusiveLock()
+        self._allocated: Dict[int, Allocated] = defaultdict(Allocated)
+        self._create_timeouts: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[dict, int], None]] = []
+        self._capacity_listeners: List[Callable[[Optional[int]], None]] = []
+        self.last_reconciliation: Optional[dict] = None
+
+    def on_transition(self, listener: Callable[[dict, int], None]):
+        """Observateur appelé avec (allocation, +1/-1) quand une allocation commence ou cesse de consommer"""
+        self._listeners.append(listener)
+        return listener
+
+    def on_capacity_change(self, listener: Callable[[Optional[int]], None]):
+        """Observateur appelé avec l'id de l'hôte dont les ressources allouées ont changé (None: tous les hôtes)"""
+        self._capacity_listeners.append(listener)
+        return listener
+
+    def register_create_timeout(self, name: str, seconds: float):
+        """Déclare le plus long délai d'une création de VM réservée par un appelant"""
+        self._create_timeouts[name] = seconds
+        if LEDGER_RESERVATION_TTL < self.reservation_ttl:
+            logger.info(f"LEDGER_RESERVATION_TTL ({LEDGER_RESERVATION_TTL:.0f}s) inférieur au délai de création "
+                           f"{name} ({seconds:.0f}s): les réservations expirent après {self.reservation_ttl:.0f}s")
+
+    @property
+    def reservation_ttl(self) -> float:
+        longest = max(self._create_timeouts.values(), default=0)
+        return max(LEDGER_RESERVATION_TTL, longest + LEDGER_RESERVATION_MARGIN if longest else 0)
+
+    def _capacity_changed(self, cluster_id: Optional[int]):
+        # Appelé hors du verrou: les observateurs peuvent relire le registre
+        for listener in self._capacity_listeners:
+            try:
+                listener(cluster_id)
+            except Exception as e:
+                logger.error(f"Erreur dans l'observateur de capacité {listener}: {e}")
+
+    # --- Capacité ---
+
+    def allocated(self, cluster_id: int) -> Allocated:
+        with self._lock:
+            current = self._allocated.get(cluster_id)
+            return current.copy() if current is not None else Allocated()
+
+    def snapshot(self) -> Dict[int, Allocated]:
+        """Copie des ressources allouées de chaque hôte"""
+        with self._lock:
+            return {cluster_id: a.copy() for cluster_id, a in self._allocated.items() if a.vms}
+
+    def effective_available(self, host: dict) -> dict:
+        """Capacité encore allouable selon le modèle de capacité (vCPU, MiB, GB)"""
+        return capacity_model.free(host, self.allocated(host['id']))
+
+    def fits(self, host: dict, cpu_count: int, memory_size_mib: int, disk_size_gb: int) -> bool:
+        return capacity_model.fits(host, self.allocated(host['id']), cpu_count, memory_size_mib, disk_size_gb)
+
+    # --- Cycle de vie d'une allocation ---
+
+    def reserve(self, host: dict, vm_config: dict, placement_group_id: Optional[int] = None,
+                priority: Optional[str] = None) -> Optional[int]:
+        """Vérifie la capacité et enregistre une allocation 'reserved'; None si l'hôte est plein"""
+        from database import SessionLocal
+        from models.model_allocation import VMAllocationEntity
+        cpu_count = vm_config['cpu_count']
+        memory_size_mib = vm_config['memory_size_mib']
+        disk_size_gb = vm_config['disk_size_gb']
+        with self._writes.shared():
+            with self._lock:
+                allocated = self._allocated[host['id']]
+                # Vérification et décompte sous le même verrou: pas de surallocation concurrente
+                if not capacity_model.fits(host, allocated, cpu_count, memory_size_mib, disk_size_gb):
+                    return None
+                allocated.add(cpu_count, memory_size_mib, disk_size_gb)
+            db = SessionLocal()
+            try:
+                allocation = VMAllocationEntity(
+                    cluster_id=host['id'],
+                    user_id=str(vm_config['user_id']),
+                    vm_name=vm_config['name'],
+                    cpu_count=cpu_count,
+                    memory_size_mib=memory_size_mib,
+                    disk_size_gb=disk_size_gb,
+                    vm_offer_id=vm_config.get('vm_offer_id'),
+                    system_image_id=vm_config.get('system_image_id'),
+                    placement_group_id=placement_group_id,
+                    priority=priority,
+                    state='reserved',
+                    # Écrit en UTC comme le seuil de expire_reservations (server_default dépend du fuseau de la base)
+                    created_at=datetime.datetime.utcnow().replace(microsecond=0)
+                )
+                db.add(allocation)
+                db.commit()
+                allocation_id = allocation.id
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    self._allocated[host['id']].add(cpu_count, memory_size_mib, disk_size_gb, -1)
+                raise
+            finally:
+                db.close()
+        self._capacity_changed(host['id'])
+        return allocation_id
+
+    def transition(self, allocation_id: int, state: str, vm_id: Optional[str] = None,
+                   expected: Optional[tuple] = None) -> Optional[dict]:
+        """Change l'état d'une allocation et met à jour les sommes par hôte; None si introuvable ou si son
+        état courant n'est pas dans expected"""
+        from database import SessionLocal
+        from models.model_allocation import VMAllocationEntity
+        values = {'state': state}
+        if vm_id is not None:
+            values['vm_id'] = str(vm_id)
+        with self._writes.shared():
+            db = SessionLocal()
+            try:
+                while True:
+                    allocation = db.query(VMAllocationEntity).filter(VMAllocationEntity.id == allocation_id).first()
+                    if allocation is None:
+                        return None
+                    previous = allocation.state
+                    if expected is not None and previous not in expected:
+                        return None
+                    # Mise à jour conditionnelle: un changement concurrent (autre instance, expiration) est relu
+                    updated = db.query(VMAllocationEntity).filter(
+                        VMAllocationEntity.id == allocation_id,
+                        VMAllocationEntity.state == previous
+                    ).update(values, synchronize_session=False)
+                    db.commit()
+                    if updated:
+                        break
+                was_allocated = previous in ALLOCATED_STATES
+                is_allocated = state in ALLOCATED_STATES
+                if was_allocated != is_allocated:
+                    with self._lock:
+                        self._allocated[allocation.cluster_id].add(
+                            allocation.cpu_count, allocation.memory_size_mib, allocation.disk_size_gb,
+                            1 if is_allocated else -1)
+                result = db.query(VMAllocationEntity).filter(VMAllocationEntity.id == allocation_id).first().to_dict()
+            finally:
+                db.close()
+        if was_allocated != is_allocated:
+            self._capacity_changed(result['cluster_id'])
+            for listener in self._listeners:
+                try:
+                    listener(result, 1 if is_allocated else -1)
+                except Exception as e:
+                    logger.error(f"Erreur dans l'observateur d'allocations {listener}: {e}")
+        return result
+
+    def activate(self, allocation_id: int, vm_id: Optional[str] = None):
+        return self.transition(allocation_id, 'active', vm_id)
+
+    def fail(self, allocation_id: int):
+        return self.transition(allocation_id, 'failed')
+
+    def mark_unknown(self, allocation_id: int):
+        return self.transition(allocation_id, 'unknown')
+
+    def release(self, allocation_id: int):
+        return self.transition(allocation_id, 'released')
+
+    def assign(self, allocation_id: int, from_user: str, user_id: str, vm_name: str,
+               priority: Optional[str] = None) -> Optional[dict]:
+        """Transfère une allocation active à un autre utilisateur (mise à jour conditionnelle: une seule instance
+        peut l'obtenir); None si elle n'appartient plus à from_user. Les ressources allouées ne changent pas."""
+        from database import SessionLocal
+        from models.model_allocation import VMAllocationEntity
+        values = {'user_id': str(user_id), 'vm_name': vm_name}
+        if priority is not None:
+            values['priority'] = priority
+        db = SessionLocal()
+        try:
+            updated = db.query(VMAllocationEntity).filter(
+                VMAllocationEntity.id == allocation_id,
+                VMAllocationEntity.user_id == from_user,
+                VMAllocationEntity.state == 'active'
+            ).update(values, synchronize_session=False)
+            db.commit()
+            if not updated:
+                return None
+            return db.query(VMAllocationEntity).filter(VMAllocationEntity.id == allocation_id).first().to_dict()
+        finally:
+            db.close()
+
+    def forget_host(self, before: Optional[dict], after: Optional[dict]):
+        # Les lignes de l'hôte supprimé disparaissent par cascade
+        if after is None and before is not None:
+            with self._lock:
+                self._allocated.pop(before['id'], None)
+
+    # --- Consultation ---
+
+    def find(self, db, cluster_id: Optional[int] = None, user_id: Optional[str] = None,
+             state: Optional[str] = None, limit: int = 100) -> List[dict]:
+        from models.model_allocation import VMAllocationEntity
+        query = db.query(VMAllocationEntity)
+        if cluster_id is not None:
+            query = query.filter(VMAllocationEntity.cluster_id == cluster_id)
+        if user_id is not None:
+            query = query.filter(VMAllocationEntity.user_id == str(user_id))
+        if state is not None:
+            query = query.filter(VMAllocationEntity.state == state)
+        else:
+            query = query.filter(VMAllocationEntity.state.in_(ALLOCATED_STATES))
+        return [a.to_dict() for a in query.order_by(VMAllocationEntity.id.desc()).limit(limit).all()]
+
+    def count_by_host(self, db, user_id: str) -> Dict[int, int]:
+        """Nombre de VM allouées à un utilisateur sur chaque hôte"""
+        from sqlalchemy import func
+        from models.model_allocation import VMAllocationEntity
+        rows = db.query(VMAllocationEntity.cluster_id, func.count(VMAllocationEntity.id)).filter(
+            VMAllocationEntity.user_id == str(user_id),
+            VMAllocationEntity.state.in_(ALLOCATED_STATES)
+        ).group_by(VMAllocationEntity.cluster_id).all()
+        return {cluster_id: vms for cluster_id, vms in rows}
+
+    # --- Réconciliation ---
+
+    def rebuild(self, db):
+        """Recalcule les sommes par hôte depuis la base, sans écriture concurrente entre la requête et le
+        remplacement des sommes"""
+        from sqlalchemy import func
+        from models.model_allocation import VMAllocationEntity
+        with self._writes.exclusive():
+            # Nouvelle transaction: la lecture voit toutes les écritures validées avant le verrou
+            db.commit()
+            rows = db.query(
+                VMAllocationEntity.cluster_id,
+                func.count(VMAllocationEntity.id),
+                func.sum(VMAllocationEntity.cpu_count),
+                func.sum(VMAllocationEntity.memory_size_mib),
+                func.sum(VMAllocationEntity.disk_size_gb),
+            ).filter(VMAllocationEntity.state.in_(ALLOCATED_STATES)).group_by(VMAllocationEntity.cluster_id).all()
+            allocated: Dict[int, Allocated] = defaultdict(Allocated)
+            for cluster_id, vms, cpu_count, memory_size_mib, disk_size_gb in rows:
+                entry = allocated[cluster_id]
+                entry.add(int(cpu_count or 0), int(memory_size_mib or 0), int(disk_size_gb or 0))
+                entry.vms = vms
+            with self._lock:
+                self._allocated = allocated
+        self._capacity_changed(None)
+
+    def expire_reservations(self, db) -> int:
+        """Passe à failed, une par une via transition() (sommes et observateurs à jour), les réservations plus
+        anciennes que reservation_ttl et toujours 'reserved'"""
+        from models.model_allocation import VMAllocationEntity
+        threshold = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.reservation_ttl)
+        stale = [row.id for row in db.query(VMAllocationEntity.id).filter(
+            VMAllocationEntity.state == 'reserved',
+            VMAllocationEntity.created_at < threshold
+        ).all()]
+        expired = 0
+        for allocation_id in stale:
+            if self.transition(allocation_id, 'failed', expected=('reserved',)) is not None:
+                expired += 1
+        if expired:
+            logger.warning(f"{expired} réservation(s) expirée(s) après {self.reservation_ttl:.0f}s sans issue")
+        return expired
+
+    def reconcile(self, db) -> dict:
+        """Expire les réservations orphelines, recalcule les sommes et compare aux capacités déclarées"""
+        from models.model_cluster import ClusterEntity
+        expired = self.expire_reservations(db)
+        self.rebuild(db)
+        tolerances = {
+            'available_ram': LEDGER_DRIFT_TOLERANCE_RAM,
+            'available_rom': LEDGER_DRIFT_TOLERANCE_ROM,
+        }
+        drifted = []
+        clusters = [cluster.to_dict() for cluster in db.query(ClusterEntity).all()]
+        for host in clusters:
+            allocated = self.allocated(host['id'])
+            derived = derived_free(host, allocated)
+            # Une ressource surallouée n'a pas d'équivalent physique à comparer
+            host_class = capacity_model.classify(host)
+            if host_class.ram_overcommit > 1:
+                derived.pop('available_ram')
+            if host_class.disk_overcommit > 1:
+                derived.pop('available_rom')
+            drift = {
+                metric: {'reported': host[metric], 'derived': round(value, 2),
+                         'delta': round(host[metric] - value, 2)}
+                for metric, value in derived.items() if abs(host[metric] - value) > tolerances[metric]
+            }
+            if drift:
+                drifted.append({'cluster_id': host['id'], 'nom': host['nom'], 'allocated': allocated.to_dict(),
+                                'drift': drift})
+        report = {
+            'checked_at': datetime.datetime.utcnow().replace(microsecond=0).isoformat(),
+            'hosts': len(clusters),
+            'expired_reservations': expired,
+            'drifted_hosts': drifted,
+        }
+        self.last_reconciliation = report
+        if drifted:
+            logger.warning(f"Écart entre registre d'allocations et capacité déclarée sur {len(drifted)} hôte(s): "
+                           f"{[d['cluster_id'] for d in drifted]}")
+        return report
+
+    def rebuild_now(self):
+        from database import SessionLocal
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        finally:
+            db.close()
+
+    def reconcile_now(self) -> dict:
+        from database import SessionLocal
+        db = SessionLocal()
+        try:
+            return self.reconcile(db)
+        finally:
+            db.close()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.reconcile_now)
+            except Exception as e:
+                logger.error(f"Erreur lors de la réconciliation du registre d'allocations: {e}")
+            await asyncio.sleep(LEDGER_RECONCILE_INTERVAL)
+
+    def start(self):
+        if LEDGER_RECONCILE_INTERVAL > 0 and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            allocated = {cluster_id: a.to_dict() for cluster_id, a in self._allocated.items() if a.vms}
+        return {'allocated_by_host': allocated, 'reservation_ttl_s': self.reservation_ttl,
+                'last_reconciliation': self.last_reconciliation}
+
+
+# Instance partagée par les routes
+allocation_ledger = AllocationLedger()
+on_cluster_change(allocation_ledger.forget_host)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Capacités matérielles des hôtes (architecture et drapeaux CPU) en bitsets.
+
+Chaque capacité ('arch:x86_64', 'flag:avx2', ...) reçoit un numéro de bit à sa
+première apparition. Deux structures sont maintenues:
+- par hôte, le masque de ses capacités;
+- un index inversé: pour chaque capacité, le bitset des hôtes qui l'ont
+  (bit n = hôte occupant l'emplacement n).
+
+Les emplacements sont denses: un hôte reçoit le plus petit emplacement libre à
+son ajout et le garde tant qu'il est présent, y compris lors des
+resynchronisations; l'emplacement d'un hôte supprimé est réutilisé. La taille
+des bitsets suit donc le nombre d'hôtes, pas le plus grand identifiant.
+
+Les hôtes compatibles avec une demande sont l'intersection (ET binaire) des
+bitsets des capacités exigées, calculée une fois par placement; le filtrage
+des candidats se réduit ensuite à un test de bit par hôte. Un hôte qui ne
+déclare pas d'architecture hérite de celle déduite de son champ processeur.
+
+L'index est tenu à jour par les notifications de changement de cluster,
+construit depuis la base au premier usage et resynchronisé toutes les
+CAPABILITY_INDEX_REFRESH secondes (écritures d'autres instances). Les
+notifications reçues pendant la requête de resynchronisation sont rejouées sur
+le résultat.
+"""
+import heapq
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.cluster_hooks import on_cluster_change
+
+# Intervalle de resynchronisation depuis la base (0: construit une seule fois)
+CAPABILITY_INDEX_REFRESH = float(os.getenv('CAPABILITY_INDEX_REFRESH', '60'))
+
+ARCH_ALIASES = {
+    'amd64': 'x86_64', 'x64': 'x86_64', 'x86-64': 'x86_64', 'intel64': 'x86_64',
+    'arm64': 'aarch64', 'armv8': 'aarch64', 'armv8l': 'aarch64',
+}
+
+
+def normalize_arch(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    value = value.strip().lower()
+    return ARCH_ALIASES.get(value, value) or None
+
+
+def infer_arch(processeur: Optional[str]) -> Optional[str]:
+    """Architecture déduite d'un nom de processeur libre (ex: 'Intel Xeon E5-2680', 'x86_64')"""
+    if not processeur:
+        return None
+    text = processeur.lower()
+    if any(marker in text for marker in ('aarch64', 'arm', 'graviton', 'ampere', 'neoverse')):
+        return 'aarch64'
+    if any(marker in text for marker in ('x86', 'amd64', 'intel', 'xeon', 'amd', 'epyc', 'ryzen', 'core')):
+        return 'x86_64'
+    return None
+
+
+def normalize_flags(flags: Optional[Iterable[str]]) -> List[str]:
+    if not flags:
+        return []
+    return sorted({flag.strip().lower() for flag in flags if flag and flag.strip()})
+
+
+def host_capabilities(host: dict) -> List[str]:
+    capabilities = [f"flag:{flag}" for flag in normalize_flags(host.get('cpu_flags'))]
+    arch = normalize_arch(host.get('architecture')) or infer_arch(host.get('processeur'))
+    if arch:
+        capabilities.append(f"arch:{arch}")
+    return capabilities
+
+
+def popcount(bitset: int) -> int:
+    return bin(bitset).count('1')
+
+
+class CapabilityIndex:
+    def __init__(self, refresh: float = CAPABILITY_INDEX_REFRESH):
+        self._lock = threading.Lock()
+        self.refresh = refresh
+        self.initialized = False
+        self._built_at = 0.0
+        # Notifications reçues pendant une resynchronisation, rejouées après elle
+        self._missed: Optional[List[Tuple[Optional[dict], Optional[dict]]]] = None
+        self._bits: Dict[str, int] = {}  # capacité -> numéro de bit
+        self._names: List[str] = []  # numéro de bit -> capacité
+        self._hosts: Dict[int, int] = {}  # hôte -> masque des capacités
+        self._postings: Dict[int, int] = {}  # numéro de bit -> bitset des emplacements d'hôtes
+        self._slots: Dict[int, int] = {}  # hôte -> emplacement
+        self._free_slots: List[int] = []  # tas des emplacements libérés
+        self._next_slot = 0
+
+    # --- Maintenance ---
+
+    def _bit(self, capability: str) -> int:
+        bit = self._bits.get(capability)
+        if bit is None:
+            bit = self._bits[capability] = len(self._names)
+            self._names.append(capability)
+        return bit
+
+    def _mask(self, capabilities: Iterable[str]) -> int:
+        mask = 0
+        for capability in capabilities:
+            mask |= 1 << self._bit(capability)
+        return mask
+
+    def _slot(self, cluster_id: int) -> int:
+        slot = self._slots.get(cluster_id)
+        if slot is None:
+            if self._free_slots:
+                slot = heapq.heappop(self._free_slots)
+            else:
+                slot = self._next_slot
+                self._next_slot += 1
+            self._slots[cluster_id] = slot
+        return slot
+
+    def _release(self, cluster_id: int):
+        slot = self._slots.pop(cluster_id, None)
+        if slot is not None:
+            heapq.heappush(self._free_slots, slot)
+
+    def _remove(self, cluster_id: int):
+        mask = self._hosts.pop(cluster_id, 0)
+        host_bit = ~(1 << self._slots.get(cluster_id, 0))
+        bit = 0
+        while mask:
+            if mask & 1:
+                self._postings[bit] &= host_bit
+            mask >>= 1
+            bit += 1
+
+    def _add(self, host: dict):
+        mask = self._mask(host_capabilities(host))
+        self._hosts[host['id']] = mask
+        host_bit = 1 << self._slot(host['id'])
+        bit = 0
+        while mask:
+            if mask & 1:
+                self._postings[bit] = self._postings.get(bit, 0) | host_bit
+            mask >>= 1
+            bit += 1
+
+    def _apply(self, before: Optional[dict], after: Optional[dict]):
+        if before is not None:
+            self._remove(before['id'])
+            if after is None or after['id'] != before['id']:
+                self._release(before['id'])
+        if after is not None:
+            self._add(after)
+
+    def apply(self, before: Optional[dict], after: Optional[dict]):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append((before, after))
+            if not self.initialized:
+                return
+            self._apply(before, after)
+
+    def rebuild(self, clusters: Iterable[dict]):
+        clusters = list(clusters)
+        with self._lock:
+            # Les hôtes toujours présents gardent leur emplacement
+            present = {cluster['id'] for cluster in clusters}
+            for cluster_id in [cluster_id for cluster_id in self._slots if cluster_id not in present]:
+                self._release(cluster_id)
+            self._hosts.clear()
+            self._postings.clear()
+            for cluster in clusters:
+                self._add(cluster)
+            for before, after in self._missed or ():
+                self._apply(before, after)
+            self._missed = None
+            self.initialized = True
+            self._built_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return not self.initialized or (self.refresh > 0 and time.monotonic() - self._built_at >= self.refresh)
+
+    def ensure(self, db):
+        """Construit l'index depuis la base au premier usage, puis le resynchronise toutes les refresh secondes"""
+        if not self.is_stale():
+            return
+        from models.model_cluster import ClusterEntity
+        with self._lock:
+            if self._missed is not None and self.initialized:
+                # Resynchronisation déjà en cours dans un autre thread
+                return
+            if self._missed is None:
+                self._missed = []
+        try:
+            clusters = [cluster.to_dict() for cluster in db.query(ClusterEntity).all()]
+        except Exception:
+            with self._lock:
+                self._missed = None
+            raise
+        self.rebuild(clusters)
+
+    # --- Consultation ---
+
+    @staticmethod
+    def requirements(architecture: Optional[str] = None, features: Optional[List[str]] = None) -> List[str]:
+        required = [f"flag:{flag}" for flag in normalize_flags(features)]
+        arch = normalize_arch(architecture)
+        if arch:
+            required.append(f"arch:{arch}")
+        return required
+
+    def eligible(self, architecture: Optional[str] = None,
+                 features: Optional[List[str]] = None) -> Tuple[Optional[int], List[str]]:
+        """(bitset des hôtes compatibles ou None sans exigence, capacités fournies par aucun hôte)"""
+        required = self.requirements(architecture, features)
+        if not required:
+            return None, []
+        with self._lock:
+            missing = [c for c in required if not self._postings.get(self._bits.get(c, -1), 0)]
+            if missing:
+                return 0, missing
+            # Intersection en commençant par la capacité la plus rare
+            postings = sorted((self._postings[self._bits[c]] for c in required), key=popcount)
+        hosts = postings[0]
+        for posting in postings[1:]:
+            hosts &= posting
+            if not hosts:
+                break
+        return hosts, []
+
+    def contains(self, hosts: Optional[int], cluster_id: int) -> bool:
+        if hosts is None:
+            return True
+        slot = self._slots.get(cluster_id)
+        return slot is not None and (hosts >> slot) & 1 == 1
+
+    def capabilities_of(self, cluster_id: int) -> List[str]:
+        with self._lock:
+            mask = self._hosts.get(cluster_id, 0)
+            return [name for bit, name in enumerate(self._names) if mask >> bit & 1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {name: popcount(self._postings.get(bit, 0)) for bit, name in enumerate(self._names)}
+            hosts = len(self._hosts)
+        return {
+            'hosts': hosts,
+            'architectures': {name[5:]: n for name, n in counts.items() if name.startswith('arch:') and n},
+            'cpu_flags': {name[5:]: n for name, n in sorted(counts.items()) if name.startswith('flag:') and n},
+            'capability_bits': len(counts),
+            'host_slots': self._next_slot,
+        }
+
+
+# Instance partagée par les routes
+capabilities = CapabilityIndex()
+on_cluster_change(capabilities.apply)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Modèle de capacité des hôtes avec surallocation par ressource et par classe d'hôte.
+
+La capacité allouable d'un hôte est calculée dans les unités des demandes de VM:
+- vCPU    : (number_of_core - cœurs réservés) x ratio de surallocation CPU
+- mémoire : (ram x 1024 - MiB réservés à l'hôte) x ratio de surallocation mémoire, en MiB
+- disque  : rom x ratio de surallocation disque, en GB
+
+La capacité libre est la capacité allouable moins les allocations du registre.
+Deux garde-fous s'appuient sur les valeurs déclarées par l'hôte, qui reflètent
+l'usage réel: la mémoire et le disque libres déclarés (multipliés par le ratio)
+bornent la capacité libre, et un hôte dont le CPU libre déclaré est inférieur à
+CAPACITY_MIN_CPU_IDLE n'accepte plus de VM quel que soit le nombre de vCPU
+alloués. Une VM ne peut pas avoir plus de vCPU que l'hôte n'a de cœurs.
+
+La classe d'un hôte est la dernière classe (par ordre croissant de min_cores)
+dont il atteint min_cores et min_ram_gb. Les classes se configurent par
+CAPACITY_HOST_CLASSES (liste JSON), par exemple:
+    [{"name": "small", "min_cores": 0, "cpu_overcommit": 2},
+     {"name": "large", "min_cores": 32, "cpu_overcommit": 6, "ram_overcommit": 1.2}]
+"""
+import json
+import logging
+import os
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# CPU libre déclaré minimal (%) pour accepter une nouvelle VM
+CAPACITY_MIN_CPU_IDLE = float(os.getenv('CAPACITY_MIN_CPU_IDLE', '10'))
+
+DEFAULT_HOST_CLASSES = [
+    # Petits hôtes: peu de cœurs à partager, surallocation CPU prudente
+    {'name': 'small', 'min_cores': 0, 'cpu_overcommit': 2.0, 'ram_overcommit': 1.0, 'disk_overcommit': 1.0,
+     'reserved_cores': 1, 'reserved_ram_mib': 1024},
+    {'name': 'medium', 'min_cores': 16, 'cpu_overcommit': 4.0, 'ram_overcommit': 1.0, 'disk_overcommit': 1.0,
+     'reserved_cores': 2, 'reserved_ram_mib': 2048},
+    # Gros hôtes: le multiplexage de nombreuses VM absorbe mieux les pics
+    {'name': 'large', 'min_cores': 64, 'cpu_overcommit': 6.0, 'ram_overcommit': 1.0, 'disk_overcommit': 1.0,
+     'reserved_cores': 4, 'reserved_ram_mib': 4096},
+]
+
+
+class HostClass:
+    __slots__ = ('name', 'min_cores', 'min_ram_gb', 'cpu_overcommit', 'ram_overcommit', 'disk_overcommit',
+                 'reserved_cores', 'reserved_ram_mib')
+
+    def __init__(self, name: str, min_cores: int = 0, min_ram_gb: int = 0, cpu_overcommit: float = 1.0,
+                 ram_overcommit: float = 1.0, disk_overcommit: float = 1.0, reserved_cores: int = 0,
+                 reserved_ram_mib: int = 0):
+        self.name = name
+        self.min_cores = min_cores
+        self.min_ram_gb = min_ram_gb
+        self.cpu_overcommit = cpu_overcommit
+        self.ram_overcommit = ram_overcommit
+        self.disk_overcommit = disk_overcommit
+        self.reserved_cores = reserved_cores
+        self.reserved_ram_mib = reserved_ram_mib
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def load_host_classes() -> List[HostClass]:
+    raw = os.getenv('CAPACITY_HOST_CLASSES', '')
+    definitions = DEFAULT_HOST_CLASSES
+    if raw:
+        try:
+            definitions = json.loads(raw)
+        except ValueError as e:
+            logger.error(f"CAPACITY_HOST_CLASSES invalide, classes par défaut utilisées: {e}")
+    return [HostClass(**definition) for definition in definitions]
+
+
+class CapacityModel:
+    def __init__(self, classes: Optional[List[HostClass]] = None, min_cpu_idle: float = CAPACITY_MIN_CPU_IDLE):
+        classes = load_host_classes() if classes is None else classes
+        self.classes = sorted(classes, key=lambda host_class: (host_class.min_cores, host_class.min_ram_gb))
+        self.min_cpu_idle = min_cpu_idle
+        self._shapes = {}
+        # Ratios maximaux: bornes prudentes pour le préfiltrage SQL
+        self.max_ram_overcommit = max((c.ram_overcommit for c in self.classes), default=1.0)
+        self.max_disk_overcommit = max((c.disk_overcommit for c in self.classes), default=1.0)
+
+    def classify(self, host: dict) -> HostClass:
+        chosen = self.classes[0]
+        for host_class in self.classes:
+            if host['number_of_core'] >= host_class.min_cores and host['ram'] >= host_class.min_ram_gb:
+                chosen = host_class
+        return chosen
+
+    def _shape(self, host: dict) -> tuple:
+        """(classe, vCPU, MiB, GB) allouables, mémorisés par forme matérielle (cœurs, RAM, disque)"""
+        key = (host['number_of_core'], host['ram'], host['rom'])
+        shape = self._shapes.get(key)
+        if shape is None:
+            host_class = self.classify(host)
+            shape = (host_class,
+                     int(max(0, host['number_of_core'] - host_class.reserved_cores) * host_class.cpu_overcommit),
+                     int(max(0, host['ram'] * 1024 - host_class.reserved_ram_mib) * host_class.ram_overcommit),
+                     int(host['rom'] * host_class.disk_overcommit))
+            if len(self._shapes) > 4096:
+                self._shapes.clear()
+            self._shapes[key] = shape
+        return shape
+
+    def capacity(self, host: dict) -> dict:
+        """Capacité allouable totale de l'hôte (vCPU, MiB, GB)"""
+        _host_class, vcpus, memory_mib, disk_gb = self._shape(host)
+        return {'vcpus': vcpus, 'memory_mib': memory_mib, 'disk_gb': disk_gb}
+
+    def _free(self, host: dict, allocated) -> tuple:
+        host_class, vcpus, memory_mib, disk_gb = self._shape(host)
+        return (vcpus - allocated.cpu_count,
+                min(memory_mib - allocated.memory_size_mib, int(host['available_ram'] * 1024 * host_class.ram_overcommit)),
+                min(disk_gb - allocated.disk_size_gb, int(host['available_rom'] * host_class.disk_overcommit)))
+
+    def free(self, host: dict, allocated) -> dict:
+        """Capacité encore allouable: capacité moins allocations, bornée par l'usage déclaré par l'hôte"""
+        vcpus, memory_mib, disk_gb = self._free(host, allocated)
+        return {'vcpus': vcpus, 'memory_mib': memory_mib, 'disk_gb': disk_gb}
+
+    def fits(self, host: dict, allocated, cpu_count: int, memory_size_mib: int, disk_size_gb: int) -> bool:
+        # Appelé pour chaque candidat: une seule classification, sans dictionnaire intermédiaire
+        if cpu_count > host['number_of_core'] or (host['available_processor'] or 0) < self.min_cpu_idle:
+            return False
+        vcpus, memory_mib, disk_gb = self._free(host, allocated)
+        return vcpus >= cpu_count and memory_mib >= memory_size_mib and disk_gb >= disk_size_gb
+
+    def prefilter(self, cpu_count: int, memory_size_mib: int, disk_size_gb: int) -> dict:
+        """Seuils minimaux sur les colonnes de ClusterEntity, vrais pour tout hôte où la VM peut tenir"""
+        return {
+            'available_ram': memory_size_mib / 1024 / self.max_ram_overcommit,
+            'available_rom': disk_size_gb / self.max_disk_overcommit,
+            'available_processor': self.min_cpu_idle,
+            'number_of_core': cpu_count,
+        }
+
+    def describe(self, host: dict, allocated) -> dict:
+        capacity = self.capacity(host)
+        return {
+            'class': self._shape(host)[0].name,
+            'capacity': capacity,
+            'allocated': {'vcpus': allocated.cpu_count, 'memory_mib': allocated.memory_size_mib,
+                          'disk_gb': allocated.disk_size_gb},
+            'free': self.free(host, allocated),
+            'vcpu_per_core': round(allocated.cpu_count / host['number_of_core'], 2) if host['number_of_core'] else None,
+        }
+
+    def stats(self) -> dict:
+        return {'classes': [host_class.to_dict() for host_class in self.classes], 'min_cpu_idle': self.min_cpu_idle}
+
+
+# Instance partagée par le registre et les routes
+capacity_model = CapacityModel()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Disjoncteurs par hôte pour les appels de création de VM.
+
+closed    : les appels passent; après BREAKER_FAILURE_THRESHOLD échecs consécutifs -> open
+open      : l'hôte est retiré du placement pendant BREAKER_RECOVERY_TIMEOUT secondes -> half_open
+half_open : un nombre limité d'appels d'essai; un succès referme, un échec rouvre
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+BREAKER_RECOVERY_TIMEOUT = float(os.getenv('BREAKER_RECOVERY_TIMEOUT', '30'))
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv('BREAKER_HALF_OPEN_MAX_CALLS', '1'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 recovery_timeout: float = BREAKER_RECOVERY_TIMEOUT,
+                 half_open_max_calls: int = BREAKER_HALF_OPEN_MAX_CALLS):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.half_open_calls = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def _maybe_half_open(self, now: float):
+        if self.state == OPEN and now - self.opened_at >= self.recovery_timeout:
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+
+    def is_available(self) -> bool:
+        """Indique sans effet de bord si un appel serait autorisé"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self.state == CLOSED:
+                return True
+            return self.state == HALF_OPEN and self.half_open_calls < self.half_open_max_calls
+
+    def allow_request(self) -> bool:
+        """Réserve le droit d'appeler l'hôte (consomme un essai en half_open)"""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.half_open_calls < self.half_open_max_calls:
+                self.half_open_calls += 1
+                return True
+            return False
+
+    def release(self):
+        """Rend un essai obtenu par allow_request() sans que l'hôte ait été appelé"""
+        with self._lock:
+            if self.state == HALF_OPEN and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self.failures = 0
+            self.state = CLOSED
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 2)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'total_failures': self.total_failures,
+                'total_successes': self.total_successes,
+                'times_opened': self.times_opened,
+                'retry_in_s': retry_in,
+            }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[int, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, cluster_id: int) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(cluster_id)
+            if breaker is None:
+                breaker = self._breakers[cluster_id] = CircuitBreaker()
+            return breaker
+
+    def is_available(self, cluster_id: int) -> bool:
+        breaker = self._breakers.get(cluster_id)
+        return breaker is None or breaker.is_available()
+
+    def forget(self, cluster_id: int):
+        with self._lock:
+            self._breakers.pop(cluster_id, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {cluster_id: breaker.to_dict() for cluster_id, breaker in breakers.items()}
+
+
+# Instance partagée par les routes
+breakers = BreakerRegistry()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Notification des changements de clusters aux structures maintenues en mémoire.
+
+Les routes appellent notify_cluster_change(avant, après) après chaque commit
+(création, mise à jour, suppression, réservation de capacité). Les états sont
+des dictionnaires ClusterEntity.to_dict(); None signifie absent.
+"""
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_listeners: List[Callable[[Optional[dict], Optional[dict]], None]] = []
+
+
+def on_cluster_change(listener: Callable[[Optional[dict], Optional[dict]], None]):
+    """Enregistre un observateur (utilisable comme décorateur)"""
+    _listeners.append(listener)
+    return listener
+
+
+def notify_cluster_change(before: Optional[dict], after: Optional[dict]):
+    for listener in _listeners:
+        try:
+            listener(before, after)
+        except Exception as e:
+            logger.error(f"Erreur dans l'observateur {getattr(listener, '__qualname__', listener)}: {e}")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Cache des candidats classés par profil de demande de VM.
+
+La plupart des demandes viennent de quelques offres (vm_offer_id) aux mêmes
+vCPU / mémoire / disque. Pour chaque profil (zone, vCPU, MiB, GB, image,
+politique), le cache garde la liste des hôtes où la VM tient, triée par score
+(services/placement.host_score). Une demande répétée lit la tête de la liste:
+seuls la santé de l'hôte et le bitset d'architecture / drapeaux CPU sont
+vérifiés au passage, en O(1) par hôte lu.
+
+L'invalidation est sélective: quand un hôte change (heartbeat, modification,
+suppression), que ses allocations changent (réservation, libération) ou que
+ses images en cache changent, seul cet hôte est réévalué dans les profils de
+sa zone: retiré, reclassé ou ajouté par recherche dichotomique. Une liste
+n'est jamais modifiée en place (hors remplacement d'un élément à score
+identique): les lecteurs la parcourent sans verrou. Une reconstruction
+complète du registre d'allocations vide le cache.
+
+Les écritures d'autres instances ne sont pas notifiées: une entrée est
+reconstruite depuis la base après DECISION_CACHE_TTL secondes. La réservation
+revérifie de toute façon la capacité sous verrou.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from services.allocation_ledger import allocation_ledger
+from services.capabilities import capabilities
+from services.cluster_hooks import on_cluster_change
+from services.health_monitor import health_monitor
+from services.image_locality import image_locality
+from services.placement import PLACEMENT_POLICY, POLICIES, host_score
+
+logger = logging.getLogger(__name__)
+
+DECISION_CACHE_ENABLED = os.getenv('DECISION_CACHE_ENABLED', 'true').lower() == 'true'
+DECISION_CACHE_TTL = float(os.getenv('DECISION_CACHE_TTL', '60'))
+DECISION_CACHE_MAX_ENTRIES = int(os.getenv('DECISION_CACHE_MAX_ENTRIES', '256'))
+
+
+class HostSnapshot:
+    """État d'un hôte au moment de son classement, avec les attributs et to_dict() d'un ClusterEntity"""
+
+    def __init__(self, data: dict):
+        self.__dict__.update(data)
+        self._data = data
+
+    def to_dict(self) -> dict:
+        return dict(self._data)
+
+
+class CacheEntry:
+    __slots__ = ('zone', 'cpu_count', 'memory_size_mib', 'disk_size_gb', 'image_id', 'policy', 'created', 'order',
+                 'scores', 'hits')
+
+    def __init__(self, zone: str, cpu_count: int, memory_size_mib: int, disk_size_gb: int, image_id: Optional[int],
+                 policy: str):
+        self.zone = zone
+        self.cpu_count = cpu_count
+        self.memory_size_mib = memory_size_mib
+        self.disk_size_gb = disk_size_gb
+        self.image_id = image_id
+        self.policy = policy
+        self.created = time.monotonic()
+        self.order: List[tuple] = []  # (score, id, HostSnapshot) triés; remplacée à chaque modification
+        self.scores: Dict[int, float] = {}  # id -> score dans order
+        self.hits = 0
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            'zone': self.zone, 'cpu_count': self.cpu_count, 'memory_size_mib': self.memory_size_mib,
+            'disk_size_gb': self.disk_size_gb, 'system_image_id': self.image_id, 'policy': self.policy,
+            'hosts': len(self.order), 'hits': self.hits, 'age_s': round(now - self.created, 1),
+        }
+
+
+class DecisionCache:
+    def __init__(self, enabled: bool = DECISION_CACHE_ENABLED, ttl: float = DECISION_CACHE_TTL,
+                 max_entries: int = DECISION_CACHE_MAX_ENTRIES, ledger=None, locality=None, health=None):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.ledger = allocation_ledger if ledger is None else ledger
+        self.locality = image_locality if locality is None else locality
+        self.health = health_monitor if health is None else health
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[tuple, CacheEntry]' = OrderedDict()  # ordre LRU
+        self._by_zone: Dict[str, Set[tuple]] = {}
+        self._hosts: Dict[int, dict] = {}  # dernier état connu de chaque hôte chargé ou notifié
+        self._versions: Dict[str, int] = {}  # changements par zone, pour écarter une construction concurrente
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0, 'stale_builds': 0,
+                         'host_updates': 0, 'reranked': 0, 'flushes': 0}
+
+    @staticmethod
+    def key(zone: str, vm_requirements, policy: Optional[str] = None) -> tuple:
+        return (zone, vm_requirements.cpu_count, vm_requirements.memory_size_mib, vm_requirements.disk_size_gb,
+                vm_requirements.system_image_id, policy or PLACEMENT_POLICY)
+
+    # --- Lecture ---
+
+    def ranked(self, zone: str, vm_requirements, load: Callable[[], list], eligible: Optional[int] = None,
+               policy: Optional[str] = None) -> Iterator[HostSnapshot]:
+        """Candidats classés de la zone; load() charge les hôtes de la zone depuis la base en cas d'absence"""
+        key = self.key(zone, vm_requirements, policy)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created > self.ttl:
+                self._drop(key)
+                self.counters['expired'] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.counters['hits'] += 1
+                order = entry.order
+            else:
+                self.counters['misses'] += 1
+                version = self._versions.get(zone, 0)
+        if entry is None:
+            entry = self._build(key, load(), version)
+            order = entry.order
+            with self._lock:
+                if self._versions.get(zone, 0) == version:
+                    self._store(key, entry)
+                else:
+                    # Un hôte de la zone a changé pendant la construction: résultat utilisé une fois, non conservé
+                    self.counters['stale_builds'] += 1
+        return self._placeable(order, eligible)
+
+    def _placeable(self, order: List[tuple], eligible: Optional[int]) -> Iterator[HostSnapshot]:
+        is_placeable = self.health.is_placeable
+        for _score, host_id, snapshot in order:
+            if is_placeable(host_id) and capabilities.contains(eligible, host_id):
+                yield snapshot
+
+    # --- Construction ---
+
+    def _score(self, entry: CacheEntry, host: dict) -> Optional[tuple]:
+        """(score, id, instantané) si la VM du profil tient sur l'hôte, sinon None"""
+        if host.get('zone') != entry.zone or not self.ledger.fits(host, entry.cpu_count, entry.memory_size_mib,
+                                                                   entry.disk_size_gb):
+            return None
+        snapshot = HostSnapshot(host)
+        return host_score(snapshot, entry.image_id, self.locality, POLICIES[entry.policy]), host['id'], snapshot
+
+    def _build(self, key: tuple, hosts: list, version: int) -> CacheEntry:
+        entry = CacheEntry(*key)
+        known = {}
+        for host in hosts:
+            data = host.to_dict()
+            known[data['id']] = data
+            item = self._score(entry, data)
+            if item is not None:
+                entry.order.append(item)
+                entry.scores[data['id']] = item[0]
+        entry.order.sort(key=lambda item: item[:2])
+        with self._lock:
+            if self._versions.get(entry.zone, 0) == version:
+                # Aucune notification depuis le chargement: la base fait foi (écritures d'autres instances)
+                self._hosts.update(known)
+            else:
+                # Un état notifié pendant la construction est plus récent que celui chargé
+                for host_id, data in known.items():
+                    self._hosts.setdefault(host_id, data)
+        return entry
+
+    def _store(self, key: tuple, entry: CacheEntry):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        self._by_zone.setdefault(entry.zone, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.counters['evicted'] += 1
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key)
+        keys = self._by_zone.get(entry.zone)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_zone[entry.zone]
+
+    # --- Invalidation sélective ---
+
+    def _reevaluate(self, host_id: int, zones: Set[str]):
+        """Retire, reclasse ou ajoute l'hôte dans les profils des zones données (sous verrou)"""
+        host = self._hosts.get(host_id)
+        for zone in zones:
+            self._versions[zone] = self._versions.get(zone, 0) + 1
+            for key in self._by_zone.get(zone, ()):
+                entry = self._entries[key]
+                old = entry.scores.get(host_id)
+                item = self._score(entry, host) if host is not None else None
+                if old is None and item is None:
+                    continue
+                self.counters['reranked'] += 1
+                if old is not None and item is not None and item[0] == old:
+                    # Même rang: remplacement de l'élément, lisible sans verrou
+                    entry.order[bisect.bisect_left(entry.order, (old, host_id))] = item
+                    continue
+                order = list(entry.order)
+                if old is not None:
+                    del order[bisect.bisect_left(order, (old, host_id))]
+                    del entry.scores[host_id]
+                if item is not None:
+                    order.insert(bisect.bisect_left(order, item[:2]), item)
+                    entry.scores[host_id] = item[0]
+                entry.order = order
+
+    def on_cluster_change(self, before: Optional[dict], after: Optional[dict]):
+        if not self.enabled:
+            return
+        host_id = (after or before)['id']
+        zones = {host['zone'] for host in (before, after) if host is not None and host.get('zone')}
+        with self._lock:
+            self.counters['host_updates'] += 1
+            if after is None:
+                self._hosts.pop(host_id, None)
+            else:
+                self._hosts[host_id] = after
+            self._reevaluate(host_id, zones)
+
+    def on_host_changed(self, cluster_id: Optional[int]):
+        """Allocations ou images en cache d'un hôte modifiées; None: toutes les allocations recalculées"""
+        if not self.enabled:
+            return
+        if cluster_id is None:
+            self.clear()
+            return
+        with self._lock:
+            host = self._hosts.get(cluster_id)
+            if host is None or not host.get('zone'):
+                # Hôte jamais chargé: absent de tout profil, et ses valeurs déclarées l'en excluent toujours
+                return
+            self.counters['host_updates'] += 1
+            self._reevaluate(cluster_id, {host['zone']})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_zone.clear()
+            for zone in self._versions:
+                self._versions[zone] += 1
+            self.counters['flushes'] += 1
+
+    # --- Consultation ---
+
+    def stats(self, limit: int = 20) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            profiles = sorted(self._entries.values(), key=lambda entry: -entry.hits)[:limit]
+            return {
+                'enabled': self.enabled,
+                'ttl_s': self.ttl,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hit_ratio': round(self.counters['hits'] / lookups, 4) if lookups else None,
+                'counters': dict(self.counters),
+                'profiles': [entry.to_dict(now) for entry in profiles],
+            }
+
+
+# Instance partagée par le placement
+decision_cache = DecisionCache()
+on_cluster_change(decision_cache.on_cluster_change)
+allocation_ledger.on_capacity_change(decision_cache.on_host_changed)
+image_locality.on_change(decision_cache.on_host_changed)
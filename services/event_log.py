@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""Journal binaire en ajout seul des mutations de clusters et des décisions de placement.
+
+Format d'un enregistrement (petit-boutiste):
+  longueur du contenu (uint32) | crc32 du contenu (uint32) | horodatage (float64) | type (uint8) | contenu JSON compact
+L'offset d'un événement est sa position logique en octets depuis la création du
+journal: il ne repart pas de zéro après une compaction, ce qui garde valides les
+offsets notés par dump_event_log.py ou par un consommateur qui relit le journal.
+Un enregistrement tronqué ou corrompu en fin de fichier (arrêt brutal) est
+ignoré à la relecture puis écrasé à la réouverture.
+
+Les écritures passent par un tampon; un thread vide le tampon et appelle
+fsync au plus toutes les EVENT_LOG_FSYNC_INTERVAL secondes, ou dès que
+EVENT_LOG_FSYNC_BATCH événements sont en attente (fsync groupé).
+
+L'état dérivé du journal (PlacementState) est maintenu en mémoire. Tous les
+EVENT_LOG_SNAPSHOT_EVERY événements, le journal est compacté: il est réécrit
+(fichier temporaire puis renommage atomique) en un enregistrement d'instantané
+de l'état suivi des événements ajoutés pendant la réécriture. L'instantané
+porte l'offset logique (base_offset) du premier événement qui le suit. Le
+fichier reste ainsi borné, et la reprise au démarrage relit l'instantané puis
+au plus EVENT_LOG_SNAPSHOT_EVERY événements.
+
+Au démarrage, les hôtes rejoués alimentent les index construits à partir des
+hôtes (zones, capacités) sans balayer la base, si la relecture est complète et
+que la base contient le même ensemble d'hôtes (voir seed()); sinon ces index se
+construisent depuis la base comme sans journal. Le registre des allocations,
+l'index des groupes de placement et le cache de décisions restent reconstruits
+depuis la base: le journal ne contient ni les allocations ni les appartenances
+aux groupes, seulement l'issue des placements.
+"""
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from services.cluster_hooks import on_cluster_change
+
+logger = logging.getLogger(__name__)
+
+# Désactivé par défaut; par exemple data/events.log
+EVENT_LOG_PATH = os.getenv('EVENT_LOG_PATH', '')
+EVENT_LOG_FSYNC_INTERVAL = float(os.getenv('EVENT_LOG_FSYNC_INTERVAL', '0.05'))
+EVENT_LOG_FSYNC_BATCH = int(os.getenv('EVENT_LOG_FSYNC_BATCH', '512'))
+EVENT_LOG_SNAPSHOT_EVERY = int(os.getenv('EVENT_LOG_SNAPSHOT_EVERY', '100000'))
+
+HEADER = struct.Struct('<IIdB')
+
+CLUSTER_UPSERT = 1
+CLUSTER_DELETE = 2
+PLACEMENT = 3
+SNAPSHOT = 4
+EVENT_TYPES = {CLUSTER_UPSERT: 'cluster_upsert', CLUSTER_DELETE: 'cluster_delete', PLACEMENT: 'placement',
+               SNAPSHOT: 'snapshot'}
+EVENT_CODES = {name: code for code, name in EVENT_TYPES.items()}
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def encode(event_type: int, payload: dict, ts: Optional[float] = None) -> bytes:
+    body = _encoder.encode(payload).encode()
+    return HEADER.pack(len(body), zlib.crc32(body), time.time() if ts is None else ts, event_type) + body
+
+
+def read_events(path: str, offset: int = 0, types: Optional[Set[int]] = None) -> Iterator[Tuple[int, float, int, dict]]:
+    """Produit (offset, horodatage, type, contenu) à partir de l'offset logique offset; s'arrête au premier
+    enregistrement invalide. Un offset antérieur à la dernière compaction repart de l'instantané de tête."""
+    base, delta = _snapshot_base(path)
+    position = 0 if offset < base else offset - delta
+    for event_offset, ts, event_type, body in _read_raw(path, position):
+        if types is None or event_type in types:
+            yield (base if event_offset == 0 and event_type == SNAPSHOT else event_offset + delta), ts, \
+                event_type, json.loads(body)
+
+
+def _snapshot_base(path: str) -> Tuple[int, int]:
+    """(offset logique du premier événement après l'instantané de tête, écart offset logique - position)"""
+    for _, _, event_type, body in _read_raw(path):
+        if event_type == SNAPSHOT:
+            end = HEADER.size + len(body)
+            # Instantané sans base_offset (format antérieur): les offsets repartaient de zéro
+            base = json.loads(body).get('base_offset', end)
+            return base, base - end
+        break
+    return 0, 0
+
+
+def _read_raw(path: str, offset: int = 0):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        buffer = f.read(1 << 20)
+        position = 0
+        while True:
+            if len(buffer) - position < HEADER.size or \
+                    len(buffer) - position < HEADER.size + HEADER.unpack_from(buffer, position)[0]:
+                more = f.read(1 << 20)
+                if not more:
+                    return
+                buffer = buffer[position:] + more
+                offset += position
+                position = 0
+                continue
+            length, crc, ts, event_type = HEADER.unpack_from(buffer, position)
+            start = position + HEADER.size
+            body = buffer[start:start + length]
+            if zlib.crc32(body) != crc:
+                logger.warning(f"Enregistrement corrompu à l'offset {offset + position}, relecture interrompue")
+                return
+            yield offset + position, ts, event_type, body
+            position = start + length
+
+
+class PlacementState:
+    """État reconstruit à partir du journal"""
+
+    def __init__(self):
+        self.hosts: Dict[int, dict] = {}
+        self.placements_by_host: Dict[int, int] = defaultdict(int)
+        self.outcomes: Dict[str, int] = defaultdict(int)
+        self.events = 0
+
+    def apply(self, event_type: int, payload: dict):
+        self.events += 1
+        if event_type == CLUSTER_UPSERT:
+            self.hosts[payload['id']] = payload
+        elif event_type == CLUSTER_DELETE:
+            self.hosts.pop(payload['id'], None)
+            self.placements_by_host.pop(payload['id'], None)
+        elif event_type == PLACEMENT:
+            self.outcomes[payload.get('outcome', 'unknown')] += 1
+            if payload.get('outcome') == 'created' and payload.get('host_id') is not None:
+                self.placements_by_host[payload['host_id']] += 1
+
+    def to_dict(self) -> dict:
+        return {'hosts': list(self.hosts.values()), 'placements_by_host': dict(self.placements_by_host),
+                'outcomes': dict(self.outcomes), 'events': self.events}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'PlacementState':
+        state = cls()
+        state.hosts = {host['id']: host for host in data['hosts']}
+        state.placements_by_host.update({int(k): v for k, v in data['placements_by_host'].items()})
+        state.outcomes.update(data['outcomes'])
+        state.events = data['events']
+        return state
+
+
+class EventLog:
+    def __init__(self, path: str = EVENT_LOG_PATH, fsync_interval: float = EVENT_LOG_FSYNC_INTERVAL,
+                 fsync_batch: int = EVENT_LOG_FSYNC_BATCH, snapshot_every: int = EVENT_LOG_SNAPSHOT_EVERY):
+        self.path = path
+        self.compact_path = f"{path}.compact"
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.snapshot_every = snapshot_every
+        self.state = PlacementState()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._file = None
+        self._flusher: Optional[threading.Thread] = None
+        self._closing = False
+        self._offset = 0
+        # Offset logique - position dans le fichier (non nul après une compaction)
+        self._delta = 0
+        self._pending = 0
+        self._since_snapshot = 0
+        self.counters = {'appended': 0, 'fsyncs': 0, 'compactions': 0}
+        self.recovery: Optional[dict] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    # --- Ouverture et reprise ---
+
+    def open(self) -> dict:
+        """Rejoue le journal (instantané de tête puis événements) et ouvre le fichier en ajout"""
+        started = time.perf_counter()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.compact_path):
+            # Compaction interrompue avant le renommage: le journal d'origine est intact
+            os.remove(self.compact_path)
+        state, position, delta = PlacementState(), 0, 0
+        from_snapshot = False
+        replayed = 0
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size:
+            for event_offset, _, event_type, body in _read_raw(self.path):
+                if event_type == SNAPSHOT:
+                    snapshot = json.loads(body)
+                    state, from_snapshot = PlacementState.from_dict(snapshot), True
+                    delta = snapshot.get('base_offset', HEADER.size + len(body)) - HEADER.size - len(body)
+                else:
+                    state.apply(event_type, json.loads(body))
+                    replayed += 1
+                position = event_offset + HEADER.size + len(body)
+        self._file = open(self.path, 'ab' if os.path.exists(self.path) else 'wb')
+        if self._file.tell() != position:
+            # Enregistrement partiel en fin de fichier: le supprimer
+            self._file.truncate(position)
+            self._file.seek(position)
+        self.state = state
+        self._delta = delta
+        self._offset = position + delta
+        self._since_snapshot = replayed
+        self._closing = False
+        self._flusher = threading.Thread(target=self._flush_loop, name='event-log-flusher', daemon=True)
+        self._flusher.start()
+        self.recovery = {
+            'from_snapshot': from_snapshot,
+            'replayed_events': replayed,
+            # Faux si des octets ont été écartés en fin de fichier (écriture interrompue ou corruption)
+            'complete': position == size,
+            'seeded_indexes': False,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+        }
+        return self.recovery
+
+    def seed(self, db, indexes: Iterable) -> bool:
+        """Alimente les index construits à partir des hôtes avec l'état rejoué, sans balayer la base.
+
+        Seulement si la relecture est complète et que la base contient le même ensemble d'hôtes (nombre et
+        identifiant maximal: une base recréée ou un journal d'une autre base ne correspond pas). Les écritures
+        d'autres instances sont rattrapées par la resynchronisation périodique des index, comme sans journal.
+        """
+        from sqlalchemy import func
+        from models.model_cluster import ClusterEntity
+        if self.recovery is None or not self.recovery['complete'] or not self.state.hosts:
+            return False
+        count, max_id = db.query(func.count(ClusterEntity.id), func.max(ClusterEntity.id)).one()
+        if (count, max_id) != (len(self.state.hosts), max(self.state.hosts)):
+            logger.info("Hôtes du journal différents de la base: index construits depuis la base")
+            return False
+        hosts = list(self.state.hosts.values())
+        for index in indexes:
+            index.rebuild(hosts)
+        self.recovery['seeded_indexes'] = True
+        return True
+
+    def close(self):
+        if self._file is None:
+            return
+        self._closing = True
+        self._wake.set()
+        self._flusher.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    # --- Écriture ---
+
+    def append(self, event_type: int, payload: dict) -> Optional[int]:
+        """Ajoute un événement; retourne son offset (None si le journal est fermé)"""
+        record = encode(event_type, payload)
+        with self._lock:
+            if self._file is None:
+                return None
+            offset = self._offset
+            self._file.write(record)
+            self._offset += len(record)
+            self._pending += 1
+            self._since_snapshot += 1
+            self.counters['appended'] += 1
+            self.state.apply(event_type, payload)
+            wake = self._pending >= self.fsync_batch or self._since_snapshot >= self.snapshot_every
+        if wake:
+            self._wake.set()
+        return offset
+
+    def _sync(self):
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+            self.counters['fsyncs'] += 1
+
+    def _flush_loop(self):
+        while not self._closing:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            try:
+                with self._lock:
+                    if self._file is None:
+                        return
+                    self._sync()
+                    compaction_due = self._since_snapshot >= self.snapshot_every
+                if compaction_due:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'écriture du journal d'événements: {e}")
+
+    def compact(self):
+        """Remplace le journal par un instantané de l'état suivi des événements ajoutés pendant la réécriture"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            base = self._offset
+            record = encode(SNAPSHOT, dict(base_offset=base, **self.state.to_dict()))
+            self._since_snapshot = 0
+        with open(self.compact_path, 'wb') as out:
+            out.write(record)
+            with self._lock:
+                if self._file is None:
+                    out.close()
+                    os.remove(self.compact_path)
+                    return
+                self._sync()
+                with open(self.path, 'rb') as current:
+                    current.seek(base - self._delta)
+                    shutil.copyfileobj(current, out)
+                out.flush()
+                os.fsync(out.fileno())
+                os.replace(self.compact_path, self.path)
+                self._file.close()
+                self._file = open(self.path, 'ab')
+                self._delta = base - len(record)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.counters['compactions'] += 1
+
+    # --- Observateurs ---
+
+    def on_cluster_change(self, before: Optional[dict], after: Optional[dict]):
+        if after is not None:
+            self.append(CLUSTER_UPSERT, after)
+        elif before is not None:
+            self.append(CLUSTER_DELETE, {'id': before['id']})
+
+    def record_placement(self, payload: dict):
+        self.append(PLACEMENT, payload)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'path': self.path,
+                'offset': self._offset,
+                'pending_fsync': self._pending,
+                'events_since_snapshot': self._since_snapshot,
+                'counters': dict(self.counters),
+                'recovery': self.recovery,
+                'state': {
+                    'hosts': len(self.state.hosts),
+                    'events': self.state.events,
+                    'outcomes': dict(self.state.outcomes),
+                },
+            }
+
+
+# Instance partagée; ouverte au démarrage si EVENT_LOG_PATH est défini
+event_log = EventLog()
+on_cluster_change(event_log.on_cluster_change)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Agrégats de capacité de la flotte maintenus de façon incrémentale.
+
+Les sommes (totales et par type de processeur) et les histogrammes de capacité
+libre sont mis à jour à chaque changement de cluster en retirant l'ancienne
+contribution et en ajoutant la nouvelle, sans parcourir la table. Une
+réconciliation à la demande recalcule les agrégats depuis la base et signale
+les écarts.
+
+Les ressources allouées par le registre d'allocations (réservations comprises)
+sont suivies de la même façon: à chaque réservation ou changement d'état, la
+contribution de l'hôte concerné est remplacée, sans attendre le heartbeat
+suivant.
+"""
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from services.allocation_ledger import allocation_ledger
+from services.cluster_hooks import on_cluster_change
+
+SUMMED_FIELDS = ('rom', 'available_rom', 'ram', 'available_ram', 'number_of_core', 'available_processor')
+ALLOCATED_FIELDS = ('vms', 'cpu_count', 'memory_size_mib', 'disk_size_gb')
+
+# Bornes inférieures des classes des histogrammes de capacité libre
+HISTOGRAM_BUCKETS = {
+    'available_ram': [0, 2, 4, 8, 16, 32, 64, 128],  # GB
+    'available_rom': [0, 10, 50, 100, 250, 500, 1000, 2000],  # GB
+    'available_processor': [0, 10, 25, 50, 75, 90],  # %
+}
+
+
+def _empty_totals() -> dict:
+    totals = {'clusters': 0}
+    totals.update({field: 0 for field in SUMMED_FIELDS})
+    return totals
+
+
+def _allocated_of(allocated) -> tuple:
+    return tuple(getattr(allocated, field) for field in ALLOCATED_FIELDS)
+
+
+def _bucket_labels(edges):
+    labels = []
+    for i, low in enumerate(edges):
+        labels.append(f"{low}-{edges[i + 1]}" if i + 1 < len(edges) else f"{low}+")
+    return labels
+
+
+def _utilization(totals: dict) -> dict:
+    def used_pct(total, available):
+        return round((1 - available / total) * 100, 2) if total else 0.0
+
+    return {
+        'rom_pct': used_pct(totals['rom'], totals['available_rom']),
+        'ram_pct': used_pct(totals['ram'], totals['available_ram']),
+        # available_processor est un pourcentage par hôte: moyenne sur la flotte
+        'processor_pct': round(100 - totals['available_processor'] / totals['clusters'], 2)
+        if totals['clusters'] else 0.0,
+    }
+
+
+class FleetStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.initialized = False
+        self._reset()
+
+    def _reset(self):
+        self.totals = _empty_totals()
+        self.by_processor: Dict[str, dict] = defaultdict(_empty_totals)
+        self.histograms = {metric: [0] * len(edges) for metric, edges in HISTOGRAM_BUCKETS.items()}
+        self._reset_allocated(allocation_ledger.snapshot())
+
+    def _reset_allocated(self, by_host: dict):
+        self._allocated_by_host = {cluster_id: _allocated_of(a) for cluster_id, a in by_host.items()}
+        self.allocated = dict.fromkeys(ALLOCATED_FIELDS, 0)
+        for values in self._allocated_by_host.values():
+            for field, value in zip(ALLOCATED_FIELDS, values):
+                self.allocated[field] += value
+
+    def _set_allocated(self, cluster_id: int, values: tuple):
+        previous = self._allocated_by_host.pop(cluster_id, (0,) * len(ALLOCATED_FIELDS))
+        if any(values):
+            self._allocated_by_host[cluster_id] = values
+        for field, old, new in zip(ALLOCATED_FIELDS, previous, values):
+            self.allocated[field] += new - old
+
+    def _contribute(self, cluster: dict, sign: int):
+        processor = cluster.get('processeur') or 'inconnu'
+        group = self.by_processor[processor]
+        for totals in (self.totals, group):
+            totals['clusters'] += sign
+            for field in SUMMED_FIELDS:
+                totals[field] += sign * (cluster.get(field) or 0)
+        if group['clusters'] == 0:
+            del self.by_processor[processor]
+        for metric, edges in HISTOGRAM_BUCKETS.items():
+            index = max(0, bisect_right(edges, cluster.get(metric) or 0) - 1)
+            self.histograms[metric][index] += sign
+
+    def apply(self, before: Optional[dict], after: Optional[dict]):
+        """Applique un changement de cluster (avant/après) aux agrégats"""
+        with self._lock:
+            if not self.initialized:
+                return
+            if before is not None:
+                self._contribute(before, -1)
+            if after is not None:
+                self._contribute(after, 1)
+            else:
+                # Hôte supprimé: ses allocations disparaissent avec lui
+                self._set_allocated(before['id'], (0,) * len(ALLOCATED_FIELDS))
+
+    def on_allocation_change(self, cluster_id: Optional[int]):
+        """Observateur du registre: remplace la contribution allouée de l'hôte (None: tous les hôtes)"""
+        with self._lock:
+            if not self.initialized:
+                return
+            # Relu sous le verrou: deux notifications concurrentes ne peuvent pas s'inverser
+            if cluster_id is None:
+                self._reset_allocated(allocation_ledger.snapshot())
+            else:
+                self._set_allocated(cluster_id, _allocated_of(allocation_ledger.allocated(cluster_id)))
+
+    def rebuild(self, clusters: Iterable[dict]):
+        with self._lock:
+            self._reset()
+            for cluster in clusters:
+                self._contribute(cluster, 1)
+            self.initialized = True
+
+    def _export(self, totals: dict, by_processor: Dict[str, dict], histograms: Dict[str, list],
+                allocated: dict) -> dict:
+        def allocated_pct(value, total):
+            return round(value / total * 100, 2) if total else 0.0
+
+        return {
+            'totals': {k: round(v, 2) if isinstance(v, float) else v for k, v in totals.items()},
+            'utilization': _utilization(totals),
+            # Registre d'allocations: réservations comprises, vCPU rapportés aux cœurs (peut dépasser 100 %)
+            'allocated': dict(allocated, utilization={
+                'rom_pct': allocated_pct(allocated['disk_size_gb'], totals['rom']),
+                'ram_pct': allocated_pct(allocated['memory_size_mib'] / 1024, totals['ram']),
+                'cpu_pct': allocated_pct(allocated['cpu_count'], totals['number_of_core']),
+            }),
+            'by_processor': {
+                processor: dict({k: round(v, 2) if isinstance(v, float) else v for k, v in group.items()},
+                                utilization=_utilization(group))
+                for processor, group in sorted(by_processor.items())
+            },
+            'free_capacity_histograms': {
+                metric: dict(zip(_bucket_labels(HISTOGRAM_BUCKETS[metric]), counts))
+                for metric, counts in histograms.items()
+            },
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._export(dict(self.totals), {k: dict(v) for k, v in self.by_processor.items()},
+                                {k: list(v) for k, v in self.histograms.items()}, dict(self.allocated))
+
+    def reconcile(self, clusters: Iterable[dict], repair: bool = True) -> dict:
+        """Compare les agrégats incrémentaux à un recalcul complet; corrige si demandé"""
+        expected = FleetStats()
+        expected.rebuild(clusters)
+        with self._lock:
+            drift = {}
+            for field, value in expected.totals.items():
+                current = self.totals.get(field, 0)
+                if abs(current - value) > 1e-6:
+                    drift[field] = {'incremental': current, 'expected': value}
+            for processor in set(self.by_processor) | set(expected.by_processor):
+                current = self.by_processor.get(processor, _empty_totals())
+                wanted = expected.by_processor.get(processor, _empty_totals())
+                if any(abs(current[f] - wanted[f]) > 1e-6 for f in wanted):
+                    drift[f"by_processor.{processor}"] = {'incremental': dict(current), 'expected': dict(wanted)}
+            for metric, counts in expected.histograms.items():
+                if counts != self.histograms[metric]:
+                    drift[f"histogram.{metric}"] = {'incremental': list(self.histograms[metric]), 'expected': counts}
+            if expected.allocated != self.allocated:
+                drift['allocated'] = {'incremental': dict(self.allocated), 'expected': dict(expected.allocated)}
+            was_initialized = self.initialized
+            if repair:
+                self.totals = expected.totals
+                self.by_processor = expected.by_processor
+                self.histograms = expected.histograms
+                self._allocated_by_host = expected._allocated_by_host
+                self.allocated = expected.allocated
+                self.initialized = True
+        return {'consistent': not drift, 'initialized': was_initialized,
+                'repaired': repair and bool(drift), 'drift': drift}
+
+
+# Instance partagée par les routes
+fleet_stats = FleetStats()
+on_cluster_change(fleet_stats.apply)
+allocation_ledger.on_capacity_change(fleet_stats.on_allocation_change)
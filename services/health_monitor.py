@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Sonde de santé concurrente des service-vm-host enregistrés.
+
+Chaque hôte est sondé en HTTP (GET SERVICE_VM_HOST_HEALTH_PATH) avec un
+parallélisme borné et un intervalle adaptatif: espacé pour un hôte sain,
+resserré pour un hôte suspect, en recul exponentiel pour un hôte hors service.
+L'état (up / suspect / down) est conservé en mémoire et consulté par le
+placement sans aucune requête supplémentaire.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_ENABLED = os.getenv('HEALTH_PROBE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SERVICE_VM_HOST_HEALTH_PATH = os.getenv('SERVICE_VM_HOST_HEALTH_PATH', '/api/service-vm-host/health')
+PROBE_CONCURRENCY = int(os.getenv('PROBE_CONCURRENCY', '256'))
+PROBE_TIMEOUT = float(os.getenv('PROBE_TIMEOUT', '2'))
+PROBE_INTERVAL = float(os.getenv('PROBE_INTERVAL', '15'))
+PROBE_SUSPECT_INTERVAL = float(os.getenv('PROBE_SUSPECT_INTERVAL', '3'))
+PROBE_MAX_INTERVAL = float(os.getenv('PROBE_MAX_INTERVAL', '120'))
+PROBE_DOWN_THRESHOLD = int(os.getenv('PROBE_DOWN_THRESHOLD', '3'))
+# Intervalle de resynchronisation de la liste des hôtes depuis la base
+PROBE_HOST_REFRESH = float(os.getenv('PROBE_HOST_REFRESH', '60'))
+# Nombre de latences conservées pour les percentiles
+PROBE_LATENCY_WINDOW = 10000
+
+UP = 'up'
+SUSPECT = 'suspect'
+DOWN = 'down'
+
+
+class HostHealth:
+    __slots__ = ('ip', 'state', 'failures', 'next_probe_at', 'last_probe_at', 'last_latency', 'last_error')
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.state = UP
+        self.failures = 0
+        self.next_probe_at = 0.0
+        self.last_probe_at = None
+        self.last_latency = None
+        self.last_error = None
+
+    def to_dict(self):
+        return {
+            'ip': self.ip,
+            'state': self.state,
+            'failures': self.failures,
+            'last_probe_at': self.last_probe_at,
+            'last_latency_ms': round(self.last_latency * 1000, 2) if self.last_latency is not None else None,
+            'last_error': self.last_error,
+        }
+
+
+async def http_probe(ip: str, port: int, path: str, timeout: float) -> Tuple[bool, Optional[str]]:
+    """GET HTTP minimal sur une connexion dédiée; succès si le statut est 2xx/3xx"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {ip}:{port}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[1].isdigit():
+            return False, "réponse HTTP invalide"
+        status_code = int(parts[1])
+        if 200 <= status_code < 400:
+            return True, None
+        return False, f"statut {status_code}"
+    except asyncio.TimeoutError:
+        return False, "timeout"
+    except OSError as e:
+        return False, str(e) or e.__class__.__name__
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+class HealthMonitor:
+    def __init__(self, probe=http_probe):
+        self._probe = probe
+        self.hosts: Dict[int, HostHealth] = {}
+        # Les routes (threads) modifient la liste pendant que la boucle la parcourt
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=PROBE_LATENCY_WINDOW)
+        self._task: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+        self.probes_total = 0
+        self.probe_failures = 0
+        self.cycles = 0
+        self.last_cycle = {'hosts': 0, 'duration_ms': 0.0}
+
+    # --- Consultation par le placement ---
+
+    def is_placeable(self, cluster_id: int) -> bool:
+        """Un hôte inconnu (pas encore sondé) est considéré comme disponible"""
+        health = self.hosts.get(cluster_id)
+        return health is None or health.state == UP
+
+    def state(self, cluster_id: int) -> Optional[str]:
+        health = self.hosts.get(cluster_id)
+        return health.state if health is not None else None
+
+    # --- Suivi des hôtes ---
+
+    def _track(self, cluster_id: int, ip: str):
+        health = self.hosts.get(cluster_id)
+        if health is None:
+            self.hosts[cluster_id] = HostHealth(ip)
+        elif health.ip != ip:
+            # Nouvelle adresse: repartir d'un état neutre et sonder rapidement
+            self.hosts[cluster_id] = HostHealth(ip)
+
+    def track_host(self, cluster_id: int, ip: str):
+        with self._lock:
+            self._track(cluster_id, ip)
+
+    def forget_host(self, cluster_id: int):
+        with self._lock:
+            self.hosts.pop(cluster_id, None)
+
+    def sync_hosts(self, hosts: Dict[int, str]):
+        """Aligne les hôtes suivis sur la liste enregistrée (id -> ip)"""
+        with self._lock:
+            for cluster_id in list(self.hosts):
+                if cluster_id not in hosts:
+                    del self.hosts[cluster_id]
+            for cluster_id, ip in hosts.items():
+                self._track(cluster_id, ip)
+
+    def _snapshot(self) -> list:
+        with self._lock:
+            return list(self.hosts.items())
+
+    # --- Sondes ---
+
+    def _record(self, health: HostHealth, ok: bool, latency: float, error: Optional[str], now: float):
+        previous = health.state
+        health.last_probe_at = time.time()
+        health.last_latency = latency
+        self.probes_total += 1
+        if ok:
+            self._latencies.append(latency)
+            health.failures = 0
+            health.last_error = None
+            # Un hôte hors service repasse par l'état suspect avant d'être réintégré
+            health.state = SUSPECT if previous == DOWN else UP
+        else:
+            self.probe_failures += 1
+            health.failures += 1
+            health.last_error = error
+            health.state = DOWN if health.failures >= PROBE_DOWN_THRESHOLD else SUSPECT
+
+        if health.state == UP:
+            interval = PROBE_INTERVAL * random.uniform(0.9, 1.1)
+        elif health.state == SUSPECT:
+            interval = PROBE_SUSPECT_INTERVAL
+        else:
+            interval = min(PROBE_SUSPECT_INTERVAL * 2 ** (health.failures - PROBE_DOWN_THRESHOLD + 1),
+                           PROBE_MAX_INTERVAL)
+        health.next_probe_at = now + interval
+        if previous != health.state:
+            logger.info(f"Hôte {health.ip}: {previous} -> {health.state}" +
+                        (f" ({error})" if error else ""))
+
+    async def run_cycle(self, now: Optional[float] = None) -> int:
+        """Sonde en parallèle (borné) tous les hôtes dont la sonde est échue"""
+        now = time.monotonic() if now is None else now
+        due = [(cluster_id, health) for cluster_id, health in self._snapshot() if health.next_probe_at <= now]
+        if not due:
+            return 0
+        port = int(os.getenv('SERVICE_VM_HOST_PORT', '5003'))
+        semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+        async def probe_one(health: HostHealth):
+            async with semaphore:
+                start = time.monotonic()
+                ok, error = await self._probe(health.ip, port, SERVICE_VM_HOST_HEALTH_PATH, PROBE_TIMEOUT)
+                self._record(health, ok, time.monotonic() - start, error, time.monotonic())
+
+        start = time.monotonic()
+        await asyncio.gather(*(probe_one(health) for _, health in due))
+        self.cycles += 1
+        self.last_cycle = {'hosts': len(due), 'duration_ms': round((time.monotonic() - start) * 1000, 2)}
+        return len(due)
+
+    async def _refresh_hosts(self):
+        from database import SessionLocal
+        from models.model_cluster import ClusterEntity
+
+        def load():
+            db = SessionLocal()
+            try:
+                return {row.id: row.ip for row in db.query(ClusterEntity.id, ClusterEntity.ip).all()}
+            finally:
+                db.close()
+
+        try:
+            self.sync_hosts(await asyncio.to_thread(load))
+        except Exception as e:
+            logger.warning(f"Impossible de recharger la liste des hôtes à sonder: {e}")
+
+    async def run(self):
+        while True:
+            try:
+                if time.monotonic() - self._last_refresh >= PROBE_HOST_REFRESH:
+                    self._last_refresh = time.monotonic()
+                    await self._refresh_hosts()
+                await self.run_cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur dans la boucle de sonde: {e}")
+            next_due = min((h.next_probe_at for _, h in self._snapshot()), default=time.monotonic() + 1)
+            await asyncio.sleep(min(max(next_due - time.monotonic(), 0.05), 1.0))
+
+    def start(self):
+        if HEALTH_PROBE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self, include_hosts: bool = False) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+        hosts = self._snapshot()
+        states = {UP: 0, SUSPECT: 0, DOWN: 0}
+        for _, health in hosts:
+            states[health.state] += 1
+        result = {
+            'enabled': HEALTH_PROBE_ENABLED,
+            'hosts': len(hosts),
+            'states': states,
+            'probes_total': self.probes_total,
+            'probe_failures': self.probe_failures,
+            'cycles': self.cycles,
+            'last_cycle': self.last_cycle,
+            'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                           'max': round(latencies[-1] * 1000, 2) if latencies else None},
+        }
+        if include_hosts:
+            result['host_states'] = {cluster_id: h.to_dict() for cluster_id, h in hosts}
+        else:
+            result['unhealthy_hosts'] = {cluster_id: h.to_dict() for cluster_id, h in hosts if h.state != UP}
+        return result
+
+
+# Instance partagée par les routes
+health_monitor = HealthMonitor()
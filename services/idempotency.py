@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Déduplication des requêtes portant un en-tête Idempotency-Key.
+
+- Les requêtes concurrentes avec la même clé partagent un seul placement en cours;
+  il se poursuit si la première requête est abandonnée.
+- Les résultats définitifs sont conservés IDEMPOTENCY_TTL secondes, en mémoire
+  (LRU borné à IDEMPOTENCY_CACHE_SIZE entrées) et dans la table
+  idempotency_record pour survivre à un redémarrage.
+- Une clé réutilisée avec un corps de requête différent est refusée (422), une
+  clé de plus de IDEMPOTENCY_KEY_MAX_LENGTH caractères aussi (400).
+- Si la base est indisponible, la clé ne peut pas être réservée: la requête est
+  refusée (503) plutôt que placée sans garantie.
+
+Seuls les résultats qu'un nouvel essai ne doit pas rejouer sont conservés: VM
+créée, ou délai dépassé côté hôte (la VM a pu être créée). Les erreurs
+transitoires (429, aucun hôte, échec de tous les hôtes) peuvent être retentées
+avec la même clé.
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))
+# Au-delà de ce délai, une réservation 'in_progress' orpheline peut être reprise
+IDEMPOTENCY_STALE_AFTER = float(os.getenv('IDEMPOTENCY_STALE_AFTER', '1800'))
+# Codes statusCode (corps de réponse) conservés pour être rejoués
+IDEMPOTENCY_CACHED_STATUSES = {200, 201, 202, 504}
+# Longueur de la colonne idempotency_record.key
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Résultat normalisé: (statut HTTP, corps JSON, en-têtes)
+Result = Tuple[int, dict, Dict[str, str]]
+
+
+def fingerprint(payload: str) -> str:
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow().replace(microsecond=0)
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_CACHE_SIZE,
+                 persist: bool = True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist = persist
+        self._lock = threading.Lock()
+        # clé -> (expiration monotone, empreinte, résultat)
+        self._cache: "OrderedDict[str, Tuple[float, str, Result]]" = OrderedDict()
+        # clé -> (empreinte, tâche partagée)
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.stats_counters = {'executed': 0, 'replayed': 0, 'joined': 0, 'conflicts': 0, 'mismatches': 0,
+                               'interrupted': 0, 'unavailable': 0}
+
+    # --- Cache mémoire ---
+
+    def _get_cached(self, key: str) -> Optional[Tuple[str, Result]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1], entry[2]
+
+    def _put_cached(self, key: str, request_hash: str, result: Result, ttl: Optional[float] = None):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), request_hash, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    # --- Persistance ---
+
+    def _load(self, key: str):
+        from database import SessionLocal
+        from models.model_idempotency import IdempotencyRecordEntity
+        db = SessionLocal()
+        try:
+            record = db.query(IdempotencyRecordEntity).filter(IdempotencyRecordEntity.key == key).first()
+            if record is None:
+                return None
+            if record.expires_at <= _utcnow():
+                db.delete(record)
+                db.commit()
+                return None
+            return {
+                'request_hash': record.request_hash,
+                'status': record.status,
+                'http_status': record.http_status,
+                'response': record.response,
+                'created_at': record.created_at,
+                'expires_at': record.expires_at,
+            }
+        finally:
+            db.close()
+
+    def _claim(self, key: str, request_hash: str) -> bool:
+        """Réserve la clé en base; reprend une réservation orpheline trop ancienne"""
+        from database import SessionLocal
+        from models.model_idempotency import IdempotencyRecordEntity
+        db = SessionLocal()
+        try:
+            now = _utcnow()
+            record = db.query(IdempotencyRecordEntity).filter(IdempotencyRecordEntity.key == key).first()
+            if record is not None:
+                stale = record.status == 'in_progress' and record.created_at is not None and \
+                    (now - record.created_at).total_seconds() > IDEMPOTENCY_STALE_AFTER
+                if not (stale or record.expires_at <= now):
+                    return False
+                db.delete(record)
+                db.flush()
+            db.add(IdempotencyRecordEntity(
+                key=key,
+                request_hash=request_hash,
+                status='in_progress',
+                created_at=now,
+                expires_at=now + datetime.timedelta(seconds=self.ttl)
+            ))
+            db.commit()
+            return True
+        except IntegrityError as e:
+            # Violation d'unicité: une autre instance a réservé la clé entre-temps
+            db.rollback()
+            logger.warning(f"Réservation de la clé d'idempotence '{key}' impossible: {e}")
+            return False
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _complete(self, key: str, result: Optional[Result]):
+        """Enregistre le résultat définitif, ou libère la clé si le résultat n'est pas conservé"""
+        from database import SessionLocal
+        from models.model_idempotency import IdempotencyRecordEntity
+        db = SessionLocal()
+        try:
+            record = db.query(IdempotencyRecordEntity).filter(IdempotencyRecordEntity.key == key).first()
+            if record is None:
+                return
+            if result is None:
+                db.delete(record)
+            else:
+                record.status = 'completed'
+                record.http_status = result[0]
+                record.response = json.dumps(result[1])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erreur lors de l'enregistrement de la clé d'idempotence '{key}': {e}")
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        from database import SessionLocal
+        from models.model_idempotency import IdempotencyRecordEntity
+        db = SessionLocal()
+        try:
+            deleted = db.query(IdempotencyRecordEntity).filter(
+                IdempotencyRecordEntity.expires_at <= _utcnow()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    # --- Exécution ---
+
+    @staticmethod
+    def is_cacheable(result: Result) -> bool:
+        http_status, content, _ = result
+        return http_status < 300 and content.get('statusCode') in IDEMPOTENCY_CACHED_STATUSES
+
+    def _mismatch(self) -> Result:
+        self.stats_counters['mismatches'] += 1
+        return 422, {"statusCode": 422, "data": None,
+                     "message": "Clé d'idempotence déjà utilisée avec une requête différente"}, {}
+
+    async def execute(self, key: str, request_hash: str, producer: Callable[[], Awaitable[Result]]) -> Tuple[Result, bool]:
+        """Exécute producer une seule fois par clé; retourne (résultat, rejoué)"""
+        cached = self._get_cached(key)
+        if cached is not None:
+            if cached[0] != request_hash:
+                return self._mismatch(), False
+            self.stats_counters['replayed'] += 1
+            return cached[1], True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            if inflight[0] != request_hash:
+                return self._mismatch(), False
+            self.stats_counters['joined'] += 1
+            result, _ = await self._join(inflight[1])
+            return result, True
+
+        # Le placement tourne dans sa propre tâche, enregistrée avant tout await: les requêtes concurrentes
+        # s'y joignent, et l'abandon de la première requête (client déconnecté) ne l'interrompt pas
+        task = asyncio.ensure_future(self._execute_once(key, request_hash, producer))
+        self._inflight[key] = (request_hash, task)
+        task.add_done_callback(lambda _: self._finished(key, task))
+        return await self._join(task)
+
+    def _finished(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Éviter l'avertissement "exception never retrieved" si plus personne n'attendait
+            task.exception()
+
+    async def _join(self, task: asyncio.Future) -> Tuple[Result, bool]:
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                # C'est cette requête qui est annulée, pas le placement partagé
+                raise
+            return self._interrupted(), False
+
+    def _interrupted(self) -> Result:
+        self.stats_counters['interrupted'] += 1
+        return 503, {"statusCode": 503, "data": None,
+                     "message": "Le placement associé à cette clé d'idempotence a été interrompu, réessayez"}, \
+            {"Retry-After": "1"}
+
+    def _unavailable(self) -> Result:
+        self.stats_counters['unavailable'] += 1
+        return 503, {"statusCode": 503, "data": None,
+                     "message": "Stockage des clés d'idempotence indisponible, réessayez"}, \
+            {"Retry-After": "5"}
+
+    async def _execute_once(self, key: str, request_hash: str, producer) -> Tuple[Result, bool]:
+        if self.persist:
+            try:
+                record = await asyncio.to_thread(self._load, key)
+            except SQLAlchemyError as e:
+                logger.error(f"Lecture de la clé d'idempotence '{key}' impossible: {e}")
+                return self._unavailable(), False
+            if record is not None and record['request_hash'] != request_hash:
+                return self._mismatch(), False
+            if record is not None and record['status'] == 'completed':
+                result = (record['http_status'], json.loads(record['response']), {})
+                remaining = (record['expires_at'] - _utcnow()).total_seconds()
+                self._put_cached(key, request_hash, result, ttl=remaining)
+                self.stats_counters['replayed'] += 1
+                return result, True
+            try:
+                claimed = await asyncio.to_thread(self._claim, key, request_hash)
+            except SQLAlchemyError as e:
+                # Sans réservation, placer quand même risquerait un doublon
+                logger.error(f"Réservation de la clé d'idempotence '{key}' impossible: {e}")
+                return self._unavailable(), False
+            if not claimed:
+                self.stats_counters['conflicts'] += 1
+                return (409, {"statusCode": 409, "data": None,
+                              "message": "Une requête avec cette clé d'idempotence est déjà en cours"},
+                        {"Retry-After": "5"}), False
+
+        self.stats_counters['executed'] += 1
+        try:
+            result = await producer()
+        except BaseException:
+            if self.persist:
+                await asyncio.to_thread(self._complete, key, None)
+            raise
+        cacheable = self.is_cacheable(result)
+        if cacheable:
+            self._put_cached(key, request_hash, result)
+        if self.persist:
+            await asyncio.to_thread(self._complete, key, result if cacheable else None)
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._cache)
+        return dict(self.stats_counters, cached=cached, inflight=len(self._inflight),
+                    max_entries=self.max_entries, ttl_s=self.ttl)
+
+
+# Instance partagée par les routes
+idempotency_store = IdempotencyStore()
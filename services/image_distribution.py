@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""Pré-distribution des rootfs d'images système vers les hôtes.
+
+L'image est découpée en chunks adressés par leur contenu (sha256) et poussée
+vers les hôtes en éventail à débit limité. Un hôte ayant terminé devient à son
+tour une source : les hôtes suivants reçoivent l'ordre de récupérer les chunks
+chez ce pair plutôt que depuis l'origine, ce qui évite la tempête de
+téléchargements au premier démarrage. La progression par hôte est persistée
+dans la table image_staging.
+
+Protocole attendu côté service-vm-host (voir scripts/fake_vm_host.py):
+- GET  /images/{image_id}/chunks                    -> {"chunks": [digest, ...]}
+- PUT  /images/{image_id}/chunks/{digest}           corps = octets du chunk
+- GET  /images/{image_id}/chunks/{digest}           -> octets du chunk (service aux pairs)
+- POST /images/{image_id}/chunks/{digest}/fetch     {"source_url": ...}
+- POST /images/{image_id}/manifest                  manifeste -> assemblage du rootfs
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from services.image_locality import image_locality
+from services.vm_host_client import vm_host_url
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CHUNK_DIR = os.getenv('IMAGE_CHUNK_DIR', os.path.join('data', 'chunks'))
+# Seul répertoire d'où les rootfs peuvent être distribués
+IMAGE_ROOTFS_DIR = os.getenv('IMAGE_ROOTFS_DIR', os.path.join('data', 'images'))
+IMAGE_CHUNK_SIZE = int(os.getenv('IMAGE_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# Nombre maximal d'hôtes en cours de transfert
+STAGING_MAX_CONCURRENCY = int(os.getenv('STAGING_MAX_CONCURRENCY', '8'))
+# Nombre d'hôtes alimentés simultanément par l'origine / par chaque pair
+STAGING_ORIGIN_SLOTS = int(os.getenv('STAGING_ORIGIN_SLOTS', '2'))
+STAGING_PEER_SLOTS = int(os.getenv('STAGING_PEER_SLOTS', '2'))
+# Débit maximal sortant de l'origine en octets/s (0 = illimité)
+STAGING_ORIGIN_BANDWIDTH = int(os.getenv('STAGING_ORIGIN_BANDWIDTH', '0'))
+STAGING_REQUEST_TIMEOUT = float(os.getenv('STAGING_REQUEST_TIMEOUT', '60'))
+STAGING_MAX_ATTEMPTS = int(os.getenv('STAGING_MAX_ATTEMPTS', '3'))
+# Intervalle minimal entre deux écritures de progression en base
+STAGING_PROGRESS_INTERVAL = 1.0
+
+
+def resolve_source(source_path: str, root: str = IMAGE_ROOTFS_DIR) -> str:
+    """Chemin réel du rootfs, relatif à IMAGE_ROOTFS_DIR; ValueError s'il en sort (.., lien symbolique)"""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, source_path))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"Le rootfs doit se trouver dans {IMAGE_ROOTFS_DIR}")
+    return path
+
+
+class ChunkStore:
+    """Stockage local des chunks adressés par contenu et des manifestes"""
+
+    def __init__(self, root: str = IMAGE_CHUNK_DIR, chunk_size: int = IMAGE_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def manifest_path(self, image_id: int) -> str:
+        return os.path.join(self.root, 'manifests', f"{image_id}.json")
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(self.chunk_path(digest))
+
+    def read(self, digest: str) -> bytes:
+        with open(self.chunk_path(digest), 'rb') as f:
+            return f.read()
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def import_image(self, image_id: int, source_path: str) -> dict:
+        """Découpe l'image en chunks (dédupliqués) et enregistre son manifeste"""
+        chunks = []
+        image_hash = hashlib.sha256()
+        size = 0
+        with open(source_path, 'rb') as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                digest = hashlib.sha256(data).hexdigest()
+                if not self.has(digest):
+                    self._write(self.chunk_path(digest), data)
+                image_hash.update(data)
+                chunks.append({'digest': digest, 'size': len(data)})
+                size += len(data)
+        manifest = {
+            'system_image_id': image_id,
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'digest': image_hash.hexdigest(),
+            'chunks': chunks,
+        }
+        self._write(self.manifest_path(image_id), json.dumps(manifest).encode())
+        return manifest
+
+    def load_manifest(self, image_id: int) -> Optional[dict]:
+        try:
+            with open(self.manifest_path(image_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class TokenBucket:
+    """Limiteur de débit asynchrone (seau à jetons autorisant une dette)"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: int):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            await asyncio.sleep(wait)
+
+
+def _load_hosts(cluster_ids: Optional[List[int]]) -> List[dict]:
+    from database import SessionLocal
+    from models.model_cluster import ClusterEntity
+    db = SessionLocal()
+    try:
+        query = db.query(ClusterEntity.id, ClusterEntity.ip)
+        if cluster_ids:
+            query = query.filter(ClusterEntity.id.in_(cluster_ids))
+        return [{'id': row.id, 'ip': row.ip} for row in query.all()]
+    finally:
+        db.close()
+
+
+def _done_hosts(image_id: int) -> set:
+    from database import SessionLocal
+    from models.model_staging import ImageStagingEntity
+    db = SessionLocal()
+    try:
+        rows = db.query(ImageStagingEntity.cluster_id).filter(
+            ImageStagingEntity.system_image_id == image_id,
+            ImageStagingEntity.status == 'done'
+        ).all()
+        return {row.cluster_id for row in rows}
+    finally:
+        db.close()
+
+
+def save_progress(image_id: int, cluster_id: int, **fields):
+    """Crée ou met à jour la ligne de progression d'un hôte"""
+    from database import SessionLocal
+    from models.model_staging import ImageStagingEntity
+    db = SessionLocal()
+    try:
+        row = db.query(ImageStagingEntity).filter(
+            ImageStagingEntity.system_image_id == image_id,
+            ImageStagingEntity.cluster_id == cluster_id
+        ).first()
+        if row is None:
+            row = ImageStagingEntity(system_image_id=image_id, cluster_id=cluster_id)
+            db.add(row)
+        for key, value in fields.items():
+            setattr(row, key, value)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erreur lors de l'enregistrement de la progression ({image_id}, {cluster_id}): {e}")
+    finally:
+        db.close()
+
+
+def _list_host_chunks(host: dict, image_id: int) -> set:
+    try:
+        response = requests.get(vm_host_url(host['ip'], f"/images/{image_id}/chunks"),
+                                timeout=STAGING_REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            return set(response.json().get('chunks', []))
+    except Exception as e:
+        logger.warning(f"Impossible de lister les chunks de l'hôte {host['id']}: {e}")
+    return set()
+
+
+def _push_chunk(host: dict, image_id: int, digest: str, data: bytes):
+    response = requests.put(
+        vm_host_url(host['ip'], f"/images/{image_id}/chunks/{digest}"),
+        data=data,
+        headers={"Content-Type": "application/octet-stream"},
+        timeout=STAGING_REQUEST_TIMEOUT
+    )
+    if response.status_code not in [200, 201, 204]:
+        raise RuntimeError(f"Envoi du chunk {digest[:12]} refusé: {response.status_code} - {response.text}")
+
+
+def _fetch_from_peer(host: dict, peer: dict, image_id: int, digest: str) -> bool:
+    try:
+        response = requests.post(
+            vm_host_url(host['ip'], f"/images/{image_id}/chunks/{digest}/fetch"),
+            json={"source_url": vm_host_url(peer['ip'], f"/images/{image_id}/chunks/{digest}")},
+            timeout=STAGING_REQUEST_TIMEOUT
+        )
+        return response.status_code in [200, 201, 204]
+    except Exception as e:
+        logger.warning(f"Récupération du chunk {digest[:12]} depuis le pair {peer['id']} échouée: {e}")
+        return False
+
+
+def _post_manifest(host: dict, manifest: dict):
+    response = requests.post(
+        vm_host_url(host['ip'], f"/images/{manifest['system_image_id']}/manifest"),
+        json=manifest,
+        timeout=STAGING_REQUEST_TIMEOUT
+    )
+    if response.status_code not in [200, 201, 204]:
+        raise RuntimeError(f"Assemblage refusé: {response.status_code} - {response.text}")
+
+
+class ImageDistributor:
+    """Orchestration de la distribution d'une image vers un ensemble d'hôtes"""
+
+    def __init__(self, store: Optional[ChunkStore] = None):
+        self.store = store or ChunkStore()
+        self.jobs: Dict[int, dict] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def is_running(self, image_id: int) -> bool:
+        task = self._tasks.get(image_id)
+        return task is not None and not task.done()
+
+    def start(self, image_id: int, source_path: str, cluster_ids: Optional[List[int]] = None) -> asyncio.Task:
+        """Lance la distribution en tâche de fond (à appeler depuis la boucle d'événements)"""
+        source_path = resolve_source(source_path)
+        task = asyncio.create_task(self.stage_image(image_id, source_path, cluster_ids))
+        self._tasks[image_id] = task
+        return task
+
+    def job_status(self, image_id: int) -> Optional[dict]:
+        job = self.jobs.get(image_id)
+        if job is None:
+            return None
+        return dict(job, running=self.is_running(image_id))
+
+    async def stage_image(self, image_id: int, source_path: str, cluster_ids: Optional[List[int]] = None) -> dict:
+        job = {
+            'system_image_id': image_id,
+            'started_at': time.time(),
+            'finished_at': None,
+            'hosts': 0,
+            'done': 0,
+            'failed': 0,
+            'origin_bytes': 0,
+            'peer_bytes': 0,
+        }
+        self.jobs[image_id] = job
+        try:
+            manifest = await asyncio.to_thread(self.store.import_image, image_id, source_path)
+            hosts = await asyncio.to_thread(_load_hosts, cluster_ids)
+            already_done = await asyncio.to_thread(_done_hosts, image_id)
+        except Exception as e:
+            logger.error(f"Impossible de préparer la distribution de l'image {image_id}: {e}")
+            job['error'] = str(e)
+            job['finished_at'] = time.time()
+            return job
+
+        job['hosts'] = len(hosts)
+        job['chunks'] = len(manifest['chunks'])
+        seeds = [h for h in hosts if h['id'] in already_done]
+        job['done'] = len(seeds)
+        pending = deque(h for h in hosts if h['id'] not in already_done)
+        for host in pending:
+            await asyncio.to_thread(save_progress, image_id, host['id'], status='pending',
+                                    chunks_total=len(manifest['chunks']), chunks_done=0, bytes_done=0, error=None)
+
+        bucket = TokenBucket(STAGING_ORIGIN_BANDWIDTH)
+        attempts: Dict[int, int] = {}
+        peer_busy: Dict[int, int] = {}
+        origin_busy = 0
+        active: Dict[asyncio.Task, Tuple[dict, Optional[dict]]] = {}
+
+        while pending or active:
+            while pending and len(active) < STAGING_MAX_CONCURRENCY:
+                # Préférer un pair disposant d'un créneau libre, sinon l'origine
+                peer = min((s for s in seeds if peer_busy.get(s['id'], 0) < STAGING_PEER_SLOTS),
+                           key=lambda s: peer_busy.get(s['id'], 0), default=None)
+                if peer is not None:
+                    peer_busy[peer['id']] = peer_busy.get(peer['id'], 0) + 1
+                elif origin_busy < STAGING_ORIGIN_SLOTS:
+                    origin_busy += 1
+                else:
+                    break
+                host = pending.popleft()
+                task = asyncio.create_task(self._transfer(host, peer, manifest, bucket, job))
+                active[task] = (host, peer)
+
+            done, _ = await asyncio.wait(active, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                host, peer = active.pop(task)
+                if peer is not None:
+                    peer_busy[peer['id']] -= 1
+                else:
+                    origin_busy -= 1
+                error = task.exception()
+                if error is None:
+                    seeds.append(host)
+                    job['done'] += 1
+                    image_locality.add_image(host['id'], image_id)
+                    continue
+                attempts[host['id']] = attempts.get(host['id'], 0) + 1
+                logger.warning(f"Distribution de l'image {image_id} vers l'hôte {host['id']} échouée "
+                               f"(tentative {attempts[host['id']]}): {error}")
+                if attempts[host['id']] < STAGING_MAX_ATTEMPTS:
+                    pending.append(host)
+                else:
+                    job['failed'] += 1
+                    await asyncio.to_thread(save_progress, image_id, host['id'], status='failed', error=str(error))
+
+        job['finished_at'] = time.time()
+        logger.info(f"Distribution de l'image {image_id} terminée: {job['done']}/{job['hosts']} hôtes, "
+                    f"{job['failed']} échecs")
+        return job
+
+    async def _transfer(self, host: dict, peer: Optional[dict], manifest: dict, bucket: TokenBucket, job: dict):
+        image_id = manifest['system_image_id']
+        source = f"peer:{peer['id']}" if peer is not None else 'origin'
+        present = await asyncio.to_thread(_list_host_chunks, host, image_id)
+
+        # Un chunk présent plusieurs fois dans l'image n'est transféré qu'une fois
+        sizes = {}
+        per_digest = {}
+        for chunk in manifest['chunks']:
+            sizes[chunk['digest']] = chunk['size']
+            per_digest[chunk['digest']] = per_digest.get(chunk['digest'], 0) + 1
+        missing = [digest for digest in sizes if digest not in present]
+        chunks_done = sum(per_digest[digest] for digest in sizes if digest in present)
+        bytes_done = sum(sizes[digest] * per_digest[digest] for digest in sizes if digest in present)
+        await asyncio.to_thread(save_progress, image_id, host['id'], status='staging', source=source,
+                                chunks_done=chunks_done, bytes_done=bytes_done, error=None)
+
+        last_save = time.monotonic()
+        for digest in missing:
+            fetched = False
+            if peer is not None:
+                fetched = await asyncio.to_thread(_fetch_from_peer, host, peer, image_id, digest)
+                if fetched:
+                    job['peer_bytes'] += sizes[digest]
+            if not fetched:
+                data = await asyncio.to_thread(self.store.read, digest)
+                await bucket.acquire(len(data))
+                await asyncio.to_thread(_push_chunk, host, image_id, digest, data)
+                job['origin_bytes'] += len(data)
+            chunks_done += per_digest[digest]
+            bytes_done += sizes[digest] * per_digest[digest]
+            if time.monotonic() - last_save >= STAGING_PROGRESS_INTERVAL:
+                last_save = time.monotonic()
+                await asyncio.to_thread(save_progress, image_id, host['id'],
+                                        chunks_done=chunks_done, bytes_done=bytes_done)
+
+        await asyncio.to_thread(_post_manifest, host, manifest)
+        await asyncio.to_thread(save_progress, image_id, host['id'], status='done',
+                                chunks_done=len(manifest['chunks']), bytes_done=manifest['size'])
+
+
+# Instance partagée par les routes
+image_distributor = ImageDistributor()
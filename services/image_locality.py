@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Index en mémoire des images système présentes dans le cache de chaque hôte.
+
+Les hôtes rapportent la liste de leurs images en cache à chaque enregistrement
+(heartbeat via POST /api/service-clusters/). L'index est reconstruit
+naturellement après un redémarrage au fil des heartbeats suivants.
+"""
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class ImageLocalityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts_by_image: Dict[int, Set[int]] = defaultdict(set)
+        self._images_by_host: Dict[int, FrozenSet[int]] = {}
+        self._placements = 0
+        self._warm_hits = 0
+        self._listeners: List[Callable[[int], None]] = []
+
+    def on_change(self, listener: Callable[[int], None]):
+        """Observateur appelé avec l'id de l'hôte dont la liste d'images en cache a changé"""
+        self._listeners.append(listener)
+        return listener
+
+    def _changed(self, cluster_id: int):
+        for listener in self._listeners:
+            try:
+                listener(cluster_id)
+            except Exception as e:
+                logger.error(f"Erreur dans l'observateur de localité {listener}: {e}")
+
+    def update_host(self, cluster_id: int, image_ids: Iterable[int]):
+        """Remplace la liste des images en cache rapportée par un hôte"""
+        new_images = frozenset(image_ids)
+        with self._lock:
+            old_images = self._images_by_host.get(cluster_id, frozenset())
+            for image_id in old_images - new_images:
+                hosts = self._hosts_by_image.get(image_id)
+                if hosts is not None:
+                    hosts.discard(cluster_id)
+                    if not hosts:
+                        del self._hosts_by_image[image_id]
+            for image_id in new_images - old_images:
+                self._hosts_by_image[image_id].add(cluster_id)
+            self._images_by_host[cluster_id] = new_images
+        if new_images != old_images:
+            self._changed(cluster_id)
+
+    def add_image(self, cluster_id: int, image_id: int):
+        with self._lock:
+            images = self._images_by_host.get(cluster_id, frozenset())
+            self._hosts_by_image[image_id].add(cluster_id)
+            self._images_by_host[cluster_id] = images | {image_id}
+        if image_id not in images:
+            self._changed(cluster_id)
+
+    def remove_host(self, cluster_id: int):
+        self.update_host(cluster_id, ())
+        with self._lock:
+            self._images_by_host.pop(cluster_id, None)
+
+    def hosts_with_image(self, image_id: int) -> FrozenSet[int]:
+        with self._lock:
+            return frozenset(self._hosts_by_image.get(image_id, ()))
+
+    def has_image(self, cluster_id: int, image_id: Optional[int]) -> bool:
+        if image_id is None:
+            return False
+        with self._lock:
+            return cluster_id in self._hosts_by_image.get(image_id, ())
+
+    def record_placement(self, cluster_id: int, image_id: Optional[int]) -> bool:
+        """Comptabilise un placement et indique s'il a touché un cache chaud"""
+        warm = self.has_image(cluster_id, image_id)
+        with self._lock:
+            self._placements += 1
+            if warm:
+                self._warm_hits += 1
+        return warm
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "placements": self._placements,
+                "warm_hits": self._warm_hits,
+                "warm_hit_ratio": round(self._warm_hits / self._placements, 4) if self._placements else 0.0,
+                "tracked_hosts": len(self._images_by_host),
+                "hosts_by_image": {image_id: len(hosts) for image_id, hosts in self._hosts_by_image.items()},
+            }
+
+
+# Instance partagée par les routes
+image_locality = ImageLocalityIndex()
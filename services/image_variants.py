@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Génération des variantes (miniature, carte, WebP) des images système.
+
+Les variantes sont calculées dans un pool de processus pour ne bloquer ni la
+boucle d'événements ni les threads de requêtes, puis stockées dans un
+répertoire de cache à côté de l'image originale. La taille totale du cache est
+bornée : les variantes les moins récemment servies sont évincées en premier et
+régénérées à la demande.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Définition des variantes: taille maximale (None = taille d'origine), format et qualité
+VARIANTS = {
+    'thumbnail': {'size': (128, 128), 'format': 'PNG', 'ext': 'png'},
+    'card': {'size': (480, 270), 'format': 'JPEG', 'ext': 'jpg', 'quality': 85},
+    'webp': {'size': None, 'format': 'WEBP', 'ext': 'webp', 'quality': 80},
+}
+MEDIA_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+VARIANT_CACHE_DIRNAME = 'variants'
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+IMAGE_VARIANT_CACHE_MAX_BYTES = int(os.getenv('IMAGE_VARIANT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Nouvelles tentatives de lecture d'une variante évincée pendant qu'on la sert
+VARIANT_READ_ATTEMPTS = 3
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_eviction_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Retourne le pool de processus partagé (créé à la première utilisation)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS)
+        return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def variant_path(image_path: str, variant: str) -> str:
+    """Chemin de la variante dans le répertoire de cache voisin de l'original"""
+    spec = VARIANTS[variant]
+    directory, filename = os.path.split(image_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, VARIANT_CACHE_DIRNAME, f"{stem}.{variant}.{spec['ext']}")
+
+
+def render_variant(image_path: str, variant: str) -> str:
+    """Redimensionne et ré-encode une image (exécuté dans un processus du pool)"""
+    spec = VARIANTS[variant]
+    dest = variant_path(image_path, variant)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with Image.open(image_path) as img:
+        img.load()
+        if spec['format'] == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA')
+        if spec['size']:
+            img.thumbnail(spec['size'], Image.LANCZOS)
+        options = {}
+        if 'quality' in spec:
+            options['quality'] = spec['quality']
+        # Écrire dans un fichier temporaire puis renommer pour ne jamais servir une variante partielle
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        img.save(tmp, spec['format'], **options)
+    os.replace(tmp, dest)
+    return dest
+
+
+def _on_variant_done(future: Future):
+    if future.exception() is not None:
+        logger.error(f"Erreur lors de la génération d'une variante: {future.exception()}")
+        return
+    evict_cache(os.path.dirname(future.result()))
+
+
+def schedule_variants(image_path: str, variants: Optional[List[str]] = None) -> Dict[str, Future]:
+    """Soumet la génération des variantes au pool et retourne les futures par variante"""
+    futures = {}
+    for variant in variants or VARIANTS:
+        future = get_executor().submit(render_variant, image_path, variant)
+        future.add_done_callback(_on_variant_done)
+        futures[variant] = future
+    return futures
+
+
+async def generate_variants(image_path: str, variants: Optional[List[str]] = None) -> Dict[str, str]:
+    """Version asynchrone: attend les variantes sans bloquer la boucle d'événements"""
+    futures = schedule_variants(image_path, variants)
+    results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures.values()))
+    return dict(zip(futures.keys(), results))
+
+
+def get_variant(image_path: str, variant: str, timeout: float = 30) -> str:
+    """Retourne le chemin d'une variante, en la régénérant si elle a été évincée"""
+    if variant not in VARIANTS:
+        raise ValueError(f"Variante inconnue: {variant}")
+    path = variant_path(image_path, variant)
+    if not os.path.exists(path):
+        path = schedule_variants(image_path, [variant])[variant].result(timeout=timeout)
+    try:
+        # Marquer la variante comme récemment servie pour l'éviction LRU
+        os.utime(path)
+    except FileNotFoundError:
+        # Évincée entre la vérification et la mise à jour: régénérer
+        path = schedule_variants(image_path, [variant])[variant].result(timeout=timeout)
+    except OSError:
+        pass
+    return path
+
+
+def read_variant(image_path: str, variant: str, timeout: float = 30) -> bytes:
+    """Contenu d'une variante; régénérée si l'éviction la supprime entre la recherche et la lecture"""
+    for _ in range(VARIANT_READ_ATTEMPTS):
+        path = get_variant(image_path, variant, timeout)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(f"Variante {variant} de {image_path} évincée avant lecture")
+
+
+def delete_variants(image_path: str):
+    for variant in VARIANTS:
+        path = variant_path(image_path, variant)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def evict_cache(cache_dir: str, max_bytes: Optional[int] = None) -> int:
+    """Évince les variantes les moins récemment utilisées jusqu'à repasser sous la borne.
+
+    Retourne le nombre d'octets libérés.
+    """
+    max_bytes = IMAGE_VARIANT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _eviction_lock:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(cache_dir) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except FileNotFoundError:
+            return 0
+        freed = 0
+        if total <= max_bytes:
+            return 0
+        entries.sort()
+        for _, size, path in entries:
+            if total - freed <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+        logger.info(f"Cache des variantes: {freed} octets évincés dans {cache_dir}")
+        return freed
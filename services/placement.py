@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Classement des hôtes candidats pour le placement d'une VM."""
+import os
+from typing import List, Optional
+
+from services.health_monitor import health_monitor
+from services.image_locality import image_locality
+
+# Bonus de score accordé aux hôtes ayant déjà l'image système en cache
+IMAGE_LOCALITY_BONUS = float(os.getenv('PLACEMENT_IMAGE_LOCALITY_BONUS', '0.25'))
+# Politique de classement par défaut (voir POLICIES)
+PLACEMENT_POLICY = os.getenv('PLACEMENT_POLICY', 'pack')
+
+
+def _ratio(available, total) -> float:
+    return available / total if total else 0.0
+
+
+def load_score(host) -> float:
+    """Moyenne des ratios de ressources disponibles (plus bas = hôte plus rempli)"""
+    return (_ratio(host.available_rom, host.rom) +
+            _ratio(host.available_ram, host.ram) +
+            (host.available_processor or 0) / 100) / 3
+
+
+def dominant_score(host) -> float:
+    """Ratio disponible de la ressource la plus rare de l'hôte"""
+    return min(_ratio(host.available_rom, host.rom), _ratio(host.available_ram, host.ram),
+               (host.available_processor or 0) / 100)
+
+
+# Score de charge par politique (plus bas = classé en premier)
+POLICIES = {
+    'pack': load_score,  # hôtes les plus remplis d'abord (comportement historique)
+    'spread': lambda host: -load_score(host),  # hôtes les moins remplis d'abord
+    'dominant': dominant_score,  # hôtes dont la ressource la plus rare est la plus entamée d'abord
+}
+
+
+def rank_hosts(hosts, vm_requirements, locality=None, health=None, policy: Optional[str] = None) -> List:
+    """Trie les hôtes candidats du plus approprié au moins approprié.
+
+    Les hôtes que la sonde de santé ne considère pas comme disponibles sont
+    écartés. Le score de charge de la politique (PLACEMENT_POLICY par défaut) est minoré du bonus de localité lorsque l'hôte
+    possède déjà l'image système demandée, afin d'éviter le téléchargement du rootfs.
+    """
+    locality = image_locality if locality is None else locality
+    health = health_monitor if health is None else health
+    image_id = vm_requirements.system_image_id
+    policy_score = POLICIES[policy or PLACEMENT_POLICY]
+    return sorted((host for host in hosts if health.is_placeable(host.id)),
+                  key=lambda host: host_score(host, image_id, locality, policy_score))
+
+
+def host_score(host, image_id: Optional[int], locality=None, policy_score=None) -> float:
+    """Score d'un hôte seul (plus bas = classé en premier): charge selon la politique, moins le bonus de localité"""
+    locality = image_locality if locality is None else locality
+    value = (policy_score or POLICIES[PLACEMENT_POLICY])(host)
+    if locality.has_image(host.id, image_id):
+        value -= IMAGE_LOCALITY_BONUS
+    return value
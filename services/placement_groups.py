@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Groupes de placement: affinité, anti-affinité et répartition souple.
+
+- affinity      : toutes les VM du groupe dans le même domaine (hôte, rack ou zone)
+                  que les membres existants; la première VM choisit le domaine.
+- anti_affinity : au plus une VM du groupe par domaine.
+- soft_spread   : domaines les moins occupés par le groupe d'abord, sans exclusion.
+
+Le nombre de VM de chaque groupe par hôte, par domaine et par zone est indexé en
+mémoire (construit depuis vm_allocation au premier usage, puis mis à jour à chaque
+réservation et à chaque libération): la vérification des contraintes ne fait
+aucune requête SQL et ne parcourt pas les membres du groupe. L'appartenance est prise sous verrou au moment de la
+réservation (claim) pour que deux placements concurrents ne violent pas une
+contrainte stricte.
+"""
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from services.allocation_ledger import allocation_ledger, ALLOCATED_STATES
+from services.cluster_hooks import on_cluster_change
+from services.zone_index import zone_index
+
+POLICIES = ('affinity', 'anti_affinity', 'soft_spread')
+SCOPES = ('host', 'rack', 'zone')
+
+
+class PlacementGroup:
+    __slots__ = ('id', 'name', 'policy', 'scope', 'user_id', 'members', 'domains', 'zones')
+
+    def __init__(self, id: int, name: str, policy: str, scope: str = 'host', user_id: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.policy = policy
+        self.scope = scope
+        self.user_id = user_id
+        self.members: Counter = Counter()  # hôte -> nombre de VM du groupe
+        self.domains: Counter = Counter()  # domaine (hôte, rack ou zone) -> nombre de VM du groupe
+        self.zones: Counter = Counter()  # zone -> nombre de VM du groupe
+
+    def add(self, cluster_id: int, count: int = 1, zones=None):
+        zones = zone_index if zones is None else zones
+        for counter, key in ((self.members, cluster_id), (self.domains, domain_of(self.scope, cluster_id, zones)),
+                             (self.zones, zones.zone_of(cluster_id))):
+            counter[key] += count
+            if counter[key] <= 0:
+                del counter[key]
+
+    def recount(self, zones=None):
+        """Recalcule les domaines après le déplacement ou la suppression d'un hôte membre"""
+        members = self.members
+        self.members, self.domains, self.zones = Counter(), Counter(), Counter()
+        for cluster_id, count in members.items():
+            self.add(cluster_id, count, zones)
+
+    def size(self) -> int:
+        return sum(self.members.values())
+
+    def to_dict(self, include_members: bool = False) -> dict:
+        data = {'id': self.id, 'name': self.name, 'policy': self.policy, 'scope': self.scope,
+                'user_id': self.user_id, 'size': self.size(), 'hosts': len(self.members),
+                'domains': len(self.domains)}
+        if include_members:
+            data['members'] = dict(self.members)
+        return data
+
+
+def domain_of(scope: str, cluster_id: int, zones=zone_index):
+    if scope == 'zone':
+        return zones.zone_of(cluster_id)
+    if scope == 'rack':
+        return zones.zone_of(cluster_id), zones.rack_of(cluster_id)
+    return cluster_id
+
+
+class GroupConstraint:
+    """Contrainte d'un groupe pour un placement; lit les compteurs du groupe sans les copier.
+
+    Le filtrage est indicatif: la décision définitive est prise par claim() sous verrou.
+    """
+
+    def __init__(self, group: PlacementGroup, zones=None):
+        self.group = group
+        self.zones = zone_index if zones is None else zones
+
+    def domain(self, cluster_id: int):
+        return domain_of(self.group.scope, cluster_id, self.zones)
+
+    def allows_zone(self, zone: str) -> bool:
+        """Permet de sauter une zone entière sans requête"""
+        group = self.group
+        if group.policy == 'affinity' and group.zones:
+            return zone in group.zones
+        if group.policy == 'anti_affinity' and group.scope == 'zone':
+            return group.domains.get(zone, 0) == 0
+        return True
+
+    def allows(self, cluster_id: int) -> bool:
+        group = self.group
+        if group.policy == 'affinity':
+            return not group.domains or self.domain(cluster_id) in group.domains
+        if group.policy == 'anti_affinity':
+            return group.domains.get(self.domain(cluster_id), 0) == 0
+        return True
+
+    def apply(self, hosts: List) -> List:
+        """Filtre (contraintes strictes) puis trie de façon stable (répartition souple)"""
+        if self.group.policy == 'soft_spread':
+            domains = self.group.domains
+            return sorted(hosts, key=lambda host: domains.get(self.domain(host.id), 0))
+        return [host for host in hosts if self.allows(host.id)]
+
+
+class PlacementGroupIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.initialized = False
+        self._by_name: Dict[str, PlacementGroup] = {}
+        self._by_id: Dict[int, PlacementGroup] = {}
+        self.conflicts = 0
+
+    # --- Chargement et maintenance ---
+
+    def rebuild(self, groups: Iterable[dict], memberships: Iterable[tuple]):
+        """groups: dictionnaires de groupe; memberships: (groupe, hôte, nombre de VM)"""
+        by_id = {}
+        for data in groups:
+            by_id[data['id']] = PlacementGroup(data['id'], data['name'], data['policy'], data.get('scope') or 'host',
+                                               data.get('user_id'))
+        for group_id, cluster_id, count in memberships:
+            if group_id in by_id:
+                by_id[group_id].add(cluster_id, count)
+        with self._lock:
+            self._by_id = by_id
+            self._by_name = {group.name: group for group in by_id.values()}
+            self.initialized = True
+
+    def ensure(self, db):
+        if self.initialized:
+            return
+        # Les domaines (rack, zone) des membres viennent de l'index des zones
+        zone_index.ensure(db)
+        from sqlalchemy import func
+        from models.model_allocation import VMAllocationEntity
+        from models.model_placement_group import PlacementGroupEntity
+        groups = [group.to_dict() for group in db.query(PlacementGroupEntity).all()]
+        memberships = db.query(
+            VMAllocationEntity.placement_group_id, VMAllocationEntity.cluster_id, func.count(VMAllocationEntity.id)
+        ).filter(
+            VMAllocationEntity.placement_group_id.isnot(None),
+            VMAllocationEntity.state.in_(ALLOCATED_STATES)
+        ).group_by(VMAllocationEntity.placement_group_id, VMAllocationEntity.cluster_id).all()
+        self.rebuild(groups, memberships)
+
+    def add_group(self, data: dict) -> PlacementGroup:
+        group = PlacementGroup(data['id'], data['name'], data['policy'], data.get('scope') or 'host',
+                               data.get('user_id'))
+        with self._lock:
+            self._by_id[group.id] = group
+            self._by_name[group.name] = group
+        return group
+
+    def remove_group(self, group_id: int):
+        with self._lock:
+            group = self._by_id.pop(group_id, None)
+            if group is not None:
+                self._by_name.pop(group.name, None)
+
+    def on_allocation(self, allocation: dict, sign: int):
+        """Observateur du registre: une VM du groupe commence ou cesse d'occuper un hôte"""
+        group_id = allocation.get('placement_group_id')
+        if group_id is None:
+            return
+        with self._lock:
+            group = self._by_id.get(group_id)
+            if group is not None:
+                group.add(allocation['cluster_id'], sign)
+
+    def on_cluster_change(self, before: Optional[dict], after: Optional[dict]):
+        """Hôte supprimé: ses VM quittent les groupes; hôte déplacé: domaines recalculés"""
+        if before is None:
+            return
+        cluster_id = before['id']
+        with self._lock:
+            for group in self._by_id.values():
+                if cluster_id not in group.members:
+                    continue
+                if after is None:
+                    del group.members[cluster_id]
+                    group.recount()
+                elif (before.get('zone'), before.get('rack')) != (after.get('zone'), after.get('rack')):
+                    group.recount()
+
+    # --- Placement ---
+
+    def get(self, name: str) -> Optional[PlacementGroup]:
+        return self._by_name.get(name)
+
+    def get_by_id(self, group_id: int) -> Optional[PlacementGroup]:
+        return self._by_id.get(group_id)
+
+    def constraint(self, group: PlacementGroup) -> GroupConstraint:
+        return GroupConstraint(group)
+
+    def claim(self, group: PlacementGroup, cluster_id: int) -> bool:
+        """Vérifie la contrainte et compte la VM sur l'hôte de façon atomique"""
+        with self._lock:
+            if not GroupConstraint(group).allows(cluster_id):
+                self.conflicts += 1
+                return False
+            group.add(cluster_id)
+            return True
+
+    def unclaim(self, group: PlacementGroup, cluster_id: int):
+        with self._lock:
+            group.add(cluster_id, -1)
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [group.to_dict() for group in self._by_id.values()]
+
+
+# Instance partagée par les routes
+placement_groups = PlacementGroupIndex()
+allocation_ledger.on_transition(placement_groups.on_allocation)
+on_cluster_change(placement_groups.on_cluster_change)
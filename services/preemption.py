@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Candidats à la préemption quand aucun hôte ne peut accueillir une demande.
+
+Pour une demande de classe de priorité P sans hôte disponible, chaque hôte
+des zones demandées (sain, compatible, assez grand une fois vidé) est évalué:
+quelles VM actives de classe strictement inférieure à P faudrait-il arrêter
+pour que la demande y tienne ? Sur chaque hôte, les classes sont ouvertes
+une à une en partant de la plus basse: une seule VM si elle suffit (la plus
+petite), sinon celles qui couvrent le plus le déficit restant, puis les VM
+devenues inutiles sont retirées de l'ensemble.
+
+L'ensemble retenu est le moins coûteux, dans l'ordre: classe la plus haute
+touchée, nombre de VM, puis mémoire arrêtée. Les VM réservées ou d'état
+inconnu, les membres d'un groupe de placement et les VM du pool préchauffé
+(WARM_POOL_USER) ne sont jamais proposés.
+
+Le résultat n'est qu'une suggestion jointe à la réponse 404: aucune VM n'est
+arrêtée par le service.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from services.allocation_ledger import ALLOCATED_STATES, allocation_ledger
+from services.capabilities import capabilities
+from services.capacity_model import capacity_model
+from services.health_monitor import health_monitor
+from services.warm_pool import WARM_POOL_USER
+from services.priority_classes import priority_classes
+from services.rebalancer import HostState, _vm_resources
+
+logger = logging.getLogger(__name__)
+
+PREEMPTION_ENABLED = os.getenv('PREEMPTION_ENABLED', 'true').lower() == 'true'
+
+
+class PreemptionPlanner:
+    def __init__(self, enabled: bool = PREEMPTION_ENABLED, model=None, classes=None, is_placeable=None):
+        self.enabled = enabled
+        self.model = capacity_model if model is None else model
+        self.classes = priority_classes if classes is None else classes
+        self.is_placeable = health_monitor.is_placeable if is_placeable is None else is_placeable
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _fits(self, state: HostState, target: tuple) -> bool:
+        return self.model.fits(state.host, state.allocated, *target)
+
+    def _remaining(self, state: HostState, target: tuple) -> tuple:
+        free = self.model.free(state.host, state.allocated)
+        return (max(0, target[0] - free['vcpus']), max(0, target[1] - free['memory_mib']),
+                max(0, target[2] - free['disk_gb']))
+
+    def _evict(self, state: HostState, vm: dict, sign: int = -1):
+        state.add(*_vm_resources(vm), sign=sign)
+
+    def _select(self, state: HostState, target: tuple, allowed: List[dict]) -> Optional[List[dict]]:
+        """VM à arrêter parmi allowed pour que la cible tienne sur l'hôte; None si impossible (copie restaurée)"""
+        need = [value or 1 for value in target]
+        deficit = self._remaining(state, target)
+        # Une seule VM couvrant tout le déficit: la plus petite en mémoire
+        for vm in sorted((vm for vm in allowed if all(r >= d for r, d in zip(_vm_resources(vm), deficit))),
+                         key=lambda vm: (vm['memory_size_mib'], vm['cpu_count']))[:3]:
+            self._evict(state, vm)
+            fits = self._fits(state, target)
+            self._evict(state, vm, 1)
+            if fits:
+                return [vm]
+        # Sinon, tour à tour la VM qui couvre le plus le déficit restant (la moins prioritaire à couverture égale)
+        chosen = []
+        remaining = list(allowed)
+        while remaining and not self._fits(state, target):
+            left = self._remaining(state, target)
+            vm = min(remaining, key=lambda vm: (
+                -sum(min(r, d) / n for r, d, n in zip(_vm_resources(vm), left, need)),
+                self.classes.value(vm['priority']), vm['memory_size_mib']))
+            remaining.remove(vm)
+            if not any(min(r, d) for r, d in zip(_vm_resources(vm), left)):
+                break
+            self._evict(state, vm)
+            chosen.append(vm)
+        fits = self._fits(state, target)
+        if fits:
+            # Retirer les VM devenues inutiles, les plus prioritaires d'abord
+            for vm in sorted(chosen, key=lambda vm: -self.classes.value(vm['priority'])):
+                self._evict(state, vm, 1)
+                if self._fits(state, target):
+                    chosen.remove(vm)
+                else:
+                    self._evict(state, vm)
+        for vm in chosen:
+            self._evict(state, vm, 1)
+        return chosen if fits else None
+
+    def _host_victims(self, state: HostState, target: tuple, victims: List[dict]) -> Optional[tuple]:
+        """(coût, VM à arrêter) le moins coûteux sur l'hôte, classes ouvertes de la plus basse à la plus haute"""
+        levels = sorted({self.classes.value(vm['priority']) for vm in victims})
+        for level in levels:
+            allowed = [vm for vm in victims if self.classes.value(vm['priority']) <= level]
+            chosen = self._select(state, target, allowed)
+            if chosen is not None:
+                cost = (max(self.classes.value(vm['priority']) for vm in chosen), len(chosen),
+                        sum(vm['memory_size_mib'] for vm in chosen))
+                return cost, chosen
+        return None
+
+    def candidates(self, db, vm_requirements, zones: List[str], eligible: Optional[int] = None) -> Optional[dict]:
+        """Ensemble de VM moins prioritaires le moins coûteux à arrêter pour placer la demande; None si aucun"""
+        if not self.enabled:
+            return None
+        from models.model_allocation import VMAllocationEntity
+        from models.model_cluster import ClusterEntity
+        priority = self.classes.resolve(vm_requirements.priority) or self.classes.default
+        value = self.classes.value(priority)
+        target = (vm_requirements.cpu_count, vm_requirements.memory_size_mib, vm_requirements.disk_size_gb)
+        with self._lock:
+            self.counters[priority]['evaluations'] += 1
+        if not any(other < value for other in self.classes.classes.values()) or not zones:
+            return self._record(priority, None)
+
+        states = {}
+        for cluster in db.query(ClusterEntity).filter(ClusterEntity.zone.in_(zones)).all():
+            host = cluster.to_dict()
+            if not self.is_placeable(host['id']) or not capabilities.contains(eligible, host['id']):
+                continue
+            # Hôte trop petit même vidé, ou CPU déclaré saturé: aucune préemption n'y suffirait
+            capacity = self.model.capacity(host)
+            if target[0] > min(host['number_of_core'], capacity['vcpus']) or target[1] > capacity['memory_mib'] \
+                    or target[2] > capacity['disk_gb'] \
+                    or (host['available_processor'] or 0) < self.model.min_cpu_idle:
+                continue
+            state = HostState(host)
+            state.allocated = allocation_ledger.allocated(host['id'])
+            states[host['id']] = state
+        if not states:
+            return self._record(priority, None)
+
+        victims: Dict[int, List[dict]] = defaultdict(list)
+        for allocation in db.query(VMAllocationEntity).filter(
+                VMAllocationEntity.cluster_id.in_(list(states)),
+                VMAllocationEntity.state.in_(ALLOCATED_STATES)).all():
+            vm = allocation.to_dict()
+            # Les VM préchauffées ne sont pas des victimes: le pool les réclame ou les libère lui-même
+            if vm['state'] == 'active' and vm['vm_id'] and not vm['placement_group_id'] \
+                    and vm['user_id'] != WARM_POOL_USER and self.classes.value(vm['priority']) < value:
+                victims[vm['cluster_id']].append(vm)
+
+        rank = {zone: index for index, zone in enumerate(zones)}
+        best = None
+        for cluster_id, host_victims in victims.items():
+            state = states[cluster_id]
+            found = self._host_victims(state, target, host_victims)
+            if found is None:
+                continue
+            key = (found[0], rank.get(state.host.get('zone'), len(rank)), cluster_id)
+            if best is None or key < best[0]:
+                best = (key, state, found[1])
+        if best is None:
+            return self._record(priority, None)
+        _key, state, chosen = best
+        freed = [sum(values) for values in zip(*(_vm_resources(vm) for vm in chosen))]
+        return self._record(priority, {
+            'priority': priority,
+            'cluster_id': state.id,
+            'nom': state.host.get('nom'),
+            'zone': state.host.get('zone'),
+            'victims': [{
+                'allocation_id': vm['id'],
+                'vm_id': vm['vm_id'],
+                'vm_name': vm['vm_name'],
+                'user_id': vm['user_id'],
+                'priority': vm['priority'] or self.classes.default,
+                'cpu_count': vm['cpu_count'],
+                'memory_size_mib': vm['memory_size_mib'],
+                'disk_size_gb': vm['disk_size_gb'],
+            } for vm in chosen],
+            'freed': {'vcpus': freed[0], 'memory_mib': freed[1], 'disk_gb': freed[2]},
+            'highest_victim_priority': max((vm['priority'] or self.classes.default for vm in chosen),
+                                           key=self.classes.value),
+        })
+
+    def _record(self, priority: str, result: Optional[dict]) -> Optional[dict]:
+        with self._lock:
+            self.counters[priority]['found' if result is not None else 'not_found'] += 1
+        if result is not None:
+            logger.info(f"Préemption possible pour une demande {priority}: {len(result['victims'])} VM sur "
+                        f"l'hôte {result['cluster_id']}")
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'enabled': self.enabled, 'by_class': {name: dict(counts) for name, counts in self.counters.items()}}
+
+
+# Instance partagée par le placement
+preemption_planner = PreemptionPlanner()
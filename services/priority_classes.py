@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Classes de priorité des demandes de VM.
+
+Chaque classe a un nom et une valeur entière: la file d'admission sert les
+classes de plus grande valeur d'abord, et une VM ne peut être proposée à la
+préemption que pour une demande de classe strictement supérieure. Les classes
+se configurent par PRIORITY_CLASSES, ex: "critical:1000,production:100,dev:0".
+Une demande sans classe reçoit PRIORITY_DEFAULT_CLASS; une allocation
+enregistrée sans classe (antérieure aux classes) aussi.
+"""
+import logging
+import os
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = os.getenv('PRIORITY_CLASSES', 'critical:1000,production:100,standard:50,dev:0')
+PRIORITY_DEFAULT_CLASS = os.getenv('PRIORITY_DEFAULT_CLASS', 'standard')
+
+
+def parse_classes(value: str) -> Dict[str, int]:
+    classes = {}
+    for item in value.split(','):
+        if ':' in item:
+            name, priority = item.rsplit(':', 1)
+            classes[name.strip()] = int(priority)
+    return classes
+
+
+class PriorityClasses:
+    def __init__(self, classes: Optional[Dict[str, int]] = None, default: str = PRIORITY_DEFAULT_CLASS):
+        self.classes = parse_classes(PRIORITY_CLASSES) if classes is None else classes
+        if default not in self.classes:
+            logger.error(f"Classe de priorité par défaut inconnue: {default}, classe la plus basse utilisée")
+            default = min(self.classes, key=self.classes.get)
+        self.default = default
+
+    def resolve(self, name: Optional[str]) -> Optional[str]:
+        """Nom de classe effectif; None si la classe demandée n'existe pas"""
+        if not name:
+            return self.default
+        return name if name in self.classes else None
+
+    def value(self, name: Optional[str]) -> int:
+        """Valeur de priorité d'une classe (classe par défaut si absente ou inconnue)"""
+        return self.classes.get(name or self.default, self.classes[self.default])
+
+    def names(self) -> List[str]:
+        """Classes par priorité décroissante"""
+        return sorted(self.classes, key=lambda name: -self.classes[name])
+
+
+# Instance partagée par l'admission, le registre et la préemption
+priority_classes = PriorityClasses()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""Planification de migrations pour défragmenter la capacité libre.
+
+Après des semaines de créations et de suppressions, la capacité libre est
+éparpillée: la flotte a assez de vCPU et de mémoire au total pour une grosse
+VM, mais aucun hôte ne peut l'accueillir. Le planificateur part des hôtes
+(capacités déclarées) et des allocations du registre, et cherche le plus
+petit ensemble de migrations qui libère, pour chaque taille cible, le nombre
+d'emplacements demandé.
+
+Déroulement, sur une copie en mémoire de la flotte:
+1. les emplacements déjà libres sont réservés, taille cible la plus grosse
+   d'abord;
+2. pour chaque emplacement manquant, les hôtes les plus proches de pouvoir
+   accueillir la cible (plus petit déficit) sont évalués: VM à déplacer les
+   moins nombreuses possibles (une seule si elle suffit, sinon celles qui
+   couvrent le plus le déficit), chacune vers l'hôte de même architecture
+   où elle laisse le moins de place perdue (best fit, pour ne pas
+   fragmenter ailleurs);
+3. le meilleur hôte (moins de migrations, puis moins de mémoire déplacée)
+   est retenu, ses migrations appliquées à la copie et l'emplacement réservé.
+
+Le problème exact est un problème de bin packing (NP-difficile): le résultat
+est une heuristique gloutonne. Chaque emplacement ajoute au plan une suite
+de migrations exécutable telle quelle; si le budget de temps est épuisé, le
+plan partiel reste donc valable (complete=false).
+
+Ne sont jamais déplacées: les allocations réservées ou d'état inconnu, les
+VM sans identifiant, les membres d'un groupe de placement (contraintes
+d'affinité) et les VM préchauffées (le pool les réclame sur leur hôte
+d'origine). Le plan n'est qu'une suggestion: aucune migration n'est
+exécutée.
+"""
+import datetime
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from services.allocation_ledger import ALLOCATED_STATES, Allocated
+from services.capacity_model import capacity_model as default_capacity_model
+from services.warm_pool import WARM_POOL_USER
+
+logger = logging.getLogger(__name__)
+
+# Budget de temps par défaut et maximal d'une planification (secondes)
+REBALANCE_TIME_BUDGET = float(os.getenv('REBALANCE_TIME_BUDGET', '2'))
+REBALANCE_MAX_TIME_BUDGET = float(os.getenv('REBALANCE_MAX_TIME_BUDGET', '30'))
+# Hôtes évalués pour chaque emplacement manquant (les plus proches d'accueillir la cible)
+REBALANCE_MAX_CANDIDATES = int(os.getenv('REBALANCE_MAX_CANDIDATES', '32'))
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+class HostState:
+    """Hôte de la copie de travail: valeurs déclarées ajustées au fil des migrations simulées"""
+    __slots__ = ('id', 'host', 'allocated', 'vms', 'reserved', 'version')
+
+    def __init__(self, host: dict):
+        self.id = host['id']
+        self.host = dict(host)
+        self.allocated = Allocated()
+        self.vms: Dict[int, dict] = {}  # allocations déplaçables, par id
+        self.reserved = 0  # emplacements cibles réservés sur l'hôte
+        self.version = 0  # incrémentée à chaque changement, pour le cache des déficits
+
+    def add(self, cpu_count: int, memory_size_mib: int, disk_size_gb: int, sign: int = 1):
+        self.allocated.add(cpu_count, memory_size_mib, disk_size_gb, sign)
+        self.version += 1
+        # L'usage déclaré suit les VM déplacées (mémoire en GB et disque dans les unités de ClusterEntity)
+        self.host['available_ram'] -= sign * memory_size_mib / 1024
+        self.host['available_rom'] -= sign * disk_size_gb
+
+
+def _vm_resources(vm: dict) -> tuple:
+    return vm['cpu_count'], vm['memory_size_mib'], vm['disk_size_gb']
+
+
+class RebalancePlanner:
+    def __init__(self, hosts: List[dict], allocations: List[dict], model=None, is_placeable=None):
+        self.model = default_capacity_model if model is None else model
+        self.is_placeable = is_placeable or (lambda cluster_id: True)
+        self.hosts: Dict[int, HostState] = {host['id']: HostState(host) for host in hosts}
+        self.pinned = 0
+        for allocation in allocations:
+            state = self.hosts.get(allocation['cluster_id'])
+            if state is None or allocation['state'] not in ALLOCATED_STATES:
+                continue
+            state.allocated.add(*_vm_resources(allocation))
+            if allocation['state'] == 'active' and allocation.get('vm_id') and not allocation.get('placement_group_id') \
+                    and allocation['user_id'] != WARM_POOL_USER:
+                state.vms[allocation['id']] = allocation
+            else:
+                self.pinned += 1
+        self.by_arch: Dict[Optional[str], List[HostState]] = {}
+        for state in self.hosts.values():
+            self.by_arch.setdefault(state.host.get('architecture'), []).append(state)
+        self.moved = set()
+        self._reservations: List[tuple] = []
+        self._deficits: Dict[tuple, Dict[int, tuple]] = {}  # cible -> id -> (version, score, déficit)
+        self.deadline = float('inf')
+        self.exhausted = False
+
+    # --- Capacité ---
+
+    def _fits(self, state: HostState, cpu_count: int, memory_size_mib: int, disk_size_gb: int) -> bool:
+        return self.model.fits(state.host, state.allocated, cpu_count, memory_size_mib, disk_size_gb)
+
+    def slots(self, state: HostState, target: tuple) -> int:
+        """Nombre de VM de la taille cible que l'hôte peut encore accueillir"""
+        cpu_count, memory_size_mib, disk_size_gb = target
+        if not self._fits(state, cpu_count, memory_size_mib, disk_size_gb):
+            return 0
+        free = self.model.free(state.host, state.allocated)
+        return min(free['vcpus'] // cpu_count if cpu_count else free['vcpus'],
+                   free['memory_mib'] // memory_size_mib if memory_size_mib else free['memory_mib'],
+                   free['disk_gb'] // disk_size_gb if disk_size_gb else free['disk_gb'])
+
+    def fragmentation(self, target: tuple) -> dict:
+        """Emplacements libres pour la cible et part de la mémoire libre inutilisable pour elle"""
+        slots = stranded = free_total = 0
+        for state in self.hosts.values():
+            free = self.model.free(state.host, state.allocated)['memory_mib']
+            if free <= 0:
+                continue
+            free_total += free
+            host_slots = self.slots(state, target)
+            slots += host_slots
+            if not host_slots:
+                stranded += free
+        return {'slots': slots, 'free_memory_mib': free_total,
+                'stranded_ratio': round(stranded / free_total, 4) if free_total else 0.0}
+
+    # --- Migrations simulées ---
+
+    def _check_budget(self):
+        if time.monotonic() > self.deadline:
+            raise BudgetExhausted()
+
+    def _move(self, vm: dict, source: HostState, destination: HostState):
+        resources = _vm_resources(vm)
+        source.add(*resources, sign=-1)
+        destination.add(*resources)
+        del source.vms[vm['id']]
+        destination.vms[vm['id']] = vm
+
+    def _destination(self, vm: dict, source: HostState) -> Optional[HostState]:
+        """Hôte de même architecture où la VM laisse le moins de mémoire libre (best fit)"""
+        cpu_count, memory_size_mib, disk_size_gb = _vm_resources(vm)
+        best = None
+        best_left = None
+        for index, state in enumerate(self.by_arch.get(source.host.get('architecture'), ())):
+            if index % 256 == 0:
+                self._check_budget()
+            if state is source or not self.is_placeable(state.id):
+                continue
+            if not self._fits(state, cpu_count, memory_size_mib, disk_size_gb):
+                continue
+            left = self.model.free(state.host, state.allocated)['memory_mib'] - memory_size_mib
+            if best is None or left < best_left:
+                best, best_left = state, left
+                if left == 0:
+                    break
+        return best
+
+    def _deficit(self, state: HostState, target: tuple) -> Optional[tuple]:
+        """Ressources à libérer sur l'hôte pour la cible; None si l'hôte ne peut pas l'accueillir même vidé"""
+        cpu_count, memory_size_mib, disk_size_gb = target
+        if cpu_count > state.host['number_of_core'] or \
+                (state.host['available_processor'] or 0) < self.model.min_cpu_idle:
+            return None
+        capacity = self.model.capacity(state.host)
+        if capacity['vcpus'] < cpu_count * (state.reserved + 1) or \
+                capacity['memory_mib'] < memory_size_mib * (state.reserved + 1) or \
+                capacity['disk_gb'] < disk_size_gb * (state.reserved + 1):
+            return None
+        free = self.model.free(state.host, state.allocated)
+        deficit = (max(0, cpu_count - free['vcpus']), max(0, memory_size_mib - free['memory_mib']),
+                   max(0, disk_size_gb - free['disk_gb']))
+        movable = [sum(resources) for resources in zip(*(_vm_resources(vm) for vm in state.vms.values()
+                                                          if vm['id'] not in self.moved))] or [0, 0, 0]
+        if any(need > available for need, available in zip(deficit, movable)):
+            return None
+        return deficit
+
+    def _remaining(self, state: HostState, target: tuple) -> tuple:
+        free = self.model.free(state.host, state.allocated)
+        return (max(0, target[0] - free['vcpus']), max(0, target[1] - free['memory_mib']),
+                max(0, target[2] - free['disk_gb']))
+
+    def _try_free(self, state: HostState, target: tuple, deficit: tuple) -> Optional[List[tuple]]:
+        """Déplace (sur la copie) des VM de l'hôte jusqu'à ce que la cible y tienne; migrations effectuées ou None
+        (copie restaurée)"""
+        need = [value or 1 for value in target]
+        candidates = [vm for vm in state.vms.values() if vm['id'] not in self.moved]
+        moves = []
+        try:
+            # Une seule VM couvrant tout le déficit: la plus petite en mémoire
+            single = sorted((vm for vm in candidates if all(r >= d for r, d in zip(_vm_resources(vm), deficit))),
+                            key=lambda vm: (vm['memory_size_mib'], vm['cpu_count']))
+            for vm in single[:3]:
+                destination = self._destination(vm, state)
+                if destination is None:
+                    continue
+                self._move(vm, state, destination)
+                if self._fits(state, *target):
+                    return [(vm, state, destination)]
+                self._move(vm, destination, state)
+            # Sinon, tour à tour la VM qui couvre le plus le déficit restant (la plus petite à couverture égale)
+            remaining = list(candidates)
+            while remaining and not self._fits(state, *target):
+                left = self._remaining(state, target)
+                vm = min(remaining, key=lambda vm: (
+                    -sum(min(r, d) / n for r, d, n in zip(_vm_resources(vm), left, need)), vm['memory_size_mib']))
+                remaining.remove(vm)
+                if not any(min(r, d) for r, d in zip(_vm_resources(vm), left)):
+                    break
+                destination = self._destination(vm, state)
+                if destination is not None:
+                    self._move(vm, state, destination)
+                    moves.append((vm, state, destination))
+        except BudgetExhausted:
+            self._undo(moves)
+            raise
+        if not self._fits(state, *target):
+            self._undo(moves)
+            return None
+        # Retirer les migrations devenues inutiles (la cible tient sans elles)
+        for move in list(moves):
+            vm, source, destination = move
+            if not self._fits(source, *_vm_resources(vm)):
+                continue
+            self._move(vm, destination, source)
+            if self._fits(state, *target):
+                moves.remove(move)
+            else:
+                self._move(vm, source, destination)
+        return moves
+
+    def _undo(self, moves: List[tuple]):
+        for vm, source, destination in reversed(moves):
+            self._move(vm, destination, source)
+
+    def _free_slot(self, target: tuple) -> Optional[tuple]:
+        """Meilleur hôte à défragmenter pour un emplacement; (hôte, migrations) appliquées à la copie"""
+        weights = [value or 1 for value in target]
+        cache = self._deficits.setdefault(target, {})
+        scored = []
+        for state in self.hosts.values():
+            if not self.is_placeable(state.id):
+                continue
+            # Seuls les hôtes modifiés depuis le dernier emplacement sont réévalués
+            cached = cache.get(state.id)
+            if cached is None or cached[0] != state.version:
+                deficit = self._deficit(state, target)
+                score = sum(d / w for d, w in zip(deficit, weights)) if deficit is not None else None
+                cached = cache[state.id] = (state.version, score, deficit)
+            if cached[1] is not None:
+                scored.append((cached[1], state.id, cached[2]))
+        scored.sort()
+        best = None
+        try:
+            for _score, cluster_id, deficit in scored[:REBALANCE_MAX_CANDIDATES]:
+                self._check_budget()
+                state = self.hosts[cluster_id]
+                moves = self._try_free(state, target, deficit)
+                if moves is None:
+                    continue
+                cost = (len(moves), sum(vm['memory_size_mib'] for vm, _s, _d in moves))
+                self._undo(moves)
+                if best is None or cost < best[0]:
+                    best = (cost, state, moves)
+                    if cost[0] == 1:
+                        break
+        except BudgetExhausted:
+            # Budget épuisé en cours d'évaluation: garder le meilleur hôte déjà trouvé, puis s'arrêter
+            if best is None:
+                raise
+            self.exhausted = True
+        if best is None:
+            return None
+        _cost, state, moves = best
+        for vm, source, destination in moves:
+            self._move(vm, source, destination)
+        return state, moves
+
+    def _reserve(self, state: HostState, target: tuple):
+        state.add(*target)
+        state.reserved += 1
+        self._reservations.append((state, target))
+
+    # --- Planification ---
+
+    def plan(self, targets: List[dict], budget: float = REBALANCE_TIME_BUDGET) -> dict:
+        started = time.monotonic()
+        self.deadline = started + budget
+        ordered = sorted(range(len(targets)), key=lambda i: (
+            -targets[i]['memory_size_mib'], -targets[i]['cpu_count'], -targets[i]['disk_size_gb']))
+        sizes = {i: (targets[i]['cpu_count'], targets[i]['memory_size_mib'], targets[i]['disk_size_gb'])
+                 for i in ordered}
+        reports = {i: dict(targets[i], before=self.fragmentation(sizes[i]), reserved=0) for i in ordered}
+
+        # Emplacements déjà libres, réservés pour ne pas être occupés par les VM déplacées
+        for i in ordered:
+            for state in self.hosts.values():
+                while reports[i]['reserved'] < targets[i]['count'] and self.is_placeable(state.id) \
+                        and self._fits(state, *sizes[i]):
+                    self._reserve(state, sizes[i])
+                    reports[i]['reserved'] += 1
+        migrations = []
+        freed = []
+        try:
+            for i in ordered:
+                while reports[i]['reserved'] < targets[i]['count'] and not self.exhausted:
+                    found = self._free_slot(sizes[i])
+                    if found is None:
+                        break
+                    state, moves = found
+                    for vm, source, destination in moves:
+                        self.moved.add(vm['id'])
+                        migrations.append({
+                            'step': len(migrations) + 1,
+                            'allocation_id': vm['id'],
+                            'vm_id': vm['vm_id'],
+                            'vm_name': vm['vm_name'],
+                            'user_id': vm['user_id'],
+                            'cpu_count': vm['cpu_count'],
+                            'memory_size_mib': vm['memory_size_mib'],
+                            'disk_size_gb': vm['disk_size_gb'],
+                            'from_cluster_id': source.id,
+                            'to_cluster_id': destination.id,
+                        })
+                    self._reserve(state, sizes[i])
+                    reports[i]['reserved'] += 1
+                    freed.append({'cluster_id': state.id, 'target': i, 'migrations': len(moves)})
+        except BudgetExhausted:
+            self.exhausted = True
+        exhausted = self.exhausted
+
+        # État final sans les réservations, pour mesurer le gain
+        for state, size in self._reservations:
+            state.add(*size, sign=-1)
+            state.reserved -= 1
+        self._reservations = []
+        moved = [sum(m[field] for m in migrations) for field in ('cpu_count', 'memory_size_mib', 'disk_size_gb')]
+        return {
+            'complete': not exhausted and all(reports[i]['reserved'] >= targets[i]['count'] for i in ordered),
+            'budget_exhausted': exhausted,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+            'hosts': len(self.hosts),
+            'movable_vms': sum(len(state.vms) for state in self.hosts.values()),
+            'pinned_vms': self.pinned,
+            'targets': [dict(reports[i], after=self.fragmentation(sizes[i]),
+                             satisfied=reports[i]['reserved'] >= targets[i]['count']) for i in range(len(targets))],
+            'migrations': migrations,
+            'freed_hosts': freed,
+            'moved': {'vms': len(migrations), 'vcpus': moved[0], 'memory_mib': moved[1], 'disk_gb': moved[2]},
+        }
+
+
+def load_state(db, zone: Optional[str] = None) -> tuple:
+    """Hôtes (d'une zone ou de toute la flotte) et allocations qui consomment de la capacité"""
+    from models.model_allocation import VMAllocationEntity
+    from models.model_cluster import ClusterEntity
+    query = db.query(ClusterEntity)
+    if zone is not None:
+        query = query.filter(ClusterEntity.zone == zone)
+    hosts = [host.to_dict() for host in query.all()]
+    allocations = db.query(VMAllocationEntity).filter(VMAllocationEntity.state.in_(ALLOCATED_STATES))
+    if zone is not None:
+        allocations = allocations.filter(VMAllocationEntity.cluster_id.in_([host['id'] for host in hosts]))
+    return hosts, [allocation.to_dict() for allocation in allocations.all()]
+
+
+class Rebalancer:
+    def __init__(self):
+        self.last_plan: Optional[dict] = None
+
+    def plan(self, db, targets: List[dict], budget: Optional[float] = None, zone: Optional[str] = None) -> dict:
+        """Calcule un plan de migrations sur l'état courant (suggestion seulement) et le conserve"""
+        from services.health_monitor import health_monitor
+        budget = min(REBALANCE_MAX_TIME_BUDGET, budget or REBALANCE_TIME_BUDGET)
+        hosts, allocations = load_state(db, zone)
+        planner = RebalancePlanner(hosts, allocations, is_placeable=health_monitor.is_placeable)
+        plan = planner.plan(targets, budget)
+        plan.update(zone=zone, budget_s=budget,
+                    planned_at=datetime.datetime.utcnow().replace(microsecond=0).isoformat())
+        if not plan['complete']:
+            logger.info(f"Plan de défragmentation partiel: {len(plan['migrations'])} migration(s), "
+                        f"budget épuisé: {plan['budget_exhausted']}")
+        self.last_plan = plan
+        return plan
+
+
+# Instance partagée par les routes
+rebalancer = Rebalancer()
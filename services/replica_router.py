@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Routage des lectures vers les réplicas avec prise en compte du retard.
+
+- Les sessions de lecture (RoutingSession) lisent sur un réplica choisi en
+  tourniquet parmi ceux dont le retard est inférieur à REPLICA_MAX_LAG; sans
+  réplica disponible elles lisent sur le primaire.
+- Dès qu'une session écrit (flush), elle reste épinglée au primaire jusqu'à sa
+  fermeture: une requête relit toujours ses propres écritures.
+- Les écritures et les transactions de placement utilisent SessionLocal,
+  toujours liée au primaire.
+
+Le retard est mesuré par un battement: une ligne replica_heartbeat est mise à
+jour sur le primaire toutes les REPLICA_HEARTBEAT_INTERVAL secondes, puis relue
+sur chaque réplica; le retard est l'écart entre les deux valeurs (à
+l'intervalle du battement près). Un réplica injoignable ou sans battement est
+écarté.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from itertools import count
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', '5'))
+REPLICA_HEARTBEAT_INTERVAL = float(os.getenv('REPLICA_HEARTBEAT_INTERVAL', '1'))
+HEARTBEAT_ID = 1
+
+
+class ReplicaState:
+    def __init__(self, engine):
+        self.engine = engine
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.reads = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'url': self.engine.url.render_as_string(hide_password=True),
+            'healthy': self.healthy,
+            'lag_s': None if self.lag is None else round(self.lag, 3),
+            'error': self.error,
+            'checked_at': self.checked_at,
+            'reads': self.reads,
+        }
+
+
+class ReplicaRouter:
+    def __init__(self, max_lag: float = REPLICA_MAX_LAG, heartbeat_interval: float = REPLICA_HEARTBEAT_INTERVAL):
+        self.max_lag = max_lag
+        self.heartbeat_interval = heartbeat_interval
+        self.primary = None
+        self.replicas: List[ReplicaState] = []
+        self._cursor = count()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.primary_reads = 0
+        self.fallbacks = 0
+
+    def configure(self, primary, replica_engines):
+        self.primary = primary
+        self.replicas = [ReplicaState(engine) for engine in replica_engines]
+
+    def choose(self):
+        """Moteur du prochain réplica sain, ou None pour lire sur le primaire"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        with self._lock:
+            if not healthy:
+                self.primary_reads += 1
+                if self.replicas:
+                    self.fallbacks += 1
+                return None
+            replica = healthy[next(self._cursor) % len(healthy)]
+            replica.reads += 1
+        return replica.engine
+
+    # --- Battement et mesure du retard ---
+
+    def write_heartbeat(self) -> float:
+        from models.model_replica import ReplicaHeartbeatEntity
+        now = time.time()
+        with Session(bind=self.primary) as db:
+            heartbeat = db.get(ReplicaHeartbeatEntity, HEARTBEAT_ID)
+            if heartbeat is None:
+                db.add(ReplicaHeartbeatEntity(id=HEARTBEAT_ID, written_at=now))
+            else:
+                heartbeat.written_at = now
+            db.commit()
+        return now
+
+    @staticmethod
+    def read_heartbeat(engine) -> Optional[float]:
+        from models.model_replica import ReplicaHeartbeatEntity
+        with Session(bind=engine) as db:
+            heartbeat = db.get(ReplicaHeartbeatEntity, HEARTBEAT_ID)
+            return None if heartbeat is None else heartbeat.written_at
+
+    def check(self):
+        """Écrit le battement sur le primaire puis mesure le retard de chaque réplica"""
+        try:
+            primary_value = self.write_heartbeat()
+        except Exception as e:
+            logger.error(f"Impossible d'écrire le battement sur le primaire: {e}")
+            return
+        for replica in self.replicas:
+            replica.checked_at = time.time()
+            try:
+                value = self.read_heartbeat(replica.engine)
+            except Exception as e:
+                replica.healthy, replica.lag, replica.error = False, None, str(e)
+                continue
+            replica.error = None
+            # Le battement relu date au plus de l'écriture précédente si le réplica est à jour
+            replica.lag = None if value is None else max(0.0, primary_value - value - self.heartbeat_interval)
+            was_healthy = replica.healthy
+            replica.healthy = replica.lag is not None and replica.lag <= self.max_lag
+            if was_healthy and not replica.healthy:
+                logger.warning(f"Réplica {replica.to_dict()['url']} écarté (retard {replica.lag}s)")
+
+    async def run(self):
+        while True:
+            await asyncio.to_thread(self.check)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            'replicas': [replica.to_dict() for replica in self.replicas],
+            'max_lag_s': self.max_lag,
+            'heartbeat_interval_s': self.heartbeat_interval,
+            'primary_reads': self.primary_reads,
+            'fallbacks_to_primary': self.fallbacks,
+        }
+
+
+# Instance partagée, configurée par database.py
+replica_router = ReplicaRouter()
+
+
+class RoutingSession(Session):
+    """Session de lecture: réplica tant qu'elle n'a rien écrit, primaire ensuite"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._replica = None
+        self._pinned = False
+
+    def get_bind(self, mapper=None, **kwargs):
+        if self._pinned or self._flushing or isinstance(kwargs.get('clause'), UpdateBase):
+            self._pinned = True
+            return super().get_bind(mapper, **kwargs)
+        if self._replica is None:
+            # Un seul réplica par session pour des lectures cohérentes entre elles
+            self._replica = replica_router.choose() or False
+        if self._replica is False:
+            return super().get_bind(mapper, **kwargs)
+        return self._replica
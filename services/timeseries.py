@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Séries temporelles compactes de la capacité disponible par hôte.
+
+Chaque hôte possède trois anneaux de taille fixe adossés à des array:
+- raw : les échantillons bruts (un par heartbeat / mise à jour),
+- 1m  : agrégats par minute (min, max, somme, nombre),
+- 1h  : agrégats par heure.
+Les agrégats sont alimentés au fil de l'eau à chaque échantillon: aucun
+recalcul n'est nécessaire et les anneaux écrasent simplement les plus anciens
+points. Les horodatages sont partagés entre les métriques d'un même hôte.
+
+Mémoire par hôte (valeurs par défaut, 3 métriques; valeurs, min et max en
+float32, sommes en float64 pour garder des moyennes exactes):
+  raw : 360 x (8 o horodatage + 3 x 4 o)                   =  7 200 o
+  1m  : 720 x (8 o début + 2 o nombre + 3 x (4 + 4 + 8) o) = 41 760 o
+  1h  : 720 x (8 o début + 2 o nombre + 3 x (4 + 4 + 8) o) = 41 760 o
+  soit environ 90 Ko par hôte (90 Mo pour 1000 hôtes), indépendamment du
+  nombre d'échantillons reçus. memory_per_host() donne la valeur exacte.
+
+La persistance optionnelle écrit périodiquement tous les anneaux dans un
+fichier binaire (TIMESERIES_PERSIST_PATH) relu au démarrage.
+"""
+import asyncio
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, Optional
+
+from services.cluster_hooks import on_cluster_change
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('available_ram', 'available_rom', 'available_processor')
+TIMESERIES_RAW_POINTS = int(os.getenv('TIMESERIES_RAW_POINTS', '360'))
+TIMESERIES_MINUTE_POINTS = int(os.getenv('TIMESERIES_MINUTE_POINTS', '720'))
+TIMESERIES_HOUR_POINTS = int(os.getenv('TIMESERIES_HOUR_POINTS', '720'))
+TIMESERIES_PERSIST_PATH = os.getenv('TIMESERIES_PERSIST_PATH', '')
+TIMESERIES_PERSIST_INTERVAL = float(os.getenv('TIMESERIES_PERSIST_INTERVAL', '300'))
+
+_MAGIC = b'CTS1'
+_HEADER = struct.Struct('<4sBIIII')  # magic, nb métriques, raw, 1m, 1h, nb hôtes
+_RING_STATE = struct.Struct('<II')  # tête, taille
+
+
+class RawRing:
+    def __init__(self, points: int):
+        self.points = points
+        self.ts = array('d', bytes(8 * points))
+        self.values = [array('f', bytes(4 * points)) for _ in METRICS]
+        self.head = 0
+        self.size = 0
+
+    def append(self, ts: float, values):
+        self.ts[self.head] = ts
+        for i, value in enumerate(values):
+            self.values[i][self.head] = value
+        self.head = (self.head + 1) % self.points
+        self.size = min(self.size + 1, self.points)
+
+    def iter_range(self, metric: int, start: float, end: float):
+        first = (self.head - self.size) % self.points
+        for k in range(self.size):
+            i = (first + k) % self.points
+            if start <= self.ts[i] <= end:
+                yield self.ts[i], self.values[metric][i]
+
+    def arrays(self):
+        return [self.ts] + self.values
+
+
+class BucketRing:
+    def __init__(self, points: int, width: int):
+        self.points = points
+        self.width = width
+        self.start = array('q', bytes(8 * points))
+        self.count = array('H', bytes(2 * points))
+        self.mins = [array('f', bytes(4 * points)) for _ in METRICS]
+        self.maxs = [array('f', bytes(4 * points)) for _ in METRICS]
+        self.sums = [array('d', bytes(8 * points)) for _ in METRICS]
+        self.head = 0  # index du seau courant
+        self.size = 0
+
+    def add(self, ts: float, values):
+        bucket_start = int(ts // self.width) * self.width
+        if self.size and bucket_start < self.start[self.head]:
+            return  # échantillon antérieur au seau courant: ignoré
+        if not self.size or bucket_start != self.start[self.head]:
+            if self.size:
+                self.head = (self.head + 1) % self.points
+            self.size = min(self.size + 1, self.points)
+            self.start[self.head] = bucket_start
+            self.count[self.head] = 0
+            for i, value in enumerate(values):
+                self.mins[i][self.head] = value
+                self.maxs[i][self.head] = value
+                self.sums[i][self.head] = 0.0
+        i_head = self.head
+        if self.count[i_head] < 0xFFFF:
+            self.count[i_head] += 1
+        for i, value in enumerate(values):
+            if value < self.mins[i][i_head]:
+                self.mins[i][i_head] = value
+            if value > self.maxs[i][i_head]:
+                self.maxs[i][i_head] = value
+            self.sums[i][i_head] += value
+
+    def iter_range(self, metric: int, start: float, end: float):
+        """Produit (début, min, max, moyenne, nombre) des seaux recoupant [start, end]"""
+        first = (self.head - self.size + 1) % self.points
+        for k in range(self.size):
+            i = (first + k) % self.points
+            if self.start[i] + self.width > start and self.start[i] <= end and self.count[i]:
+                yield (self.start[i], self.mins[metric][i], self.maxs[metric][i],
+                       self.sums[metric][i] / self.count[i], self.count[i])
+
+    def arrays(self):
+        return [self.start, self.count] + self.mins + self.maxs + self.sums
+
+
+class HostSeries:
+    def __init__(self, raw_points: int, minute_points: int, hour_points: int):
+        self.raw = RawRing(raw_points)
+        self.minute = BucketRing(minute_points, 60)
+        self.hour = BucketRing(hour_points, 3600)
+
+    def record(self, ts: float, values):
+        self.raw.append(ts, values)
+        self.minute.add(ts, values)
+        self.hour.add(ts, values)
+
+    def rings(self):
+        return (self.raw, self.minute, self.hour)
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for ring in self.rings() for a in ring.arrays())
+
+
+class TimeSeriesStore:
+    def __init__(self, raw_points: int = TIMESERIES_RAW_POINTS, minute_points: int = TIMESERIES_MINUTE_POINTS,
+                 hour_points: int = TIMESERIES_HOUR_POINTS):
+        self.raw_points = raw_points
+        self.minute_points = minute_points
+        self.hour_points = hour_points
+        self._lock = threading.Lock()
+        self._hosts: Dict[int, HostSeries] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def memory_per_host(self) -> int:
+        return HostSeries(self.raw_points, self.minute_points, self.hour_points).nbytes()
+
+    def record(self, cluster_id: int, values: dict, ts: Optional[float] = None):
+        ts = time.time() if ts is None else ts
+        sample = [float(values.get(metric) or 0) for metric in METRICS]
+        with self._lock:
+            series = self._hosts.get(cluster_id)
+            if series is None:
+                series = self._hosts[cluster_id] = HostSeries(self.raw_points, self.minute_points, self.hour_points)
+            series.record(ts, sample)
+
+    def drop(self, cluster_id: int):
+        with self._lock:
+            self._hosts.pop(cluster_id, None)
+
+    def on_change(self, before: Optional[dict], after: Optional[dict]):
+        if after is not None:
+            self.record(after['id'], after)
+        elif before is not None:
+            self.drop(before['id'])
+
+    def has_host(self, cluster_id: int) -> bool:
+        return cluster_id in self._hosts
+
+    def query(self, cluster_id: int, metric: str, start: float, end: float, resolution: str = 'auto') -> Optional[dict]:
+        """Points et agrégats d'une métrique sur [start, end] à la résolution demandée"""
+        metric_index = METRICS.index(metric)
+        with self._lock:
+            series = self._hosts.get(cluster_id)
+            if series is None:
+                return None
+            if resolution == 'auto':
+                resolution = self._auto_resolution(series, start)
+            if resolution == 'raw':
+                points = [{'ts': ts, 'value': round(value, 3)}
+                          for ts, value in series.raw.iter_range(metric_index, start, end)]
+                values = [p['value'] for p in points]
+                summary = {
+                    'count': len(values),
+                    'min': min(values) if values else None,
+                    'max': max(values) if values else None,
+                    'avg': round(sum(values) / len(values), 3) if values else None,
+                }
+            else:
+                ring = series.minute if resolution == '1m' else series.hour
+                buckets = list(ring.iter_range(metric_index, start, end))
+                points = [{'ts': b[0], 'min': round(b[1], 3), 'max': round(b[2], 3), 'avg': round(b[3], 3),
+                           'count': b[4]} for b in buckets]
+                total = sum(b[4] for b in buckets)
+                summary = {
+                    'count': total,
+                    'min': min(b[1] for b in buckets) if buckets else None,
+                    'max': max(b[2] for b in buckets) if buckets else None,
+                    'avg': round(sum(b[3] * b[4] for b in buckets) / total, 3) if total else None,
+                }
+        return {'cluster_id': cluster_id, 'metric': metric, 'resolution': resolution,
+                'start': start, 'end': end, 'summary': summary, 'points': points}
+
+    @staticmethod
+    def _auto_resolution(series: HostSeries, start: float) -> str:
+        """Résolution la plus fine dont l'anneau couvre encore le début de la plage"""
+        raw = series.raw
+        if raw.size and (raw.size < raw.points or raw.ts[raw.head] <= start):
+            return 'raw'
+        minute = series.minute
+        oldest = minute.start[(minute.head - minute.size + 1) % minute.points] if minute.size else None
+        if oldest is not None and (minute.size < minute.points or oldest <= start):
+            return '1m'
+        return '1h'
+
+    def stats(self) -> dict:
+        with self._lock:
+            hosts = len(self._hosts)
+        per_host = self.memory_per_host()
+        return {
+            'hosts': hosts,
+            'metrics': list(METRICS),
+            'points': {'raw': self.raw_points, '1m': self.minute_points, '1h': self.hour_points},
+            'memory_per_host_bytes': per_host,
+            'memory_total_bytes': per_host * hosts,
+        }
+
+    # --- Persistance binaire ---
+
+    def save(self, path: str = TIMESERIES_PERSIST_PATH):
+        if not path:
+            return
+        tmp = f"{path}.tmp"
+        with self._lock:
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, len(METRICS), self.raw_points, self.minute_points,
+                                     self.hour_points, len(self._hosts)))
+                for cluster_id, series in self._hosts.items():
+                    f.write(struct.pack('<q', cluster_id))
+                    for ring in series.rings():
+                        f.write(_RING_STATE.pack(ring.head, ring.size))
+                        for a in ring.arrays():
+                            a.tofile(f)
+        os.replace(tmp, path)
+
+    def load(self, path: str = TIMESERIES_PERSIST_PATH) -> int:
+        """Recharge les séries; ignore un fichier dont les dimensions ne correspondent pas"""
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            magic, n_metrics, raw, minute, hour, n_hosts = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or (n_metrics, raw, minute, hour) != (len(METRICS), self.raw_points,
+                                                                     self.minute_points, self.hour_points):
+                logger.warning(f"Fichier de séries temporelles {path} incompatible, ignoré")
+                return 0
+            hosts = {}
+            for _ in range(n_hosts):
+                (cluster_id,) = struct.unpack('<q', f.read(8))
+                series = HostSeries(raw, minute, hour)
+                for ring in series.rings():
+                    ring.head, ring.size = _RING_STATE.unpack(f.read(_RING_STATE.size))
+                    for a in ring.arrays():
+                        n = len(a)
+                        del a[:]
+                        a.fromfile(f, n)
+                hosts[cluster_id] = series
+        with self._lock:
+            self._hosts = hosts
+        return len(hosts)
+
+    async def _persist_loop(self):
+        while True:
+            await asyncio.sleep(TIMESERIES_PERSIST_INTERVAL)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                logger.error(f"Erreur lors de la sauvegarde des séries temporelles: {e}")
+
+    def start(self):
+        """Recharge le fichier de persistance et lance la sauvegarde périodique si configurée"""
+        if not TIMESERIES_PERSIST_PATH or self._task is not None:
+            return
+        try:
+            loaded = self.load()
+            logger.info(f"{loaded} séries temporelles rechargées depuis {TIMESERIES_PERSIST_PATH}")
+        except Exception as e:
+            logger.error(f"Impossible de recharger les séries temporelles: {e}")
+        self._task = asyncio.create_task(self._persist_loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self.save)
+
+
+# Instance partagée par les routes
+timeseries = TimeSeriesStore()
+on_cluster_change(timeseries.on_change)
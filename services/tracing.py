@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""Traces par requête (format Chrome / Perfetto) et profils CPU à la demande.
+
+Une requête est tracée si elle porte l'en-tête TRACING_HEADER (X-Trace) ou si
+elle est tirée au sort (TRACING_SAMPLE). Ses phases sont alors chronométrées
+par des spans imbriqués:
+- sql            : chaque ordre SQL (hook SQLAlchemy sur tous les moteurs)
+- orm.*          : requête ORM complète; l'écart avec les spans sql qu'elle
+                   contient est le temps d'hydratation des objets
+- serialize.*    : conversion en dictionnaires dans la route, puis
+                   'serialize.response' entre le retour de la route et
+                   l'envoi de la réponse (validation et rendu JSON FastAPI)
+- vm_host.*      : appels au service-vm-host
+Chaque requête tracée occupe sa propre piste (tid) et est ajoutée à
+TRACING_PATH au format « JSON Array » des traces Chrome, lisible dans
+chrome://tracing ou ui.perfetto.dev. La réponse porte l'en-tête X-Trace-Id.
+
+L'en-tête TRACING_PROFILE_HEADER (X-Profile), ou le tirage TRACING_PROFILE_SAMPLE,
+ajoute un profil cProfile de la requête, téléchargeable par l'API
+d'administration (/api/service-clusters/admin/profiles/<trace_id>). cProfile
+ne suit que le thread où il est activé: le profil couvre les fonctions
+décorées par @traced(..., profile=True), qui s'exécutent dans un thread du
+pool (placement, listes de clusters). Si TRACING_TOKEN est défini, les en-têtes
+ne sont pris en compte que si leur valeur est ce jeton.
+
+Sans trace active, un span coûte une lecture de ContextVar et retourne un
+objet inerte partagé (quelques dizaines de ns, scripts/bench_tracing.py). Les
+hooks SQL ne sont branchés qu'à la première requête tracée: tant qu'aucune
+requête n'est tracée, les ordres SQL n'ont aucun surcoût. Ensuite, le chemin
+d'exécution de SQLAlchemy avec événements coûte environ 5 µs par ordre, bien
+moins qu'un aller-retour MySQL; TRACING_SQL=false supprime les spans sql.
+"""
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from io import StringIO
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+TRACING_SAMPLE = float(os.getenv('TRACING_SAMPLE', '0'))
+TRACING_PROFILE_SAMPLE = float(os.getenv('TRACING_PROFILE_SAMPLE', '0'))
+TRACING_HEADER = os.getenv('TRACING_HEADER', 'X-Trace').lower().encode()
+TRACING_PROFILE_HEADER = os.getenv('TRACING_PROFILE_HEADER', 'X-Profile').lower().encode()
+TRACING_TOKEN = os.getenv('TRACING_TOKEN', '')
+TRACING_PATH = os.getenv('TRACING_PATH', 'data/traces.json')
+TRACING_MAX_BYTES = int(os.getenv('TRACING_MAX_BYTES', str(64 * 1024 * 1024)))
+TRACING_PROFILE_DIR = os.getenv('TRACING_PROFILE_DIR', 'data/profiles')
+TRACING_MAX_PROFILES = int(os.getenv('TRACING_MAX_PROFILES', '50'))
+TRACING_SQL = os.getenv('TRACING_SQL', 'true').lower() == 'true'
+# Longueur maximale des ordres SQL recopiés dans les traces
+TRACING_SQL_MAX_LENGTH = int(os.getenv('TRACING_SQL_MAX_LENGTH', '200'))
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+class RequestTrace:
+    __slots__ = ('trace_id', 'track', 'name', 'wall_start', 'perf_start', 'events', 'profile', 'profilers',
+                 'handler_end')
+
+    def __init__(self, trace_id: str, track: int, name: str, profile: bool):
+        self.trace_id = trace_id
+        self.track = track
+        self.name = name
+        self.wall_start = time.time()
+        self.perf_start = time.perf_counter()
+        self.events: List[tuple] = []  # (nom, catégorie, début, fin, arguments)
+        self.profile = profile
+        self.profilers: List[cProfile.Profile] = []
+        self.handler_end: Optional[float] = None
+
+    def add(self, name: str, category: str, start: float, end: float, args: Optional[dict] = None):
+        self.events.append((name, category, start, end, args))
+
+    def chrome_events(self, pid: int) -> List[dict]:
+        def ts(t: float) -> float:
+            return round((self.wall_start + t - self.perf_start) * 1e6, 1)
+
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': self.track,
+                   'args': {'name': f"{self.name} [{self.trace_id}]"}}]
+        for name, category, start, end, args in self.events:
+            event_ = {'name': name, 'cat': category, 'ph': 'X', 'ts': ts(start),
+                      'dur': round((end - start) * 1e6, 1), 'pid': pid, 'tid': self.track}
+            if args:
+                event_['args'] = args
+            events.append(event_)
+        return events
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar('request_trace', default=None)
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'category', 'args', 'start')
+
+    def __init__(self, trace: RequestTrace, name: str, category: str, args: dict):
+        self.trace = trace
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.trace.add(self.name, self.category, self.start, time.perf_counter(), self.args)
+        return False
+
+    def set(self, **args):
+        self.args = dict(self.args or {}, **args)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, category: str = 'app', **args):
+    """Chronomètre un bloc dans la trace de la requête courante (inerte si la requête n'est pas tracée)"""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, category, args)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+class _ProfileSegment:
+    """Active cProfile dans le thread courant pendant un appel décoré"""
+    __slots__ = ('trace', 'profiler')
+
+    _active = threading.local()
+
+    def __init__(self, trace: RequestTrace):
+        self.trace = trace
+        self.profiler = None
+
+    def __enter__(self):
+        # Un seul profileur par thread: un appel décoré imbriqué est couvert par le premier
+        if not getattr(self._active, 'on', False):
+            self._active.on = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self._active.on = False
+            self.trace.profilers.append(self.profiler)
+        return False
+
+
+def traced(name: str, category: str = 'app', profile: bool = False):
+    """Décorateur: span autour de la fonction, profil CPU si la requête le demande (fonctions synchrones).
+
+    Utilisé sur une route, il marque aussi la fin du traitement pour mesurer
+    la sérialisation de la réponse par FastAPI."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                trace = _current.get()
+                if trace is None:
+                    return await func(*args, **kwargs)
+                with _Span(trace, name, category, None):
+                    result = await func(*args, **kwargs)
+                trace.handler_end = time.perf_counter()
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _Span(trace, name, category, None):
+                if profile and trace.profile:
+                    with _ProfileSegment(trace):
+                        result = func(*args, **kwargs)
+                else:
+                    result = func(*args, **kwargs)
+            trace.handler_end = time.perf_counter()
+            return result
+        return wrapper
+
+    return decorator
+
+
+# --- Ordres SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('trace_sql_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is None:
+        return
+    starts = conn.info.get('trace_sql_start')
+    if starts:
+        trace.add('sql', 'db', starts.pop(), time.perf_counter(),
+                  {'statement': ' '.join(statement.split())[:TRACING_SQL_MAX_LENGTH]})
+
+
+_sql_hooks_installed = False
+
+
+def install_sql_hooks():
+    """Branche les hooks SQL sur tous les moteurs, à la première requête tracée seulement:
+    un processus qui ne trace jamais ne paie pas la distribution des événements SQLAlchemy"""
+    global _sql_hooks_installed
+    if TRACING_SQL and not _sql_hooks_installed:
+        _sql_hooks_installed = True
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+# --- Export et profils ---
+
+class Tracer:
+    def __init__(self, path: str = TRACING_PATH, max_bytes: int = TRACING_MAX_BYTES,
+                 profile_dir: str = TRACING_PROFILE_DIR, max_profiles: int = TRACING_MAX_PROFILES,
+                 sample: float = TRACING_SAMPLE, profile_sample: float = TRACING_PROFILE_SAMPLE,
+                 token: str = TRACING_TOKEN):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self.sample = sample
+        self.profile_sample = profile_sample
+        self.token = token.encode()
+        self._lock = threading.Lock()
+        self._file = None
+        self._written = 0
+        self._tracks = 0
+        self.pid = os.getpid()
+        self.profiles: 'OrderedDict[str, dict]' = OrderedDict()
+        self.counters = {'traced': 0, 'profiled': 0, 'events': 0, 'rotations': 0, 'errors': 0}
+
+    def _header_allows(self, value: Optional[bytes]) -> bool:
+        return value is not None and (not self.token or value == self.token)
+
+    def start(self, scope: dict) -> Optional[RequestTrace]:
+        """Décide si la requête est tracée (en-tête ou tirage) et crée sa trace"""
+        trace_header = profile_header = None
+        for name, value in scope.get('headers', ()):
+            if name == TRACING_HEADER:
+                trace_header = value
+            elif name == TRACING_PROFILE_HEADER:
+                profile_header = value
+        profile = self._header_allows(profile_header) or (
+            self.profile_sample > 0 and random.random() < self.profile_sample)
+        if not (profile or self._header_allows(trace_header) or (self.sample > 0 and random.random() < self.sample)):
+            return None
+        with self._lock:
+            self._tracks += 1
+            track = self._tracks
+            install_sql_hooks()
+        return RequestTrace(uuid.uuid4().hex[:16], track, f"{scope['method']} {scope['path']}", profile)
+
+    def finish(self, trace: RequestTrace, status: int):
+        try:
+            events = trace.chrome_events(self.pid)
+            # La requête entière est le premier span de sa piste
+            root = {'name': trace.name, 'cat': 'request', 'ph': 'X',
+                    'ts': round(trace.wall_start * 1e6, 1),
+                    'dur': round((time.perf_counter() - trace.perf_start) * 1e6, 1),
+                    'pid': self.pid, 'tid': trace.track, 'args': {'trace_id': trace.trace_id, 'status': status}}
+            events.insert(1, root)
+            data = ''.join(_encoder.encode(e) + ',\n' for e in events)
+            with self._lock:
+                if self._file is None:
+                    self._open()
+                elif self._written > self.max_bytes:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+                self._written += len(data)
+                self.counters['traced'] += 1
+                self.counters['events'] += len(events)
+            if trace.profilers:
+                self._save_profile(trace, root['dur'] / 1000, status)
+        except Exception as e:
+            self.counters['errors'] += 1
+            logger.warning(f"Trace {trace.trace_id} non enregistrée: {e}")
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        # Format « JSON Array » des traces Chrome: le crochet fermant est facultatif
+        self._file.write('[\n')
+        self._written = 2
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, f"{self.path}.1")
+        self.counters['rotations'] += 1
+        self._open()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _save_profile(self, trace: RequestTrace, duration_ms: float, status: int):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stats = pstats.Stats(trace.profilers[0])
+        for profiler in trace.profilers[1:]:
+            stats.add(profiler)
+        path = os.path.join(self.profile_dir, f"{trace.trace_id}.prof")
+        stats.dump_stats(path)
+        with self._lock:
+            self.profiles[trace.trace_id] = {
+                'trace_id': trace.trace_id, 'request': trace.name, 'status': status,
+                'duration_ms': round(duration_ms, 2), 'created_at': trace.wall_start, 'path': path,
+            }
+            self.counters['profiled'] += 1
+            expired = []
+            while len(self.profiles) > self.max_profiles:
+                expired.append(self.profiles.popitem(last=False)[1]['path'])
+        for old in expired:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    # --- Consultation ---
+
+    def trace_document(self) -> str:
+        """Fichier de traces courant sous forme de tableau JSON complet"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        if not os.path.exists(self.path):
+            return '[]'
+        with open(self.path, encoding='utf-8') as f:
+            content = f.read().rstrip().rstrip(',')
+        return content + '\n]' if content.startswith('[') else '[]'
+
+    def profile(self, trace_id: str) -> Optional[dict]:
+        with self._lock:
+            return self.profiles.get(trace_id)
+
+    def profile_text(self, trace_id: str, sort: str = 'cumulative', limit: int = 40) -> Optional[str]:
+        entry = self.profile(trace_id)
+        if entry is None:
+            return None
+        out = StringIO()
+        pstats.Stats(entry['path'], stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'path': self.path,
+                'sample': self.sample,
+                'profile_sample': self.profile_sample,
+                'headers': {'trace': TRACING_HEADER.decode(), 'profile': TRACING_PROFILE_HEADER.decode()},
+                'token_required': bool(self.token),
+                'bytes_written': self._written,
+                'counters': dict(self.counters),
+                'profiles': [dict(entry) for entry in reversed(self.profiles.values())],
+            }
+
+
+class TracingMiddleware:
+    """Middleware ASGI: ouvre la trace de la requête, la termine et ajoute l'en-tête X-Trace-Id"""
+
+    def __init__(self, app, instance: Optional[Tracer] = None):
+        self.app = app
+        self.tracer = instance or tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        trace = self.tracer.start(scope)
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        response_status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response_status[0] = message['status']
+                if trace.handler_end is not None:
+                    trace.add('serialize.response', 'serialize', trace.handler_end, time.perf_counter())
+                message = dict(message, headers=list(message.get('headers', [])) +
+                               [(b'x-trace-id', trace.trace_id.encode())])
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self.tracer.finish(trace, response_status[0])
+
+
+# Instance partagée par le middleware et l'API d'administration
+tracer = Tracer()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Capture du trafic réel de l'API pour le rejouer en essai de charge.
+
+Un middleware ASGI enregistre, pour chaque requête, une ligne JSON compacte:
+  t  : instant d'arrivée en secondes depuis l'ouverture de la capture
+  m  : méthode HTTP
+  r  : gabarit de la route (ex: /api/service-clusters/{cluster_id})
+  pp : paramètres de chemin, q : paramètres de requête, b : corps JSON
+  k  : clé d'idempotence, s : statut HTTP, d : durée en ms
+  c  : requêtes en cours au moment de l'arrivée (concurrence d'origine)
+La première ligne du fichier est un en-tête {"v": 1, "start": <epoch>}.
+
+Les valeurs sont assainies avant écriture: les nombres et booléens sont
+conservés (ils portent la forme de la charge: tailles de VM, capacités des
+hôtes), les chaînes sont remplacées par un pseudonyme stable '~xxxxxxxx'
+(HMAC tronqué) sauf pour les champs descriptifs sans donnée personnelle
+(TRAFFIC_CAPTURE_CLEAR_KEYS: zone, architecture, drapeaux CPU...). Une même
+valeur donne le même pseudonyme pendant toute la capture: un hôte, un
+utilisateur ou un groupe reste reconnaissable au rejeu sans être identifiable.
+Les corps non JSON ou plus gros que TRAFFIC_CAPTURE_MAX_BODY ne sont pas
+conservés, seule leur taille l'est.
+
+La capture est désactivée tant que TRAFFIC_CAPTURE_PATH est vide. Le fichier
+est remplacé par un nouveau au-delà de TRAFFIC_CAPTURE_MAX_BYTES (l'ancien est
+conservé sous <chemin>.1). Le rejeu se fait avec scripts/replay_traffic.py.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+
+logger = logging.getLogger(__name__)
+
+TRAFFIC_CAPTURE_PATH = os.getenv('TRAFFIC_CAPTURE_PATH', '')
+# Part des requêtes enregistrées (0..1)
+TRAFFIC_CAPTURE_SAMPLE = float(os.getenv('TRAFFIC_CAPTURE_SAMPLE', '1.0'))
+TRAFFIC_CAPTURE_MAX_BODY = int(os.getenv('TRAFFIC_CAPTURE_MAX_BODY', '65536'))
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.getenv('TRAFFIC_CAPTURE_MAX_BYTES', str(256 * 1024 * 1024)))
+TRAFFIC_CAPTURE_FLUSH_INTERVAL = float(os.getenv('TRAFFIC_CAPTURE_FLUSH_INTERVAL', '1.0'))
+# Clé des pseudonymes; aléatoire par défaut (pseudonymes stables le temps d'un processus)
+TRAFFIC_CAPTURE_SALT = os.getenv('TRAFFIC_CAPTURE_SALT', '')
+TRAFFIC_CAPTURE_CLEAR_KEYS = set(filter(None, os.getenv(
+    'TRAFFIC_CAPTURE_CLEAR_KEYS',
+    'zone,zone_priority,rack,spread,architecture,cpu_flags,cpu_features,processeur,os_type,policy,scope,all',
+).split(',')))
+TRAFFIC_CAPTURE_EXCLUDE = tuple(filter(None, os.getenv(
+    'TRAFFIC_CAPTURE_EXCLUDE', '/swagger,/docs,/redoc,/openapi.json').split(',')))
+
+FORMAT_VERSION = 1
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+class Sanitizer:
+    def __init__(self, salt: bytes, clear_keys=TRAFFIC_CAPTURE_CLEAR_KEYS):
+        self.salt = salt
+        self.clear_keys = clear_keys
+
+    def pseudonym(self, value: str) -> str:
+        return '~' + hmac.new(self.salt, value.encode(), hashlib.blake2s).hexdigest()[:8]
+
+    def value(self, value, key: Optional[str] = None):
+        if isinstance(value, dict):
+            return {k: self.value(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.value(v, key) for v in value]
+        if isinstance(value, str):
+            return value if key in self.clear_keys or not value else self.pseudonym(value)
+        return value
+
+    def url_param(self, key: str, value: str) -> str:
+        # Les valeurs numériques ou booléennes d'une URL (identifiants, options) sont conservées telles quelles
+        if key in self.clear_keys or value.lstrip('-').isdigit() or value in ('true', 'false'):
+            return value
+        return self.pseudonym(value)
+
+    def path_params(self, params: dict) -> dict:
+        return {key: self.url_param(key, str(value)) for key, value in params.items()}
+
+    def query(self, query_string: bytes) -> Optional[dict]:
+        if not query_string:
+            return None
+        return {key: self.url_param(key, value)
+                for key, value in parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)}
+
+
+class TrafficCapture:
+    def __init__(self, path: str = TRAFFIC_CAPTURE_PATH, sample: float = TRAFFIC_CAPTURE_SAMPLE,
+                 max_body: int = TRAFFIC_CAPTURE_MAX_BODY, max_bytes: int = TRAFFIC_CAPTURE_MAX_BYTES,
+                 flush_interval: float = TRAFFIC_CAPTURE_FLUSH_INTERVAL, salt: str = TRAFFIC_CAPTURE_SALT):
+        self.path = path
+        self.sample = sample
+        self.max_body = max_body
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.sanitizer = Sanitizer(salt.encode() if salt else os.urandom(16))
+        self._lock = threading.Lock()
+        self._file = None
+        self._start = 0.0
+        self._written = 0
+        self._last_flush = 0.0
+        self.in_flight = 0
+        self.counters = {'recorded': 0, 'sampled_out': 0, 'bodies_dropped': 0, 'rotations': 0, 'errors': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._start = time.time()
+        header = _encoder.encode({'v': FORMAT_VERSION, 'start': self._start}) + '\n'
+        self._file.write(header)
+        self._written = len(header)
+        self._last_flush = time.monotonic()
+
+    def _rotate(self):
+        self._file.close()
+        os.replace(self.path, f"{self.path}.1")
+        self.counters['rotations'] += 1
+        self._open()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def record(self, started: float, method: str, scope: dict, body: Optional[bytes], body_size: int,
+               status: int, duration: float, concurrency: int):
+        """Assainit puis écrit une requête terminée; ne lève jamais d'exception vers le middleware"""
+        try:
+            entry = {'m': method, 's': status, 'd': round(duration * 1000, 2), 'c': concurrency}
+            route = scope.get('route')
+            if route is not None:
+                entry['r'] = route.path
+                if scope.get('path_params'):
+                    entry['pp'] = self.sanitizer.path_params(scope['path_params'])
+            else:
+                entry['r'] = scope['path']
+            query = self.sanitizer.query(scope.get('query_string', b''))
+            if query:
+                entry['q'] = query
+            for name, value in scope.get('headers', ()):
+                if name == b'idempotency-key':
+                    entry['k'] = self.sanitizer.pseudonym(value.decode('latin-1'))
+            if body:
+                try:
+                    entry['b'] = self.sanitizer.value(json.loads(body))
+                except ValueError:
+                    entry['bs'] = body_size
+            elif body_size:
+                entry['bs'] = body_size
+                self.counters['bodies_dropped'] += 1
+            with self._lock:
+                if self._file is None:
+                    self._open()
+                if self._written > self.max_bytes:
+                    self._rotate()
+                entry['t'] = round(max(0.0, started - self._start), 4)
+                line = _encoder.encode(entry) + '\n'
+                self._file.write(line)
+                self._written += len(line)
+                self.counters['recorded'] += 1
+                now = time.monotonic()
+                if now - self._last_flush >= self.flush_interval:
+                    self._file.flush()
+                    self._last_flush = now
+        except Exception as e:
+            self.counters['errors'] += 1
+            logger.warning(f"Capture de trafic: requête non enregistrée: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'path': self.path or None,
+                'sample': self.sample,
+                'bytes_written': self._written,
+                'in_flight': self.in_flight,
+                'counters': dict(self.counters),
+            }
+
+
+class TrafficCaptureMiddleware:
+    """Middleware ASGI: observe le corps et le statut sans modifier la requête ni la réponse"""
+
+    def __init__(self, app, capture: Optional[TrafficCapture] = None):
+        self.app = app
+        self.capture = capture or traffic_capture
+
+    async def __call__(self, scope, receive, send):
+        capture = self.capture
+        if scope['type'] != 'http' or not capture.enabled or scope['path'].startswith(TRAFFIC_CAPTURE_EXCLUDE):
+            await self.app(scope, receive, send)
+            return
+        if capture.sample < 1.0 and random.random() >= capture.sample:
+            capture.counters['sampled_out'] += 1
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        size = 0
+        response_status = [500]
+        done = [False]
+
+        async def receive_wrapper():
+            nonlocal size
+            message = await receive()
+            if message['type'] == 'http.request':
+                body = message.get('body', b'')
+                size += len(body)
+                if size <= capture.max_body:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response_status[0] = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body') and not done[0]:
+                # Réponse envoyée: la requête ne compte plus dans la concurrence
+                done[0] = True
+                capture.in_flight -= 1
+
+        started = time.time()
+        started_perf = time.perf_counter()
+        concurrency = capture.in_flight
+        capture.in_flight += 1
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if not done[0]:
+                capture.in_flight -= 1
+            capture.record(started, scope['method'], scope, b''.join(chunks) if size <= capture.max_body else None,
+                           size, response_status[0], time.perf_counter() - started_perf, concurrency)
+
+
+# Instance partagée; active si TRAFFIC_CAPTURE_PATH est défini
+traffic_capture = TrafficCapture()
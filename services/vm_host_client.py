@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Construction des URLs du service-vm-host exposé par chaque hôte."""
+import os
+from typing import Optional
+
+
+def vm_host_base_url(host_ip: str) -> str:
+    vm_host_port = os.getenv('SERVICE_VM_HOST_PORT', '5003')
+    return f"http://{host_ip}:{vm_host_port}/api/service-vm-host"
+
+
+def vm_host_url(host_ip: str, path: str) -> str:
+    """URL d'un endpoint du service-vm-host, ex: vm_host_url(ip, '/vm/create')"""
+    return f"{vm_host_base_url(host_ip)}{path}"
+
+
+def vm_id_of(vm_creation) -> Optional[str]:
+    """Identifiant de la VM dans la réponse du service-vm-host, s'il est présent"""
+    if not isinstance(vm_creation, dict):
+        return None
+    data = vm_creation.get('data')
+    for source in (vm_creation, data if isinstance(data, dict) else {}):
+        for key in ('vm_id', 'id'):
+            if source.get(key) is not None:
+                return str(source[key])
+    return None
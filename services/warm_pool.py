@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""Pool de VM préchauffées par offre et image système.
+
+Créer une VM sur un hôte peut prendre plusieurs minutes (image, démarrage).
+Pour les couples (vm_offer_id, system_image_id) les plus demandés, le service
+garde un nombre configurable de VM déjà créées et mises en pause, réparties
+entre les hôtes. Une demande de création de même offre, image, ressources et
+type d'OS réclame une VM du pool: l'hôte la renomme, l'attribue à
+l'utilisateur, applique le mot de passe root et la relance.
+
+Chaque VM du pool est une allocation ordinaire du registre (utilisateur
+WARM_POOL_USER, état active): la capacité qu'elle occupe est décomptée du
+placement et le pool est reconstitué au démarrage depuis la base. La
+réclamation transfère l'allocation à l'utilisateur par une mise à jour
+conditionnelle, si bien que deux instances ne peuvent pas obtenir la même VM
+(le remplissage, lui, doit tourner sur une seule instance).
+
+Le remplissage tourne en tâche de fond, WARM_POOL_REFILL_CONCURRENCY créations
+ou suppressions au plus à la fois, en recul exponentiel après des échecs. Le
+retard de remplissage est le temps entre l'apparition d'une place libre
+(réclamation, échec, agrandissement du pool) et l'arrivée de la VM qui la
+comble.
+
+Les pools se configurent par WARM_POOLS (liste JSON), par exemple:
+    [{"vm_offer_id": 1, "system_image_id": 2, "cpu_count": 2, "memory_size_mib": 2048,
+      "disk_size_gb": 5, "os_type": "ubuntu-24.04", "size": 4}]
+et se modifient à chaud par PUT /api/service-clusters/placement/warm-pools.
+
+Protocole attendu côté service-vm-host (voir scripts/fake_vm_host.py):
+- POST   /vm/create           configuration + "paused": true -> VM créée en pause
+- POST   /vm/{vm_id}/claim    {"name", "user_id", "root_password"} -> VM personnalisée et relancée
+- DELETE /vm/{vm_id}          suppression (pool réduit, personnalisation échouée)
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import requests
+
+from services.admission import admission
+from services.allocation_ledger import allocation_ledger
+from services.capabilities import capabilities
+from services.capacity_model import capacity_model
+from services.circuit_breaker import breakers
+from services.cluster_hooks import on_cluster_change
+from services.health_monitor import health_monitor
+from services.image_locality import image_locality
+from services.placement import host_score
+from services.priority_classes import priority_classes
+from services.vm_host_client import vm_host_url, vm_id_of
+from services.zone_index import zone_index
+
+logger = logging.getLogger(__name__)
+
+# Propriétaire des allocations des VM du pool dans le registre
+WARM_POOL_USER = os.getenv('WARM_POOL_USER', 'warm-pool')
+WARM_POOL_REFILL_CONCURRENCY = int(os.getenv('WARM_POOL_REFILL_CONCURRENCY', '2'))
+WARM_POOL_INTERVAL = float(os.getenv('WARM_POOL_INTERVAL', '10'))
+WARM_POOL_MAX_BACKOFF = float(os.getenv('WARM_POOL_MAX_BACKOFF', '300'))
+WARM_POOL_CREATE_TIMEOUT = float(os.getenv('WARM_POOL_CREATE_TIMEOUT', '1500'))
+WARM_POOL_CLAIM_TIMEOUT = float(os.getenv('WARM_POOL_CLAIM_TIMEOUT', '60'))
+VM_HOST_CONNECT_TIMEOUT = float(os.getenv('VM_HOST_CONNECT_TIMEOUT', '5'))
+# La réservation d'une VM du pool doit survivre à sa création complète
+allocation_ledger.register_create_timeout('warm_pool', VM_HOST_CONNECT_TIMEOUT + WARM_POOL_CREATE_TIMEOUT)
+# Nombre de retards de remplissage conservés pour les percentiles
+WARM_POOL_LAG_WINDOW = 1000
+
+SPEC_FIELDS = ('vm_offer_id', 'system_image_id', 'cpu_count', 'memory_size_mib', 'disk_size_gb')
+
+
+class WarmVM:
+    __slots__ = ('allocation_id', 'vm_id', 'vm_name', 'cluster_id', 'ip', 'ready_at', 'retry_at')
+
+    def __init__(self, allocation_id: int, vm_id: str, vm_name: str, cluster_id: int, ip: str):
+        self.allocation_id = allocation_id
+        self.vm_id = vm_id
+        self.vm_name = vm_name
+        self.cluster_id = cluster_id
+        self.ip = ip
+        self.ready_at = time.time()
+        self.retry_at = 0.0  # prochaine tentative de suppression après un échec (monotonic)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__ if field != 'retry_at'}
+
+
+class WarmPool:
+    def __init__(self, vm_offer_id: int, system_image_id: int, cpu_count: int, memory_size_mib: int,
+                 disk_size_gb: int, size: int = 0, os_type: Optional[str] = None):
+        self.vm_offer_id = int(vm_offer_id)
+        self.system_image_id = int(system_image_id)
+        self.cpu_count = int(cpu_count)
+        self.memory_size_mib = int(memory_size_mib)
+        self.disk_size_gb = int(disk_size_gb)
+        self.os_type = os_type
+        self.size = max(0, int(size))
+        self.ready: List[WarmVM] = []
+        self.retiring: List[WarmVM] = []
+        self.creating = 0
+        self.creating_on: Counter = Counter()  # créations en cours par hôte, pour répartir le pool
+        self.vacancies = deque()  # apparition des places libres non encore comblées (monotonic)
+        self.lags = deque(maxlen=WARM_POOL_LAG_WINDOW)
+        self.claims = 0
+        self.misses = 0
+        self.created = 0
+        self.failures = 0
+        self.retired = 0
+        self.consecutive_failures = 0
+        self.backoff_until = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def key(self) -> tuple:
+        return self.vm_offer_id, self.system_image_id
+
+    def spec(self) -> dict:
+        return {'vm_offer_id': self.vm_offer_id, 'system_image_id': self.system_image_id,
+                'cpu_count': self.cpu_count, 'memory_size_mib': self.memory_size_mib,
+                'disk_size_gb': self.disk_size_gb, 'os_type': self.os_type, 'size': self.size}
+
+    def matches(self, vm_requirements) -> bool:
+        """Mêmes ressources et même OS que les VM du pool"""
+        return (vm_requirements.cpu_count == self.cpu_count
+                and vm_requirements.memory_size_mib == self.memory_size_mib
+                and vm_requirements.disk_size_gb == self.disk_size_gb
+                and (self.os_type is None or vm_requirements.os_type == self.os_type))
+
+    def to_dict(self, now: float) -> dict:
+        lags = sorted(self.lags)
+
+        def percentile(p):
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))], 1) if lags else None
+
+        requests_total = self.claims + self.misses
+        return dict(self.spec(), **{
+            'ready': len(self.ready),
+            'creating': self.creating,
+            'retiring': len(self.retiring),
+            'claims': self.claims,
+            'misses': self.misses,
+            'hit_rate': round(self.claims / requests_total, 4) if requests_total else None,
+            'created': self.created,
+            'failures': self.failures,
+            'retired': self.retired,
+            'refill_lag_s': {'current': round(now - self.vacancies[0], 1) if self.vacancies else 0.0,
+                             'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1.0)},
+            'backoff_s': round(max(0.0, self.backoff_until - now), 1),
+            'last_error': self.last_error,
+            'hosts': dict(Counter(vm.cluster_id for vm in self.ready)),
+        })
+
+
+def load_pool_specs() -> List[dict]:
+    raw = os.getenv('WARM_POOLS', '')
+    if not raw:
+        return []
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logger.error(f"WARM_POOLS invalide, aucun pool de VM préchauffées: {e}")
+        return []
+
+
+class WarmPoolManager:
+    def __init__(self, specs: Optional[List[dict]] = None):
+        self._lock = threading.Lock()
+        self.pools: Dict[tuple, WarmPool] = {}
+        self._orphans: List[WarmVM] = []  # VM d'un pool supprimé ou reconfiguré, à supprimer
+        self._task: Optional[asyncio.Task] = None
+        self._jobs = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._inflight = 0
+        for spec in (load_pool_specs() if specs is None else specs):
+            try:
+                self.configure(spec)
+            except ValueError as e:
+                logger.error(f"Pool de VM préchauffées ignoré ({spec}): {e}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.pools)
+
+    # --- Configuration ---
+
+    def configure(self, spec: dict) -> WarmPool:
+        """Crée ou modifie un pool; ses VM sont supprimées si les ressources ou l'OS changent"""
+        missing = [field for field in SPEC_FIELDS if spec.get(field) is None]
+        if missing:
+            raise ValueError(f"Champs manquants: {', '.join(missing)}")
+        try:
+            pool = WarmPool(**{field: spec[field] for field in SPEC_FIELDS},
+                            size=spec.get('size', 0), os_type=spec.get('os_type'))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Pool invalide: {e}")
+        with self._lock:
+            current = self.pools.get(pool.key)
+            if current is not None and current.spec() == dict(pool.spec(), size=current.size):
+                # Seule la taille change: le pool garde ses VM et ses compteurs
+                current.size = pool.size
+                pool = current
+            else:
+                if current is not None:
+                    self._orphans.extend(current.ready + current.retiring)
+                self.pools[pool.key] = pool
+        self.wake()
+        return pool
+
+    # --- Réclamation par le placement ---
+
+    def _pick(self, pool: WarmPool, zones: List[str], eligible: Optional[int]) -> Optional[WarmVM]:
+        """VM prête dans la première zone demandée qui en a une, sur un hôte sain (sous verrou)"""
+        rank = {zone: index for index, zone in enumerate(zones)}
+        best = None
+        for vm in pool.ready:
+            position = rank.get(zone_index.zone_of(vm.cluster_id))
+            if position is None or (best is not None and position >= best[0]):
+                continue
+            if not health_monitor.is_placeable(vm.cluster_id) or not capabilities.contains(eligible, vm.cluster_id):
+                continue
+            if not breakers.get(vm.cluster_id).is_available():
+                continue
+            best = (position, vm)
+        return best[1] if best is not None else None
+
+    def claim(self, db, vm_requirements, zones: List[str], eligible: Optional[int] = None) -> Optional[dict]:
+        """Attribue une VM du pool à la demande; None si aucune ne convient (création classique)"""
+        pool = self.pools.get((vm_requirements.vm_offer_id, vm_requirements.system_image_id))
+        if pool is None or not pool.matches(vm_requirements):
+            return None
+        while True:
+            with self._lock:
+                vm = self._pick(pool, zones, eligible)
+                if vm is None:
+                    pool.misses += 1
+                    return None
+                pool.ready.remove(vm)
+                pool.vacancies.append(time.monotonic())
+            self.wake()
+            # Transfert conditionnel: la VM a pu être réclamée par une autre instance
+            allocation = allocation_ledger.assign(vm.allocation_id, WARM_POOL_USER, vm_requirements.user_id,
+                                                  vm_requirements.name,
+                                                  priority_classes.resolve(vm_requirements.priority))
+            if allocation is not None:
+                break
+        result = self._customize(vm, vm_requirements)
+        if result is None:
+            # VM inutilisable: rendue au pool pour suppression, capacité décomptée jusque-là
+            allocation_ledger.assign(vm.allocation_id, vm_requirements.user_id, WARM_POOL_USER, vm.vm_name)
+            with self._lock:
+                pool.retiring.append(vm)
+                pool.misses += 1
+            return None
+        with self._lock:
+            pool.claims += 1
+        from models.model_cluster import ClusterEntity
+        host = db.query(ClusterEntity).filter(ClusterEntity.id == vm.cluster_id).first()
+        image_locality.record_placement(vm.cluster_id, pool.system_image_id)
+        return {
+            'host': host.to_dict() if host is not None else {'id': vm.cluster_id, 'ip': vm.ip},
+            'vm_creation': result,
+            'allocation': allocation,
+            'attempts': [],
+            'warm_pool': {'vm_offer_id': pool.vm_offer_id, 'system_image_id': pool.system_image_id,
+                          'ready_since': vm.ready_at},
+        }
+
+    def _customize(self, vm: WarmVM, vm_requirements) -> Optional[dict]:
+        breaker = breakers.get(vm.cluster_id)
+        body = {'name': vm_requirements.name, 'user_id': vm_requirements.user_id}
+        if vm_requirements.root_password:
+            body['root_password'] = vm_requirements.root_password
+        try:
+            response = requests.post(
+                vm_host_url(vm.ip, f"/vm/{vm.vm_id}/claim"),
+                json=body,
+                headers={"Content-Type": "application/json"},
+                timeout=(VM_HOST_CONNECT_TIMEOUT, WARM_POOL_CLAIM_TIMEOUT)
+            )
+        except requests.exceptions.RequestException as e:
+            breaker.record_failure()
+            logger.warning(f"Réclamation de la VM préchauffée {vm.vm_id} sur l'hôte {vm.cluster_id} échouée: {e}")
+            return None
+        if response.status_code not in [200, 201, 202]:
+            if response.status_code >= 500 or response.status_code == 429:
+                breaker.record_failure()
+            logger.warning(f"Réclamation de la VM préchauffée {vm.vm_id} refusée par l'hôte {vm.cluster_id}: "
+                           f"{response.status_code} - {response.text}")
+            return None
+        breaker.record_success()
+        return response.json()
+
+    def forget_host(self, before: Optional[dict], after: Optional[dict]):
+        # Hôte supprimé: ses VM et leurs allocations ont disparu
+        if after is None and before is not None:
+            with self._lock:
+                for pool in self.pools.values():
+                    pool.ready = [vm for vm in pool.ready if vm.cluster_id != before['id']]
+                    pool.retiring = [vm for vm in pool.retiring if vm.cluster_id != before['id']]
+                self._orphans = [vm for vm in self._orphans if vm.cluster_id != before['id']]
+            self.wake()
+
+    # --- Reconstitution au démarrage ---
+
+    def load(self, db):
+        """Reconstitue les pools depuis les allocations actives de WARM_POOL_USER"""
+        from models.model_allocation import VMAllocationEntity
+        from models.model_cluster import ClusterEntity
+        rows = db.query(VMAllocationEntity, ClusterEntity.ip).join(
+            ClusterEntity, ClusterEntity.id == VMAllocationEntity.cluster_id
+        ).filter(
+            VMAllocationEntity.user_id == WARM_POOL_USER,
+            VMAllocationEntity.state == 'active'
+        ).all()
+        with self._lock:
+            known = {vm.allocation_id for pool in self.pools.values() for vm in pool.ready + pool.retiring}
+            known.update(vm.allocation_id for vm in self._orphans)
+            for allocation, ip in rows:
+                if allocation.id in known or allocation.vm_id is None:
+                    continue
+                vm = WarmVM(allocation.id, allocation.vm_id, allocation.vm_name, allocation.cluster_id, ip)
+                pool = self.pools.get((allocation.vm_offer_id, allocation.system_image_id))
+                if pool is not None and (allocation.cpu_count, allocation.memory_size_mib, allocation.disk_size_gb) \
+                        == (pool.cpu_count, pool.memory_size_mib, pool.disk_size_gb):
+                    pool.ready.append(vm)
+                else:
+                    self._orphans.append(vm)
+        logger.info(f"Pool de VM préchauffées rechargé: {len(rows)} VM")
+
+    def load_now(self):
+        from database import SessionLocal
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    # --- Remplissage ---
+
+    def _pick_host(self, pool: WarmPool) -> Optional[dict]:
+        """Hôte où la VM tient, le moins garni en VM de ce pool, puis le mieux classé; compté comme
+        création en cours dès son choix pour que les remplissages concurrents se répartissent"""
+        from database import SessionLocal
+        from models.model_cluster import ClusterEntity
+        minimum = capacity_model.prefilter(pool.cpu_count, pool.memory_size_mib, pool.disk_size_gb)
+        db = SessionLocal()
+        try:
+            hosts = [host.to_dict() for host in db.query(ClusterEntity).filter(
+                ClusterEntity.available_rom >= minimum['available_rom'],
+                ClusterEntity.available_ram >= minimum['available_ram'],
+                ClusterEntity.available_processor >= minimum['available_processor'],
+                ClusterEntity.number_of_core >= minimum['number_of_core']
+            ).all()]
+        finally:
+            db.close()
+        candidates = [(host_score(SimpleNamespace(**host), pool.system_image_id), host) for host in hosts
+                      if health_monitor.is_placeable(host['id']) and breakers.get(host['id']).is_available()
+                      and allocation_ledger.fits(host, pool.cpu_count, pool.memory_size_mib, pool.disk_size_gb)]
+        with self._lock:
+            per_host = Counter(vm.cluster_id for vm in pool.ready) + pool.creating_on
+            best = min(candidates, default=None, key=lambda item: (per_host[item[1]['id']], item[0]))
+            if best is None:
+                return None
+            pool.creating_on[best[1]['id']] += 1
+            return best[1]
+
+    def _create_vm(self, pool: WarmPool) -> WarmVM:
+        """Crée une VM en pause sur l'hôte choisi (exécuté dans un thread); lève une exception en cas d'échec"""
+        host = self._pick_host(pool)
+        if host is None:
+            raise RuntimeError("Aucun hôte avec suffisamment de ressources disponibles")
+        acquired = admission.try_acquire_host(host['id'])
+        try:
+            if not acquired:
+                raise RuntimeError(f"Hôte {host['id']} à sa limite de créations simultanées")
+            vm_config = {
+                "name": f"warm-{pool.vm_offer_id}-{pool.system_image_id}-{uuid.uuid4().hex[:8]}",
+                "user_id": WARM_POOL_USER,
+                "os_type": pool.os_type,
+                "cpu_count": pool.cpu_count,
+                "memory_size_mib": pool.memory_size_mib,
+                "disk_size_gb": pool.disk_size_gb,
+                "vm_offer_id": pool.vm_offer_id,
+                "system_image_id": pool.system_image_id
+            }
+            allocation_id = allocation_ledger.reserve(host, vm_config)
+            if allocation_id is None:
+                raise RuntimeError(f"Capacité de l'hôte {host['id']} prise entre-temps")
+            breaker = breakers.get(host['id'])
+            try:
+                response = requests.post(
+                    vm_host_url(host['ip'], "/vm/create"),
+                    json=dict(vm_config, service_cluster_id=host['id'], paused=True),
+                    headers={"Content-Type": "application/json"},
+                    timeout=(VM_HOST_CONNECT_TIMEOUT, WARM_POOL_CREATE_TIMEOUT)
+                )
+            except requests.exceptions.ReadTimeout:
+                # La VM a pu être créée: sa capacité reste décomptée
+                breaker.record_failure()
+                allocation_ledger.mark_unknown(allocation_id)
+                raise
+            except requests.exceptions.RequestException:
+                breaker.record_failure()
+                allocation_ledger.fail(allocation_id)
+                raise
+            if response.status_code not in [200, 201, 202]:
+                allocation_ledger.fail(allocation_id)
+                if response.status_code >= 500 or response.status_code == 429:
+                    breaker.record_failure()
+                raise RuntimeError(f"Création refusée par l'hôte {host['id']}: "
+                                   f"{response.status_code} - {response.text}")
+            breaker.record_success()
+            vm_id = vm_id_of(response.json())
+            if vm_id is None:
+                allocation_ledger.mark_unknown(allocation_id)
+                raise RuntimeError(f"Identifiant de VM absent de la réponse de l'hôte {host['id']}")
+            allocation_ledger.activate(allocation_id, vm_id)
+            image_locality.add_image(host['id'], pool.system_image_id)
+            return WarmVM(allocation_id, vm_id, vm_config['name'], host['id'], host['ip'])
+        finally:
+            with self._lock:
+                pool.creating_on[host['id']] -= 1
+                if pool.creating_on[host['id']] <= 0:
+                    del pool.creating_on[host['id']]
+            if acquired:
+                admission.release_host(host['id'])
+
+    def _delete_vm(self, vm: WarmVM):
+        """Supprime la VM sur l'hôte puis libère son allocation (exécuté dans un thread)"""
+        response = requests.delete(vm_host_url(vm.ip, f"/vm/{vm.vm_id}"),
+                                   timeout=(VM_HOST_CONNECT_TIMEOUT, WARM_POOL_CLAIM_TIMEOUT))
+        # 404: VM déjà absente, la capacité peut être libérée
+        if response.status_code not in [200, 202, 204, 404]:
+            raise RuntimeError(f"Suppression refusée par l'hôte {vm.cluster_id}: "
+                               f"{response.status_code} - {response.text}")
+        allocation_ledger.release(vm.allocation_id)
+
+    async def _fill(self, pool: WarmPool):
+        try:
+            vm = await asyncio.to_thread(self._create_vm, pool)
+        except Exception as e:
+            with self._lock:
+                pool.failures += 1
+                pool.consecutive_failures += 1
+                pool.backoff_until = time.monotonic() + min(
+                    WARM_POOL_MAX_BACKOFF, WARM_POOL_INTERVAL * 2 ** (pool.consecutive_failures - 1))
+                pool.last_error = str(e)
+            logger.warning(f"Remplissage du pool ({pool.vm_offer_id}, {pool.system_image_id}) échoué: {e}")
+            return
+        with self._lock:
+            pool.ready.append(vm)
+            pool.created += 1
+            pool.consecutive_failures = 0
+            pool.backoff_until = 0.0
+            if pool.vacancies:
+                pool.lags.append(time.monotonic() - pool.vacancies.popleft())
+
+    async def _retire(self, pool: Optional[WarmPool], vm: WarmVM):
+        try:
+            await asyncio.to_thread(self._delete_vm, vm)
+        except Exception as e:
+            logger.warning(f"Suppression de la VM préchauffée {vm.vm_id} sur l'hôte {vm.cluster_id} échouée: {e}")
+            vm.retry_at = time.monotonic() + WARM_POOL_INTERVAL
+            with self._lock:
+                (pool.retiring if pool is not None else self._orphans).append(vm)
+            return
+        if pool is not None:
+            with self._lock:
+                pool.retired += 1
+
+    def _start_job(self, coroutine, pool: Optional[WarmPool] = None):
+        self._inflight += 1
+        if pool is not None:
+            pool.creating += 1
+
+        async def job():
+            try:
+                await coroutine
+            finally:
+                self._inflight -= 1
+                if pool is not None:
+                    pool.creating -= 1
+                self._wake.set()
+
+        task = asyncio.create_task(job())
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+
+    def refill_cycle(self):
+        """Lance suppressions et créations dans la limite de WARM_POOL_REFILL_CONCURRENCY"""
+        now = time.monotonic()
+        retire = []
+        with self._lock:
+            for pool in self.pools.values():
+                # Pool réduit: supprimer les VM en trop, les plus récentes d'abord
+                while len(pool.ready) > pool.size:
+                    pool.retiring.append(pool.ready.pop())
+                missing = pool.size - len(pool.ready)
+                while len(pool.vacancies) > max(0, missing):
+                    pool.vacancies.pop()
+                while len(pool.vacancies) < missing:
+                    pool.vacancies.append(now)
+                retire.extend((pool, vm) for vm in pool.retiring if vm.retry_at <= now)
+                pool.retiring = [vm for vm in pool.retiring if vm.retry_at > now]
+            retire.extend((None, vm) for vm in self._orphans if vm.retry_at <= now)
+            self._orphans = [vm for vm in self._orphans if vm.retry_at > now]
+        for index, (pool, vm) in enumerate(retire):
+            if self._inflight >= WARM_POOL_REFILL_CONCURRENCY:
+                with self._lock:
+                    for pool, vm in retire[index:]:
+                        (pool.retiring if pool is not None else self._orphans).append(vm)
+                return
+            self._start_job(self._retire(pool, vm))
+        for pool in list(self.pools.values()):
+            if now < pool.backoff_until:
+                continue
+            deficit = pool.size - len(pool.ready) - pool.creating
+            while deficit > 0 and self._inflight < WARM_POOL_REFILL_CONCURRENCY:
+                self._start_job(self._fill(pool), pool)
+                deficit -= 1
+
+    def wake(self):
+        """Réveille la boucle de remplissage (appelable depuis un thread)"""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self):
+        try:
+            await asyncio.to_thread(self.load_now)
+        except Exception as e:
+            logger.error(f"Impossible de recharger le pool de VM préchauffées: {e}")
+        while True:
+            try:
+                self.refill_cycle()
+            except Exception as e:
+                logger.error(f"Erreur dans la boucle de remplissage du pool de VM préchauffées: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), WARM_POOL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        # Boucle inactive tant qu'aucun pool n'est configuré (WARM_POOLS ou API)
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = [task for task in [self._task, *self._jobs] if task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._jobs.clear()
+
+    # --- Consultation ---
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            pools = [pool.to_dict(now) for pool in self.pools.values()]
+            orphans = len(self._orphans)
+        claims = sum(pool['claims'] for pool in pools)
+        requests_total = claims + sum(pool['misses'] for pool in pools)
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'refill_concurrency': WARM_POOL_REFILL_CONCURRENCY,
+            'refills_in_flight': self._inflight,
+            'hit_rate': round(claims / requests_total, 4) if requests_total else None,
+            'ready': sum(pool['ready'] for pool in pools),
+            'held': {'vcpus': sum(pool['ready'] * pool['cpu_count'] for pool in pools),
+                     'memory_mib': sum(pool['ready'] * pool['memory_size_mib'] for pool in pools),
+                     'disk_gb': sum(pool['ready'] * pool['disk_size_gb'] for pool in pools)},
+            'orphans': orphans,
+            'pools': pools,
+        }
+
+
+# Instance partagée par le placement et les routes
+warm_pool = WarmPoolManager()
+on_cluster_change(warm_pool.forget_host)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Index de capacité par zone pour le placement multi-zones.
+
+Pour chaque zone: les hôtes qu'elle contient et le maximum de chaque ressource
+disponible parmi eux. Le placement parcourt les zones dans l'ordre de priorité
+et saute sans requête SQL celles dont aucun hôte ne peut accueillir la VM; seules
+les zones visitées sont interrogées, ce qui garde le coût indépendant du nombre
+total de zones tant que les premières zones ont de la place.
+
+L'index est tenu à jour par les notifications de changement de cluster,
+construit depuis la base au premier usage et resynchronisé toutes les
+ZONE_INDEX_REFRESH secondes (écritures d'autres instances). Les notifications
+reçues pendant la requête de resynchronisation sont rejouées sur le résultat.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.cluster_hooks import on_cluster_change
+
+DEFAULT_ZONE = os.getenv('DEFAULT_ZONE', 'default')
+# Zone de cette instance: préférée en l'absence de zone demandée
+APP_ZONE = os.getenv('APP_ZONE', '')
+# Ordre de débordement entre zones, ex: "eu-west-1a,eu-west-1b"; les autres zones suivent par ordre alphabétique
+ZONE_PRIORITY = [zone.strip() for zone in os.getenv('ZONE_PRIORITY', '').split(',') if zone.strip()]
+# Intervalle de resynchronisation depuis la base (0: construit une seule fois)
+ZONE_INDEX_REFRESH = float(os.getenv('ZONE_INDEX_REFRESH', '60'))
+
+CAPACITY_FIELDS = ('available_ram', 'available_rom', 'available_processor', 'number_of_core')
+
+
+class ZoneIndex:
+    def __init__(self, priority: Optional[List[str]] = None, local_zone: str = APP_ZONE,
+                 refresh: float = ZONE_INDEX_REFRESH):
+        self.priority = ZONE_PRIORITY if priority is None else priority
+        self.local_zone = local_zone
+        self.refresh = refresh
+        self.initialized = False
+        self._built_at = 0.0
+        # Notifications reçues pendant une resynchronisation, rejouées après elle
+        self._missed: Optional[List[Tuple[Optional[dict], Optional[dict]]]] = None
+        self._lock = threading.Lock()
+        self._hosts: Dict[int, dict] = {}
+        self._zones: Dict[str, Set[int]] = defaultdict(set)
+        self._max: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+
+    # --- Maintenance ---
+
+    def _add(self, host: dict):
+        zone = host.get('zone') or DEFAULT_ZONE
+        entry = {field: host.get(field) or 0 for field in CAPACITY_FIELDS}
+        entry.update(zone=zone, rack=host.get('rack'))
+        self._hosts[host['id']] = entry
+        self._zones[zone].add(host['id'])
+        current = self._max.get(zone)
+        if current is not None and zone not in self._dirty:
+            for field in CAPACITY_FIELDS:
+                current[field] = max(current[field], entry[field])
+        else:
+            self._dirty.add(zone)
+
+    def _remove(self, cluster_id: int):
+        entry = self._hosts.pop(cluster_id, None)
+        if entry is None:
+            return
+        zone = entry['zone']
+        self._zones[zone].discard(cluster_id)
+        if not self._zones[zone]:
+            del self._zones[zone]
+            self._max.pop(zone, None)
+            self._dirty.discard(zone)
+        else:
+            # Le maximum a pu baisser: recalcul paresseux
+            self._dirty.add(zone)
+
+    def apply(self, before: Optional[dict], after: Optional[dict]):
+        with self._lock:
+            if self._missed is not None:
+                self._missed.append((before, after))
+            if not self.initialized:
+                return
+            if before is not None:
+                self._remove(before['id'])
+            if after is not None:
+                self._add(after)
+
+    def rebuild(self, clusters: Iterable[dict]):
+        with self._lock:
+            self._hosts.clear()
+            self._zones.clear()
+            self._max.clear()
+            self._dirty.clear()
+            for cluster in clusters:
+                self._add(cluster)
+            for before, after in self._missed or ():
+                if before is not None:
+                    self._remove(before['id'])
+                if after is not None:
+                    self._add(after)
+            self._missed = None
+            self.initialized = True
+            self._built_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return not self.initialized or (self.refresh > 0 and time.monotonic() - self._built_at >= self.refresh)
+
+    def ensure(self, db):
+        """Construit l'index depuis la base au premier usage, puis le resynchronise toutes les refresh secondes"""
+        if not self.is_stale():
+            return
+        from models.model_cluster import ClusterEntity
+        with self._lock:
+            if self._missed is not None and self.initialized:
+                # Resynchronisation déjà en cours dans un autre thread
+                return
+            if self._missed is None:
+                self._missed = []
+        try:
+            clusters = [cluster.to_dict() for cluster in db.query(ClusterEntity).all()]
+        except Exception:
+            with self._lock:
+                self._missed = None
+            raise
+        self.rebuild(clusters)
+
+    # --- Consultation ---
+
+    def _zone_max(self, zone: str) -> dict:
+        if zone in self._dirty or zone not in self._max:
+            hosts = [self._hosts[cluster_id] for cluster_id in self._zones.get(zone, ())]
+            self._max[zone] = {field: max((h[field] for h in hosts), default=0) for field in CAPACITY_FIELDS}
+            self._dirty.discard(zone)
+        return self._max[zone]
+
+    def can_fit(self, zone: str, ram_gb: float, rom_gb: float, processor_pct: float, cores: int) -> bool:
+        """Condition nécessaire: au moins un hôte de la zone a chaque ressource en quantité suffisante"""
+        with self._lock:
+            if zone not in self._zones:
+                return False
+            best = self._zone_max(zone)
+        return (best['available_ram'] >= ram_gb and best['available_rom'] >= rom_gb
+                and best['available_processor'] >= processor_pct and best['number_of_core'] >= cores)
+
+    def zones(self) -> List[str]:
+        """Toutes les zones connues dans l'ordre de priorité par défaut"""
+        with self._lock:
+            known = set(self._zones)
+        ordered = [zone for zone in self.priority if zone in known]
+        return ordered + sorted(known - set(ordered))
+
+    def order(self, preferred: Optional[str] = None, priority: Optional[List[str]] = None,
+              spillover: bool = True) -> List[str]:
+        """Zones à parcourir: demandées d'abord, puis (si débordement) les autres par priorité"""
+        requested = list(priority or ([preferred] if preferred else []))
+        if not requested:
+            # Aucune zone demandée: toutes les zones, la zone locale en tête
+            zones = self.zones()
+            if self.local_zone in zones:
+                zones.remove(self.local_zone)
+                zones.insert(0, self.local_zone)
+            return zones
+        ordered = list(dict.fromkeys(requested))
+        if spillover:
+            ordered += [zone for zone in self.zones() if zone not in ordered]
+        return ordered
+
+    def zone_of(self, cluster_id: int) -> Optional[str]:
+        entry = self._hosts.get(cluster_id)
+        return entry['zone'] if entry else None
+
+    def rack_of(self, cluster_id: int) -> Optional[str]:
+        entry = self._hosts.get(cluster_id)
+        return entry['rack'] if entry else None
+
+    def stats(self) -> dict:
+        zones = self.zones()
+        with self._lock:
+            return {
+                'zones': {
+                    zone: {
+                        'hosts': len(self._zones.get(zone, ())),
+                        'racks': len({self._hosts[h]['rack'] for h in self._zones.get(zone, ())}),
+                        'max_available': dict(self._zone_max(zone)),
+                    }
+                    for zone in zones
+                },
+                'priority': self.priority,
+                'local_zone': self.local_zone or None,
+            }
+
+
+def spread_order(keys: List, user_counts: Dict, key_of) -> List:
+    """Trie de façon stable les éléments par nombre de VM de l'utilisateur dans leur domaine de panne"""
+    return sorted(keys, key=lambda item: user_counts.get(key_of(item), 0))
+
+
+# Instance partagée par les routes
+zone_index = ZoneIndex()
+on_cluster_change(zone_index.apply)
@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Base SQLite jetable et services de fond inactifs, avant tout import de l'application
+_tmp = tempfile.mkdtemp(prefix='service-cluster-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{_tmp}/service_cluster.db"
+os.environ['READ_REPLICA_URLS'] = ''
+os.environ['EVENT_LOG_PATH'] = ''
+os.environ['HEALTH_PROBE_ENABLED'] = 'false'
+os.environ['TRAFFIC_CAPTURE_PATH'] = ''
+os.environ['WARM_POOLS'] = ''
+os.environ['SYSTEM_IMAGE_DIR'] = os.path.join(_tmp, 'system-images')
+
+
+class FakeVMHost:
+    """Faux service-vm-host en mémoire: remplace requests.post et injecte pannes et latence par IP"""
+
+    def __init__(self):
+        self.faults = {}  # ip -> {'status': code, 'latency': s, 'down': bool}
+        self.calls = []
+        self.names = []  # noms des VM demandées, dans l'ordre d'arrivée
+        self._lock = threading.Lock()
+
+    def set_fault(self, ip: str, **fault):
+        self.faults[ip] = fault
+
+    def clear(self, ip: str):
+        self.faults.pop(ip, None)
+
+    def calls_to(self, ip: str) -> int:
+        return self.calls.count(ip)
+
+    @staticmethod
+    def _response(status_code: int, body: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(body).encode()
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+    def post(self, url, json=None, headers=None, timeout=None, **kwargs):
+        ip = urlparse(url).hostname
+        with self._lock:
+            self.calls.append(ip)
+            self.names.append((json or {}).get('name'))
+        fault = self.faults.get(ip, {})
+        if fault.get('down'):
+            raise requests.exceptions.ConnectionError(f"Connexion refusée par {ip}")
+        latency = fault.get('latency', 0)
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout is not None and latency > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.exceptions.ReadTimeout(f"{ip} n'a pas répondu en {read_timeout}s")
+        time.sleep(latency)
+        if fault.get('status'):
+            return self._response(fault['status'], {'detail': 'Panne injectée'})
+        return self._response(201, {'vm_id': uuid.uuid4().hex, 'name': (json or {}).get('name')})
+
+
+@pytest.fixture
+def fake_vm_host(monkeypatch):
+    host = FakeVMHost()
+    monkeypatch.setattr(requests, 'post', host.post)
+    return host
+
+
+@pytest.fixture
+def client():
+    """Application sur une base vide, avec les index en mémoire remis à zéro"""
+    from fastapi.testclient import TestClient
+    import app as app_module
+    import database
+    from services.allocation_ledger import allocation_ledger
+    from services.capabilities import capabilities
+    from services.circuit_breaker import breakers
+    from services.decision_cache import decision_cache
+    from services.fleet_stats import fleet_stats
+    from services.health_monitor import health_monitor
+    from services.idempotency import idempotency_store
+    from services.image_locality import image_locality
+    from services.placement_groups import placement_groups
+    from services.zone_index import zone_index
+
+    database.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as connection:
+        for table in reversed(database.Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    allocation_ledger.rebuild_now()
+    for index in (zone_index, capabilities, placement_groups, fleet_stats):
+        index.initialized = False
+    decision_cache.clear()
+    breakers._breakers.clear()
+    health_monitor.hosts.clear()
+    idempotency_store._cache.clear()
+    for cluster_id in list(image_locality._images_by_host):
+        image_locality.remove_host(cluster_id)
+    return TestClient(app_module.app)
+
+
+@pytest.fixture
+def add_host(client):
+    """Enregistre un hôte comme le ferait son heartbeat; retourne son dictionnaire"""
+    counter = iter(range(1, 1000))
+
+    def add(ip: str, **fields):
+        n = next(counter)
+        body = {'nom': f"host-{n}", 'adresse_mac': f"02:00:00:00:00:{n:02x}", 'ip': ip, 'rom': 500,
+                'available_rom': 400, 'ram': 64, 'available_ram': 48, 'processeur': 'x86_64',
+                'available_processor': 90.0, 'number_of_core': 16}
+        body.update(fields)
+        response = client.post('/api/service-clusters/', json=body).json()
+        assert response['statusCode'] in (200, 201), response
+        return response['data']['cluster']
+
+    return add
+
+
+def create_vm(client, **fields):
+    body = {'name': 'vm', 'user_id': '1', 'os_type': 'ubuntu-24.04', 'cpu_count': 2, 'memory_size_mib': 2048,
+            'disk_size_gb': 5}
+    body.update(fields)
+    headers = {}
+    if 'idempotency_key' in body:
+        headers['Idempotency-Key'] = body.pop('idempotency_key')
+    return client.post('/api/service-clusters/find-suitable-host', json=body, headers=headers)
@@ -0,0 +1,244 @@
+import asyncio
+
+import httpx
+import pytest
+
+from routes import cluster_route
+from services.admission import AdmissionController, AdmissionRejected
+
+
+def _body(name: str, user_id: str = '1', **fields):
+    body = {'name': name, 'user_id': user_id, 'os_type': 'ubuntu-24.04', 'cpu_count': 1, 'memory_size_mib': 512,
+            'disk_size_gb': 1}
+    body.update(fields)
+    return body
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Contrôleur d'admission propre au test, avec des limites basses"""
+    def install(**limits):
+        limits.setdefault('user_weights', {})
+        admission = AdmissionController(**limits)
+        monkeypatch.setattr(cluster_route, 'admission', admission)
+        return admission
+    return install
+
+
+async def _post(http, body):
+    return await http.post('/api/service-clusters/find-suitable-host', json=body)
+
+
+def _run(app, scenario):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+            return await scenario(http)
+    return asyncio.run(main())
+
+
+async def _until(condition, timeout: float = 5):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+
+def test_full_queue_returns_429_with_retry_after(client, add_host, fake_vm_host, controller):
+    add_host('10.0.0.1')
+    fake_vm_host.set_fault('10.0.0.1', latency=0.3)
+    admission = controller(max_concurrency=1, max_queue_depth=1)
+
+    async def scenario(http):
+        running = asyncio.create_task(_post(http, _body('vm-1')))
+        await _until(lambda: admission._running == 1)
+        queued = asyncio.create_task(_post(http, _body('vm-2')))
+        await _until(lambda: admission._queued == 1)
+        rejected = await _post(http, _body('vm-3'))
+        return await running, await queued, rejected
+
+    running, queued, rejected = _run(client.app, scenario)
+
+    assert running.json()['statusCode'] == 200 and queued.json()['statusCode'] == 200
+    assert rejected.status_code == 429 and int(rejected.headers['Retry-After']) >= 1
+    assert rejected.json()['data']['retry_after'] == int(rejected.headers['Retry-After'])
+    assert admission.rejections == {'queue_full': 1}
+    assert fake_vm_host.names == ['vm-1', 'vm-2']
+
+
+def test_user_queue_limit_rejects_only_that_user(client, add_host, fake_vm_host, controller):
+    add_host('10.0.0.1')
+    fake_vm_host.set_fault('10.0.0.1', latency=0.3)
+    admission = controller(max_concurrency=1, max_user_queue_depth=1)
+
+    async def scenario(http):
+        running = asyncio.create_task(_post(http, _body('a-1', 'a')))
+        await _until(lambda: admission._running == 1)
+        queued = asyncio.create_task(_post(http, _body('a-2', 'a')))
+        await _until(lambda: admission._queued == 1)
+        rejected = await _post(http, _body('a-3', 'a'))
+        other = asyncio.create_task(_post(http, _body('b-1', 'b')))
+        return [await running, await queued, rejected, await other]
+
+    responses = _run(client.app, scenario)
+
+    assert [response.status_code for response in responses] == [200, 200, 429, 200]
+    assert 'Retry-After' in responses[2].headers
+    assert admission.rejections == {'user_queue_full': 1}
+
+
+def test_queue_is_fair_between_users(client, add_host, fake_vm_host, controller):
+    add_host('10.0.0.1')
+    fake_vm_host.set_fault('10.0.0.1', latency=0.1)
+    admission = controller(max_concurrency=1)
+
+    async def scenario(http):
+        tasks = [asyncio.create_task(_post(http, _body('a-1', 'a')))]
+        await _until(lambda: admission._running == 1)
+        # L'utilisateur a remplit la file avant que b n'arrive
+        for name, user_id in (('a-2', 'a'), ('a-3', 'a'), ('a-4', 'a'), ('b-1', 'b'), ('b-2', 'b')):
+            tasks.append(asyncio.create_task(_post(http, _body(name, user_id))))
+            await _until(lambda: admission._queued == len(tasks) - 1)
+        return await asyncio.gather(*tasks)
+
+    responses = _run(client.app, scenario)
+
+    assert all(response.json()['statusCode'] == 200 for response in responses)
+    # Fins virtuelles: a-2=1, a-3=2, a-4=3, b-1=1, b-2=2 (égalité départagée par l'ordre d'arrivée)
+    assert fake_vm_host.names == ['a-1', 'a-2', 'b-1', 'a-3', 'b-2', 'a-4']
+
+
+def test_saturated_hosts_return_429(client, add_host, fake_vm_host, controller):
+    add_host('10.0.0.1')
+    fake_vm_host.set_fault('10.0.0.1', latency=0.3)
+    admission = controller(max_concurrency=4, max_inflight_per_host=1)
+
+    async def scenario(http):
+        first = asyncio.create_task(_post(http, _body('vm-1')))
+        await _until(lambda: admission.metrics()['host_inflight'] == {1: 1})
+        second = await _post(http, _body('vm-2'))
+        return await first, second
+
+    first, second = _run(client.app, scenario)
+
+    assert first.json()['statusCode'] == 200
+    assert second.status_code == 429 and int(second.headers['Retry-After']) >= 1
+    assert admission.rejections == {'hosts_saturated': 1}
+    assert fake_vm_host.names == ['vm-1'] and admission.metrics()['host_inflight'] == {}
+
+
+# --- File de priorité (contrôleur seul) ---
+
+def _drain(admission: AdmissionController, first, waiters: dict) -> list:
+    """Libère les créneaux un à un et retourne l'ordre d'attribution des demandes en attente"""
+    async def main():
+        granted = []
+        tasks = {}
+        for name, (user_id, priority) in waiters.items():
+            tasks[name] = asyncio.create_task(admission.acquire(user_id, priority))
+            await asyncio.sleep(0)
+        ticket = first
+        while len(granted) < len(tasks):
+            admission.release(ticket)
+            pending = [task for name, task in tasks.items() if name not in granted]
+            await asyncio.wait(pending, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+            done = [name for name, task in tasks.items() if task.done() and name not in granted]
+            assert len(done) == 1
+            granted.append(done[0])
+            ticket = tasks[done[0]].result()
+        admission.release(ticket)
+        return granted
+
+    return asyncio.run(main())
+
+
+def test_higher_class_overtakes_queued_lower_classes():
+    admission = AdmissionController(max_concurrency=1, user_weights={})
+
+    async def first():
+        return await admission.acquire('0', 'standard')
+
+    running = asyncio.run(first())
+    order = _drain(admission, running, {
+        'dev-1': ('1', 'dev'), 'dev-2': ('2', 'dev'), 'standard': ('3', 'standard'), 'critical': ('4', 'critical')})
+
+    assert order == ['critical', 'standard', 'dev-1', 'dev-2']
+    assert admission.metrics()['running'] == 0 and admission.metrics()['queue_depth'] == 0
+
+
+def test_weighted_fair_queuing_within_a_class():
+    admission = AdmissionController(max_concurrency=1, user_weights={'heavy': 2})
+
+    async def first():
+        return await admission.acquire('0')
+
+    running = asyncio.run(first())
+    waiters = {f"heavy-{n}": ('heavy', 'standard') for n in range(4)}
+    waiters.update({f"light-{n}": ('light', 'standard') for n in range(2)})
+    order = _drain(admission, running, waiters)
+
+    # Fins virtuelles: heavy 0.5, 1, 1.5, 2; light 1, 2 (égalités départagées par l'ordre d'arrivée)
+    assert order == ['heavy-0', 'heavy-1', 'light-0', 'heavy-2', 'heavy-3', 'light-1']
+
+
+def test_cancelled_waiter_does_not_block_the_heap():
+    admission = AdmissionController(max_concurrency=1, user_weights={})
+
+    async def main():
+        running = await admission.acquire('0')
+        cancelled = asyncio.create_task(admission.acquire('1', 'critical'))
+        waiting = asyncio.create_task(admission.acquire('2', 'dev'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        depth = admission.metrics()['queue_depth']
+        admission.release(running)
+        ticket = await asyncio.wait_for(waiting, 1)
+        admission.release(ticket)
+        return cancelled, ticket, depth
+
+    cancelled, ticket, depth = asyncio.run(main())
+
+    assert cancelled.cancelled() and ticket.priority == 'dev' and depth == 1
+    metrics = admission.metrics()
+    assert metrics['queue_depth'] == 0 and metrics['running'] == 0 and admission._heap == []
+
+
+def test_queue_timeout_frees_the_waiter_slot():
+    admission = AdmissionController(max_concurrency=1, queue_timeout=0.01, user_weights={})
+
+    async def main():
+        running = await admission.acquire('0')
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire('1', 'dev')
+        admission.release(running)
+        return rejected.value
+
+    rejected = asyncio.run(main())
+
+    assert rejected.reason == 'queue_timeout' and rejected.retry_after >= 1
+    assert admission.metrics()['queue_depth'] == 0
+
+
+def test_metrics_per_class():
+    admission = AdmissionController(max_concurrency=1, max_queue_depth=1, user_weights={})
+
+    async def main():
+        running = await admission.acquire('0', 'production')
+        queued = asyncio.create_task(admission.acquire('1', 'critical'))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire('2', 'dev')
+        during = admission.metrics()['classes']
+        admission.release(running)
+        admission.release(await queued)
+        return during
+
+    during = asyncio.run(main())
+    classes = admission.metrics()['classes']
+
+    assert during['critical']['queue_depth'] == 1 and during['dev']['queue_depth'] == 0
+    assert classes['critical']['priority'] > classes['production']['priority'] > classes['dev']['priority']
+    assert classes['production']['admitted'] == 1 and classes['critical']['admitted'] == 1
+    assert classes['dev'] == dict(classes['dev'], admitted=0, rejections={'queue_full': 1})
+    assert classes['critical']['wait_ms']['max'] is not None and classes['dev']['wait_ms']['max'] is None
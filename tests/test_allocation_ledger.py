@@ -0,0 +1,103 @@
+import datetime
+import threading
+
+from services.allocation_ledger import AllocationLedger, LEDGER_RESERVATION_MARGIN, allocation_ledger
+
+VM = {'user_id': '1', 'name': 'vm', 'cpu_count': 1, 'memory_size_mib': 512, 'disk_size_gb': 1}
+
+
+def _backdate(allocation_id: int, seconds: float):
+    from database import SessionLocal
+    from models.model_allocation import VMAllocationEntity
+    db = SessionLocal()
+    try:
+        db.query(VMAllocationEntity).filter(VMAllocationEntity.id == allocation_id).update(
+            {'created_at': datetime.datetime.utcnow() - datetime.timedelta(seconds=seconds)})
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_reservation_ttl_covers_longest_create_timeout():
+    ledger = AllocationLedger()
+    ledger.register_create_timeout('placement', 1505)
+    ledger.register_create_timeout('warm_pool', 1500)
+
+    assert ledger.reservation_ttl == 1505 + LEDGER_RESERVATION_MARGIN
+
+
+def test_expired_reservation_notifies_listeners(client, add_host):
+    host = add_host('10.0.0.1')
+    allocation_id = allocation_ledger.reserve(host, VM)
+    _backdate(allocation_id, allocation_ledger.reservation_ttl + 1)
+    notified = []
+    allocation_ledger._listeners.append(lambda allocation, delta: notified.append((allocation['id'], delta)))
+    try:
+        assert allocation_ledger.reconcile_now()['expired_reservations'] == 1
+    finally:
+        allocation_ledger._listeners.pop()
+
+    assert notified == [(allocation_id, -1)]
+    assert allocation_ledger.allocated(host['id']).vms == 0
+
+
+def test_expiry_keeps_reservation_resolved_in_the_meantime(client, add_host):
+    host = add_host('10.0.0.1')
+    allocation_id = allocation_ledger.reserve(host, VM)
+    _backdate(allocation_id, allocation_ledger.reservation_ttl + 1)
+    allocation_ledger.activate(allocation_id, 'vm-1')
+
+    assert allocation_ledger.reconcile_now()['expired_reservations'] == 0
+    assert allocation_ledger.transition(allocation_id, 'failed', expected=('reserved',)) is None
+    assert allocation_ledger.allocated(host['id']).vms == 1
+
+
+def test_rebuild_does_not_lose_concurrent_reservations(client, add_host, monkeypatch):
+    from collections import defaultdict
+    from services import allocation_ledger as ledger_module
+    host = add_host('10.0.0.1')
+    queried, resume = threading.Event(), threading.Event()
+
+    def paused_defaultdict(factory):
+        # Entre la requête de la reconstruction et le remplacement des sommes
+        queried.set()
+        resume.wait(5)
+        return defaultdict(factory)
+
+    monkeypatch.setattr(ledger_module, 'defaultdict', paused_defaultdict)
+    rebuilder = threading.Thread(target=allocation_ledger.rebuild_now)
+    rebuilder.start()
+    assert queried.wait(5)
+    reserver = threading.Thread(target=allocation_ledger.reserve, args=(host, VM))
+    reserver.start()
+    # La réservation attend la fin de la reconstruction
+    reserver.join(0.2)
+    assert reserver.is_alive()
+    resume.set()
+    rebuilder.join()
+    reserver.join()
+
+    assert allocation_ledger.allocated(host['id']).vms == 1
+
+
+def test_warm_pool_creations_outlive_reservation_ttl():
+    from services.warm_pool import VM_HOST_CONNECT_TIMEOUT, WARM_POOL_CREATE_TIMEOUT
+
+    assert allocation_ledger.reservation_ttl >= \
+        VM_HOST_CONNECT_TIMEOUT + WARM_POOL_CREATE_TIMEOUT + LEDGER_RESERVATION_MARGIN
+
+
+def test_reservation_created_at_is_utc(client, add_host):
+    from database import SessionLocal
+    from models.model_allocation import VMAllocationEntity
+
+    host = add_host('10.0.0.1')
+    allocation_id = allocation_ledger.reserve(host, VM)
+    db = SessionLocal()
+    try:
+        created_at = db.query(VMAllocationEntity).filter(VMAllocationEntity.id == allocation_id).one().created_at
+    finally:
+        db.close()
+
+    assert abs((datetime.datetime.utcnow() - created_at).total_seconds()) < 5
+    assert allocation_ledger.reconcile_now()['expired_reservations'] == 0
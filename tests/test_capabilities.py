@@ -0,0 +1,69 @@
+from services.capabilities import CapabilityIndex, capabilities, popcount
+
+
+def test_periodic_refresh_picks_up_other_instance_writes(client, add_host):
+    from database import SessionLocal
+    from models.model_cluster import ClusterEntity
+    host = add_host('10.0.0.1', architecture='x86_64', cpu_flags=['avx2'])
+    db = SessionLocal()
+    try:
+        capabilities.ensure(db)
+        assert capabilities.eligible('x86_64', ['avx512f']) == (0, ['flag:avx512f'])
+        # Écriture d'une autre instance: aucune notification locale
+        db.query(ClusterEntity).filter(ClusterEntity.id == host['id']).update({'cpu_flags': 'avx2 avx512f'})
+        db.commit()
+
+        capabilities._built_at -= capabilities.refresh
+        capabilities.ensure(db)
+
+        eligible, missing = capabilities.eligible('x86_64', ['avx512f'])
+        assert missing == [] and capabilities.contains(eligible, host['id'])
+    finally:
+        db.close()
+
+
+def test_changes_notified_during_refresh_are_replayed():
+    index = CapabilityIndex(refresh=60)
+
+    class Query:
+        def all(self):
+            # Hôte notifié pendant la requête, absent de son résultat
+            index.apply(None, {'id': 3, 'architecture': 'aarch64', 'cpu_flags': ['sve']})
+            return []
+
+    class Session:
+        def query(self, *args):
+            return Query()
+
+    index.ensure(Session())
+
+    eligible, missing = index.eligible('aarch64', ['sve'])
+    assert missing == [] and index.contains(eligible, 3) and popcount(eligible) == 1
+
+
+def test_host_slots_are_dense_and_reused():
+    index = CapabilityIndex(refresh=0)
+    index.rebuild([{'id': 10 ** 6, 'architecture': 'x86_64', 'cpu_flags': ['avx2']},
+                   {'id': 7, 'architecture': 'x86_64', 'cpu_flags': []}])
+
+    eligible, _ = index.eligible('x86_64')
+    # Bitset borné par le nombre d'hôtes, pas par le plus grand identifiant
+    assert eligible.bit_length() == 2
+    assert index.contains(eligible, 10 ** 6) and index.contains(eligible, 7)
+    assert not index.contains(eligible, 8)
+
+    # Une mise à jour garde l'emplacement; une suppression le libère pour le prochain hôte
+    index.apply({'id': 7}, {'id': 7, 'architecture': 'x86_64', 'cpu_flags': ['avx2']})
+    index.apply({'id': 10 ** 6}, None)
+    index.apply(None, {'id': 42, 'architecture': 'aarch64', 'cpu_flags': []})
+
+    assert index.stats()['host_slots'] == 2
+    eligible, _ = index.eligible('x86_64', ['avx2'])
+    assert popcount(eligible) == 1 and index.contains(eligible, 7) and not index.contains(eligible, 42)
+    eligible, _ = index.eligible('aarch64')
+    assert popcount(eligible) == 1 and index.contains(eligible, 42)
+
+    # Une resynchronisation conserve les emplacements des hôtes toujours présents
+    slots = dict(index._slots)
+    index.rebuild([{'id': 42, 'architecture': 'aarch64'}, {'id': 7, 'architecture': 'x86_64'}])
+    assert index._slots == slots
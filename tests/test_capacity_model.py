@@ -0,0 +1,92 @@
+from services.allocation_ledger import Allocated
+from services.capacity_model import CapacityModel, HostClass
+
+
+def _host(cores: int, ram: int, rom: int, **fields) -> dict:
+    host = {'number_of_core': cores, 'ram': ram, 'available_ram': ram, 'rom': rom, 'available_rom': rom,
+            'available_processor': 90.0}
+    host.update(fields)
+    return host
+
+
+def _allocated(cpu_count: int = 0, memory_size_mib: int = 0, disk_size_gb: int = 0) -> Allocated:
+    allocated = Allocated()
+    allocated.add(cpu_count, memory_size_mib, disk_size_gb)
+    return allocated
+
+
+def test_capacity_per_default_class():
+    model = CapacityModel()
+
+    # (cœurs - réservés) x ratio CPU, RAM en MiB moins la réserve de la classe
+    assert model.capacity(_host(8, 16, 200)) == {'vcpus': 14, 'memory_mib': 15360, 'disk_gb': 200}
+    assert model.capacity(_host(16, 64, 500)) == {'vcpus': 56, 'memory_mib': 63488, 'disk_gb': 500}
+    assert model.capacity(_host(64, 256, 2000)) == {'vcpus': 360, 'memory_mib': 258048, 'disk_gb': 2000}
+    assert [model.classify(_host(cores, 64, 500)).name for cores in (1, 15, 16, 63, 64)] == \
+        ['small', 'small', 'medium', 'medium', 'large']
+
+
+def test_class_requires_min_ram():
+    model = CapacityModel([HostClass('small'), HostClass('big', min_cores=16, min_ram_gb=128)])
+
+    assert model.classify(_host(32, 64, 500)).name == 'small'
+    assert model.classify(_host(32, 128, 500)).name == 'big'
+
+
+def test_free_subtracts_allocations_and_is_bounded_by_declared_usage():
+    model = CapacityModel()
+    host = _host(16, 64, 500)
+    allocated = _allocated(10, 4096, 50)
+
+    assert model.free(host, allocated) == {'vcpus': 46, 'memory_mib': 59392, 'disk_gb': 450}
+
+    # L'hôte déclare moins de mémoire et de disque libres que le registre ne le suppose
+    busy = dict(host, available_ram=20, available_rom=100)
+    assert model.free(busy, allocated) == {'vcpus': 46, 'memory_mib': 20480, 'disk_gb': 100}
+
+
+def test_overcommit_ratios_scale_capacity_and_declared_bounds():
+    model = CapacityModel([HostClass('dense', cpu_overcommit=3, ram_overcommit=1.5, disk_overcommit=2,
+                                     reserved_cores=2, reserved_ram_mib=1024)])
+    host = _host(10, 8, 100, available_ram=4, available_rom=40)
+
+    assert model.capacity(host) == {'vcpus': 24, 'memory_mib': 10752, 'disk_gb': 200}
+    assert model.free(host, _allocated()) == {'vcpus': 24, 'memory_mib': 6144, 'disk_gb': 80}
+
+
+def test_fits():
+    model = CapacityModel()
+    host = _host(16, 64, 500)
+    allocated = _allocated(50, 4096, 50)
+
+    assert model.fits(host, allocated, 6, 59392, 450)
+    assert not model.fits(host, allocated, 7, 1024, 1)
+    assert not model.fits(host, allocated, 1, 59393, 1)
+    assert not model.fits(host, allocated, 1, 1024, 451)
+    # Une VM ne peut pas avoir plus de vCPU que l'hôte n'a de cœurs, même si la surallocation le permettrait
+    assert not model.fits(host, _allocated(), 17, 1024, 1)
+
+
+def test_min_cpu_idle_guard():
+    model = CapacityModel(min_cpu_idle=10)
+    host = _host(16, 64, 500)
+
+    assert model.fits(dict(host, available_processor=10), _allocated(), 1, 1024, 1)
+    assert not model.fits(dict(host, available_processor=9.5), _allocated(), 1, 1024, 1)
+    assert not model.fits(dict(host, available_processor=None), _allocated(), 1, 1024, 1)
+
+
+def test_prefilter_thresholds_use_the_largest_ratios():
+    assert CapacityModel(min_cpu_idle=10).prefilter(4, 8192, 20) == {
+        'available_ram': 8, 'available_rom': 20, 'available_processor': 10, 'number_of_core': 4}
+
+    model = CapacityModel([HostClass('small', ram_overcommit=1.0),
+                           HostClass('dense', min_cores=32, ram_overcommit=2.0, disk_overcommit=4.0)],
+                          min_cpu_idle=5)
+    thresholds = model.prefilter(4, 8192, 20)
+    assert thresholds == {'available_ram': 4, 'available_rom': 5, 'available_processor': 5, 'number_of_core': 4}
+
+    # Le préfiltre ne doit écarter aucun hôte où la VM tient
+    host = _host(32, 8, 10, available_ram=4, available_rom=5)
+    assert model.fits(host, _allocated(), 4, 8192, 20)
+    assert all(host[column] >= threshold for column, threshold in thresholds.items())
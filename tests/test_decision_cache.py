@@ -0,0 +1,76 @@
+from models.model_cluster import VMRequirements
+from services.decision_cache import DecisionCache, HostSnapshot
+
+ZONE = 'eu-west-1a'
+
+
+class Ledger:
+    """Capacité réduite à la RAM libre déclarée"""
+
+    @staticmethod
+    def fits(host: dict, cpu_count: int, memory_size_mib: int, disk_size_gb: int) -> bool:
+        return host['available_ram'] * 1024 >= memory_size_mib
+
+
+class Health:
+    @staticmethod
+    def is_placeable(cluster_id: int) -> bool:
+        return True
+
+
+def _host(cluster_id: int, available_ram: int) -> dict:
+    return {'id': cluster_id, 'nom': f"host-{cluster_id}", 'ip': f"10.0.0.{cluster_id}", 'zone': ZONE, 'rack': None,
+            'ram': 64, 'available_ram': available_ram, 'rom': 500, 'available_rom': 400, 'number_of_core': 16,
+            'available_processor': 90.0, 'architecture': 'x86_64', 'cpu_flags': []}
+
+
+def _ranked(cache: DecisionCache, *hosts: dict) -> set:
+    """Hôtes candidats (l'ordre dépend de la politique de placement)"""
+    requirements = VMRequirements(cpu_count=2, memory_size_mib=4096, disk_size_gb=5)
+    return {host.id for host in cache.ranked(ZONE, requirements, lambda: [HostSnapshot(h) for h in hosts])}
+
+
+def _expire(cache: DecisionCache):
+    for entry in cache._entries.values():
+        entry.created -= cache.ttl + 1
+
+
+def test_rebuild_after_ttl_refreshes_known_hosts():
+    cache = DecisionCache(ttl=60, ledger=Ledger(), health=Health())
+    assert _ranked(cache, _host(1, 48), _host(2, 32)) == {1, 2}
+
+    # Une autre instance a rempli l'hôte 1, sans notification locale: la reconstruction après TTL l'écarte
+    _expire(cache)
+    assert _ranked(cache, _host(1, 2), _host(2, 32)) == {2}
+    assert cache.stats()['counters']['expired'] == 1
+
+    # Une libération locale réévalue l'hôte 1 avec l'état relu, pas celui du premier chargement
+    cache.on_host_changed(1)
+    assert _ranked(cache) == {2}
+
+
+def test_selective_invalidation_reranks_a_single_host():
+    cache = DecisionCache(ttl=60, ledger=Ledger(), health=Health())
+    assert _ranked(cache, _host(1, 48), _host(2, 32)) == {1, 2}
+
+    cache.on_cluster_change(_host(1, 48), _host(1, 2))
+    assert _ranked(cache) == {2}
+    cache.on_cluster_change(_host(1, 2), _host(1, 60))
+    cache.on_cluster_change(_host(2, 32), None)
+    assert _ranked(cache) == {1}
+    assert cache.stats()['counters']['misses'] == 1
+
+
+def test_change_notified_during_build_wins_over_loaded_state():
+    cache = DecisionCache(ttl=60, ledger=Ledger(), health=Health())
+    requirements = VMRequirements(cpu_count=2, memory_size_mib=4096, disk_size_gb=5)
+
+    def load():
+        # Heartbeat de l'hôte 1 pendant la requête: l'état chargé est déjà périmé
+        cache.on_cluster_change(None, _host(1, 2))
+        return [HostSnapshot(_host(1, 48))]
+
+    assert [host.id for host in cache.ranked(ZONE, requirements, load)] == [1]
+    assert cache.stats()['counters']['stale_builds'] == 1 and cache.stats()['entries'] == 0
+    assert cache._hosts[1]['available_ram'] == 2
+    assert _ranked(cache, _host(1, 2)) == set()
@@ -0,0 +1,153 @@
+import os
+
+from services.event_log import CLUSTER_DELETE, CLUSTER_UPSERT, PLACEMENT, SNAPSHOT, EventLog, read_events
+
+
+def _host(i: int) -> dict:
+    return {'id': i, 'nom': f"host-{i}", 'ip': f"10.0.0.{i}"}
+
+
+def test_compaction_bounds_the_log_and_preserves_state(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path, snapshot_every=10 ** 9)
+    log.open()
+    for n in range(500):
+        log.append(CLUSTER_UPSERT, _host(n % 5))
+        log.append(PLACEMENT, {'outcome': 'created', 'host_id': n % 5})
+    log.append(CLUSTER_DELETE, {'id': 4})
+    size = os.path.getsize(path)
+
+    log.compact()
+    log.append(PLACEMENT, {'outcome': 'failed'})
+    expected = log.state.to_dict()
+    log.close()
+
+    assert os.path.getsize(path) < size / 10
+    assert [event[2] for event in read_events(path)] == [SNAPSHOT, PLACEMENT]
+    recovered = EventLog(path)
+    recovery = recovered.open()
+    recovered.close()
+    assert recovery['from_snapshot'] and recovery['replayed_events'] == 1
+    assert recovered.state.to_dict() == expected
+
+
+def test_interrupted_compaction_keeps_original_log(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path)
+    log.open()
+    log.append(CLUSTER_UPSERT, _host(1))
+    log.close()
+    with open(f"{path}.compact", 'wb') as f:
+        f.write(b'partiel')
+
+    recovered = EventLog(path)
+    recovery = recovered.open()
+    recovered.close()
+
+    assert not os.path.exists(f"{path}.compact")
+    assert recovery == dict(recovery, from_snapshot=False, replayed_events=1)
+    assert list(recovered.state.hosts) == [1]
+
+
+def test_offsets_stay_monotonic_across_compaction(tmp_path):
+    path = str(tmp_path / 'events.log')
+    log = EventLog(path, snapshot_every=10 ** 9)
+    log.open()
+    offsets = [log.append(CLUSTER_UPSERT, _host(n % 3)) for n in range(50)]
+    log.compact()
+    offsets.append(log.append(PLACEMENT, {'outcome': 'created', 'host_id': 1}))
+    log.compact()
+    offsets.append(log.append(PLACEMENT, {'outcome': 'failed'}))
+    log.close()
+
+    assert offsets == sorted(offsets) and len(set(offsets)) == len(offsets)
+    events = list(read_events(path))
+    assert [event[2] for event in events] == [SNAPSHOT, PLACEMENT]
+    # L'instantané porte l'offset du premier événement qui le suit
+    assert [event[0] for event in events] == [offsets[-1], offsets[-1]]
+    # Relecture à partir d'un offset noté avant la compaction: l'événement est retrouvé à son offset
+    assert [event[0] for event in read_events(path, offsets[-1])] == [offsets[-1]]
+    # Un offset compacté repart de l'instantané
+    assert [event[2] for event in read_events(path, offsets[10])] == [SNAPSHOT, PLACEMENT]
+
+    reopened = EventLog(path)
+    reopened.open()
+    assert reopened.append(PLACEMENT, {'outcome': 'created', 'host_id': 2}) > offsets[-1]
+    reopened.close()
+
+
+def _db_hosts(client, add_host, count: int):
+    return [add_host(f"10.0.0.{i + 1}", zone='eu-west-1a') for i in range(count)]
+
+
+def test_seed_builds_host_indexes_from_the_log(tmp_path, client, add_host):
+    from database import SessionLocal
+    from models.model_cluster import ClusterEntity
+    from services.capabilities import CapabilityIndex
+    from services.zone_index import ZoneIndex
+
+    path = str(tmp_path / 'events.log')
+    hosts = _db_hosts(client, add_host, 3)
+    log = EventLog(path)
+    log.open()
+    for host in hosts:
+        log.on_cluster_change(None, host)
+    log.close()
+
+    zones, capabilities = ZoneIndex(), CapabilityIndex()
+    recovered = EventLog(path)
+    recovered.open()
+    db = SessionLocal()
+    try:
+        assert recovered.seed(db, (zones, capabilities))
+        # Aucun balayage de la base: les index sont déjà à jour
+        db.query(ClusterEntity).delete()
+        zones.ensure(db)
+        capabilities.ensure(db)
+    finally:
+        db.close()
+        recovered.close()
+
+    assert recovered.recovery['seeded_indexes']
+    assert zones.zones() == ['eu-west-1a'] and zones.zone_of(hosts[0]['id']) == 'eu-west-1a'
+    assert capabilities.initialized
+
+
+def test_seed_falls_back_to_the_database(tmp_path, client, add_host):
+    from database import SessionLocal
+    from services.zone_index import ZoneIndex
+
+    path = str(tmp_path / 'events.log')
+    hosts = _db_hosts(client, add_host, 2)
+    log = EventLog(path)
+    log.open()
+    for host in hosts:
+        log.on_cluster_change(None, host)
+    log.on_cluster_change(None, dict(hosts[0], id=99))
+    log.close()
+
+    db = SessionLocal()
+    try:
+        # Base différente du journal (remise à zéro, autre base): pas d'alimentation
+        mismatched = EventLog(path)
+        mismatched.open()
+        assert not mismatched.seed(db, (ZoneIndex(),))
+        mismatched.close()
+
+        # Journal corrompu: la relecture s'arrête avant la fin et n'est pas utilisée, même si les hôtes
+        # rejoués jusque-là correspondent à la base
+        path = str(tmp_path / 'corrupt.log')
+        log = EventLog(path)
+        log.open()
+        for host in hosts + hosts:
+            log.on_cluster_change(None, host)
+        log.close()
+        with open(path, 'r+b') as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b'xxx')
+        corrupt = EventLog(path)
+        recovery = corrupt.open()
+        assert not recovery['complete'] and not corrupt.seed(db, (ZoneIndex(),))
+        corrupt.close()
+    finally:
+        db.close()
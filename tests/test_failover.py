@@ -0,0 +1,145 @@
+import time
+
+import pytest
+
+from routes import cluster_route
+from services.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN, breakers
+
+from conftest import create_vm
+
+
+def test_breaker_closed_open_half_open_closed(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, half_open_max_calls=1)
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow_request()
+
+    now[0] += 30
+    assert breaker.is_available()
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Un seul essai à la fois en half_open
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request()
+
+
+def test_failed_half_open_trial_reopens(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=10)
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    breaker.record_failure()
+    now[0] += 10
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.to_dict()['times_opened'] == 2
+
+
+def test_failover_to_next_ranked_host(client, add_host, fake_vm_host):
+    # Politique pack: l'hôte le plus rempli est classé en premier
+    first = add_host('10.0.0.1', available_ram=20)
+    second = add_host('10.0.0.2', available_ram=40)
+    fake_vm_host.set_fault('10.0.0.1', status=503)
+
+    body = create_vm(client).json()
+
+    assert body['statusCode'] == 200
+    assert body['data']['host']['id'] == second['id']
+    assert [attempt['host_id'] for attempt in body['data']['attempts']] == [first['id']]
+    assert body['data']['allocation']['state'] == 'active'
+    assert fake_vm_host.calls == ['10.0.0.1', '10.0.0.2']
+
+
+def test_repeated_failures_open_breaker_and_skip_host(client, add_host, fake_vm_host):
+    add_host('10.0.0.1', available_ram=20)
+    add_host('10.0.0.2', available_ram=40)
+    fake_vm_host.set_fault('10.0.0.1', down=True)
+
+    # Une image différente à chaque fois: l'hôte 2 ne gagne pas de bonus de localité
+    for image_id in range(breakers.get(1).failure_threshold):
+        assert create_vm(client, system_image_id=100 + image_id).json()['statusCode'] == 200
+    assert breakers.get(1).state == OPEN
+
+    calls = fake_vm_host.calls_to('10.0.0.1')
+    body = create_vm(client, system_image_id=200).json()
+    assert body['statusCode'] == 200 and body['data']['attempts'] == []
+    assert fake_vm_host.calls_to('10.0.0.1') == calls
+    snapshot = client.get('/api/service-clusters/placement/breakers').json()['data']['breakers']
+    assert snapshot['1']['state'] == OPEN
+
+
+def test_latency_opens_breaker(client, add_host, fake_vm_host, monkeypatch):
+    monkeypatch.setattr(cluster_route, 'PLACEMENT_LATENCY_BUDGET', 0.05)
+    host = add_host('10.0.0.1')
+    fake_vm_host.set_fault('10.0.0.1', latency=1)
+
+    for _ in range(breakers.get(host['id']).failure_threshold):
+        body = create_vm(client).json()
+        # Pas de nouvel essai ailleurs: la VM a pu être créée malgré le délai dépassé
+        assert body['statusCode'] == 504
+    assert breakers.get(host['id']).state == OPEN
+
+    body = create_vm(client).json()
+    assert body['statusCode'] == 503
+
+
+def test_all_hosts_failing_returns_attempts(client, add_host, fake_vm_host, monkeypatch):
+    monkeypatch.setattr(cluster_route, 'PLACEMENT_MAX_ATTEMPTS', 2)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        add_host(ip)
+        fake_vm_host.set_fault(ip, status=500)
+
+    body = create_vm(client).json()
+
+    assert body['statusCode'] == 500
+    assert len(body['data']['attempts']) == 2
+    assert len(fake_vm_host.calls) == 2
+
+
+@pytest.mark.parametrize('status_code', [400, 409])
+def test_client_error_is_not_retried(client, add_host, fake_vm_host, status_code):
+    add_host('10.0.0.1', available_ram=20)
+    add_host('10.0.0.2', available_ram=40)
+    fake_vm_host.set_fault('10.0.0.1', status=status_code)
+
+    body = create_vm(client).json()
+
+    assert body['statusCode'] == status_code
+    assert fake_vm_host.calls == ['10.0.0.1']
+    assert breakers.get(1).state == CLOSED
+
+
+def test_unused_half_open_trial_is_released(client, add_host, fake_vm_host, monkeypatch):
+    from services.allocation_ledger import allocation_ledger
+    host = add_host('10.0.0.1')
+    breaker = breakers.get(host['id'])
+    breaker.state = HALF_OPEN
+    # Capacité prise par un placement concurrent entre le classement et la réservation
+    monkeypatch.setattr(allocation_ledger, 'reserve', lambda *args, **kwargs: None)
+
+    create_vm(client)
+
+    assert fake_vm_host.calls == []
+    assert breaker.state == HALF_OPEN and breaker.half_open_calls == 0 and breaker.is_available()
+
+
+def test_failed_reservation_releases_half_open_trial(client, add_host, fake_vm_host, monkeypatch):
+    from services.allocation_ledger import allocation_ledger
+    host = add_host('10.0.0.1')
+    breaker = breakers.get(host['id'])
+    breaker.state = HALF_OPEN
+
+    def reserve(*args, **kwargs):
+        raise RuntimeError("base indisponible")
+
+    monkeypatch.setattr(allocation_ledger, 'reserve', reserve)
+
+    with pytest.raises(RuntimeError):
+        create_vm(client)
+
+    assert breaker.half_open_calls == 0 and breaker.is_available()
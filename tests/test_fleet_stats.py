@@ -0,0 +1,51 @@
+from services.allocation_ledger import allocation_ledger
+from services.fleet_stats import fleet_stats
+
+from conftest import create_vm
+
+
+def _stats(client, **params):
+    body = client.get('/api/service-clusters/stats', params=params).json()
+    assert body['statusCode'] == 200, body
+    return body['data']
+
+
+def test_reservation_is_counted_before_next_heartbeat(client, add_host):
+    host = add_host('10.0.0.1', ram=64, rom=500, number_of_core=16)
+    assert _stats(client)['allocated']['vms'] == 0
+
+    allocation_id = allocation_ledger.reserve(host, {'user_id': '1', 'name': 'vm', 'cpu_count': 4,
+                                                     'memory_size_mib': 8192, 'disk_size_gb': 50})
+
+    allocated = fleet_stats.snapshot()['allocated']
+    assert (allocated['vms'], allocated['cpu_count'], allocated['memory_size_mib'], allocated['disk_size_gb']) \
+        == (1, 4, 8192, 50)
+    assert allocated['utilization'] == {'rom_pct': 10.0, 'ram_pct': 12.5, 'cpu_pct': 25.0}
+
+    allocation_ledger.fail(allocation_id)
+    assert fleet_stats.snapshot()['allocated']['vms'] == 0
+
+
+def test_placement_updates_allocated_and_reconciles(client, add_host, fake_vm_host):
+    add_host('10.0.0.1')
+    add_host('10.0.0.2')
+    _stats(client)
+
+    for _ in range(3):
+        assert create_vm(client).json()['statusCode'] == 200
+
+    data = _stats(client, reconcile='true')
+    assert data['allocated']['vms'] == 3 and data['allocated']['cpu_count'] == 6
+    assert data['reconciliation']['consistent'], data['reconciliation']
+
+
+def test_deleted_host_drops_its_allocations(client, add_host, fake_vm_host):
+    host = add_host('10.0.0.1')
+    _stats(client)
+    assert create_vm(client).json()['statusCode'] == 200
+
+    client.delete(f"/api/service-clusters/{host['id']}")
+
+    data = _stats(client, reconcile='true')
+    assert data['allocated']['vms'] == 0 and data['totals']['clusters'] == 0
+    assert data['reconciliation']['consistent'], data['reconciliation']
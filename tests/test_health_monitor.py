@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+from services.health_monitor import HealthMonitor, DOWN, PROBE_DOWN_THRESHOLD, UP
+
+
+def test_failed_probes_take_host_down():
+    async def probe(ip, port, path, timeout):
+        return ip != '10.0.0.2', None if ip != '10.0.0.2' else 'timeout'
+
+    monitor = HealthMonitor(probe=probe)
+    monitor.track_host(1, '10.0.0.1')
+    monitor.track_host(2, '10.0.0.2')
+    for _ in range(PROBE_DOWN_THRESHOLD):
+        asyncio.run(monitor.run_cycle(now=float('inf')))
+    assert monitor.state(1) == UP and monitor.is_placeable(1)
+    assert monitor.state(2) == DOWN and not monitor.is_placeable(2)
+
+
+def test_cycle_survives_concurrent_track_and_forget():
+    async def probe(ip, port, path, timeout):
+        await asyncio.sleep(0)
+        return True, None
+
+    monitor = HealthMonitor(probe=probe)
+    for cluster_id in range(200):
+        monitor.track_host(cluster_id, f"10.0.{cluster_id // 256}.{cluster_id % 256}")
+    stop = threading.Event()
+
+    def churn():
+        cluster_id = 1000
+        while not stop.is_set():
+            monitor.track_host(cluster_id, '10.1.0.1')
+            monitor.forget_host(cluster_id - 1)
+            cluster_id += 1
+
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        for _ in range(50):
+            assert asyncio.run(monitor.run_cycle(now=float('inf'))) > 0
+            monitor.stats(include_hosts=True)
+    finally:
+        stop.set()
+        thread.join()
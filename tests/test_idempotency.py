@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+
+import httpx
+
+from services.idempotency import IdempotencyStore
+
+from conftest import create_vm
+
+N = 8
+
+
+def _body(**fields):
+    body = {'name': 'vm', 'user_id': '1', 'os_type': 'ubuntu-24.04', 'cpu_count': 2, 'memory_size_mib': 2048,
+            'disk_size_gb': 5}
+    body.update(fields)
+    return body
+
+
+async def _fire(app, key: str, bodies):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+        return await asyncio.gather(*(
+            http.post('/api/service-clusters/find-suitable-host', json=body, headers={'Idempotency-Key': key})
+            for body in bodies))
+
+
+def _allocations():
+    from database import SessionLocal
+    from models.model_allocation import VMAllocationEntity
+    db = SessionLocal()
+    try:
+        return db.query(VMAllocationEntity).count()
+    finally:
+        db.close()
+
+
+def test_concurrent_same_key_places_once(client, add_host, fake_vm_host):
+    add_host('10.0.0.1')
+    # Le faux hôte répond lentement: toutes les requêtes arrivent pendant le placement
+    fake_vm_host.set_fault('10.0.0.1', latency=0.3)
+
+    responses = asyncio.run(_fire(client.app, 'key-1', [_body()] * N))
+
+    assert len(fake_vm_host.calls) == 1
+    assert _allocations() == 1
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.text for response in responses}) == 1
+    assert sum(response.headers.get('Idempotent-Replayed') == 'true' for response in responses) == N - 1
+
+    # Un nouvel essai après coup rejoue le résultat sans nouveau placement
+    replay = create_vm(client, idempotency_key='key-1')
+    assert replay.text == responses[0].text and replay.headers['Idempotent-Replayed'] == 'true'
+    assert len(fake_vm_host.calls) == 1
+
+
+def test_same_key_different_body_is_rejected(client, add_host, fake_vm_host):
+    add_host('10.0.0.1')
+    assert create_vm(client, idempotency_key='key-2').json()['statusCode'] == 200
+
+    response = create_vm(client, idempotency_key='key-2', cpu_count=4)
+
+    assert response.status_code == 422
+    assert len(fake_vm_host.calls) == 1
+
+
+def test_concurrent_different_body_is_rejected(client, add_host, fake_vm_host):
+    add_host('10.0.0.1')
+    fake_vm_host.set_fault('10.0.0.1', latency=0.3)
+
+    first, second = asyncio.run(_fire(client.app, 'key-3', [_body(), _body(cpu_count=4)]))
+
+    assert first.status_code == 200 and second.status_code == 422
+    assert len(fake_vm_host.calls) == 1
+
+
+def test_key_claimed_by_another_instance_conflicts(client, add_host, fake_vm_host):
+    from database import SessionLocal
+    from models.model_idempotency import IdempotencyRecordEntity
+    from services.idempotency import fingerprint
+    from models.model_cluster import VMRequirements
+
+    add_host('10.0.0.1')
+    body = _body()
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    db = SessionLocal()
+    try:
+        db.add(IdempotencyRecordEntity(key='key-4', status='in_progress', created_at=now,
+                                       request_hash=fingerprint(VMRequirements(**body).model_dump_json()),
+                                       expires_at=now + datetime.timedelta(hours=1)))
+        db.commit()
+    finally:
+        db.close()
+
+    response = create_vm(client, idempotency_key='key-4')
+
+    assert response.status_code == 409 and response.headers['Retry-After']
+    assert fake_vm_host.calls == []
+
+
+def test_placement_survives_cancelled_first_request():
+    store = IdempotencyStore(persist=False)
+    release = asyncio.Event()
+    runs = []
+
+    async def producer():
+        runs.append(1)
+        await release.wait()
+        return 200, {'statusCode': 200, 'data': {'vm': 1}}, {}
+
+    async def scenario():
+        first = asyncio.create_task(store.execute('k', 'h', producer))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(store.execute('k', 'h', producer))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first, await joiner
+
+    first, (result, replayed) = asyncio.run(scenario())
+
+    assert first.cancelled()
+    assert result[1]['data'] == {'vm': 1} and replayed
+    assert runs == [1]
+
+
+def test_joiners_get_503_when_shared_placement_is_cancelled():
+    store = IdempotencyStore(persist=False)
+
+    async def producer():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        first = asyncio.create_task(store.execute('k', 'h', producer))
+        await asyncio.sleep(0)
+        joiner = asyncio.create_task(store.execute('k', 'h', producer))
+        await asyncio.sleep(0)
+        request_hash, shared = store._inflight['k']
+        shared.cancel()
+        return await asyncio.gather(first, joiner)
+
+    (first, _), (joined, _) = asyncio.run(scenario())
+
+    assert first[0] == 503 and joined[0] == 503
+    assert store.stats()['inflight'] == 0
+
+
+def test_overlong_key_is_rejected(client, add_host, fake_vm_host):
+    add_host('10.0.0.1')
+
+    response = create_vm(client, idempotency_key='k' * 256)
+
+    assert response.status_code == 400
+    assert fake_vm_host.calls == []
+
+
+def test_database_error_on_claim_returns_503(client, add_host, fake_vm_host, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from services.idempotency import idempotency_store
+
+    def unavailable(key, request_hash):
+        raise OperationalError('INSERT', {}, Exception('server has gone away'))
+
+    add_host('10.0.0.1')
+    monkeypatch.setattr(idempotency_store, '_claim', unavailable)
+
+    response = create_vm(client, idempotency_key='key-5')
+
+    assert response.status_code == 503 and response.headers['Retry-After']
+    assert fake_vm_host.calls == []
+
+
+def test_claim_race_is_a_conflict_but_other_errors_propagate(client, monkeypatch):
+    import pytest
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    from sqlalchemy.orm import Session
+
+    store = IdempotencyStore()
+
+    def commit(error):
+        def fail(self):
+            raise error
+        monkeypatch.setattr(Session, 'commit', fail)
+
+    commit(IntegrityError('INSERT', {}, Exception('Duplicate entry')))
+    assert store._claim('key-6', 'h') is False
+
+    commit(OperationalError('INSERT', {}, Exception('server has gone away')))
+    with pytest.raises(OperationalError):
+        store._claim('key-6', 'h')
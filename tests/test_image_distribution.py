@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from services.image_distribution import resolve_source
+
+
+@pytest.fixture
+def root(tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    (images / 'ubuntu.ext4').write_bytes(b'rootfs')
+    (tmp_path / '.env').write_text('MYSQL_PASSWORD=secret')
+    return str(images)
+
+
+def test_relative_path_resolves_inside_root(root):
+    assert resolve_source('ubuntu.ext4', root) == os.path.realpath(os.path.join(root, 'ubuntu.ext4'))
+
+
+@pytest.mark.parametrize('source_path', ['../.env', '/etc/passwd', '', '.'])
+def test_paths_outside_root_are_rejected(root, source_path):
+    with pytest.raises(ValueError):
+        resolve_source(source_path, root)
+
+
+def test_symlink_escaping_root_is_rejected(root, tmp_path):
+    os.symlink(tmp_path / '.env', os.path.join(root, 'link.ext4'))
+    with pytest.raises(ValueError):
+        resolve_source('link.ext4', root)
@@ -0,0 +1,91 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from services import image_variants
+from services.image_variants import evict_cache, get_variant, read_variant, render_variant, variant_path
+
+
+def _png(width: int = 800, height: int = 600) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGBA', (width, height), (20, 120, 200, 255)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def original(tmp_path):
+    path = tmp_path / 'ubuntu.png'
+    path.write_bytes(_png())
+    return str(path)
+
+
+def test_render_variants(original):
+    for variant, spec in image_variants.VARIANTS.items():
+        dest = render_variant(original, variant)
+        assert dest == variant_path(original, variant)
+        with Image.open(dest) as img:
+            assert img.format == spec['format']
+            if spec['size']:
+                assert img.width <= spec['size'][0] and img.height <= spec['size'][1]
+            else:
+                assert img.size == (800, 600)
+    assert not [name for name in os.listdir(os.path.dirname(dest)) if name.endswith('.tmp')]
+
+
+def test_eviction_removes_least_recently_served(original):
+    paths = {variant: render_variant(original, variant) for variant in ('thumbnail', 'card', 'webp')}
+    for n, variant in enumerate(('card', 'webp', 'thumbnail')):
+        os.utime(paths[variant], (1000 + n, 1000 + n))
+    keep = os.path.getsize(paths['thumbnail'])
+
+    freed = evict_cache(os.path.dirname(paths['card']), max_bytes=keep)
+
+    assert freed > 0
+    assert sorted(os.listdir(os.path.dirname(paths['card']))) == [os.path.basename(paths['thumbnail'])]
+
+
+def test_variant_evicted_while_served_is_regenerated(original, monkeypatch):
+    path = render_variant(original, 'thumbnail')
+    utime = os.utime
+
+    def evicted(target, *args, **kwargs):
+        # L'éviction supprime la variante entre la recherche et la mise à jour LRU
+        if target == path and os.path.exists(path):
+            os.remove(path)
+        return utime(target, *args, **kwargs)
+
+    monkeypatch.setattr(os, 'utime', evicted)
+
+    assert get_variant(original, 'thumbnail') == path
+    assert os.path.exists(path)
+    monkeypatch.undo()
+    assert read_variant(original, 'thumbnail')[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+def test_upload_and_serve_variants(client):
+    response = client.post('/api/service-clusters/system-images/',
+                           data={'name': 'Ubuntu 24.04', 'os_type': 'ubuntu-24.04', 'version': '24.04'},
+                           files={'image': ('ubuntu.png', _png(), 'image/png')}).json()
+    assert response['statusCode'] == 201, response
+    image_id = response['data']['id']
+    url = f"/api/service-clusters/system-images/{image_id}/image"
+
+    original = client.get(url)
+    assert original.status_code == 200 and original.content == _png()
+
+    thumbnail = client.get(url, params={'variant': 'thumbnail'})
+    assert thumbnail.headers['content-type'] == 'image/png'
+    with Image.open(io.BytesIO(thumbnail.content)) as img:
+        assert img.size == (128, 96)
+
+    # Variante évincée du cache: régénérée à la demande
+    from routes.system_image_route import _absolute
+    os.remove(variant_path(_absolute(response['data']['image_path']), 'card'))
+    card = client.get(url, params={'variant': 'card'})
+    assert card.headers['content-type'] == 'image/jpeg'
+
+    assert client.get(url, params={'variant': 'bmp'}).json()['statusCode'] == 400
+    assert client.delete(f"/api/service-clusters/system-images/{image_id}").json()['statusCode'] == 200
+    assert client.get(url).json()['statusCode'] == 404
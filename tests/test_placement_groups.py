@@ -0,0 +1,139 @@
+import random
+import threading
+from collections import Counter
+
+from services.circuit_breaker import OPEN, breakers
+from services.placement_groups import PlacementGroupIndex, domain_of, placement_groups
+from services.zone_index import ZoneIndex
+
+from conftest import create_vm
+
+THREADS = 8
+
+
+def _create_group(client, name: str, policy: str, scope: str = 'host'):
+    response = client.post('/api/service-clusters/placement-groups/',
+                           json={'name': name, 'policy': policy, 'scope': scope}).json()
+    assert response['statusCode'] == 201, response
+    return placement_groups.get(name)
+
+
+def _zones(racks: int, per_rack: int) -> ZoneIndex:
+    zones = ZoneIndex(refresh=0)
+    zones.rebuild({'id': rack * per_rack + n + 1, 'zone': 'zone-a', 'rack': f"rack-{rack}", 'available_ram': 256,
+                   'available_rom': 2000, 'available_processor': 100, 'number_of_core': 64}
+                  for rack in range(racks) for n in range(per_rack))
+    return zones
+
+
+def test_affinity_keeps_members_on_the_first_host(client, add_host, fake_vm_host):
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        add_host(ip)
+    group = _create_group(client, 'web', 'affinity')
+
+    hosts = {create_vm(client, placement_group='web').json()['data']['host']['id'] for _ in range(4)}
+
+    assert len(hosts) == 1
+    assert group.members == Counter({hosts.pop(): 4})
+
+
+def test_anti_affinity_spreads_then_refuses(client, add_host, fake_vm_host):
+    first, second = add_host('10.0.0.1'), add_host('10.0.0.2')
+    group = _create_group(client, 'db', 'anti_affinity')
+
+    placed = [create_vm(client, placement_group='db').json() for _ in range(3)]
+
+    assert {body['data']['host']['id'] for body in placed[:2]} == {first['id'], second['id']}
+    assert placed[2]['statusCode'] == 404
+    assert group.members == Counter({first['id']: 1, second['id']: 1})
+
+
+def test_concurrent_claims_respect_anti_affinity(monkeypatch):
+    zones = _zones(racks=10, per_rack=3)
+    monkeypatch.setattr('services.placement_groups.zone_index', zones)
+    index = PlacementGroupIndex()
+    index.rebuild([{'id': 1, 'name': 'anti-rack', 'policy': 'anti_affinity', 'scope': 'rack'}], [])
+    group = index.get('anti-rack')
+    hosts = list(range(1, 31))
+    barrier = threading.Barrier(THREADS)
+    winners = []
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        barrier.wait()
+        for cluster_id in rng.sample(hosts, len(hosts)):
+            if index.claim(group, cluster_id):
+                winners.append(cluster_id)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    racks = Counter(domain_of('rack', cluster_id, zones) for cluster_id in winners)
+    assert len(winners) == 10 and set(racks.values()) == {1}
+    assert group.size() == 10 and index.conflicts == THREADS * len(hosts) - 10
+
+
+def test_concurrent_claim_unclaim_leaves_counters_balanced(monkeypatch):
+    monkeypatch.setattr('services.placement_groups.zone_index', _zones(racks=4, per_rack=2))
+    index = PlacementGroupIndex()
+    index.rebuild([{'id': 1, 'name': 'spread', 'policy': 'soft_spread', 'scope': 'rack'}], [])
+    group = index.get('spread')
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        for _ in range(500):
+            cluster_id = rng.randint(1, 8)
+            assert index.claim(group, cluster_id)
+            index.unclaim(group, cluster_id)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert group.size() == 0 and not group.members and not group.domains and not group.zones
+
+
+def test_failed_placement_releases_group_counters(client, add_host, fake_vm_host):
+    for ip in ('10.0.0.1', '10.0.0.2'):
+        add_host(ip)
+        fake_vm_host.set_fault(ip, status=500)
+    group = _create_group(client, 'batch', 'anti_affinity')
+
+    body = create_vm(client, placement_group='batch').json()
+
+    assert body['statusCode'] == 500 and len(body['data']['attempts']) == 2
+    assert group.size() == 0 and not group.domains
+
+
+def test_open_breaker_releases_group_claim(client, add_host, fake_vm_host):
+    host = add_host('10.0.0.1')
+    group = _create_group(client, 'cache', 'anti_affinity')
+    breaker = breakers.get(host['id'])
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+    create_vm(client, placement_group='cache')
+
+    assert fake_vm_host.calls == []
+    assert group.size() == 0
+
+
+def test_lost_group_claim_keeps_half_open_trial(client, add_host, fake_vm_host, monkeypatch):
+    from services.circuit_breaker import HALF_OPEN
+    host = add_host('10.0.0.1')
+    _create_group(client, 'queue', 'anti_affinity')
+    breaker = breakers.get(host['id'])
+    breaker.state = HALF_OPEN
+    # Un placement concurrent prend le domaine entre le filtrage et le claim
+    monkeypatch.setattr(placement_groups, 'claim', lambda group, cluster_id: False)
+
+    create_vm(client, placement_group='queue')
+
+    assert fake_vm_host.calls == []
+    assert breaker.half_open_calls == 0 and breaker.is_available()
@@ -0,0 +1,55 @@
+import pytest
+
+from models.model_cluster import VMRequirements
+from services.allocation_ledger import allocation_ledger
+from services.preemption import preemption_planner
+from services.warm_pool import WARM_POOL_USER
+
+
+@pytest.mark.parametrize('owner, preempted', [('42', True), (WARM_POOL_USER, False)])
+def test_warm_pool_vms_are_never_victims(client, add_host, owner, preempted):
+    from database import SessionLocal
+    host = add_host('10.0.0.1', ram=8, available_ram=8)
+    # Hôte rempli (8 Go moins la réserve de l'hôte) par une seule VM de basse priorité
+    allocation_id = allocation_ledger.reserve(host, {'user_id': owner, 'name': 'low', 'cpu_count': 1,
+                                                     'memory_size_mib': 6144, 'disk_size_gb': 1}, priority='dev')
+    allocation_ledger.activate(allocation_id, 'vm-low')
+    request = VMRequirements(cpu_count=1, memory_size_mib=4096, disk_size_gb=1, priority='critical')
+
+    db = SessionLocal()
+    try:
+        plan = preemption_planner.candidates(db, request, ['default'])
+    finally:
+        db.close()
+
+    if preempted:
+        assert [victim['allocation_id'] for victim in plan['victims']] == [allocation_id]
+    else:
+        assert plan is None
+
+
+def test_lowest_class_is_preempted_first(client, add_host):
+    from database import SessionLocal
+
+    def fill(host, *priorities):
+        allocations = {}
+        for priority in priorities:
+            vm = {'user_id': '42', 'name': f"{priority}-{host['id']}", 'cpu_count': 1,
+                  'memory_size_mib': 6144 // len(priorities), 'disk_size_gb': 1}
+            allocations[priority] = allocation_ledger.reserve(host, vm, priority=priority)
+            allocation_ledger.activate(allocations[priority], f"vm-{allocations[priority]}")
+        return allocations
+
+    # Premier hôte: une seule VM standard suffirait; second hôte: trois classes, la plus basse créée en dernier
+    fill(add_host('10.0.0.1', ram=8, available_ram=8), 'standard')
+    mixed = fill(add_host('10.0.0.2', ram=8, available_ram=8), 'production', 'standard', 'dev')
+    request = VMRequirements(cpu_count=1, memory_size_mib=2048, disk_size_gb=1, priority='critical')
+
+    db = SessionLocal()
+    try:
+        plan = preemption_planner.candidates(db, request, ['default'])
+    finally:
+        db.close()
+
+    assert [victim['allocation_id'] for victim in plan['victims']] == [mixed['dev']]
+    assert plan['highest_victim_priority'] == 'dev'
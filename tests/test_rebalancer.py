@@ -0,0 +1,70 @@
+from itertools import count
+
+from services.capacity_model import CapacityModel, HostClass
+from services.rebalancer import RebalancePlanner
+from services.warm_pool import WARM_POOL_USER
+
+# Une seule classe sans surallocation ni réserve: capacité = cœurs et RAM déclarés
+MODEL = CapacityModel([HostClass('flat')], min_cpu_idle=0)
+TARGET = {'cpu_count': 4, 'memory_size_mib': 8192, 'disk_size_gb': 10, 'count': 1}
+
+
+class Fleet:
+    def __init__(self):
+        self.hosts = []
+        self.allocations = []
+        self._ids = count(1)
+
+    def vm(self, cpu_count: int, memory_size_mib: int, user_id: str = '1', placement_group_id=None) -> dict:
+        allocation_id = next(self._ids)
+        return {'id': allocation_id, 'vm_id': f"vm-{allocation_id}", 'vm_name': f"vm-{allocation_id}",
+                'user_id': user_id, 'state': 'active', 'placement_group_id': placement_group_id,
+                'cpu_count': cpu_count, 'memory_size_mib': memory_size_mib, 'disk_size_gb': 1}
+
+    def host(self, cluster_id: int, cores: int, ram_gb: int, *vms: dict):
+        used_mib = sum(vm['memory_size_mib'] for vm in vms)
+        self.hosts.append({'id': cluster_id, 'number_of_core': cores, 'ram': ram_gb,
+                           'available_ram': ram_gb - used_mib / 1024, 'rom': 1000, 'available_rom': 1000,
+                           'available_processor': 90.0, 'architecture': 'x86_64'})
+        self.allocations += [dict(vm, cluster_id=cluster_id) for vm in vms]
+
+    def pinned_host(self, cluster_id: int) -> set:
+        """Hôte 8 cœurs / 16 GB occupé par une VM de groupe de placement et une VM préchauffée"""
+        vms = [self.vm(4, 8192, placement_group_id=7), self.vm(2, 4096, user_id=WARM_POOL_USER)]
+        self.host(cluster_id, 8, 16, *vms)
+        return {vm['id'] for vm in vms}
+
+    def planner(self) -> RebalancePlanner:
+        return RebalancePlanner(self.hosts, self.allocations, model=MODEL)
+
+
+def test_plan_frees_a_slot_with_the_fewest_migrations():
+    fleet = Fleet()
+    pinned = fleet.pinned_host(1)
+    # Même déficit (2 vCPU, 4 GiB) sur les hôtes 2 et 3: une migration suffit sur le 2, il en faut deux sur le 3
+    fleet.host(2, 8, 16, *(fleet.vm(2, 4096) for _ in range(3)))
+    fleet.host(3, 8, 16, *(fleet.vm(1, 2048) for _ in range(6)))
+    planner = fleet.planner()
+    assert planner.fragmentation((4, 8192, 10))['slots'] == 0
+
+    plan = planner.plan([TARGET])
+
+    assert plan['complete'] and plan['targets'][0]['satisfied']
+    assert plan['targets'][0]['after']['slots'] >= 1
+    assert len(plan['migrations']) == 1
+    assert plan['migrations'][0]['from_cluster_id'] == 2 and plan['migrations'][0]['to_cluster_id'] != 2
+    assert plan['freed_hosts'] == [{'cluster_id': 2, 'target': 0, 'migrations': 1}]
+    assert plan['pinned_vms'] == 2 and not pinned & {m['allocation_id'] for m in plan['migrations']}
+
+
+def test_group_and_warm_pool_vms_are_never_moved():
+    fleet = Fleet()
+    fleet.pinned_host(1)
+    # Place libre ailleurs pour chacune des deux VM, mais aucun autre hôte assez grand pour la cible
+    fleet.host(2, 4, 6)
+    fleet.host(3, 2, 4)
+
+    plan = fleet.planner().plan([TARGET])
+
+    assert not plan['complete'] and plan['migrations'] == []
+    assert plan['movable_vms'] == 0 and plan['pinned_vms'] == 2
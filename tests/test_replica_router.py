@@ -0,0 +1,123 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from models.model_cluster import ClusterEntity
+from database import Base
+from services import replica_router as replica_router_module
+from services.replica_router import ReplicaRouter, RoutingSession
+
+CLUSTER = {'adresse_mac': '02:00:00:00:00:01', 'ip': '10.0.0.1', 'rom': 500, 'available_rom': 400, 'ram': 64,
+           'available_ram': 48, 'processeur': 'x86_64', 'available_processor': 90.0, 'number_of_core': 16}
+
+
+class Sandbox:
+    """Primaire et réplica SQLite; replicate() recopie les tables comme le ferait la réplication"""
+
+    def __init__(self, tmp_path, router: ReplicaRouter):
+        self.tables = Base.metadata.sorted_tables
+        self.primary = create_engine(f"sqlite:///{tmp_path}/primary.db")
+        self.replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+        for engine in (self.primary, self.replica):
+            Base.metadata.create_all(bind=engine)
+        self.router = router
+        router.configure(self.primary, [self.replica])
+        self.sessions = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=self.primary)
+
+    def replicate(self):
+        with self.primary.connect() as source, self.replica.begin() as target:
+            for table in reversed(self.tables):
+                target.execute(table.delete())
+            for table in self.tables:
+                rows = [dict(row._mapping) for row in source.execute(table.select())]
+                if rows:
+                    target.execute(table.insert(), rows)
+
+    def catch_up(self):
+        """Battement, réplication puis mesure: le réplica est à jour"""
+        self.router.check()
+        self.replicate()
+        self.router.check()
+
+    def add_cluster(self, nom: str):
+        with Session(bind=self.primary) as db:
+            db.add(ClusterEntity(nom=nom, **CLUSTER))
+            db.commit()
+
+    def find(self, nom: str):
+        with self.sessions() as db:
+            return db.query(ClusterEntity).filter(ClusterEntity.nom == nom).first()
+
+    def healthy(self) -> bool:
+        return self.router.replicas[0].healthy
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    router = ReplicaRouter(max_lag=0.5, heartbeat_interval=0)
+    monkeypatch.setattr(replica_router_module, 'replica_router', router)
+    sandbox = Sandbox(tmp_path, router)
+    yield sandbox
+    sandbox.primary.dispose()
+    sandbox.replica.dispose()
+
+
+def test_replica_without_heartbeat_is_skipped_until_replicated(sandbox):
+    sandbox.router.check()
+    assert not sandbox.healthy() and sandbox.router.replicas[0].lag is None
+
+    sandbox.replicate()
+    sandbox.router.check()
+
+    assert sandbox.healthy()
+
+
+def test_reads_are_served_by_the_replica(sandbox):
+    sandbox.catch_up()
+    sandbox.add_cluster('stale')
+
+    # Pas encore répliquée: la lecture sur le réplica est périmée
+    assert sandbox.find('stale') is None
+    assert sandbox.router.replicas[0].reads == 1
+
+    sandbox.replicate()
+    assert sandbox.find('stale') is not None
+
+
+def test_session_is_pinned_to_the_primary_after_a_flush(sandbox):
+    sandbox.catch_up()
+    with sandbox.sessions() as db:
+        assert db.query(ClusterEntity).count() == 0
+        assert db.get_bind() is sandbox.replica
+        db.add(ClusterEntity(nom='own-write', **CLUSTER))
+        db.flush()
+        # La session relit ses propres écritures sur le primaire
+        assert db.query(ClusterEntity).filter(ClusterEntity.nom == 'own-write').first() is not None
+        db.commit()
+        assert db.get_bind() is sandbox.primary
+        assert db.query(ClusterEntity).count() == 1
+    assert sandbox.router.replicas[0].reads == 1
+
+    # Une nouvelle session repart sur le réplica
+    assert sandbox.find('own-write') is None
+
+
+def test_lagging_replica_is_skipped_then_readmitted(sandbox, monkeypatch):
+    sandbox.catch_up()
+    sandbox.add_cluster('fresh')
+    assert sandbox.healthy()
+
+    # La réplication s'arrête pendant 10 s: le battement relu a 10 s de retard
+    now = time.time() + 10
+    monkeypatch.setattr(replica_router_module.time, 'time', lambda: now)
+    sandbox.router.check()
+
+    assert not sandbox.healthy() and sandbox.router.replicas[0].lag > sandbox.router.max_lag
+    assert sandbox.find('fresh') is not None
+    assert sandbox.router.fallbacks == 1 and sandbox.router.replicas[0].reads == 0
+
+    sandbox.replicate()
+    sandbox.router.check()
+    assert sandbox.healthy()
@@ -0,0 +1,50 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from models.model_cluster import ClusterEntity
+from database import Base, upgrade_schema
+
+
+def _legacy_engine(tmp_path):
+    """Base créée par une version antérieure: service_cluster sans zone, rack, architecture ni cpu_flags"""
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE service_cluster (id INTEGER PRIMARY KEY, nom VARCHAR(100) NOT NULL, "
+            "adresse_mac VARCHAR(17) NOT NULL UNIQUE, ip VARCHAR(15) NOT NULL UNIQUE, rom INTEGER NOT NULL, "
+            "available_rom INTEGER NOT NULL, ram INTEGER NOT NULL, available_ram INTEGER NOT NULL, "
+            "processeur VARCHAR(100) NOT NULL, available_processor FLOAT NOT NULL, number_of_core INTEGER NOT NULL)"))
+        connection.execute(text(
+            "INSERT INTO service_cluster VALUES (1, 'host-1', '02:00:00:00:00:01', '10.0.0.1', 500, 400, 64, 48, "
+            "'x86_64', 90.0, 16)"))
+    return engine
+
+
+def test_upgrade_adds_missing_columns_and_indexes(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    Base.metadata.create_all(bind=engine)
+
+    added = upgrade_schema(engine)
+
+    assert {'service_cluster.zone', 'service_cluster.rack', 'service_cluster.architecture',
+            'service_cluster.cpu_flags', 'ix_service_cluster_zone_ram'} <= set(added)
+    columns = {column['name'] for column in inspect(engine).get_columns('service_cluster')}
+    assert {'zone', 'rack', 'architecture', 'cpu_flags'} <= columns
+    with Session(bind=engine) as db:
+        host = db.get(ClusterEntity, 1)
+        # Les lignes existantes reçoivent la valeur par défaut du modèle
+        assert host.zone == 'default' and host.rack is None and host.to_dict()['cpu_flags'] == []
+        db.add(ClusterEntity(nom='host-2', adresse_mac='02:00:00:00:00:02', ip='10.0.0.2', rom=500,
+                             available_rom=400, ram=64, available_ram=48, processeur='x86_64',
+                             available_processor=90.0, number_of_core=16, zone='eu-west-1a', cpu_flags='avx2'))
+        db.commit()
+    engine.dispose()
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    assert upgrade_schema(engine) == []
+    engine.dispose()
@@ -0,0 +1,55 @@
+from services.timeseries import TimeSeriesStore
+
+
+def _fill(store, cluster_id: int, start: float, count: int, step: float):
+    for k in range(count):
+        store.record(cluster_id, {'available_ram': k, 'available_rom': 100 - k, 'available_processor': 50},
+                     ts=start + k * step)
+
+
+def test_binary_save_load_round_trip(tmp_path):
+    store = TimeSeriesStore(raw_points=4, minute_points=3, hour_points=2)
+    # Assez d'échantillons pour que les anneaux bruts et minute aient tourné
+    _fill(store, 1, 0, 10, 30)
+    _fill(store, 2, 7200, 3, 1)
+    path = str(tmp_path / 'series.bin')
+    store.save(path)
+
+    loaded = TimeSeriesStore(raw_points=4, minute_points=3, hour_points=2)
+    assert loaded.load(path) == 2
+
+    for cluster_id in (1, 2):
+        for metric in ('available_ram', 'available_rom', 'available_processor'):
+            for resolution in ('raw', '1m', '1h'):
+                assert loaded.query(cluster_id, metric, 0, 10000, resolution) == \
+                    store.query(cluster_id, metric, 0, 10000, resolution)
+    assert loaded.query(1, 'available_ram', 0, 10000, 'raw')['summary'] == {'count': 4, 'min': 6, 'max': 9,
+                                                                            'avg': 7.5}
+
+
+def test_load_ignores_file_with_other_dimensions(tmp_path):
+    store = TimeSeriesStore(raw_points=4, minute_points=3, hour_points=2)
+    _fill(store, 1, 0, 3, 1)
+    path = str(tmp_path / 'series.bin')
+    store.save(path)
+
+    other = TimeSeriesStore(raw_points=8, minute_points=3, hour_points=2)
+
+    assert other.load(path) == 0 and not other.has_host(1)
+
+
+def test_auto_resolution_uses_finest_ring_covering_start():
+    store = TimeSeriesStore(raw_points=4, minute_points=3, hour_points=2)
+    # 10 échantillons à 30 s d'intervalle: les bruts couvrent [180, 270], les minutes [120, 299]
+    _fill(store, 1, 0, 10, 30)
+
+    def resolution(start):
+        return store.query(1, 'available_ram', start, 300)['resolution']
+
+    assert resolution(180) == 'raw'
+    assert resolution(150) == '1m'
+    assert resolution(60) == '1h'
+
+    # Tant que l'anneau brut n'est pas plein, il couvre tout l'historique
+    _fill(store, 2, 0, 3, 30)
+    assert store.query(2, 'available_ram', 0, 300)['resolution'] == 'raw'
@@ -0,0 +1,48 @@
+from services.zone_index import ZoneIndex, zone_index
+
+
+def _host(cluster_id: int, zone: str) -> dict:
+    return {'id': cluster_id, 'zone': zone, 'rack': None, 'available_ram': 32, 'available_rom': 100,
+            'available_processor': 50, 'number_of_core': 8}
+
+
+def test_periodic_refresh_picks_up_other_instance_writes(client, add_host):
+    from database import SessionLocal
+    from models.model_cluster import ClusterEntity
+    host = add_host('10.0.0.1', zone='eu-west-1a')
+    db = SessionLocal()
+    try:
+        zone_index.ensure(db)
+        assert zone_index.zone_of(host['id']) == 'eu-west-1a'
+        # Écriture d'une autre instance: aucune notification locale
+        db.query(ClusterEntity).filter(ClusterEntity.id == host['id']).update({'zone': 'eu-west-1b'})
+        db.commit()
+
+        zone_index.ensure(db)
+        assert zone_index.zone_of(host['id']) == 'eu-west-1a'
+
+        zone_index._built_at -= zone_index.refresh
+        zone_index.ensure(db)
+        assert zone_index.zone_of(host['id']) == 'eu-west-1b'
+        assert zone_index.zones() == ['eu-west-1b']
+    finally:
+        db.close()
+
+
+def test_changes_notified_during_refresh_are_replayed():
+    index = ZoneIndex(refresh=60)
+
+    class Query:
+        def all(self):
+            # Hôte ajouté puis notifié pendant la requête, absent de son résultat
+            index.apply(None, _host(2, 'b'))
+            return []
+
+    class Session:
+        def query(self, *args):
+            return Query()
+
+    index.ensure(Session())
+
+    assert index.zone_of(2) == 'b'
+    assert index.zones() == ['b']